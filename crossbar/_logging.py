@@ -36,13 +36,15 @@ import re
 import six
 import inspect
 import json
+import struct
 import warnings
+import threading
 
 from json import JSONEncoder
 
 from functools import partial
 
-from zope.interface import provider
+from zope.interface import provider, implementer
 
 from twisted.logger import ILogObserver, formatEvent, Logger, globalLogPublisher
 from twisted.logger import LogLevel, globalLogBeginner, formatTime
@@ -50,14 +52,18 @@ from twisted.logger import LogLevel, globalLogBeginner, formatTime
 from twisted.python.constants import NamedConstant
 from twisted.python.reflect import qual
 
-from pygments import highlight, lexers, formatters
-
 from weakref import WeakKeyDictionary
 
 from ._log_categories import log_keys
 
 record_separator = u"\x1e"
 cb_logging_aware = u"CROSSBAR_RICH_LOGGING_ENABLE=True"
+cb_logging_framed = u"CROSSBAR_RICH_LOGGING_ENABLE=framed"
+
+# framed log records start with this marker byte, followed by the length of
+# the UTF-8 encoded JSON (4 bytes, big endian), followed by the JSON itself
+log_frame_marker = b"\x1e"
+log_frame_header = struct.Struct(">cI")
 
 _loggers = WeakKeyDictionary()
 _loglevel = "info"  # Default is "info"
@@ -248,17 +254,16 @@ def make_stderr_observer(levels=(LogLevel.warn, LogLevel.error,
     return StandardErrorObserver
 
 
-def make_JSON_observer(outFile):
+def _make_JSON_encoder():
     """
-    Make an observer which writes JSON to C{outfile}.
+    Make a function which encodes log events to JSON.
     """
     class CrossbarEncoder(JSONEncoder):
         def default(self, o):
             return escape_formatting(repr(o))
     encoder = CrossbarEncoder()
 
-    @provider(ILogObserver)
-    def _make_json(_event):
+    def _encode(_event):
 
         event = dict(_event)
 
@@ -303,12 +308,79 @@ def make_JSON_observer(outFile):
         if not isinstance(text, six.text_type):
             text = text.decode('utf8')
 
-        print(text, end=record_separator, file=outFile)
+        return text
+
+    return _encode
+
+
+def make_JSON_observer(outFile):
+    """
+    Make an observer which writes JSON to C{outfile}.
+    """
+    encode = _make_JSON_encoder()
+
+    @provider(ILogObserver)
+    def _make_json(_event):
+        print(encode(_event), end=record_separator, file=outFile)
         outFile.flush()
 
     return _make_json
 
 
+def frame_log_record(text):
+    """
+    Frame a JSON encoded log event for writing to a framed log channel.
+    """
+    data = text.encode('utf8')
+    return log_frame_header.pack(log_frame_marker, len(data)) + data
+
+
+@implementer(ILogObserver)
+class FramedJSONObserver(object):
+    """
+    Observer which writes log events as framed JSON to C{outFile}.
+
+    Until started, every event is written right away. Once started, frames are
+    batched and written once per reactor iteration, except for warnings and
+    errors, which are written right away (together with the frames pending).
+    """
+
+    def __init__(self, outFile):
+        self._file = getattr(outFile, 'buffer', outFile)
+        self._encode = _make_JSON_encoder()
+        self._reactor = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def start(self, reactor):
+        """
+        Start batching writes.
+        """
+        self._reactor = reactor
+        reactor.addSystemEventTrigger('after', 'shutdown', self.flush)
+
+    def __call__(self, event):
+        urgent = event.get("log_level", None) in (LogLevel.warn, LogLevel.error, LogLevel.critical)
+        frame = frame_log_record(self._encode(event))
+        with self._lock:
+            self._pending.append(frame)
+            first = len(self._pending) == 1
+        if urgent or self._reactor is None or not self._reactor.running:
+            self.flush()
+        elif first:
+            self._reactor.callFromThread(self.flush)
+
+    def flush(self):
+        """
+        Write all pending frames.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            self._file.write(b"".join(pending))
+            self._file.flush()
+
+
 def make_logfile_observer(path, show_source=False):
     """
     Make an observer that writes out to C{path}.
@@ -469,6 +541,7 @@ def color_json(json_str):
     produce colored output on terminals.
     """
     assert(type(json_str) == six.text_type)
+    from pygments import highlight, lexers, formatters
     return highlight(json_str, lexers.JsonLexer(), formatters.TerminalFormatter())
 
 
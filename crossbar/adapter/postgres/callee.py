@@ -30,16 +30,313 @@
 
 from __future__ import absolute_import
 
-from autobahn.twisted.wamp import ApplicationSession
+import json
+
+from twisted.internet.defer import inlineCallbacks, returnValue, DeferredSemaphore
+
+from txpostgres import txpostgres
+
+from autobahn.wamp.types import RegisterOptions
+from autobahn.wamp.exception import ApplicationError
 
 from crossbar._logging import make_logger
+from crossbar.adapter.postgres.common import PostgreSQLAdapter
 
 __all__ = ('PostgreSQLCallee',)
 
 
-class PostgreSQLCallee(ApplicationSession):
+class PostgreSQLRegistration(object):
+    """
+    A PostgreSQL function registered as a WAMP procedure.
+    """
+
+    def __init__(self, registration_id, uri, proc, returns_set=False, concurrency=None, fetch_size=None):
+        self.id = registration_id
+        self.uri = uri
+        self.proc = proc
+        self.returns_set = returns_set
+        self.fetch_size = fetch_size
+
+        # name of the prepared statement (per pooled connection)
+        self.statement = u'crossbar_call_{}'.format(registration_id)
+
+        # bounds the number of concurrently running calls of this procedure
+        self.semaphore = DeferredSemaphore(concurrency)
+
+        # the WAMP registration (once registered on the router)
+        self.registration = None
+
+    def __repr__(self):
+        return "PostgreSQLRegistration(id={}, uri={}, proc={}, returns_set={})".format(self.id, self.uri, self.proc, self.returns_set)
+
+
+class _StatementCursor(txpostgres.Cursor):
+    """
+    Cursor giving access to the statements prepared on its connection.
+    """
+
+    def __init__(self, cursor, connection):
+        txpostgres.Cursor.__init__(self, cursor, connection)
+        self.prepared = connection.prepared
+
+
+class _StatementConnection(txpostgres.Connection):
+    """
+    Pooled database connection keeping track of the statements prepared on it.
+    """
+
+    cursorFactory = _StatementCursor
+
+    def __init__(self, *args, **kwargs):
+        txpostgres.Connection.__init__(self, *args, **kwargs)
+        self.prepared = set()
+
+    def connect(self, *args, **kwargs):
+        # prepared statements do not survive into a new database session
+        self.prepared.clear()
+        return txpostgres.Connection.connect(self, *args, **kwargs)
+
+
+class _StatementConnectionPool(txpostgres.ConnectionPool):
+    connectionFactory = _StatementConnection
+
+
+class PostgreSQLCallee(PostgreSQLAdapter):
+
+    """
+    PostgreSQL database adapter that exposes PostgreSQL functions as
+    WAMP procedures, e.g. functions written in SQL or PL/pgSQL.
+
+    Effectively, this adapter implements a WAMP Callee Role for PostgreSQL.
+
+    A function with signature ``(jsonb, jsonb, jsonb)`` (positional
+    arguments, keyword arguments and call details) returning ``jsonb`` or
+    ``SETOF jsonb`` can be registered from a PostgreSQL database session
+    like this:
+
+    ```sql
+    SELECT crossbar.register(
+       'com.example.create_user',
+       'account.create_user',
+       options := '{"concurrency": 4}'::jsonb
+    );
+    ```
+
+    Calls are run over a bounded connection pool (``pool_size`` in the
+    ``database`` configuration), using a prepared statement per procedure
+    and pooled connection. At most ``concurrency`` calls of a procedure
+    run at the same time (default ``concurrency`` in the ``database``
+    configuration). Rows returned from a ``SETOF jsonb`` function are
+    fetched in chunks of ``fetch_size`` rows via a cursor and sent to
+    the caller as progressive results, when the caller asked for those.
+    """
 
     log = make_logger()
 
+    PG_LOCK_ADAPTER = 101
+
+    PG_ROLE = u'Callee'
+
+    PG_CHANNEL = "crossbar_register"
+    """
+    The PostgreSQL NOTIFY channel used for Crossbar.io (un)registrations
+    from within the database.
+    """
+
+    PG_CONCURRENCY = 2
+    """
+    Default maximum number of concurrently running calls per procedure.
+    """
+
+    PG_FETCH_SIZE = 1000
+    """
+    Default number of rows fetched at once from functions returning ``SETOF jsonb``.
+    """
+
+    @inlineCallbacks
     def onJoin(self, details):
-        pass
+        # map of registration ID -> PostgreSQLRegistration
+        self._registrations = {}
+
+        # names of the prepared statements of currently registered procedures
+        self._statements = set()
+
+        yield PostgreSQLAdapter.onJoin(self, details)
+
+        self._concurrency = int(self._db_config.get('concurrency', self.PG_CONCURRENCY))
+
+        try:
+            self._pool = yield self.connect_pool(self._db_config, pool_factory=_StatementConnectionPool)
+        except Exception as e:
+            self.log.error("Could not start database connection pool: {error}", error=e)
+            self.leave()
+            return
+
+        # register all procedures currently registered in the database
+        res = yield self._pool.runQuery("SELECT r.id, r.uri, r.proc, r.options, pg_get_function_result(r.proc_oid) = 'SETOF jsonb' "
+                                        "FROM crossbar.registration AS r WHERE r.unregistered_at IS NULL ORDER BY r.id")
+        for registration_id, uri, proc, options, returns_set in res:
+            try:
+                yield self._register(registration_id, uri, proc, returns_set, options)
+            except Exception as e:
+                self.log.error("Failed to register procedure '{proc}' under URI '{uri}': {error}", proc=proc, uri=uri, error=e)
+
+    def on_notify(self, notify):
+        """
+        Process PostgreSQL notifications sent via `NOTIFY` on channel `self.PG_CHANNEL`.
+        """
+        if notify.channel == self.PG_CHANNEL:
+            try:
+                obj = json.loads(notify.payload)
+
+                if not isinstance(obj, dict):
+                    raise Exception("notification payload must be a dictionary, was type {0}".format(type(obj)))
+
+                if obj.get('type', None) == 'register':
+                    for k in ['registration_id', 'uri', 'proc']:
+                        if k not in obj:
+                            raise Exception("notification payload of type 'register' must have a '{0}' attribute".format(k))
+                    d = self._register(obj['registration_id'], obj['uri'], obj['proc'],
+                                       obj.get('returns_set', False), obj.get('options', None))
+
+                elif obj.get('type', None) == 'unregister':
+                    if 'registration_id' not in obj:
+                        raise Exception("notification payload of type 'unregister' must have a 'registration_id' attribute")
+                    d = self._unregister(obj['registration_id'])
+
+                else:
+                    raise Exception("notification payload 'type' must be one of ['register', 'unregister'], was '{0}'".format(obj.get('type', None)))
+
+                def error(err):
+                    self.log.error("Failed to process notification: {error}", error=err.value)
+                d.addErrback(error)
+
+            except Exception as e:
+                self.log.error(e)
+
+        else:
+            self.log.error("Received NOTIFY on unknown channel {channel}", channel=notify.channel)
+
+    @inlineCallbacks
+    def _register(self, registration_id, uri, proc, returns_set, options):
+        options = options or {}
+        if not isinstance(options, dict):
+            raise Exception("registration options must be a dictionary, was type {0}".format(type(options)))
+
+        concurrency = int(options.get('concurrency', self._concurrency))
+        fetch_size = int(options.get('fetch_size', self._db_config.get('fetch_size', self.PG_FETCH_SIZE)))
+        if concurrency < 1 or fetch_size < 1:
+            raise Exception("invalid registration options {0}".format(options))
+
+        reg = PostgreSQLRegistration(registration_id, uri, proc, returns_set, concurrency, fetch_size)
+
+        def endpoint(*args, **kwargs):
+            details = kwargs.pop('details')
+            return reg.semaphore.run(self._call, reg, args, kwargs, details)
+
+        reg.registration = yield self.register(endpoint, uri, options=RegisterOptions(details_arg='details'))
+        self._registrations[registration_id] = reg
+        self._statements.add(reg.statement)
+
+        self.log.info("Registered PostgreSQL function '{proc}' under URI '{uri}'", proc=proc, uri=uri)
+
+    @inlineCallbacks
+    def _unregister(self, registration_id):
+        reg = self._registrations.pop(registration_id, None)
+        if reg:
+            # the statement is deallocated on each pooled connection when next used
+            self._statements.discard(reg.statement)
+            yield reg.registration.unregister()
+            self.log.info("Unregistered PostgreSQL function '{proc}' from URI '{uri}'", proc=reg.proc, uri=reg.uri)
+
+    @inlineCallbacks
+    def _call(self, reg, args, kwargs, details):
+        call_details = {
+            u'caller': details.caller,
+            u'caller_authid': getattr(details, 'caller_authid', None),
+            u'caller_authrole': getattr(details, 'caller_authrole', None),
+        }
+        params = (json.dumps(list(args)), json.dumps(kwargs), json.dumps(call_details))
+
+        try:
+            if reg.returns_set:
+                res = yield self._pool.runInteraction(self._fetch_set, reg, params, details.progress)
+            else:
+                res = yield self._pool.runInteraction(self._execute, reg, params)
+        except Exception as e:
+            # database errors may reveal internals, so only log them
+            self.log.error("Call of PostgreSQL function '{proc}' failed: {error}", proc=reg.proc, error=e)
+            raise ApplicationError(u"crossbar.error.database_error", u"call of procedure '{}' failed".format(reg.uri))
+
+        returnValue(res)
+
+    @inlineCallbacks
+    def _prepare(self, cur, reg):
+        # prepared statements live on a database connection, which keeps track of
+        # the statements already prepared on it
+        prepared = cur.prepared
+
+        # deallocate statements of procedures unregistered meanwhile
+        for statement in prepared - self._statements:
+            yield cur.execute("DEALLOCATE {}".format(statement))
+            prepared.discard(statement)
+
+        if reg.statement not in prepared:
+            yield cur.execute("PREPARE {} (jsonb, jsonb, jsonb) AS SELECT * FROM {} ($1, $2, $3)".format(reg.statement, reg.proc))
+            prepared.add(reg.statement)
+
+    @inlineCallbacks
+    def _execute(self, cur, reg, params):
+        yield self._prepare(cur, reg)
+        yield cur.execute("EXECUTE {} (%s, %s, %s)".format(reg.statement), params)
+        row = cur.fetchone()
+        returnValue(row[0] if row else None)
+
+    @inlineCallbacks
+    def _fetch_set(self, cur, reg, params, progress):
+        # PostgreSQL cannot declare a cursor over EXECUTE of a prepared statement
+        yield cur.execute("DECLARE {} NO SCROLL CURSOR FOR SELECT * FROM {} (%s, %s, %s)".format(reg.statement, reg.proc), params)
+
+        rows = []
+        while True:
+            yield cur.execute("FETCH FORWARD {} FROM {}".format(reg.fetch_size, reg.statement))
+            chunk = [row[0] for row in cur.fetchall()]
+            if not chunk:
+                break
+            if progress:
+                # stream the rows to the caller as progressive results
+                progress(chunk)
+            else:
+                rows.extend(chunk)
+            if len(chunk) < reg.fetch_size:
+                break
+
+        yield cur.execute("CLOSE {}".format(reg.statement))
+
+        returnValue(rows)
+
+
+if __name__ == '__main__':
+    from autobahn.twisted.choosereactor import install_reactor
+    from autobahn.twisted.wamp import ApplicationRunner
+
+    import sys
+    if sys.platform == 'win32':
+        # IOCPReactor does did not implement addWriter: use select reactor
+        install_reactor('select')
+    else:
+        install_reactor()
+
+    config = {
+        u'database': {
+            u'host': u'127.0.0.1',
+            u'port': u'$DBPORT',
+            u'database': u'test',
+            u'user': u'testuser',
+            u'password': u'$DBPASSWORD'
+        }
+    }
+
+    runner = ApplicationRunner(url="ws://127.0.0.1:8080/ws",
+                               realm="realm1", extra=config)
+    runner.run(PostgreSQLCallee)
@@ -62,16 +62,35 @@ class PostgreSQLAdapter(ApplicationSession):
     This lock will be held during database schema upgrades.
     """
 
+    PG_LOCK_ADAPTER = 100
+    """
+    The `key2` part of the exclusive run lock held by the adapter (one per adapter class).
+    """
+
+    PG_ROLE = u'Publisher'
+    """
+    The WAMP role implemented by the adapter (used for logging and as part of the
+    PostgreSQL application name).
+    """
+
     PG_CHANNEL = ''
 
+    PG_POOL_SIZE = 3
+    """
+    Default number of connections in the (bounded) pool used for queries
+    other than the channel listener.
+    """
+
+    _pool = None
+
     @inlineCallbacks
     def onJoin(self, details):
         self.log.debug("Joined realm '{realm}' on router", realm=details.realm)
 
         self._db_config = self.resolve_config(self.config.extra['database'])
-        self._db_config['application_name'] = "Crossbar.io PostgreSQL Adapter (Publisher)"
+        self._db_config['application_name'] = "Crossbar.io PostgreSQL Adapter ({})".format(self.PG_ROLE)
         self._db_config['scripts'] = os.path.abspath(pkg_resources.resource_filename("crossbar", "adapter/postgres/ddl"))
-        self._db_config['adapter_xlock'] = 100
+        self._db_config['adapter_xlock'] = self.PG_LOCK_ADAPTER
         self._db_config['adapter_channel'] = self.PG_CHANNEL
 
         self.log.debug("Using database configuration {db_config}", db_config=self._db_config)
@@ -83,14 +102,17 @@ class PostgreSQLAdapter(ApplicationSession):
             self.log.error("Could not connect to database: {error}", error=e)
             self.leave()
 
-        self.log.info("PostgreSQL database adapter (Publisher) ready")
+        self.log.info("PostgreSQL database adapter ({role}) ready", role=self.PG_ROLE)
 
     def onLeave(self, details):
         self.log.debug("Left realm - {}".format(details))
+        if self._pool:
+            self._pool.close()
+            self._pool = None
         self.disconnect()
 
     def onDisconnect(self):
-        self.log.info("PostgreSQL database adapter (Publisher) stopped")
+        self.log.info("PostgreSQL database adapter ({role}) stopped", role=self.PG_ROLE)
 
     def resolve_config(self, db_config):
         # check if the config contains environment variables instead of
@@ -115,6 +137,49 @@ class PostgreSQLAdapter(ApplicationSession):
                             self.log.warn("Database configuration parameter '{}' should have been read from enviroment variable {}, but the latter is not set".format(k, envvar))
         return db_config
 
+    def _connection_params(self, db_config):
+        return {
+            u'user': db_config['user'],
+            u'password': db_config['password'],
+            u'host': db_config['host'],
+            u'port': db_config['port'],
+            u'database': db_config['database'],
+        }
+
+    @inlineCallbacks
+    def connect_pool(self, db_config, size=None, pool_factory=None):
+        """
+        Start a bounded pool of database connections, separate from the
+        connection used to listen on the NOTIFY channel.
+
+        :param db_config: The (resolved) database configuration.
+        :type db_config: dict
+        :param size: Number of connections in the pool. When not given, this is
+            taken from the ``pool_size`` database configuration item, falling back
+            to ``PG_POOL_SIZE``.
+        :type size: int
+        :param pool_factory: The connection pool class (default: a plain txpostgres pool).
+        :type pool_factory: class
+
+        :returns: A started connection pool.
+        :rtype: obj
+        """
+        if size is None:
+            size = int(db_config.get('pool_size', self.PG_POOL_SIZE))
+        if size < 1:
+            raise Exception("invalid database connection pool size {} - must be positive".format(size))
+
+        pool_factory = pool_factory or txpostgres.ConnectionPool
+        pool = pool_factory(None, min=size, **self._connection_params(db_config))
+        try:
+            yield pool.start()
+        except Exception as e:
+            raise Exception("database connection pool failed: {}".format(e))
+        else:
+            self.log.debug("Started database connection pool with {size} connections", size=size)
+
+        returnValue(pool)
+
     @inlineCallbacks
     def connect_and_observe(self, db_config, channel, fun):
 
@@ -122,13 +187,7 @@ class PostgreSQLAdapter(ApplicationSession):
         #
         conn = txpostgres.Connection()
 
-        db_conn_params = {
-            u'user': db_config['user'],
-            u'password': db_config['password'],
-            u'host': db_config['host'],
-            u'port': db_config['port'],
-            u'database': db_config['database'],
-        }
+        db_conn_params = self._connection_params(db_config)
 
         try:
             yield conn.connect(**db_conn_params)
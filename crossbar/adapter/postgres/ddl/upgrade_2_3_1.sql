@@ -0,0 +1,141 @@
+DROP FUNCTION IF EXISTS crossbar.register (TEXT, TEXT, TEXT, JSONB);
+
+CREATE OR REPLACE FUNCTION crossbar.register (
+    uri         TEXT,
+    proc        TEXT,
+    signature   TEXT        DEFAULT NULL,
+    options     JSONB       DEFAULT NULL
+) RETURNS BIGINT
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS
+$$
+DECLARE
+    l_proc              TEXT;
+    l_registration_id   BIGINT;
+    l_full_sig          TEXT;
+    l_proc_oid          INT;
+    l_return_type       TEXT;
+    l_payload           TEXT;
+    l_rec               RECORD;
+ BEGIN
+    IF signature IS NOT NULL THEN
+        RAISE EXCEPTION 'using arbitrary procedure signatures is not yet supported - expecting (jsonb, jsonb, jsonb)';
+    END IF;
+
+    IF options IS NOT NULL THEN
+        IF jsonb_typeof(options) != 'object' THEN
+            RAISE EXCEPTION 'options must be a jsonb object, was %', jsonb_typeof(options);
+        END IF;
+        FOR l_rec IN (SELECT jsonb_object_keys(options) AS key)
+        LOOP
+            IF NOT l_rec.key = ANY('{concurrency,fetch_size}'::text[]) THEN
+                RAISE EXCEPTION 'illegal attribute "%" in "options"', l_rec.key;
+            END IF;
+        END LOOP;
+    END IF;
+
+    l_full_sig := TRIM(LOWER(proc)) || ' (jsonb, jsonb, jsonb)';
+
+    BEGIN
+        SELECT l_full_sig::regprocedure::oid INTO l_proc_oid;
+    EXCEPTION WHEN OTHERS THEN
+        RAISE EXCEPTION 'no function "%" exists', l_full_sig;
+    END;
+
+    SELECT pg_get_function_result(l_proc_oid) INTO l_return_type;
+
+    IF l_return_type != 'jsonb' AND l_return_type != 'SETOF jsonb' THEN
+        RAISE EXCEPTION 'currently only JSONB or SETOF JSONB as return type is supported';
+    END IF;
+
+    SELECT r.uri INTO l_proc FROM crossbar.registration AS r
+        WHERE proc_oid = l_proc_oid AND unregistered_at IS NULL;
+
+    IF l_proc IS NOT NULL THEN
+        RAISE EXCEPTION 'procedure "%" already registered under URI "%"', l_full_sig, l_proc;
+    END IF;
+
+    INSERT INTO crossbar.registration (uri, proc, signature, proc_oid, options)
+        VALUES (uri, proc, signature, l_proc_oid, options)
+            RETURNING id INTO l_registration_id
+    ;
+
+    l_payload := json_build_object(
+        'type', 'register',
+        'uri', uri,
+        'proc', proc,
+        'signature', signature,
+        'proc_oid', l_proc_oid,
+        'returns_set', l_return_type = 'SETOF jsonb',
+        'registration_id', l_registration_id,
+        'options', options
+    )::text;
+
+    PERFORM pg_notify('crossbar_register', l_payload);
+
+    RETURN l_registration_id;
+END
+$$;
+
+COMMENT ON FUNCTION crossbar.register (TEXT, TEXT, TEXT, JSONB) IS
+'Register a function.
+
+The function must have the signature (jsonb, jsonb, jsonb) for positional
+arguments, keyword arguments and call details, and return JSONB or SETOF JSONB.
+The latter is returned to the caller as progressive results (when requested).
+
+Options can set "concurrency" (maximum number of concurrently running calls)
+and "fetch_size" (number of rows fetched at once for SETOF JSONB).
+'
+;
+
+GRANT EXECUTE ON FUNCTION crossbar.register
+    (TEXT, TEXT, TEXT, JSONB)
+        TO PUBLIC
+;
+
+
+DROP FUNCTION IF EXISTS crossbar.unregister (TEXT);
+
+CREATE OR REPLACE FUNCTION crossbar.unregister (
+    uri         TEXT
+) RETURNS BIGINT
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS
+$$
+DECLARE
+    l_registration_id   BIGINT;
+    l_payload           TEXT;
+ BEGIN
+    UPDATE crossbar.registration AS r SET unregistered_at = now()
+        WHERE r.uri = unregister.uri AND unregistered_at IS NULL
+            RETURNING id INTO l_registration_id
+    ;
+
+    IF l_registration_id IS NULL THEN
+        RAISE EXCEPTION 'no procedure registered under URI "%"', uri;
+    END IF;
+
+    l_payload := json_build_object(
+        'type', 'unregister',
+        'uri', uri,
+        'registration_id', l_registration_id
+    )::text;
+
+    PERFORM pg_notify('crossbar_register', l_payload);
+
+    RETURN l_registration_id;
+END
+$$;
+
+COMMENT ON FUNCTION crossbar.unregister (TEXT) IS
+'Unregister a function previously registered under the given URI.
+'
+;
+
+GRANT EXECUTE ON FUNCTION crossbar.unregister
+    (TEXT)
+        TO PUBLIC
+;
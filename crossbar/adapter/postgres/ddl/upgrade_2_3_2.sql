@@ -0,0 +1,3 @@
+UPDATE crossbar.meta SET value = 3::text::jsonb
+    WHERE key = 'schema_version'
+;
@@ -31,8 +31,11 @@
 from __future__ import absolute_import
 
 import json
+import time
 import six
 
+from twisted.internet.defer import inlineCallbacks, DeferredList
+
 from autobahn.wamp.types import PublishOptions
 
 from crossbar._logging import make_logger
@@ -62,6 +65,24 @@ class PostgreSQLPublisher(PostgreSQLAdapter):
        'com.example.topic1',
        json_build_array(23, 7, 'hello world!')::jsonb
     );
+    ```
+
+    Events with a serialized payload of 8000 octets or more (the limit
+    for PostgreSQL NOTIFY payloads) are buffered: the event is written
+    to the table ``crossbar.event`` and the notification only carries
+    the event ID. The adapter then drains the table in batches (using
+    ``SELECT .. FOR UPDATE SKIP LOCKED``) over a small connection pool.
+    The pool size and batch size can be set via the ``pool_size`` and
+    ``batch_size`` items in the ``database`` configuration. Throughput
+    of buffered events is logged (at debug level) after each drain, e.g.
+    when generating load like this:
+
+    ```sql
+    SELECT crossbar.publish(
+       'com.example.topic1',
+       json_build_array(repeat('x', 10000))::jsonb
+    ) FROM generate_series(1, 100000);
+    ```
 
     See also:
 
@@ -76,6 +97,36 @@ class PostgreSQLPublisher(PostgreSQLAdapter):
     sent from within the database.
     """
 
+    PG_BATCH_SIZE = 500
+    """
+    Default maximum number of buffered events fetched from table
+    ``crossbar.event`` in one query (per pooled connection).
+    """
+
+    PG_DRAIN_QUERY = """
+        DELETE FROM crossbar.event WHERE id IN (
+            SELECT id FROM crossbar.event ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+        ) RETURNING id, payload
+    """
+
+    @inlineCallbacks
+    def onJoin(self, details):
+        yield PostgreSQLAdapter.onJoin(self, details)
+
+        self._batch_size = int(self._db_config.get('batch_size', self.PG_BATCH_SIZE))
+        self._drain_active = False
+        self._drain_pending = False
+        self._drained_total = 0
+
+        try:
+            self._pool = yield self.connect_pool(self._db_config)
+        except Exception as e:
+            self.log.error("Could not start database connection pool: {error}", error=e)
+            self.leave()
+        else:
+            # process any events that were buffered while we were not running
+            self._drain()
+
     def on_notify(self, notify):
         """
         Process PostgreSQL notifications sent via `NOTIFY` on channel `self.PG_CHANNEL`.
@@ -98,84 +149,13 @@ class PostgreSQLPublisher(PostgreSQLAdapter):
                     raise Exception("notification payload 'type' must be one of ['inline', 'buffered'], was '{0}'".format(obj['type']))
 
                 if obj['type'] == 'inline':
-
-                    # check allowed attributes
-                    #
-                    for k in obj:
-                        if k not in ['type', 'topic', 'args', 'kwargs', 'options', 'details']:
-                            raise Exception("invalid attribute '{0}'' in notification of type 'inline'".format(k))
-
-                    # check for mandatory 'topic' attribute
-                    #
-                    if 'topic' not in obj:
-                        raise Exception("notification payload of type 'inline' must have a 'topic' attribute")
-                    topic = obj['topic']
-                    if not isinstance(topic, six.text_type):
-                        raise Exception("notification payload of type 'inline' must have a 'topic' attribute of type string - was {0}".format(type(obj['topic'])))
-
-                    # check for optional 'args' attribute
-                    #
-                    args = None
-                    if 'args' in obj and obj['args']:
-                        if not isinstance(obj['args'], list):
-                            raise Exception("notification payload of type 'inline' with wrong type for 'args' attribute: must be list, was {0}".format(obj['args']))
-                        else:
-                            args = obj['args']
-
-                    # check for optional 'kwargs' attribute
-                    #
-                    kwargs = None
-                    if 'kwargs' in obj and obj['kwargs']:
-                        if not isinstance(obj['kwargs'], dict):
-                            raise Exception("notification payload of type 'inline' with wrong type for 'kwargs' attribute: must be dict, was {0}".format(obj['kwargs']))
-                        else:
-                            kwargs = obj['kwargs']
-
-                    # check for optional 'options' attribute
-                    #
-                    options = None
-                    if 'options' in obj and obj['options']:
-                        if not isinstance(obj['options'], dict):
-                            raise Exception("notification payload of type 'inline' with wrong type for 'options' attribute: must be dict, was {0}".format(obj['options']))
-                        else:
-                            try:
-                                options = PublishOptions(**(obj['options']))
-                            except Exception as e:
-                                raise Exception("notification payload of type 'inline' with invalid attribute in 'options': {0}".format(e))
-
-                    # check for optional 'details' attribute
-                    #
-                    details = None
-                    if 'details' in obj and obj['details']:
-                        if not isinstance(obj['details'], dict):
-                            raise Exception("notification payload of type 'inline' with wrong type for 'details' attribute: must be dict, was {0}".format(obj['details']))
-                        else:
-                            details = obj['details']
-
-                    # now actually publish the WAMP event
-                    #
-                    if options:
-                        if kwargs:
-                            args = args or []
-                            self.publish(topic, *args, options=options, **kwargs)
-                        elif args:
-                            self.publish(topic, *args, options=options)
-                        else:
-                            self.publish(topic, options=options)
-                    else:
-                        if kwargs:
-                            args = args or []
-                            self.publish(topic, *args, **kwargs)
-                        elif args:
-                            self.publish(topic, *args)
-                        else:
-                            self.publish(topic)
-
-                    # self.log.debug('Event forwarded on topic "{topic}" with options {options} and details {details}: args={args}, kwargs={kwargs}', topic=topic, options=options, details=details, args=args, kwargs=kwargs)
-                    self.log.debug('Event forwarded to topic "{topic}" (options={options}) with args={args} and kwargs={kwargs}', topic=topic, options=options, details=details, args=args, kwargs=kwargs)
+                    self._publish_event(obj)
 
                 elif obj['type'] == 'buffered':
-                    raise Exception("notification payload type 'buffered' not implemented")
+                    # the notification only carries the ID of the event buffered
+                    # in table crossbar.event: we don't fetch events one by one, but
+                    # coalesce notifications into batched drains of the table
+                    self._drain()
 
                 else:
                     raise Exception("logic error")
@@ -186,6 +166,154 @@ class PostgreSQLPublisher(PostgreSQLAdapter):
         else:
             self.log.error("Received NOTIFY on unknown channel {channel}", channel=notify.channel)
 
+    def _publish_event(self, obj):
+        """
+        Check and publish an event of type 'inline' (either received directly via
+        NOTIFY or fetched from the event table).
+        """
+
+        # check allowed attributes
+        #
+        for k in obj:
+            if k not in ['type', 'topic', 'args', 'kwargs', 'options', 'details']:
+                raise Exception("invalid attribute '{0}'' in notification of type 'inline'".format(k))
+
+        # check for mandatory 'topic' attribute
+        #
+        if 'topic' not in obj:
+            raise Exception("notification payload of type 'inline' must have a 'topic' attribute")
+        topic = obj['topic']
+        if not isinstance(topic, six.text_type):
+            raise Exception("notification payload of type 'inline' must have a 'topic' attribute of type string - was {0}".format(type(obj['topic'])))
+
+        # check for optional 'args' attribute
+        #
+        args = None
+        if 'args' in obj and obj['args']:
+            if not isinstance(obj['args'], list):
+                raise Exception("notification payload of type 'inline' with wrong type for 'args' attribute: must be list, was {0}".format(obj['args']))
+            else:
+                args = obj['args']
+
+        # check for optional 'kwargs' attribute
+        #
+        kwargs = None
+        if 'kwargs' in obj and obj['kwargs']:
+            if not isinstance(obj['kwargs'], dict):
+                raise Exception("notification payload of type 'inline' with wrong type for 'kwargs' attribute: must be dict, was {0}".format(obj['kwargs']))
+            else:
+                kwargs = obj['kwargs']
+
+        # check for optional 'options' attribute
+        #
+        options = None
+        if 'options' in obj and obj['options']:
+            if not isinstance(obj['options'], dict):
+                raise Exception("notification payload of type 'inline' with wrong type for 'options' attribute: must be dict, was {0}".format(obj['options']))
+            else:
+                try:
+                    options = PublishOptions(**(obj['options']))
+                except Exception as e:
+                    raise Exception("notification payload of type 'inline' with invalid attribute in 'options': {0}".format(e))
+
+        # check for optional 'details' attribute
+        #
+        details = None
+        if 'details' in obj and obj['details']:
+            if not isinstance(obj['details'], dict):
+                raise Exception("notification payload of type 'inline' with wrong type for 'details' attribute: must be dict, was {0}".format(obj['details']))
+            else:
+                details = obj['details']
+
+        # now actually publish the WAMP event
+        #
+        if options:
+            if kwargs:
+                args = args or []
+                self.publish(topic, *args, options=options, **kwargs)
+            elif args:
+                self.publish(topic, *args, options=options)
+            else:
+                self.publish(topic, options=options)
+        else:
+            if kwargs:
+                args = args or []
+                self.publish(topic, *args, **kwargs)
+            elif args:
+                self.publish(topic, *args)
+            else:
+                self.publish(topic)
+
+        # self.log.debug('Event forwarded on topic "{topic}" with options {options} and details {details}: args={args}, kwargs={kwargs}', topic=topic, options=options, details=details, args=args, kwargs=kwargs)
+        self.log.debug('Event forwarded to topic "{topic}" (options={options}) with args={args} and kwargs={kwargs}', topic=topic, options=options, details=details, args=args, kwargs=kwargs)
+
+    def _drain(self):
+        """
+        Trigger draining of the event table. When a drain is already running, this
+        only makes sure the running drain will do another round.
+        """
+        if not self._pool:
+            return
+
+        if self._drain_active:
+            self._drain_pending = True
+            return
+
+        d = self._drain_loop()
+
+        def error(err):
+            self.log.failure("Failed to drain buffered events: {log_failure.value}", failure=err)
+        d.addErrback(error)
+
+    @inlineCallbacks
+    def _drain_loop(self):
+        self._drain_active = True
+        try:
+            started = time.time()
+            count = 0
+            while True:
+                self._drain_pending = False
+
+                # run one batched fetch per pooled connection: since rows are
+                # locked with SKIP LOCKED, the fetches won't block each other
+                res = yield DeferredList([self._pool.runQuery(self.PG_DRAIN_QUERY, (self._batch_size,))
+                                          for _ in range(self._pool.min)], consumeErrors=True)
+
+                exhausted = True
+                rows = []
+                for success, result in res:
+                    if success:
+                        rows.extend(result)
+                        if len(result) >= self._batch_size:
+                            exhausted = False
+                    else:
+                        self.log.error("Failed to fetch buffered events: {error}", error=result.value)
+
+                # publish in the order the events were queued
+                rows.sort(key=lambda row: row[0])
+                for event_id, payload in rows:
+                    try:
+                        obj = json.loads(payload)
+                        if not isinstance(obj, dict) or obj.get('type', None) != 'inline':
+                            raise Exception("buffered event must be a dictionary of type 'inline'")
+                        self._publish_event(obj)
+                    except Exception as e:
+                        self.log.error("Dropping buffered event {event_id}: {error}", event_id=event_id, error=e)
+
+                count += len(rows)
+
+                if exhausted and not self._drain_pending:
+                    break
+        finally:
+            self._drain_active = False
+
+        if count:
+            self._drained_total += count
+            duration = time.time() - started
+            self.log.debug("Drained {count} buffered events in {duration} ms ({rate} events/s, {total} total)",
+                           count=count, duration=int(1000. * duration),
+                           rate=int(count / duration) if duration else count, total=self._drained_total)
+
 
 if __name__ == '__main__':
     from autobahn.twisted.choosereactor import install_reactor
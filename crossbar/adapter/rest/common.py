@@ -37,7 +37,6 @@ import base64
 from crossbar._logging import make_logger
 from crossbar._compat import native_string
 
-from netaddr.ip import IPAddress, IPNetwork
 
 from twisted.web import server
 from twisted.web.resource import Resource
@@ -89,6 +88,7 @@ class _CommonResource(Resource):
 
         self._require_ip = None
         if 'require_ip' in options:
+            from netaddr.ip import IPNetwork
             self._require_ip = [IPNetwork(net) for net in options['require_ip']]
 
         self._require_tls = options.get('require_tls', None)
@@ -383,6 +383,7 @@ class _CommonResource(Resource):
         # enforce client IP address
         #
         if self._require_ip:
+            from netaddr.ip import IPAddress
             ip = IPAddress(native_string(client_ip))
             allowed = False
             for net in self._require_ip:
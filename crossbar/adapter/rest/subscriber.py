@@ -30,7 +30,6 @@
 
 from __future__ import absolute_import
 
-import treq
 import json
 
 from functools import partial
@@ -50,7 +49,11 @@ class MessageForwarder(ApplicationSession):
     log = make_logger()
 
     def __init__(self, *args, **kwargs):
-        self._webtransport = kwargs.pop("webTransport", treq)
+        self._webtransport = kwargs.pop("webTransport", None)
+        if self._webtransport is None:
+            # imported here, since treq installs the default reactor when imported
+            import treq
+            self._webtransport = treq
         super(MessageForwarder, self).__init__(*args, **kwargs)
 
     @inlineCallbacks
@@ -33,11 +33,13 @@ from __future__ import absolute_import
 import os
 import json
 import re
+import hashlib
+import functools
+import collections
 import six
 
 from pprint import pformat
-
-from pygments import highlight, lexers, formatters
+from six.moves import cPickle as pickle
 
 from autobahn.websocket.protocol import parseWsUrl
 
@@ -46,9 +48,6 @@ from autobahn.wamp.message import _URI_PAT_STRICT_LAST_EMPTY
 
 from crossbar._logging import make_logger
 
-import yaml
-from yaml import Loader, SafeLoader
-
 __all__ = ('check_config',
            'check_config_file',
            'convert_config_file',
@@ -109,6 +108,11 @@ NODE_SHUTDOWN_MODES = (
 Permissible node shutdown modes.
 """
 
+MANAGEMENT_TRANSPORTS = (u'websocket', u'rawsocket')
+"""
+Permissible transports between node controller and native workers.
+"""
+
 
 log = make_logger()
 
@@ -117,12 +121,99 @@ class InvalidConfigException(Exception):
     pass
 
 
+# maximum number of successful checks to remember
+VALIDATION_CACHE_SIZE = 10000
+
+# successful checks: (checker, content digest) -> checker result, in least recently used order
+_validated = collections.OrderedDict()
+
+# counts checks depending on more than the configuration content (e.g. environment
+# variables or files), the results of which must not be cached
+_volatile_checks = [0]
+
+# cache statistics
+_validation_cache_stats = {u'hits': 0, u'misses': 0}
+
+
+def _volatile():
+    """
+    Mark the check(s) in progress as depending on the environment.
+    """
+    _volatile_checks[0] += 1
+
+
+def _digest(config):
+    """
+    Digest of configuration content: equal digests mean equal content (but equal
+    content built differently might have different digests, which only means a
+    cache miss).
+    """
+    try:
+        return hashlib.sha256(pickle.dumps(config, 2)).digest()
+    except Exception:
+        return None
+
+
+def _cached(checker):
+    """
+    Remember successful checks of configuration items by content, so that
+    checking the same item again (e.g. when a worker is started with a part of
+    the already checked node configuration, or many realms share the same roles)
+    is cheap.
+    """
+    @functools.wraps(checker)
+    def check(config, *args, **kwargs):
+        digest = _digest(config) if not (args or kwargs) else None
+        if digest is None:
+            return checker(config, *args, **kwargs)
+
+        key = (checker.__name__, digest)
+        if key in _validated:
+            _validation_cache_stats[u'hits'] += 1
+            result = _validated.pop(key)
+            _validated[key] = result
+            return result
+
+        _validation_cache_stats[u'misses'] += 1
+        volatile = _volatile_checks[0]
+        result = checker(config, *args, **kwargs)
+        if _volatile_checks[0] == volatile:
+            if _validated and len(_validated) >= VALIDATION_CACHE_SIZE:
+                _validated.popitem(last=False)
+            _validated[key] = result
+        return result
+
+    return check
+
+
+def validation_cache_info():
+    """
+    Get statistics of the configuration validation cache.
+
+    :returns: The number of cache hits, misses and cached checks.
+    :rtype: dict
+    """
+    info = dict(_validation_cache_stats)
+    info[u'size'] = len(_validated)
+    return info
+
+
+def clear_validation_cache():
+    """
+    Forget all remembered configuration checks.
+    """
+    _validated.clear()
+    _validation_cache_stats[u'hits'] = 0
+    _validation_cache_stats[u'misses'] = 0
+
+
 def color_json(json_str):
     """
     Given an already formatted JSON string, return a colored variant which will
     produce colored output on terminals.
     """
     assert(type(json_str) == six.text_type)
+    from pygments import highlight, lexers, formatters
     return highlight(json_str, lexers.JsonLexer(), formatters.TerminalFormatter())
 
 
@@ -132,6 +223,7 @@ def color_yaml(yaml_str):
     produce colored output on terminals.
     """
     assert(type(yaml_str) == six.text_type)
+    from pygments import highlight, lexers, formatters
     return highlight(yaml_str, lexers.YamlLexer(), formatters.TerminalFormatter())
 
 
@@ -151,8 +243,17 @@ def pprint_json(obj, log_to=None):
 def construct_yaml_str(self, node):
     return self.construct_scalar(node)
 
-Loader.add_constructor(u'tag:yaml.org,2002:str', construct_yaml_str)
-SafeLoader.add_constructor(u'tag:yaml.org,2002:str', construct_yaml_str)
+
+def _yaml():
+    """
+    Import PyYAML on first use (only YAML configurations need it).
+    """
+    import yaml
+    if not getattr(yaml, '_crossbar_unicode', False):
+        yaml.Loader.add_constructor(u'tag:yaml.org,2002:str', construct_yaml_str)
+        yaml.SafeLoader.add_constructor(u'tag:yaml.org,2002:str', construct_yaml_str)
+        yaml._crossbar_unicode = True
+    return yaml
 
 
 # Environment variable names used by the utilities in the Shell and Utilities volume
@@ -168,6 +269,7 @@ _ENV_VAR_PAT = re.compile(_ENV_VAR_PAT_STR)
 
 
 def _readenv(var, msg):
+    _volatile()
     match = _ENV_VAR_PAT.match(var)
     if match and match.groups():
         envvar = match.groups()[0]
@@ -190,6 +292,7 @@ def maybe_from_env(config_item, value):
     if type(value) == six.text_type:
         match = _ENVPAT.match(value)
         if match and match.groups():
+            _volatile()
             var = match.groups()[0]
             if var in os.environ:
                 new_value = os.environ[var]
@@ -222,6 +325,7 @@ def get_config_value(config, item, default=None):
         if type(config[item]) == six.text_type:
             match = _ENV_VAR_PAT.match(config[item])
             if match and match.groups():
+                _volatile()
                 envvar = match.groups()[0]
                 if envvar in os.environ:
                     value = os.environ[envvar]
@@ -367,10 +471,23 @@ def check_transport_auth_wampcra(config):
         if 'authenticator' not in config:
             raise InvalidConfigException("missing mandatory attribute 'authenticator' in dynamic WAMP-CRA configuration")
         check_or_raise_uri(config['authenticator'], "invalid authenticator URI '{}' in dynamic WAMP-CRA configuration".format(config['authenticator']))
+        check_authenticator_cache(config, "dynamic WAMP-CRA configuration")
     else:
         raise InvalidConfigException("logic error")
 
 
+def check_authenticator_cache(config, where):
+    """
+    Check the (optional) authenticator cache attributes of a dynamic authentication configuration item.
+    """
+    for k in [u'authenticator-cache-ttl', u'authenticator-cache-size']:
+        if k in config:
+            if type(config[k]) not in six.integer_types:
+                raise InvalidConfigException("invalid type {} for attribute '{}' in {} - must be an integer".format(type(config[k]), k, where))
+            if config[k] < 0:
+                raise InvalidConfigException("invalid value {} for attribute '{}' in {} - must be non-negative".format(config[k], k, where))
+
+
 def check_transport_auth_tls(config):
     """
     Check a WAMP-CRA configuration item.
@@ -424,9 +541,14 @@ def check_transport_auth_cryptosign(config):
         if 'authenticator' not in config:
             raise InvalidConfigException("missing mandatory attribute 'authenticator' in dynamic WAMP-Cryptosign configuration")
         check_or_raise_uri(config['authenticator'], "invalid authenticator URI '{}' in dynamic WAMP-Cryptosign configuration".format(config['authenticator']))
+        check_authenticator_cache(config, "dynamic WAMP-Cryptosign configuration")
     else:
         raise InvalidConfigException("logic error")
 
+    if 'verify-threads' in config:
+        if type(config['verify-threads']) not in six.integer_types or config['verify-threads'] < 0:
+            raise InvalidConfigException("invalid value {} for attribute 'verify-threads' in WAMP-Cryptosign configuration - must be a non-negative integer".format(config['verify-threads']))
+
 
 def check_transport_auth_cookie(config):
     """
@@ -495,8 +617,12 @@ def check_cookie_store_memory(store):
     """
     check_dict_args({
         'type': (True, [six.text_type]),
+        'max_entries': (False, six.integer_types)
     }, store, "WebSocket file-backed cookie store configuration")
 
+    if 'max_entries' in store and store['max_entries'] < 0:
+        raise InvalidConfigException("invalid value {} for 'max_entries' in cookie store configuration - must be non-negative".format(store['max_entries']))
+
 
 def check_cookie_store_file(store):
     """
@@ -504,14 +630,44 @@ def check_cookie_store_file(store):
     """
     check_dict_args({
         'type': (True, [six.text_type]),
-        'filename': (False, [six.text_type])
+        'filename': (False, [six.text_type]),
+        'commit_interval': (False, list(six.integer_types) + [float]),
+        'compact_interval': (False, six.integer_types),
+        'max_entries': (False, six.integer_types)
     }, store, "WebSocket memory-backed cookie store configuration")
 
+    for k in ['commit_interval', 'compact_interval', 'max_entries']:
+        if k in store and store[k] < 0:
+            raise InvalidConfigException("invalid value {} for '{}' in cookie store configuration - must be non-negative".format(store[k], k))
+
 
 _COOKIE_NAME_PAT_STR = "^[a-z][a-z0-9_]+$"
 _COOKIE_NAME_PAT = re.compile(_COOKIE_NAME_PAT_STR)
 
 
+def check_transport_admission(admission):
+    """
+    Check a WAMP transport handshake admission control configuration.
+
+    :param admission: The admission control configuration.
+    :type admission: dict
+    """
+    check_dict_args({
+        'max_pending': (False, six.integer_types),
+        'max_queued': (False, six.integer_types),
+        'queue_timeout': (False, six.integer_types),
+        'retry_after': (False, six.integer_types),
+        'handshake_timeout': (False, six.integer_types),
+    }, admission, "WAMP transport 'admission' configuration")
+
+    if 'max_pending' in admission and admission['max_pending'] < 1:
+        raise InvalidConfigException("invalid value {} for 'max_pending' in 'admission' configuration - must be positive".format(admission['max_pending']))
+
+    for k in ['max_queued', 'queue_timeout', 'retry_after', 'handshake_timeout']:
+        if k in admission and admission[k] < 0:
+            raise InvalidConfigException("invalid value {} for '{}' in 'admission' configuration - must be non-negative".format(admission[k], k))
+
+
 def check_transport_cookie(cookie):
     """
     Check a WAMP-WebSocket transport cookie configuration.
@@ -624,6 +780,19 @@ def check_transport_max_message_size(max_message_size):
         raise InvalidConfigException("invalid value {} for 'max_message_size' attribute in transport (must be from [1, 64MB])".format(max_message_size))
 
 
+def check_transport_buffer_size(buffer_size):
+    """
+    Check socket buffer size parameter in RawSocket transports.
+
+    :param buffer_size: The buffer size parameter to check.
+    :type buffer_size: int
+    """
+    if type(buffer_size) not in six.integer_types:
+        raise InvalidConfigException("'buffer_size' attribute in transport must be int ({} encountered)".format(type(buffer_size)))
+    if buffer_size < 4096 or buffer_size > 16 * 1024 * 1024:
+        raise InvalidConfigException("invalid value {} for 'buffer_size' attribute in transport (must be from [4kB, 16MB])".format(buffer_size))
+
+
 def check_listening_endpoint_tls(tls):
     """
     Check a listening endpoint TLS configuration.
@@ -641,8 +810,16 @@ def check_listening_endpoint_tls(tls):
         'dhparam': (False, [six.text_type]),
         'ciphers': (False, [six.text_type]),
         'ca_certificates': (False, [list]),
+        'session_cache': (False, [bool]),
+        'session_tickets': (False, [bool]),
+        'session_timeout': (False, six.integer_types),
+        'session_key_rotation': (False, six.integer_types),
     }, tls, "TLS listening endpoint")
 
+    for k in ['session_timeout', 'session_key_rotation']:
+        if k in tls and tls[k] < 0:
+            raise InvalidConfigException("invalid value {} for '{}' in TLS listening endpoint - must be non-negative".format(tls[k], k))
+
     return
 
 
@@ -663,6 +840,9 @@ def check_connecting_endpoint_tls(tls):
         if k not in ['ca_certificates', 'hostname', 'certificate', 'key']:
             raise InvalidConfigException("encountered unknown attribute '{}' in connecting endpoint TLS configuration".format(k))
 
+    # file checks depend on the filesystem (and current directory)
+    _volatile()
+
     for k in ['certificate', 'key']:
         if k in tls and not os.path.exists(tls[k]):
             raise InvalidConfigException(
@@ -942,6 +1122,7 @@ def check_web_path_service_websocket(config):
         'serializers': (False, [list]),
         'cookie': (False, [dict]),
         'auth': (False, [dict]),
+        'admission': (False, [dict]),
         'options': (False, [dict]),
         'debug': (False, [bool])
     }, config, "Web transport 'WebSocket' path service")
@@ -966,6 +1147,9 @@ def check_web_path_service_websocket(config):
     if 'auth' in config:
         check_transport_auth(config['auth'])
 
+    if 'admission' in config:
+        check_transport_admission(config['admission'])
+
     if 'cookie' in config:
         check_transport_cookie(config['cookie'])
 
@@ -999,9 +1183,28 @@ def check_web_path_service_static(config):
         check_dict_args({
             'enable_directory_listing': (False, [bool]),
             'mime_types': (False, [dict]),
-            'cache_timeout': (False, list(six.integer_types) + [type(None)])
+            'cache_timeout': (False, list(six.integer_types) + [type(None)]),
+            'io_threads': (False, six.integer_types),
+            'io_thread_min_size': (False, six.integer_types),
+            'memory_cache': (False, [dict])
         }, config['options'], "'options' in Web transport 'static' path service")
 
+        for k in ['io_threads', 'io_thread_min_size']:
+            if k in config['options'] and config['options'][k] < 0:
+                raise InvalidConfigException("invalid value {} for '{}' in 'options' of Web transport 'static' path service - must be non-negative".format(config['options'][k], k))
+
+        if 'memory_cache' in config['options']:
+            cache_config = config['options']['memory_cache']
+            check_dict_args({
+                'max_size': (False, six.integer_types),
+                'max_file_size': (False, six.integer_types),
+                'compress': (False, [bool])
+            }, cache_config, "'memory_cache' in 'options' of Web transport 'static' path service")
+
+            for k in ['max_size', 'max_file_size']:
+                if k in cache_config and cache_config[k] <= 0:
+                    raise InvalidConfigException("invalid value {} for '{}' in 'memory_cache' of Web transport 'static' path service - must be positive".format(cache_config[k], k))
+
 
 def check_web_path_service_wsgi(config):
     """
@@ -1119,8 +1322,12 @@ def check_web_path_service_longpoll(config):
             'session_timeout': (False, six.integer_types),
             'queue_limit_bytes': (False, six.integer_types),
             'queue_limit_messages': (False, six.integer_types),
+            'queue_drop_policy': (False, [six.text_type]),
         }, config['options'], "Web transport 'longpoll' path service")
 
+        if 'queue_drop_policy' in config['options'] and config['options']['queue_drop_policy'] not in [u'kill', u'drop_oldest', u'drop_newest']:
+            raise InvalidConfigException("invalid value '{}' for 'queue_drop_policy' in Web transport 'longpoll' path service - must be one of 'kill', 'drop_oldest' or 'drop_newest'".format(config['options']['queue_drop_policy']))
+
 
 def check_web_path_service_rest_post_body_limit(limit):
     """
@@ -1325,9 +1532,13 @@ def check_web_path_service_upload(config):
         check_dict_args({
             'max_file_size': (False, six.integer_types),
             'file_types': (False, [list]),
-            'file_permissions': (False, [six.text_type])
+            'file_permissions': (False, [six.text_type]),
+            'io_threads': (False, six.integer_types)
         }, config['options'], "Web transport 'upload' path service")
 
+        if 'io_threads' in config['options'] and config['options']['io_threads'] < 0:
+            raise InvalidConfigException("invalid value {} for 'io_threads' attribute - must be non-negative".format(config['options']['io_threads']))
+
         if 'max_file_size' in config['options']:
             check_web_path_service_max_file_size(config['options']['max_file_size'])
 
@@ -1457,6 +1668,7 @@ def check_paths(paths, nested=False):
         check_web_path_service(p, paths[p], nested)
 
 
+@_cached
 def check_listening_transport_websocket(transport):
     """
     Check a listening WebSocket-WAMP transport configuration.
@@ -1477,6 +1689,7 @@ def check_listening_transport_websocket(transport):
            'debug',
            'options',
            'auth',
+           'admission',
            'cookie']:
             raise InvalidConfigException("encountered unknown attribute '{}' in WebSocket transport configuration".format(k))
 
@@ -1513,6 +1726,9 @@ def check_listening_transport_websocket(transport):
     if 'auth' in transport:
         check_transport_auth(transport['auth'])
 
+    if 'admission' in transport:
+        check_transport_admission(transport['admission'])
+
     if 'cookie' in transport:
         check_transport_cookie(transport['cookie'])
 
@@ -1652,8 +1868,10 @@ def check_listening_transport_rawsocket(transport):
             'endpoint',
             'serializers',
             'max_message_size',
+            'buffer_size',
             'debug',
             'auth',
+            'admission',
         ]:
             raise InvalidConfigException("encountered unknown attribute '{}' in RawSocket transport configuration".format(k))
 
@@ -1676,6 +1894,9 @@ def check_listening_transport_rawsocket(transport):
     if 'max_message_size' in transport:
         check_transport_max_message_size(transport['max_message_size'])
 
+    if 'buffer_size' in transport:
+        check_transport_buffer_size(transport['buffer_size'])
+
     if 'debug' in transport:
         debug = transport['debug']
         if not isinstance(debug, bool):
@@ -1684,6 +1905,9 @@ def check_listening_transport_rawsocket(transport):
     if 'auth' in transport:
         check_transport_auth(transport['auth'])
 
+    if 'admission' in transport:
+        check_transport_admission(transport['admission'])
+
 
 def check_connecting_transport_websocket(transport):
     """
@@ -1736,7 +1960,7 @@ def check_connecting_transport_rawsocket(transport):
     :type transport: dict
     """
     for k in transport:
-        if k not in ['id', 'type', 'endpoint', 'serializer', 'debug']:
+        if k not in ['id', 'type', 'endpoint', 'serializer', 'buffer_size', 'debug']:
             raise InvalidConfigException("encountered unknown attribute '{}' in RawSocket transport configuration".format(k))
 
     if 'id' in transport:
@@ -1757,12 +1981,16 @@ def check_connecting_transport_rawsocket(transport):
     if serializer not in ['json', 'msgpack', 'cbor']:
         raise InvalidConfigException("invalid value {} for 'serializer' in RawSocket transport configuration - must be one of ['json', 'msgpack', 'cbor']".format(serializer))
 
+    if 'buffer_size' in transport:
+        check_transport_buffer_size(transport['buffer_size'])
+
     if 'debug' in transport:
         debug = transport['debug']
         if not isinstance(debug, bool):
             raise InvalidConfigException("'debug' in RawSocket transport configuration must be boolean ({} encountered)".format(type(debug)))
 
 
+@_cached
 def check_router_transport(transport):
     """
     Check router transports.
@@ -1811,6 +2039,7 @@ def check_router_transport(transport):
         raise InvalidConfigException("logic error")
 
 
+@_cached
 def check_router_component(component):
     """
     Check a component configuration for a component running side-by-side with
@@ -1889,6 +2118,7 @@ def check_connecting_transport(transport):
         raise InvalidConfigException("logic error")
 
 
+@_cached
 def check_container_component(component):
     """
     Check a container component configuration.
@@ -1951,6 +2181,7 @@ def check_container_components(components):
         check_container_component(component)
 
 
+@_cached
 def check_router_realm(realm):
     """
     Checks the configuration for a router realm entry, which can be *either* a dynamic authorizer or static permissions.
@@ -1960,7 +2191,11 @@ def check_router_realm(realm):
     for role in realm.get('roles', []):
         check_router_realm_role(role)
 
+    if 'validate' in realm and type(realm['validate']) != bool:
+        raise InvalidConfigException("invalid type {} for 'validate' in realm configuration - must be a bool".format(type(realm['validate'])))
+
 
+@_cached
 def check_router_realm_role(role):
     """
     Checks a single role from a router realm 'roles' list
@@ -2269,6 +2504,7 @@ def check_process_env(env):
                 raise InvalidConfigException("invalid type for environment variable value '{}' in 'options.env.vars' - must be a string ({} encountered)".format(v, type(v)))
 
 
+@_cached
 def check_native_worker_options(options):
     """
     Check native worker options.
@@ -2284,9 +2520,14 @@ def check_native_worker_options(options):
         raise InvalidConfigException("'options' in worker configurations must be dictionaries ({} encountered)".format(type(options)))
 
     for k in options:
-        if k not in ['title', 'reactor', 'python', 'pythonpath', 'cpu_affinity', 'env']:
+        if k not in ['title', 'reactor', 'python', 'pythonpath', 'cpu_affinity', 'env', 'log_rate']:
             raise InvalidConfigException("encountered unknown attribute '{}' in 'options' in worker configuration".format(k))
 
+    if 'log_rate' in options:
+        log_rate = options['log_rate']
+        if type(log_rate) not in six.integer_types or log_rate < 0:
+            raise InvalidConfigException("'log_rate' in 'options' in worker configuration must be a non-negative integer ({} encountered)".format(log_rate))
+
     if 'title' in options:
         title = options['title']
         if not isinstance(title, six.text_type):
@@ -2322,6 +2563,7 @@ def check_native_worker_options(options):
         check_process_env(options['env'])
 
 
+@_cached
 def check_guest(guest):
     """
     Check a guest worker configuration.
@@ -2408,6 +2650,7 @@ def check_websocket_testee(worker):
     check_listening_transport_websocket(worker['transport'])
 
 
+@_cached
 def check_worker(worker):
     """
     Check a node worker configuration item.
@@ -2457,9 +2700,41 @@ def check_controller_options(options):
         raise InvalidConfigException("'options' in controller configuration must be a dictionary ({} encountered)\n\n{}".format(type(options)))
 
     for k in options:
-        if k not in ['title', 'shutdown']:
+        if k not in ['title', 'shutdown', 'fork_server', 'startup_concurrency', 'management_transport', 'telemetry', 'loop_monitor']:
             raise InvalidConfigException("encountered unknown attribute '{}' in 'options' in controller configuration".format(k))
 
+    if 'fork_server' in options:
+        if not isinstance(options['fork_server'], bool):
+            raise InvalidConfigException("'fork_server' in 'options' in controller configuration must be a bool ({} encountered)".format(type(options['fork_server'])))
+
+    if 'startup_concurrency' in options:
+        concurrency = options['startup_concurrency']
+        if type(concurrency) not in six.integer_types or concurrency < 1:
+            raise InvalidConfigException("'startup_concurrency' in 'options' in controller configuration must be a positive integer ({} encountered)".format(concurrency))
+
+    if 'management_transport' in options:
+        if options['management_transport'] not in MANAGEMENT_TRANSPORTS:
+            raise InvalidConfigException("invalid value '{}' for 'management_transport' in 'options' in controller configuration (permissible values: {})".format(options['management_transport'], ', '.join("'{}'".format(x) for x in MANAGEMENT_TRANSPORTS)))
+
+    if 'telemetry' in options:
+        if not isinstance(options['telemetry'], bool):
+            raise InvalidConfigException("'telemetry' in 'options' in controller configuration must be a bool ({} encountered)".format(type(options['telemetry'])))
+
+    if 'loop_monitor' in options:
+        loop_monitor = options['loop_monitor']
+        if not isinstance(loop_monitor, bool):
+            if not isinstance(loop_monitor, dict):
+                raise InvalidConfigException("'loop_monitor' in 'options' in controller configuration must be a bool or a dictionary ({} encountered)".format(type(loop_monitor)))
+            for k in loop_monitor:
+                if k not in ['interval', 'threshold']:
+                    raise InvalidConfigException("encountered unknown attribute '{}' in 'loop_monitor' in controller configuration".format(k))
+            if 'interval' in loop_monitor:
+                if type(loop_monitor['interval']) not in six.integer_types + (float,) or loop_monitor['interval'] <= 0:
+                    raise InvalidConfigException("'interval' in 'loop_monitor' in controller configuration must be a positive number ({} encountered)".format(loop_monitor['interval']))
+            if 'threshold' in loop_monitor:
+                if type(loop_monitor['threshold']) not in six.integer_types + (float,) or loop_monitor['threshold'] < 0:
+                    raise InvalidConfigException("'threshold' in 'loop_monitor' in controller configuration must be a non-negative number ({} encountered)".format(loop_monitor['threshold']))
+
     if 'title' in options:
         title = options['title']
         if not isinstance(title, six.text_type):
@@ -2534,6 +2809,7 @@ def check_cdc(config):
         check_connecting_transport(config['transport'])
 
 
+@_cached
 def check_config(config):
     """
     Check a Crossbar.io top-level configuration.
@@ -2588,7 +2864,7 @@ def check_config_file(configfile):
     with open(configfile, 'r') as infile:
         if configext == '.yaml':
             try:
-                config = yaml.safe_load(infile)
+                config = _yaml().safe_load(infile)
             except InvalidConfigException as e:
                 raise InvalidConfigException("configuration file does not seem to be proper YAML ('{}')".format(e))
         else:
@@ -2617,7 +2893,7 @@ def convert_config_file(configfile):
         if configext == '.yaml':
             log.info("converting YAML configuration {} to JSON ...".format(configfile))
             try:
-                config = yaml.safe_load(infile)
+                config = _yaml().safe_load(infile)
             except Exception as e:
                 raise InvalidConfigException("configuration file does not seem to be proper YAML ('{}')".format(e))
             else:
@@ -2634,7 +2910,7 @@ def convert_config_file(configfile):
             else:
                 newconfig = os.path.abspath(configbase + '.yaml')
                 with open(newconfig, 'w') as outfile:
-                    yaml.safe_dump(config, outfile, default_flow_style=False)
+                    _yaml().safe_dump(config, outfile, default_flow_style=False)
                     log.info("ok, YAML formatted configuration written to {}".format(newconfig))
 
         else:
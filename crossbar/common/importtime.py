@@ -0,0 +1,147 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import, print_function
+
+import sys
+import json
+import time
+
+from six.moves import builtins
+
+__all__ = ('ImportProfiler', 'profile_imports', 'format_records')
+
+
+class ImportProfiler(object):
+    """
+    Measures the time spent importing modules, like ``python -X importtime``
+    (which is only available on Python 3.7+).
+
+    Only imports of modules not yet loaded are measured. Submodules imported
+    via ``from package import submodule`` are recorded under their own name.
+    """
+
+    def __init__(self, clock=None):
+        """
+
+        :param clock: Time function to use (default: ``time.time``).
+        :type clock: callable
+        """
+        self._clock = clock or time.time
+        self._import = None
+
+        # stack of imports in progress: [name, started, time in nested imports]
+        self._stack = []
+
+        # completed imports: (name, depth, self time, cumulative time), in order of completion
+        self.records = []
+
+    def install(self):
+        self._import = builtins.__import__
+        builtins.__import__ = self._profiled_import
+
+    def uninstall(self):
+        builtins.__import__ = self._import
+        self._import = None
+
+    def _profiled_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        fullname = name
+        if level > 0 and globals:
+            package = globals.get('__package__') or globals.get('__name__', '')
+            package = package.rsplit('.', level - 1)[0]
+            fullname = '{}.{}'.format(package, name) if name else package
+
+        if fullname in sys.modules:
+            # submodules loaded via "from package import submodule"
+            submodules = [u'{}.{}'.format(fullname, item) for item in fromlist or ()
+                          if item != '*' and u'{}.{}'.format(fullname, item) not in sys.modules]
+            if not submodules:
+                return self._import(name, globals, locals, fromlist, level)
+            fullname = u', '.join(submodules)
+        elif not fullname:
+            return self._import(name, globals, locals, fromlist, level)
+
+        frame = [fullname, self._clock(), 0.]
+        self._stack.append(frame)
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self._stack.pop()
+            cumulative = self._clock() - frame[1]
+            if self._stack:
+                self._stack[-1][2] += cumulative
+            self.records.append((fullname, len(self._stack), cumulative - frame[2], cumulative))
+
+
+def profile_imports(modules):
+    """
+    Import modules and measure where the time goes. To measure the real
+    import cost, run this in a fresh interpreter.
+
+    :param modules: Fully qualified names of the modules to import.
+    :type modules: list of str
+
+    :returns: The import records (name, depth, self time, cumulative time).
+    :rtype: list of tuple
+    """
+    profiler = ImportProfiler()
+    profiler.install()
+    try:
+        for name in modules:
+            __import__(name)
+    finally:
+        profiler.uninstall()
+    return profiler.records
+
+
+def format_records(records, limit=None):
+    """
+    Format import records like ``python -X importtime`` does, heaviest first.
+
+    :param records: The import records to format.
+    :type records: list of tuple
+    :param limit: Only format this many records (default: all).
+    :type limit: int
+
+    :returns: The formatted lines.
+    :rtype: list of str
+    """
+    records = sorted(records, key=lambda r: r[3], reverse=True)[:limit]
+    lines = [u'import time: self [us] | cumulative | imported package']
+    for name, depth, own, cumulative in records:
+        lines.append(u'import time: {:>9} | {:>10} | {}{}'.format(
+            int(own * 1000000), int(cumulative * 1000000), u'  ' * depth, name))
+    return lines
+
+
+if __name__ == '__main__':
+    # python -m crossbar.common.importtime <module> .. => JSON import records
+    json.dump(profile_imports(sys.argv[1:]), sys.stdout)
@@ -0,0 +1,223 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import sys
+import time
+import threading
+import traceback
+from bisect import bisect_left
+from collections import deque
+
+from autobahn.util import utcnow
+
+from crossbar._logging import make_logger
+
+__all__ = ('LoopMonitor',)
+
+
+# default heartbeat interval and stall threshold (in seconds)
+DEFAULT_INTERVAL = 0.01
+DEFAULT_THRESHOLD = 0.25
+
+
+# upper bounds (in seconds) of the buckets of the loop latency histogram (the last bucket is unbounded)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1., 2., 5., 10.)
+
+
+class LoopMonitor(object):
+    """
+    Monitors the latency of the reactor loop of a (native) process.
+
+    A heartbeat scheduled on the reactor at a high frequency measures how late
+    it runs (the scheduling lag, i.e. how long the loop was busy with other
+    things), and a histogram of the lags is kept. Lags are measured on the clock
+    of the reactor (``reactor.seconds()``), which is the clock the heartbeat is
+    scheduled with.
+
+    A watchdog thread checks that the heartbeat keeps running. When the reactor
+    is stalled for longer than a threshold, the watchdog captures the stack of the
+    reactor thread - showing what blocks the loop - which is logged (and reported)
+    once the loop is running again.
+    """
+
+    log = make_logger()
+
+    def __init__(self, reactor, interval=DEFAULT_INTERVAL, threshold=DEFAULT_THRESHOLD, keep=10, on_stall=None):
+        """
+
+        :param reactor: The reactor to monitor.
+        :type reactor: obj
+        :param interval: Heartbeat interval in seconds.
+        :type interval: float
+        :param threshold: Minimum scheduling lag in seconds to consider a stall
+            (``0`` to not watch for stalls).
+        :type threshold: float
+        :param keep: Number of most recent stalls to keep.
+        :type keep: int
+        :param on_stall: Called with the stall (a dict) when a stall is over.
+        :type on_stall: callable
+        """
+        self._reactor = reactor
+        self._interval = interval
+        self._threshold = threshold
+        self.on_stall = on_stall
+
+        self._call = None
+        self._watchdog = None
+        self._running = False
+        self._reactor_thread = None
+
+        # time the next heartbeat is due
+        self._expected = None
+
+        # stack of the reactor thread captured by the watchdog during a stall: (due, stack)
+        self._stall_stack = None
+
+        self._stalls = deque(maxlen=keep)
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the statistics.
+        """
+        self._histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._beats = 0
+        self._lag_sum = 0.
+        self._lag_max = 0.
+        self._stall_count = 0
+        self._stalls.clear()
+
+    def start(self):
+        """
+        Start monitoring. This must be called on the reactor thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._reactor_thread = threading.current_thread().ident
+        self._expected = self._reactor.seconds() + self._interval
+        self._call = self._reactor.callLater(self._interval, self._beat)
+
+        if self._threshold:
+            self._watchdog = threading.Thread(target=self._watch, name=u'crossbar-loop-watchdog')
+            self._watchdog.daemon = True
+            self._watchdog.start()
+
+    def stop(self):
+        """
+        Stop monitoring.
+        """
+        self._running = False
+        if self._call and self._call.active():
+            self._call.cancel()
+        self._call = None
+        self._watchdog = None
+
+    def _beat(self):
+        now = self._reactor.seconds()
+        lag = max(now - self._expected, 0.)
+
+        self._beats += 1
+        self._lag_sum += lag
+        if lag > self._lag_max:
+            self._lag_max = lag
+        self._histogram[bisect_left(LATENCY_BUCKETS, lag)] += 1
+
+        if self._threshold and lag >= self._threshold:
+            self._stall_count += 1
+            stack = None
+            captured = self._stall_stack
+            if captured and captured[0] == self._expected:
+                stack = captured[1]
+            self._stall_stack = None
+
+            stall = {
+                u'detected': utcnow(),
+                u'lag': lag,
+                u'stack': stack,
+            }
+            self._stalls.append(stall)
+            self.log.warn("Reactor loop was stalled for {lag:.0f} ms{stack}",
+                          lag=lag * 1000., stack=u' in:\n{}'.format(stack) if stack else u'')
+            if self.on_stall:
+                try:
+                    self.on_stall(stall)
+                except Exception:
+                    self.log.failure("Reporting reactor loop stall failed: {log_failure.value}")
+
+        self._expected = now + self._interval
+        if self._running:
+            self._call = self._reactor.callLater(self._interval, self._beat)
+
+    def _watch(self):
+        # check for stalls often enough to capture the stack early in a stall
+        period = self._threshold / 4.
+        while self._running:
+            time.sleep(period)
+            due = self._expected
+            if self._reactor.seconds() - due >= self._threshold and not (self._stall_stack and self._stall_stack[0] == due):
+                frame = sys._current_frames().get(self._reactor_thread, None)
+                if frame is not None:
+                    self._stall_stack = (due, u''.join(traceback.format_stack(frame)))
+
+    def _percentile(self, p):
+        rank = p * self._beats
+        seen = 0
+        for i, count in enumerate(self._histogram):
+            seen += count
+            if count and seen >= rank:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self._lag_max
+        return 0.
+
+    def marshal(self):
+        """
+        Marshal the loop statistics for use with WAMP calls/events. Latencies are in
+        seconds; percentiles are the upper bounds of the histogram buckets.
+
+        :returns: dict -- The loop statistics.
+        """
+        return {
+            u'interval': self._interval,
+            u'threshold': self._threshold,
+            u'running': self._running,
+            u'beats': self._beats,
+            u'lag_mean': self._lag_sum / self._beats if self._beats else 0.,
+            u'lag_max': self._lag_max,
+            u'lag_p50': self._percentile(0.5),
+            u'lag_p99': self._percentile(0.99),
+            u'lag_p999': self._percentile(0.999),
+            u'histogram': [[LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else None, count]
+                           for i, count in enumerate(self._histogram)],
+            u'stalls': self._stall_count,
+            u'recent_stalls': list(self._stalls),
+        }
@@ -73,6 +73,8 @@ if _HAS_PSUTIL:
     from crossbar.common.processinfo import ProcessInfo
     # from crossbar.common.processinfo import SystemInfo
 
+from crossbar.common.procstats import HAS_PROCFS, ProcStats, changed_stats
+
 try:
     from txpostgres import txpostgres
     _HAS_POSTGRESQL = True
@@ -203,16 +205,27 @@ class NativeProcessSession(ApplicationSession):
 
         if _HAS_PSUTIL:
             self._pinfo = ProcessInfo()
-            self._pinfo_monitor = None
-            self._pinfo_monitor_seq = 0
         else:
             self._pinfo = None
-            self._pinfo_monitor = None
-            self._pinfo_monitor_seq = None
             self.log.info("Process utilities not available")
 
+        # process statistics are read from /proc directly where available (much cheaper than psutil)
+        if HAS_PROCFS:
+            self._pstats = ProcStats()
+        else:
+            self._pstats = self._pinfo
+        self._pinfo_monitor = None
+        self._pinfo_monitor_seq = 0
+
         self._connections = {}
 
+        # channel to the node controller for high-volume telemetry (native workers only)
+        self._telemetry_channel = None
+
+        # monitor of the reactor loop of this process (if any)
+        if not hasattr(self, '_loop_monitor'):
+            self._loop_monitor = None
+
         if do_join:
             self.join(self.config.realm)
 
@@ -238,7 +251,9 @@ class NativeProcessSession(ApplicationSession):
 
             'get_process_info',
             'get_process_stats',
-            'set_process_stats_monitoring'
+            'set_process_stats_monitoring',
+            'get_socket_stats',
+            'get_loop_stats',
         ]
 
         dl = []
@@ -251,6 +266,11 @@ class NativeProcessSession(ApplicationSession):
 
         self.log.debug("Registered {len_reg} procedures", len_reg=len(regs))
 
+        # report reactor loop stalls
+        if self._loop_monitor:
+            loop_stall_topic = u'{}.on_loop_stall'.format(self._uri_prefix)
+            self._loop_monitor.on_stall = lambda stall: self.publish_telemetry(loop_stall_topic, stall)
+
     @inlineCallbacks
     def start_connection(self, id, config, details=None):
         """
@@ -364,6 +384,9 @@ class NativeProcessSession(ApplicationSession):
         """
         Get process information (open files, sockets, ...).
 
+        Note that this lists every open file and socket, which is expensive with
+        many connections. Use :meth:`get_socket_stats` for socket counts.
+
         :returns: dict -- Dictionary with process information.
         """
         self.log.debug("{cls}.get_process_info",
@@ -383,23 +406,68 @@ class NativeProcessSession(ApplicationSession):
         """
         self.log.debug("{cls}.get_process_stats", cls=self.__class__.__name__)
 
-        if self._pinfo:
-            return self._pinfo.get_stats()
+        if self._pstats:
+            return self._pstats.get_stats()
         else:
             emsg = "Could not retrieve process statistics: required packages not installed"
             raise ApplicationError(u"crossbar.error.feature_unavailable", emsg)
 
-    def set_process_stats_monitoring(self, interval, details=None):
+    def get_socket_stats(self, details=None):
+        """
+        Get the number of sockets open in this process, by type and state, e.g.
+        ``{u'tcp4': {u'LISTEN': 1, u'ESTABLISHED': 10000}, u'unix': {u'NONE': 2}}``.
+
+        :returns: dict -- Dictionary with socket counts.
+        """
+        self.log.debug("{cls}.get_socket_stats", cls=self.__class__.__name__)
+
+        if self._pstats:
+            return self._pstats.socket_counts()
+        else:
+            emsg = "Could not retrieve socket statistics: required packages not installed"
+            raise ApplicationError(u"crossbar.error.feature_unavailable", emsg)
+
+    def get_loop_stats(self, reset=False, details=None):
+        """
+        Get statistics of the reactor loop of this process: the latency of the loop
+        (how late a high-frequency heartbeat runs), and the stalls of the loop,
+        with the stack of the reactor thread during the stall (when captured).
+
+        Stalls are also published to
+        ``crossbar.node.<node_id>.worker.<worker_id>.on_loop_stall`` for native
+        workers and to ``crossbar.node.<node_id>.on_loop_stall`` for node controllers.
+
+        :param reset: Reset the statistics after retrieving.
+        :type reset: bool
+
+        :returns: dict -- Dictionary with loop statistics.
+        """
+        self.log.debug("{cls}.get_loop_stats", cls=self.__class__.__name__)
+
+        if not self._loop_monitor:
+            emsg = "Could not retrieve loop statistics: loop monitoring not enabled"
+            raise ApplicationError(u"crossbar.error.feature_unavailable", emsg)
+
+        stats = self._loop_monitor.marshal()
+        if reset:
+            self._loop_monitor.reset()
+        return stats
+
+    def set_process_stats_monitoring(self, interval, delta=False, details=None):
         """
         Enable/disable periodic publication of process statistics.
 
         :param interval: The monitoring interval in seconds. Set to 0 to disable monitoring.
         :type interval: float
+        :param delta: Only publish the statistics that changed since the previous
+            event (the first event has all statistics). Events are numbered
+            (``seq``), so subscribers can detect missed events.
+        :type delta: bool
         """
-        self.log.debug("{cls}.set_process_stats_monitoring(interval = {interval})",
-                       cls=self.__class__.__name__, interval=interval)
+        self.log.debug("{cls}.set_process_stats_monitoring(interval = {interval}, delta = {delta})",
+                       cls=self.__class__.__name__, interval=interval, delta=delta)
 
-        if self._pinfo:
+        if self._pstats:
 
             stats_monitor_set_topic = '{}.on_process_stats_monitoring_set'.format(self._uri_prefix)
 
@@ -414,11 +482,18 @@ class NativeProcessSession(ApplicationSession):
             if interval > 0:
                 stats_topic = '{}.on_process_stats'.format(self._uri_prefix)
 
+                # statistics last published
+                published = [None]
+
                 def publish_stats():
-                    stats = self._pinfo.get_stats()
+                    stats = self._pstats.get_stats()
+                    if delta:
+                        changes = changed_stats(published[0], stats)
+                        published[0] = stats
+                        stats = changes
                     self._pinfo_monitor_seq += 1
                     stats[u'seq'] = self._pinfo_monitor_seq
-                    self.publish(stats_topic, stats)
+                    self.publish_telemetry(stats_topic, stats)
 
                 self._pinfo_monitor = LoopingCall(publish_stats)
                 self._pinfo_monitor.start(interval)
@@ -428,6 +503,22 @@ class NativeProcessSession(ApplicationSession):
             emsg = "Cannot setup process statistics monitor: required packages not installed"
             raise ApplicationError(u"crossbar.error.feature_unavailable", emsg)
 
+    def publish_telemetry(self, topic, *args, **kwargs):
+        """
+        Publish a (high-volume) telemetry event, like process statistics.
+
+        Native workers started with a telemetry channel send these to the node
+        controller over that channel, so management calls and results are not
+        delayed behind telemetry. Otherwise, the event is published as usual.
+
+        :param topic: The URI of the topic to publish to.
+        :type topic: unicode
+        """
+        if self._telemetry_channel:
+            self._telemetry_channel.publish(topic, *args, **kwargs)
+        else:
+            self.publish(topic, *args, **kwargs)
+
     def trigger_gc(self, details=None):
         """
         Manually trigger a garbage collection in this native process.
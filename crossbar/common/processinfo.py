@@ -244,6 +244,21 @@ if _HAS_PSUTIL:
             res = [f.path for f in self._p.open_files()]
             return sorted(res)
 
+        def socket_counts(self):
+            """
+            Returns the number of sockets currently opened by this process,
+            by type and state.
+
+            :returns: dict -- Socket counts, e.g. ``{u'tcp4': {u'LISTEN': 1}}``.
+            """
+            res = {}
+            for c in self._p.connections(kind='all'):
+                socket_type = ProcessInfo._ADDRESS_TYPE_FAMILY_MAP.get((c.family, c.type))
+                counts = res.setdefault(socket_type, {})
+                status = str(c.status)
+                counts[status] = counts.get(status, 0) + 1
+            return res
+
         def open_sockets(self):
             """
             Returns list of open sockets currently opened by this process.
@@ -0,0 +1,275 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import time
+
+from autobahn.util import utcnow
+
+__all__ = ('ProcStats', 'changed_stats')
+
+
+# http://man7.org/linux/man-pages/man5/proc.5.html
+
+HAS_PROCFS = os.path.exists('/proc/self/stat')
+
+
+# process states (as named by psutil)
+_PROCESS_STATUS = {
+    'R': u'running',
+    'S': u'sleeping',
+    'D': u'disk-sleep',
+    'T': u'stopped',
+    't': u'tracing-stop',
+    'Z': u'zombie',
+    'X': u'dead',
+    'x': u'dead',
+    'K': u'wake-kill',
+    'W': u'waking',
+    'P': u'parked',
+    'I': u'idle',
+}
+
+# TCP connection states (as named by psutil)
+_TCP_STATUS = {
+    b'01': u'ESTABLISHED',
+    b'02': u'SYN_SENT',
+    b'03': u'SYN_RECV',
+    b'04': u'FIN_WAIT1',
+    b'05': u'FIN_WAIT2',
+    b'06': u'TIME_WAIT',
+    b'07': u'CLOSE',
+    b'08': u'CLOSE_WAIT',
+    b'09': u'LAST_ACK',
+    b'0A': u'LISTEN',
+    b'0B': u'CLOSING',
+}
+
+# socket tables: (socket type, file under /proc/net, index of the inode column, states)
+_SOCKET_TABLES = (
+    (u'tcp4', 'tcp', 9, _TCP_STATUS),
+    (u'tcp6', 'tcp6', 9, _TCP_STATUS),
+    (u'udp4', 'udp', 9, None),
+    (u'udp6', 'udp6', 9, None),
+    (u'unix', 'unix', 6, None),
+)
+
+
+class ProcStats(object):
+    """
+    Process statistics read straight from the Linux ``/proc`` filesystem.
+
+    This provides the same statistics as :meth:`crossbar.common.processinfo.ProcessInfo.get_stats`,
+    but reads ``/proc/<pid>/stat``, ``/proc/<pid>/status`` and ``/proc/<pid>/io``
+    once per call, instead of going through half a dozen psutil calls.
+    """
+
+    def __init__(self, pid='self', procfs='/proc'):
+        """
+
+        :param pid: The PID of the process, or ``'self'`` for this process.
+        :type pid: int or str
+        :param procfs: The mount point of the proc filesystem.
+        :type procfs: str
+        """
+        self._procfs = procfs
+        self._path = os.path.join(procfs, str(pid))
+
+        self._clock_ticks = float(os.sysconf('SC_CLK_TCK'))
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+        self._mem_total = self._read_mem_total()
+
+        # open files under /proc/<pid>, by name
+        self._fds = {}
+
+        # /proc/<pid>/io is not readable in some containers
+        self._has_io = True
+
+        # CPU time and wall clock of the last call (for the CPU usage in between)
+        self._last_cpu = None
+
+    def _read(self, name):
+        # keep the files open and re-read them from the start (the kernel
+        # regenerates the contents), which saves opening them on every call
+        fd = self._fds.get(name, None)
+        if fd is None:
+            fd = os.open(os.path.join(self._path, name), os.O_RDONLY)
+            self._fds[name] = fd
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks).decode('ascii', 'replace')
+
+    def close(self):
+        """
+        Close the files kept open.
+        """
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+    def _read_mem_total(self):
+        with open(os.path.join(self._procfs, 'meminfo'), 'rb') as f:
+            for line in f:
+                if line.startswith(b'MemTotal:'):
+                    return int(line.split()[1]) * 1024
+        return None
+
+    def get_stats(self):
+        """
+        Get process statistics.
+
+        :returns: dict -- Process statistics, with the same keys as
+            :meth:`crossbar.common.processinfo.ProcessInfo.get_stats`.
+        """
+        now = time.time()
+
+        # the process name (in parenthesis) may contain blanks, so parse
+        # the fields after it
+        stat = self._read('stat')
+        fields = stat[stat.rfind(')') + 2:].split()
+        user = int(fields[11]) / self._clock_ticks
+        system = int(fields[12]) / self._clock_ticks
+        resident = int(fields[21]) * self._page_size
+
+        voluntary = nonvoluntary = None
+        for line in self._read('status').splitlines():
+            if line.startswith('voluntary_ctxt_switches:'):
+                voluntary = int(line.split()[1])
+            elif line.startswith('nonvoluntary_ctxt_switches:'):
+                nonvoluntary = int(line.split()[1])
+
+        reads = writes = None
+        if self._has_io:
+            try:
+                io = self._read('io')
+            except (IOError, OSError):
+                self._has_io = False
+            else:
+                for line in io.splitlines():
+                    if line.startswith('syscr:'):
+                        reads = int(line.split()[1])
+                    elif line.startswith('syscw:'):
+                        writes = int(line.split()[1])
+
+        # CPU usage since the last call (like psutil, this is 0 on the first call)
+        cpu_percent = 0.
+        if self._last_cpu:
+            last_cpu, last_now = self._last_cpu
+            if now > last_now:
+                cpu_percent = round(100. * (user + system - last_cpu) / (now - last_now), 1)
+        self._last_cpu = (user + system, now)
+
+        return {
+            u'ts': utcnow(),
+            u'status': _PROCESS_STATUS.get(fields[0], fields[0]),
+            u'voluntary': voluntary,
+            u'nonvoluntary': nonvoluntary,
+            u'user': user,
+            u'system': system,
+            u'cpu_percent': cpu_percent,
+            u'resident': resident,
+            u'virtual': int(fields[20]),
+            u'mem_percent': 100. * resident / self._mem_total if self._mem_total else None,
+            u'reads': reads,
+            u'writes': writes,
+        }
+
+    def socket_counts(self):
+        """
+        Count the sockets of the process by type and state.
+
+        The socket tables of the kernel are scanned line by line, counting the
+        sockets owned by the process, without building per-socket information
+        like :meth:`crossbar.common.processinfo.ProcessInfo.open_sockets`.
+
+        :returns: dict -- Socket counts, e.g. ``{u'tcp4': {u'LISTEN': 1, u'ESTABLISHED': 10000}}``.
+            UDP and Unix domain sockets have no state and are counted as ``u'NONE'``.
+        """
+        # inodes of the sockets open in the process
+        fd_dir = os.path.join(self._path, 'fd')
+        inodes = set()
+        for fd in os.listdir(fd_dir):
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                # closed meanwhile
+                continue
+            if target.startswith('socket:['):
+                inodes.add(target[8:-1].encode('ascii'))
+
+        res = {}
+        for socket_type, table, inode_index, states in _SOCKET_TABLES:
+            counts = {}
+            try:
+                f = open(os.path.join(self._path, 'net', table), 'rb')
+            except (IOError, OSError):
+                # e.g. no IPv6
+                continue
+            with f:
+                # skip the header line
+                next(f, None)
+                for line in f:
+                    columns = line.split(None, inode_index + 1)
+                    if len(columns) > inode_index and columns[inode_index] in inodes:
+                        if states:
+                            state = states.get(columns[3], u'NONE')
+                        else:
+                            state = u'NONE'
+                        counts[state] = counts.get(state, 0) + 1
+            if counts:
+                res[socket_type] = counts
+        return res
+
+
+def changed_stats(previous, current):
+    """
+    Get the statistics that changed.
+
+    :param previous: The statistics previously published (or ``None``).
+    :type previous: dict
+    :param current: The current statistics.
+    :type current: dict
+
+    :returns: dict -- The items of ``current`` that are new or have a different
+        value than in ``previous`` (all of them when there are no previous statistics).
+    """
+    if not previous:
+        return dict(current)
+    return {key: value for key, value in current.items()
+            if key not in previous or previous[key] != value}
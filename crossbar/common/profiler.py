@@ -31,11 +31,14 @@
 from __future__ import absolute_import
 
 import os
+import sys
+import time
+import threading
 import tempfile
+from collections import deque
 
 import six
 
-from twisted.internet import reactor
 from twisted.internet.defer import Deferred
 from twisted.internet.threads import deferToThread
 
@@ -51,7 +54,9 @@ except ImportError:
 
 PROFILERS = {}
 
-__all__ = ('PROFILERS')
+PROFILE_FORMATS = (u'collapsed', u'speedscope')
+
+__all__ = ('PROFILERS', 'PROFILE_FORMATS', 'export_profile')
 
 
 class Profiler(object):
@@ -218,8 +223,261 @@ if _HAS_VMPROF:
 
             self.log.info("Starting profiling using {profiler} for {runtime} seconds.", profiler=self._id, runtime=runtime)
 
+            from twisted.internet import reactor
             reactor.callLater(runtime, finish_profile)
 
             return self._profile_id, self._finished
 
     PROFILERS['vmprof'] = VMprof('vmprof', config={'period': 0.01})
+
+
+def export_profile(collapsed, format=u'collapsed', interval=None, name=None):
+    """
+    Export a profile in collapsed stack format (one line ``frame;frame;.. count`` per
+    stack, root first) as used by ``flamegraph.pl``, or in the speedscope file format
+    (https://www.speedscope.app/file-format-schema.json).
+
+    :param collapsed: The profile in collapsed stack format.
+    :type collapsed: unicode
+    :param format: The format to export, one of :data:`PROFILE_FORMATS`.
+    :type format: unicode
+    :param interval: The sampling interval in seconds (speedscope weights are
+        in seconds if given, else in samples).
+    :type interval: float
+    :param name: The name of the profile (speedscope only).
+    :type name: unicode
+
+    :returns: The profile in the format requested.
+    :rtype: unicode or dict
+    """
+    if format == u'collapsed':
+        return collapsed
+    if format != u'speedscope':
+        raise Exception("invalid profile format '{}'".format(format))
+
+    frames = []
+    frame_index = {}
+    samples = []
+    weights = []
+    total = 0
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(u' ')
+        if not stack:
+            continue
+        sample = []
+        for frame in stack.split(u';'):
+            idx = frame_index.get(frame, None)
+            if idx is None:
+                idx = frame_index[frame] = len(frames)
+                frames.append({u'name': frame})
+            sample.append(idx)
+        weight = int(count) * interval if interval else int(count)
+        samples.append(sample)
+        weights.append(weight)
+        total += weight
+
+    return {
+        u'$schema': u'https://www.speedscope.app/file-format-schema.json',
+        u'exporter': u'crossbar',
+        u'name': name or u'crossbar',
+        u'shared': {u'frames': frames},
+        u'profiles': [{
+            u'type': u'sampled',
+            u'name': name or u'crossbar',
+            u'unit': u'seconds' if interval else u'none',
+            u'startValue': 0,
+            u'endValue': total,
+            u'samples': samples,
+            u'weights': weights,
+        }],
+    }
+
+
+class Sampler(Profiler):
+    """
+    Statistical profiler built into Crossbar.io: a background thread samples the
+    stacks of all threads (``sys._current_frames()``) at a fixed interval and
+    aggregates the stacks seen over a rolling time window in memory.
+
+    The sampler can run for a given time, or continuously until stopped.
+    """
+
+    def __init__(self, id, config=None):
+        Profiler.__init__(self, id, config)
+
+        # sampling interval in seconds
+        self._interval = self._config.get(u'interval', 0.01)
+
+        # the aggregate covers the most recent "window" seconds, in "buckets" buckets
+        self._window = self._config.get(u'window', 60)
+        self._buckets = self._config.get(u'buckets', 6)
+
+        # maximum number of distinct stacks per bucket (more are counted as truncated)
+        self._max_stacks = self._config.get(u'max_stacks', 10000)
+
+        # stack aggregates (stack -> samples), most recent last
+        self._aggregates = deque(maxlen=self._buckets)
+        self._lock = threading.Lock()
+
+        self._thread = None
+        self._stopping = False
+        self._stop_call = None
+
+        # number of samples taken, and time spent taking them
+        self.samples = 0
+        self.overhead = 0.
+
+        # frame names (by code object)
+        self._names = {}
+
+        # thread names (by thread ID)
+        self._threads = {}
+
+    def marshal(self):
+        res = Profiler.marshal(self)
+        res[u'profile_id'] = self._profile_id
+        res[u'samples'] = self.samples
+        return res
+
+    def start(self, runtime=10):
+        """
+        Start sampling.
+
+        :param runtime: Sampling duration in seconds, or ``0`` to sample until stopped.
+        :type runtime: float
+
+        :returns: The ID of the profile, and a deferred that fires with the profile
+            (in collapsed stack format) when sampling has stopped.
+        :rtype: tuple
+        """
+        if self._state != Profiler.STATE_STOPPED:
+            raise Exception("profile currently not stopped - cannot start")
+
+        self._state = Profiler.STATE_RUNNING
+        self._finished = Deferred()
+        self._profile_id = newid()
+        self._started = utcnow()
+        self._stopping = False
+        self.samples = 0
+        self.overhead = 0.
+        self._aggregates.clear()
+
+        self._thread = threading.Thread(target=self._run, name=u'crossbar-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+        if runtime:
+            self.log.info("Starting profiling using {profiler} for {runtime} seconds.", profiler=self._id, runtime=runtime)
+            from twisted.internet import reactor
+            self._stop_call = reactor.callLater(runtime, self.stop)
+        else:
+            self.log.info("Starting continuous profiling using {profiler}.", profiler=self._id)
+
+        return self._profile_id, self._finished
+
+    def stop(self):
+        """
+        Stop sampling, and fire the deferred returned from :meth:`start` with the profile.
+        """
+        if self._state != Profiler.STATE_RUNNING:
+            raise Exception("profile currently not running - cannot stop")
+
+        if self._stop_call and self._stop_call.active():
+            self._stop_call.cancel()
+        self._stop_call = None
+
+        self._stopping = True
+        self._thread.join()
+        self._thread = None
+
+        profile = self.snapshot()
+        finished = self._finished
+
+        self.log.info("Profile with {samples} samples created (sampling took {overhead:.1f}% of the time)",
+                      samples=self.samples, overhead=self.overhead_percent())
+
+        self._state = Profiler.STATE_STOPPED
+        self._started = None
+        self._finished = None
+        self._profile_id = None
+
+        finished.callback(profile)
+
+    def overhead_percent(self):
+        """
+        The share of time spent taking samples (in percent of the time sampled).
+        """
+        return 100. * self.overhead / max(self.samples * self._interval, self._interval)
+
+    def snapshot(self):
+        """
+        Get the stacks sampled in the current window.
+
+        :returns: The profile in collapsed stack format.
+        :rtype: unicode
+        """
+        with self._lock:
+            aggregates = [list(aggregate.items()) for aggregate in self._aggregates]
+
+        counts = {}
+        for aggregate in aggregates:
+            for stack, count in aggregate:
+                counts[stack] = counts.get(stack, 0) + count
+
+        lines = []
+        for stack, count in counts.items():
+            names = [self._threads.get(stack[0], u'thread-{}'.format(stack[0]))]
+            names.extend(self._name(code) for code in reversed(stack[1:]))
+            lines.append(u'{} {}'.format(u';'.join(names), count))
+        lines.sort()
+        return u'\n'.join(lines)
+
+    def _name(self, code):
+        if code is None:
+            return u'[truncated]'
+        name = self._names.get(code, None)
+        if name is None:
+            name = u'{} ({}:{})'.format(code.co_name, code.co_filename, code.co_firstlineno).replace(u';', u':')
+            self._names[code] = name
+        return name
+
+    def _run(self):
+        own = threading.current_thread().ident
+        interval = self._interval
+        span = float(self._window) / self._buckets
+        rotate_at = 0
+        sample_at = time.time()
+
+        while not self._stopping:
+            # sample at a fixed rate, even if waking up was delayed (e.g. by the GIL)
+            sample_at += interval
+            time.sleep(max(sample_at - time.time(), 0))
+            started = time.time()
+            sample_at = max(sample_at, started - interval)
+
+            if started >= rotate_at:
+                with self._lock:
+                    self._aggregates.append({})
+                rotate_at = started + span
+            aggregate = self._aggregates[-1]
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in self._threads:
+                    self._threads.update((t.ident, u'{}'.format(t.name)) for t in threading.enumerate())
+                stack = [ident]
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack = tuple(stack)
+                if stack not in aggregate and len(aggregate) >= self._max_stacks:
+                    stack = (ident, None)
+                with self._lock:
+                    aggregate[stack] = aggregate.get(stack, 0) + 1
+
+            self.samples += 1
+            self.overhead += time.time() - started
+
+
+PROFILERS['sampler'] = Sampler('sampler', config={'interval': 0.01, 'window': 60})
@@ -0,0 +1,162 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import socket
+
+from zope.interface import implementer
+
+from twisted.internet.interfaces import IPushProducer
+from twisted.internet.protocol import Factory
+from twisted.protocols.basic import Int32StringReceiver
+
+from autobahn.wamp.serializer import MsgPackObjectSerializer
+
+from crossbar._logging import make_logger
+
+__all__ = (
+    'TELEMETRY_FD',
+    'TelemetrySenderProtocol',
+    'TelemetryReceiverProtocol',
+    'connect_telemetry',
+)
+
+
+# the FD of native workers the telemetry channel to the node controller is on
+TELEMETRY_FD = 4
+
+# maximum size of a telemetry record (same as for RawSocket transports)
+TELEMETRY_MAX_LENGTH = 2 ** 24
+
+
+@implementer(IPushProducer)
+class TelemetrySenderProtocol(Int32StringReceiver):
+    """
+    Worker side of the telemetry channel: sends WAMP events (topic, args, kwargs)
+    to the node controller, which publishes them on the worker's behalf.
+
+    Telemetry is never queued without limit: while the controller does not
+    keep up (the transport paused us), events are dropped and counted.
+    """
+
+    log = make_logger()
+
+    MAX_LENGTH = TELEMETRY_MAX_LENGTH
+
+    def __init__(self):
+        self._serializer = MsgPackObjectSerializer()
+        self._paused = False
+        self.sent = 0
+        self.dropped = 0
+
+    def connectionMade(self):
+        self.transport.registerProducer(self, True)
+
+    def connectionLost(self, reason):
+        self.transport = None
+
+    def pauseProducing(self):
+        self._paused = True
+
+    def resumeProducing(self):
+        self._paused = False
+
+    def stopProducing(self):
+        self._paused = True
+
+    def publish(self, topic, *args, **kwargs):
+        """
+        Send an event over the telemetry channel.
+
+        :param topic: The URI of the topic to publish to.
+        :type topic: unicode
+
+        :returns: ``True`` if the event was sent, ``False`` if it was dropped.
+        :rtype: bool
+        """
+        if self._paused or self.transport is None:
+            self.dropped += 1
+            return False
+        self.sendString(self._serializer.serialize([topic, list(args), kwargs]))
+        self.sent += 1
+        return True
+
+
+class TelemetryReceiverProtocol(Int32StringReceiver):
+    """
+    Controller side of the telemetry channel of a native worker.
+    """
+
+    log = make_logger()
+
+    MAX_LENGTH = TELEMETRY_MAX_LENGTH
+
+    def __init__(self, on_event):
+        """
+
+        :param on_event: Called with ``(topic, args, kwargs)`` for every event received.
+        :type on_event: callable
+        """
+        self._serializer = MsgPackObjectSerializer()
+        self._on_event = on_event
+
+    def stringReceived(self, payload):
+        try:
+            for topic, args, kwargs in self._serializer.unserialize(payload):
+                self._on_event(topic, args, kwargs)
+        except Exception:
+            self.log.failure("Invalid telemetry record from native worker: {log_failure.value}")
+
+    def lengthLimitExceeded(self, length):
+        self.log.warn("Telemetry record of {length} bytes from native worker exceeds limit - closing channel", length=length)
+        self.transport.loseConnection()
+
+
+def connect_telemetry(reactor, fd, protocol):
+    """
+    Run a telemetry protocol over an inherited (or created) Unix domain socket.
+
+    :param fd: The file descriptor of the socket (which is closed, as the
+        reactor uses a copy).
+    :type fd: int
+    :param protocol: The protocol to run.
+    :type protocol: instance of :class:`TelemetrySenderProtocol` or :class:`TelemetryReceiverProtocol`
+
+    :returns: The protocol.
+    """
+    factory = Factory.forProtocol(lambda: protocol)
+    try:
+        reactor.adoptStreamConnection(fd, socket.AF_UNIX, factory)
+    finally:
+        os.close(fd)
+    return protocol
@@ -0,0 +1,119 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import crossbar
+from crossbar.test import TestCase
+from crossbar.common.importtime import ImportProfiler, format_records
+
+
+class _Clock(object):
+    """
+    Fake clock advancing one second per reading.
+    """
+
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        self.now += 1.
+        return self.now
+
+
+class ImportProfilerTests(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, '_cbimp'))
+        with open(os.path.join(self.path, '_cbimp', '__init__.py'), 'w') as f:
+            f.write('from . import inner\n')
+        with open(os.path.join(self.path, '_cbimp', 'inner.py'), 'w') as f:
+            f.write('import json\n')
+        sys.path.insert(0, self.path)
+        return super(ImportProfilerTests, self).setUp()
+
+    def tearDown(self):
+        sys.path.remove(self.path)
+        for name in ('_cbimp', '_cbimp.inner'):
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.path)
+        return super(ImportProfilerTests, self).tearDown()
+
+    def test_nested(self):
+        """
+        Nested imports are recorded with their depth, and their time is
+        accounted to the cumulative (but not self) time of the importer.
+        """
+        profiler = ImportProfiler(clock=_Clock())
+        profiler.install()
+        try:
+            import _cbimp  # noqa
+        finally:
+            profiler.uninstall()
+
+        # "json" is already loaded and hence not recorded
+        self.assertEqual(profiler.records, [
+            ('_cbimp.inner', 1, 1., 1.),
+            ('_cbimp', 0, 2., 3.),
+        ])
+
+    def test_format(self):
+        lines = format_records([('a', 0, 0.001, 0.003), ('b', 1, 0.002, 0.002)], limit=1)
+        self.assertEqual(lines, [
+            u'import time: self [us] | cumulative | imported package',
+            u'import time:      1000 |       3000 | a',
+        ])
+
+
+class LazyImportTests(TestCase):
+
+    def test_router_worker(self):
+        """
+        Importing the router worker does not import web, templating or
+        configuration file format packages - they are loaded on first use.
+        """
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(crossbar.__file__)))] + sys.path)
+        output = subprocess.check_output([sys.executable, '-m', 'crossbar.common.importtime',
+                                          'crossbar.worker.process', 'crossbar.worker.router'], env=env)
+        imported = set(record[0].split('.')[0] for record in json.loads(output.decode('utf8')))
+        imported.update(record[0] for record in json.loads(output.decode('utf8')))
+
+        for name in ('twisted.web.server', 'jinja2', 'pygments', 'yaml', 'netaddr', 'treq', 'pkg_resources'):
+            self.assertNotIn(name, imported)
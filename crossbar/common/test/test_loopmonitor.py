@@ -0,0 +1,131 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+from twisted.internet.task import Clock
+
+from crossbar.test import TestCase
+from crossbar.common.loopmonitor import LoopMonitor, LATENCY_BUCKETS
+
+
+class LoopMonitorTests(TestCase):
+    """
+    Tests for crossbar.common.loopmonitor.LoopMonitor.
+    """
+
+    def _beat(self, monitor, lag):
+        # run the heartbeat "lag" seconds after it was due
+        clock = monitor._reactor
+        monitor._expected = clock.seconds()
+        clock.advance(lag)
+        monitor._beat()
+
+    def test_histogram(self):
+        """
+        Heartbeats record their lag into the histogram and the percentiles.
+        """
+        monitor = LoopMonitor(Clock(), threshold=0)
+        for _ in range(98):
+            self._beat(monitor, 0.)
+        self._beat(monitor, 0.015)
+        self._beat(monitor, 0.3)
+
+        stats = monitor.marshal()
+        self.assertEqual(stats[u'beats'], 100)
+        self.assertEqual(sum(count for _, count in stats[u'histogram']), 100)
+        self.assertEqual(len(stats[u'histogram']), len(LATENCY_BUCKETS) + 1)
+        self.assertEqual(stats[u'histogram'][-1], [None, 0])
+        self.assertEqual(stats[u'lag_p50'], LATENCY_BUCKETS[0])
+        self.assertEqual(stats[u'lag_p99'], 0.02)
+        self.assertEqual(stats[u'lag_p999'], 0.5)
+        self.assertAlmostEqual(stats[u'lag_max'], 0.3)
+        self.assertEqual(stats[u'stalls'], 0)
+
+    def test_stall(self):
+        """
+        A lag above the threshold is a stall, reported with the stack the
+        watchdog captured for the same heartbeat.
+        """
+        stalls = []
+        monitor = LoopMonitor(Clock(), threshold=0.1, on_stall=stalls.append)
+        self._beat(monitor, 0.05)
+        self.assertEqual(stalls, [])
+
+        monitor._stall_stack = (monitor._reactor.seconds(), u'  File "blocking.py", line 1\n')
+        self._beat(monitor, 0.2)
+        self.assertEqual(len(stalls), 1)
+        self.assertAlmostEqual(stalls[0][u'lag'], 0.2)
+        self.assertEqual(stalls[0][u'stack'], u'  File "blocking.py", line 1\n')
+        self.assertEqual(monitor._stall_stack, None)
+
+        # a stack captured for an earlier heartbeat is not reported
+        monitor._stall_stack = (monitor._expected - 1., u'stale')
+        self._beat(monitor, 0.2)
+        self.assertEqual(stalls[1][u'stack'], None)
+
+        stats = monitor.marshal()
+        self.assertEqual(stats[u'stalls'], 2)
+        self.assertEqual(stats[u'recent_stalls'], stalls)
+
+    def test_reset(self):
+        """
+        Resetting clears the statistics.
+        """
+        monitor = LoopMonitor(Clock(), threshold=0.1)
+        self._beat(monitor, 0.2)
+        monitor.reset()
+
+        stats = monitor.marshal()
+        self.assertEqual(stats[u'beats'], 0)
+        self.assertEqual(stats[u'lag_max'], 0.)
+        self.assertEqual(stats[u'lag_p99'], 0.)
+        self.assertEqual(stats[u'stalls'], 0)
+        self.assertEqual(stats[u'recent_stalls'], [])
+
+    def test_start_stop(self):
+        """
+        The heartbeat is rescheduled on the reactor until stopped.
+        """
+        clock = Clock()
+        monitor = LoopMonitor(clock, interval=0.01, threshold=0)
+        monitor.start()
+        self.assertTrue(monitor.marshal()[u'running'])
+        clock.advance(0.01)
+        clock.advance(0.05)
+        stats = monitor.marshal()
+        self.assertEqual(stats[u'beats'], 2)
+        self.assertAlmostEqual(stats[u'lag_max'], 0.04)
+        self.assertEqual(len(clock.getDelayedCalls()), 1)
+
+        monitor.stop()
+        self.assertFalse(monitor.marshal()[u'running'])
+        self.assertEqual(clock.getDelayedCalls(), [])
@@ -0,0 +1,176 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import socket
+
+from twisted.trial.unittest import SkipTest
+
+from crossbar.test import TestCase
+from crossbar.common.procstats import HAS_PROCFS, ProcStats, changed_stats
+from crossbar.common.processinfo import _HAS_PSUTIL
+
+if _HAS_PSUTIL:
+    from crossbar.common.processinfo import ProcessInfo
+
+
+_STAT = (u'4242 (crossbar (worker) 1) S 1 4242 4242 0 -1 4194560 1000 0 0 0 '
+         u'250 50 0 0 20 0 3 0 100 104857600 2048 18446744073709551615')
+
+_STATUS = u'''Name:\tcrossbar
+State:\tS (sleeping)
+voluntary_ctxt_switches:\t120
+nonvoluntary_ctxt_switches:\t7
+'''
+
+_IO = u'''rchar: 1000
+wchar: 2000
+syscr: 30
+syscw: 40
+'''
+
+
+class ProcStatsTests(TestCase):
+    """
+    Tests for crossbar.common.procstats.ProcStats.
+    """
+
+    def _procfs(self, io=True):
+        procfs = self.mktemp()
+        os.makedirs(os.path.join(procfs, '4242'))
+        files = {
+            'meminfo': u'MemTotal:        1048576 kB\n',
+            os.path.join('4242', 'stat'): _STAT,
+            os.path.join('4242', 'status'): _STATUS,
+        }
+        if io:
+            files[os.path.join('4242', 'io')] = _IO
+        for name, contents in files.items():
+            with open(os.path.join(procfs, name), 'w') as f:
+                f.write(contents)
+        return procfs
+
+    def test_get_stats(self):
+        """
+        Statistics are parsed from stat, status and io (even if the process
+        name contains parentheses and blanks).
+        """
+        stats = ProcStats(4242, procfs=self._procfs())
+        self.addCleanup(stats.close)
+        res = stats.get_stats()
+
+        ticks = float(os.sysconf('SC_CLK_TCK'))
+        resident = 2048 * os.sysconf('SC_PAGE_SIZE')
+        self.assertEqual(res[u'status'], u'sleeping')
+        self.assertEqual(res[u'voluntary'], 120)
+        self.assertEqual(res[u'nonvoluntary'], 7)
+        self.assertEqual(res[u'user'], 250 / ticks)
+        self.assertEqual(res[u'system'], 50 / ticks)
+        self.assertEqual(res[u'cpu_percent'], 0.)
+        self.assertEqual(res[u'resident'], resident)
+        self.assertEqual(res[u'virtual'], 104857600)
+        self.assertEqual(res[u'mem_percent'], 100. * resident / (1048576 * 1024))
+        self.assertEqual(res[u'reads'], 30)
+        self.assertEqual(res[u'writes'], 40)
+
+        # the files are kept open and re-read
+        self.assertEqual(stats.get_stats()[u'voluntary'], 120)
+
+    def test_get_stats_no_io(self):
+        """
+        I/O counters are None when the io file cannot be read.
+        """
+        stats = ProcStats(4242, procfs=self._procfs(io=False))
+        self.addCleanup(stats.close)
+        res = stats.get_stats()
+        self.assertEqual(res[u'reads'], None)
+        self.assertEqual(res[u'writes'], None)
+        self.assertEqual(res[u'voluntary'], 120)
+
+    def test_get_stats_self(self):
+        """
+        The statistics of this process have the same keys as those from psutil.
+        """
+        if not HAS_PROCFS:
+            raise SkipTest("no /proc filesystem")
+        stats = ProcStats()
+        self.addCleanup(stats.close)
+        res = stats.get_stats()
+        self.assertTrue(res[u'resident'] > 0)
+        self.assertTrue(res[u'voluntary'] >= 0)
+        if _HAS_PSUTIL:
+            self.assertEqual(sorted(res.keys()), sorted(ProcessInfo().get_stats().keys()))
+
+    def test_socket_counts(self):
+        """
+        Sockets of this process are counted by type and state.
+        """
+        if not HAS_PROCFS:
+            raise SkipTest("no /proc filesystem")
+        stats = ProcStats()
+        self.addCleanup(stats.close)
+        before = stats.socket_counts().get(u'tcp4', {})
+
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        client = socket.create_connection(server.getsockname())
+        self.addCleanup(client.close)
+        accepted, _ = server.accept()
+        self.addCleanup(accepted.close)
+
+        after = stats.socket_counts()[u'tcp4']
+        self.assertEqual(after.get(u'LISTEN', 0), before.get(u'LISTEN', 0) + 1)
+        self.assertEqual(after.get(u'ESTABLISHED', 0), before.get(u'ESTABLISHED', 0) + 2)
+
+
+class ChangedStatsTests(TestCase):
+    """
+    Tests for crossbar.common.procstats.changed_stats.
+    """
+
+    def test_first(self):
+        """
+        Without previous statistics, all statistics are changes.
+        """
+        self.assertEqual(changed_stats(None, {u'user': 1.}), {u'user': 1.})
+
+    def test_changed(self):
+        """
+        Only new and changed statistics are returned.
+        """
+        previous = {u'ts': u'a', u'user': 1., u'resident': 100}
+        current = {u'ts': u'b', u'user': 1., u'resident': 200, u'reads': 3}
+        self.assertEqual(changed_stats(previous, current),
+                         {u'ts': u'b', u'resident': 200, u'reads': 3})
@@ -0,0 +1,145 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import time
+
+from crossbar.test import TestCase
+from crossbar.common.profiler import Sampler, export_profile
+
+
+def _busy(seconds):
+    """
+    Burn CPU in a function the sampler should find.
+    """
+    until = time.time() + seconds
+    while time.time() < until:
+        sum(i * i for i in range(1000))
+
+
+class SamplerTests(TestCase):
+    """
+    Tests for crossbar.common.profiler.Sampler.
+    """
+
+    def _sample(self, seconds=0.3, **config):
+        config.setdefault(u'interval', 0.005)
+        sampler = Sampler(u'sampler', config)
+        profile_id, finished = sampler.start(runtime=0)
+        self.assertEqual(sampler.marshal()[u'state'], u'running')
+        self.assertEqual(sampler.marshal()[u'profile_id'], profile_id)
+        _busy(seconds)
+
+        profiles = []
+        finished.addCallback(profiles.append)
+        sampler.stop()
+        self.assertEqual(sampler.marshal()[u'state'], u'stopped')
+        return sampler, profiles[0]
+
+    def test_sample(self):
+        """
+        Stacks are recorded root first, per thread, with the samples seen.
+        """
+        sampler, profile = self._sample()
+        self.assertTrue(sampler.samples > 0)
+
+        lines = [line for line in profile.splitlines() if u'_busy' in line]
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(u' ', 1)
+            frames = stack.split(u';')
+            self.assertEqual(frames[0], u'MainThread')
+            self.assertIn(u'test_sample', stack)
+            self.assertTrue(int(count) > 0)
+
+        # the sampler doesn't sample itself
+        self.assertNotIn(u'crossbar-sampler', profile)
+
+    def test_bounded(self):
+        """
+        Stacks beyond the maximum number of stacks are counted as truncated.
+        """
+        sampler, profile = self._sample(max_stacks=1)
+        stacks = profile.splitlines()
+        self.assertTrue(len(stacks) <= 2)
+        self.assertTrue(any(line.startswith(u'MainThread;[truncated] ') for line in stacks))
+
+    def test_window(self):
+        """
+        Only the stacks sampled within the window are kept.
+        """
+        sampler, profile = self._sample(seconds=0.5, window=0.2, buckets=2)
+        samples = sum(int(line.rsplit(u' ', 1)[1]) for line in profile.splitlines())
+        self.assertTrue(samples < sampler.samples)
+
+    def test_not_running(self):
+        """
+        A sampler that is not running can't be stopped.
+        """
+        sampler = Sampler(u'sampler')
+        self.assertRaises(Exception, sampler.stop)
+
+
+class ExportTests(TestCase):
+    """
+    Tests for crossbar.common.profiler.export_profile.
+    """
+
+    PROFILE = u'MainThread;main (a.py:1);f (a.py:5) 3\nMainThread;main (a.py:1) 1'
+
+    def test_collapsed(self):
+        self.assertEqual(export_profile(self.PROFILE), self.PROFILE)
+
+    def test_speedscope(self):
+        """
+        Speedscope profiles share the frames between samples, weighted by time.
+        """
+        res = export_profile(self.PROFILE, u'speedscope', interval=0.5, name=u'test')
+        self.assertEqual(res[u'shared'][u'frames'], [{u'name': u'MainThread'}, {u'name': u'main (a.py:1)'}, {u'name': u'f (a.py:5)'}])
+
+        profile = res[u'profiles'][0]
+        self.assertEqual(profile[u'type'], u'sampled')
+        self.assertEqual(profile[u'unit'], u'seconds')
+        self.assertEqual(profile[u'samples'], [[0, 1, 2], [0, 1]])
+        self.assertEqual(profile[u'weights'], [1.5, 0.5])
+        self.assertEqual(profile[u'endValue'], 2.0)
+
+    def test_speedscope_samples(self):
+        """
+        Without the sampling interval, speedscope profiles are weighted by samples.
+        """
+        profile = export_profile(self.PROFILE, u'speedscope')[u'profiles'][0]
+        self.assertEqual(profile[u'unit'], u'none')
+        self.assertEqual(profile[u'weights'], [3, 1])
+
+    def test_invalid_format(self):
+        self.assertRaises(Exception, export_profile, self.PROFILE, u'pprof')
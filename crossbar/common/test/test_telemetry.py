@@ -0,0 +1,127 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import socket
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.test.proto_helpers import StringTransport
+from twisted.python.runtime import platform
+
+from crossbar.test import TestCase
+from crossbar.common.telemetry import TelemetrySenderProtocol, \
+    TelemetryReceiverProtocol, connect_telemetry
+
+
+class TelemetryTests(TestCase):
+    """
+    Tests for crossbar.common.telemetry.
+    """
+
+    def _sender(self):
+        sender = TelemetrySenderProtocol()
+        sender.makeConnection(StringTransport())
+        return sender
+
+    def test_roundtrip(self):
+        """
+        Events sent are received with their topic, args and kwargs.
+        """
+        sender = self._sender()
+        self.assertTrue(sender.publish(u'com.example.stats', 1, u'two', seq=3))
+        self.assertTrue(sender.publish(u'com.example.stats', {u'cpu': 0.5}))
+
+        events = []
+        receiver = TelemetryReceiverProtocol(lambda *event: events.append(event))
+        receiver.makeConnection(StringTransport())
+        receiver.dataReceived(sender.transport.value())
+
+        self.assertEqual(events, [
+            (u'com.example.stats', [1, u'two'], {u'seq': 3}),
+            (u'com.example.stats', [{u'cpu': 0.5}], {}),
+        ])
+        self.assertEqual(sender.sent, 2)
+
+    def test_dropped_when_paused(self):
+        """
+        While the transport is paused (the receiver doesn't keep up), events
+        are dropped instead of queued.
+        """
+        sender = self._sender()
+        self.assertIs(sender.transport.producer, sender)
+
+        sender.pauseProducing()
+        self.assertFalse(sender.publish(u'com.example.stats', 1))
+        self.assertEqual(sender.transport.value(), b'')
+
+        sender.resumeProducing()
+        self.assertTrue(sender.publish(u'com.example.stats', 2))
+        self.assertEqual((sender.sent, sender.dropped), (1, 1))
+
+    def test_invalid_record(self):
+        """
+        Invalid records are logged and skipped.
+        """
+        events = []
+        receiver = TelemetryReceiverProtocol(lambda *event: events.append(event))
+        receiver.makeConnection(StringTransport())
+        receiver.stringReceived(b'\xc1')
+
+        sender = self._sender()
+        sender.publish(u'com.example.stats', 1)
+        receiver.dataReceived(sender.transport.value())
+        self.assertEqual(events, [(u'com.example.stats', [1], {})])
+        self.assertEqual(len(self.flushLoggedErrors()), 1)
+
+    @inlineCallbacks
+    def test_socketpair(self):
+        """
+        The telemetry channel runs over a Unix domain socket pair.
+        """
+        if platform.isWindows():
+            self.skipTest("no Unix domain sockets on Windows")
+
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        received = Deferred()
+        receiver = connect_telemetry(reactor, os.dup(ours.fileno()), TelemetryReceiverProtocol(lambda *event: received.callback(event)))
+        sender = connect_telemetry(reactor, os.dup(theirs.fileno()), TelemetrySenderProtocol())
+        ours.close()
+        theirs.close()
+
+        sender.publish(u'com.example.stats', seq=1)
+        event = yield received
+        self.assertEqual(event, (u'com.example.stats', [], {u'seq': 1}))
+
+        sender.transport.loseConnection()
+        receiver.transport.loseConnection()
@@ -34,10 +34,10 @@ import argparse
 import click
 import json
 import os
-import pkg_resources
 import platform
 import signal
 import sys
+import time
 
 import six
 
@@ -52,12 +52,6 @@ import crossbar
 from crossbar._logging import make_logger
 
 
-try:
-    import psutil
-    _HAS_PSUTIL = True
-except ImportError:
-    _HAS_PSUTIL = False
-
 _HAS_COLOR_TERM = False
 try:
     import colorama
@@ -87,6 +81,29 @@ BANNER = r"""     __  __  __  __  __  __      __     __
 
 _PID_FILENAME = 'node.pid'
 
+# entry points measured by "crossbar version --import-profile": (title, modules imported)
+_IMPORT_PROFILE_ENTRY_POINTS = [
+    (u'crossbar CLI', ['crossbar.controller.cli']),
+    (u'router worker', ['crossbar.worker.process', 'crossbar.worker.router']),
+    (u'container worker', ['crossbar.worker.process', 'crossbar.worker.container']),
+]
+
+# number of heaviest imports to print per entry point
+_IMPORT_PROFILE_LIMIT = 25
+
+
+def _psutil():
+    """
+    Import psutil on first use (it's only needed by a few commands).
+
+    :returns: The psutil module or ``None`` when not installed.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil
+
 
 def check_pid_exists(pid):
     """
@@ -96,7 +113,8 @@ def check_pid_exists(pid):
     :rtype: bool
     """
     if sys.platform == 'win32':
-        if _HAS_PSUTIL:
+        psutil = _psutil()
+        if psutil:
             # http://pythonhosted.org/psutil/#psutil.pid_exists
             return psutil.pid_exists(pid)
         else:
@@ -153,14 +171,15 @@ def check_is_running(cbdir):
                 remove_PID_type = "corrupt"
                 remove_PID_reason = "corrupt .pid file"
             else:
-                if sys.platform == 'win32' and not _HAS_PSUTIL:
+                psutil = _psutil()
+                if sys.platform == 'win32' and not psutil:
                     # when on Windows, and we can't actually determine if the PID exists,
                     # just assume it exists
                     return pid_data
                 else:
                     pid_exists = check_pid_exists(pid)
                     if pid_exists:
-                        if _HAS_PSUTIL:
+                        if psutil:
                             # additionally check this is actually a crossbar process
                             p = psutil.Process(pid)
                             cmdline = p.cmdline()
@@ -197,6 +216,8 @@ def run_command_version(options, reactor=None, **kwargs):
     """
     Subcommand "crossbar version".
     """
+    import pkg_resources
+
     log = make_logger()
     # verbose = True
 
@@ -306,6 +327,31 @@ def run_command_version(options, reactor=None, **kwargs):
     log.info(" Machine            : {ver}", ver=decorate(platform.machine()))
     log.info("")
 
+    if getattr(options, 'import_profile', False):
+        _log_import_profile(log)
+
+
+def _log_import_profile(log):
+    """
+    Log where the time goes when importing the CLI and the worker entry points,
+    each measured in a fresh interpreter.
+    """
+    import subprocess
+    from crossbar.common.importtime import format_records
+
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(crossbar.__file__)))] + sys.path)
+
+    for title, modules in _IMPORT_PROFILE_ENTRY_POINTS:
+        output = subprocess.check_output([sys.executable, '-m', 'crossbar.common.importtime'] + modules, env=env)
+        records = json.loads(output.decode('utf8'))
+        total = sum(record[3] for record in records if record[1] == 0)
+        log.info("Import profile of {title} ({modules}): {total} ms total",
+                 title=title, modules=', '.join(modules), total=int(total * 1000))
+        for line in format_records(records, _IMPORT_PROFILE_LIMIT):
+            log.info("{line}", line=line)
+        log.info("")
+
 
 def run_command_templates(options, **kwargs):
     """
@@ -394,7 +440,8 @@ def run_command_stop(options, exit=True, **kwargs):
     if pid_data:
         pid = pid_data['pid']
         print("Stopping Crossbar.io currently running from node directory {} (PID {}) ...".format(options.cbdir, pid))
-        if not _HAS_PSUTIL:
+        psutil = _psutil()
+        if not psutil:
             os.kill(pid, signal.SIGINT)
             print("SIGINT sent to process {}.".format(pid))
         else:
@@ -658,13 +705,14 @@ def run_command_check(options, **kwargs):
 
     old_dir = os.path.abspath(os.path.curdir)
     os.chdir(options.cbdir)
+    started = time.time()
     try:
         check_config_file(configfile)
     except Exception as e:
         print("\nError: {}\n".format(e))
         sys.exit(1)
     else:
-        print("Ok, node configuration looks good!\n")
+        print("Ok, node configuration looks good! (checked in {} ms)\n".format(int((time.time() - started) * 1000)))
         sys.exit(0)
     finally:
         os.chdir(old_dir)
@@ -736,6 +784,10 @@ def run(prog=None, args=None, reactor=None):
     parser_version.add_argument('--colour',
                                 **colour_args)
 
+    parser_version.add_argument('--import-profile',
+                                action='store_true',
+                                help='Also print where the time goes when importing the CLI and the worker entry points.')
+
     parser_version.set_defaults(func=run_command_version)
 
     # "init" command
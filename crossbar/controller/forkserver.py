@@ -0,0 +1,382 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import sys
+import json
+import socket
+import struct
+import collections
+
+from zope.interface import implementer
+
+from twisted.internet import main
+from twisted.internet.defer import Deferred, fail
+from twisted.internet.interfaces import IReadDescriptor
+from twisted.internet.process import Process, _BaseProcess
+from twisted.internet.protocol import ProcessProtocol
+from twisted.python.sendmsg import sendmsg, SCM_RIGHTS
+
+import crossbar
+from crossbar._logging import make_logger
+
+__all__ = ('ForkServer', 'ForkedProcess')
+
+
+# exit status reported for forked processes when the fork server was lost
+# (the actual exit status is unknown then): exit code 1
+LOST_STATUS = 1 << 8
+
+
+def _startup_env(env):
+    """
+    Get the environment variables affecting how a Python process starts up and
+    finds modules (which a forked process can't change anymore).
+
+    :param env: The environment.
+    :type env: dict
+
+    :returns: The startup variables of the environment.
+    :rtype: dict
+    """
+    return {name: value for name, value in env.items() if name.startswith('PYTHON') or name.startswith('LD_')}
+
+
+class ForkedProcess(Process):
+    """
+    A process forked by the fork server, talking to the node controller over
+    pipes just like a process spawned by the reactor.
+    """
+
+    def __init__(self, reactor, fork_server, pid, proto, helpers, childFDs):
+        """
+
+        :param reactor: The reactor the pipes to the process are read/written from.
+        :type reactor: obj
+        :param fork_server: The fork server that forked this process.
+        :type fork_server: instance of :class:`ForkServer`
+        :param pid: The PID of the forked process.
+        :type pid: int
+        :param proto: The process protocol to connect.
+        :type proto: instance of :class:`twisted.internet.protocol.ProcessProtocol`
+        :param helpers: Map of child FD to the (parent) end of the pipe connected to it.
+        :type helpers: dict
+        :param childFDs: Map of child FD to "r" (the parent reads), "w" (the parent writes)
+            or an FD of the parent the child inherits.
+        :type childFDs: dict
+        """
+        _BaseProcess.__init__(self, proto)
+
+        self._fork_server = fork_server
+        self.pid = pid
+        self.pipes = {}
+
+        for childFD, parentFD in helpers.items():
+            if childFDs[childFD] == "r":
+                self.pipes[childFD] = self.processReaderFactory(reactor, self, childFD, parentFD)
+            else:
+                self.pipes[childFD] = self.processWriterFactory(reactor, self, childFD, parentFD, forceReadHack=True)
+
+        try:
+            self.proto.makeConnection(self)
+        except Exception:
+            self._fork_server.log.failure("Failed to connect forked process {pid}", pid=pid)
+
+    def reapProcess(self):
+        """
+        Forked processes are not our children: the fork server reports their
+        exit status, unless it is gone.
+        """
+        if self._fork_server.lost:
+            self.processEnded(LOST_STATUS)
+
+
+class _ForkServerProtocol(ProcessProtocol):
+    """
+    Logs output of the fork server process and tracks its end.
+    """
+
+    def __init__(self, fork_server):
+        self._fork_server = fork_server
+
+    def outReceived(self, data):
+        self._log(data)
+
+    def errReceived(self, data):
+        self._log(data)
+
+    def _log(self, data):
+        for line in data.decode('utf8', 'replace').splitlines():
+            self._fork_server.log.warn("Fork server: {line}", line=line)
+
+    def processEnded(self, reason):
+        self._fork_server._ended.callback(reason.value)
+
+
+@implementer(IReadDescriptor)
+class ForkServer(object):
+    """
+    Node controller side of the fork server (see :mod:`crossbar.worker.forkserver`):
+    a template process which has imported everything a native worker needs, and
+    which forks native workers on request, much faster than spawning a fresh
+    Python for each.
+
+    Use :meth:`spawnProcess` as a drop-in for ``reactor.spawnProcess``.
+    """
+
+    log = make_logger()
+
+    HEADER = struct.Struct('>I')
+
+    def __init__(self, reactor, main=u'crossbar.worker.process.run'):
+        """
+
+        :param reactor: The reactor to run under.
+        :type reactor: obj
+        :param main: Fully qualified name of the function forked workers run.
+        :type main: unicode
+        """
+        self._reactor = reactor
+        self._main = main
+
+        self._socket = None
+        self._buffer = b''
+
+        # spawn requests waiting for the PID of the forked process, in order
+        self._pending = collections.deque()
+
+        # forked processes (PID -> ForkedProcess) not yet reported as ended
+        self._processes = {}
+
+        self._ended = Deferred()
+
+        self.pid = None
+        self.lost = False
+
+        # startup environment of the forked processes
+        self._startup_env = None
+
+    def start(self):
+        """
+        Start the fork server process.
+        """
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        exe = sys.executable
+        filename = os.path.abspath(os.path.join(crossbar.__file__, "..", "worker", "forkserver.py"))
+        args = [exe, "-u", filename, "--main", self._main]
+
+        # same as for spawned workers, but make sure to find the Crossbar we're
+        # working with even when started from a relative path
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(crossbar.__file__)))] + sys.path)
+
+        try:
+            process = self._reactor.spawnProcess(
+                _ForkServerProtocol(self), exe, args, env=env,
+                childFDs={0: "w", 1: "r", 2: "r", 3: theirs.fileno()})
+        except Exception:
+            ours.close()
+            raise
+        finally:
+            theirs.close()
+
+        self.pid = process.pid
+        self._socket = ours
+
+        # workers spawned by the node controller get the node's sys.path
+        # (which already includes the Crossbar we're working with)
+        self._startup_env = _startup_env(os.environ)
+        self._startup_env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        self._reactor.addReader(self)
+
+        self.log.info("Fork server started with PID {pid}", pid=self.pid)
+
+    def stop(self):
+        """
+        Stop the fork server process. Workers already forked continue to run.
+
+        :returns: A deferred that fires when the fork server process has ended.
+        :rtype: instance of :class:`twisted.internet.defer.Deferred`
+        """
+        if self._socket is not None:
+            self._reactor.removeReader(self)
+            self.connectionLost(None)
+        return self._ended
+
+    def can_fork(self, env):
+        """
+        Check whether a process with the given environment can be forked from the
+        fork server. A forked process gets its environment only after the fork
+        server started Python and preloaded modules, so environment variables
+        affecting that (``PYTHONPATH`` and other ``PYTHON*`` and ``LD_*`` variables)
+        must be those of the fork server. Spawn the process otherwise.
+
+        :param env: The environment of the process.
+        :type env: dict
+
+        :returns: ``True`` if the process can be forked.
+        :rtype: bool
+        """
+        return self._startup_env is not None and _startup_env(env or {}) == self._startup_env
+
+    def spawnProcess(self, processProtocol, executable, args=(), env={}, path=None,
+                     uid=None, gid=None, usePTY=0, childFDs=None):
+        """
+        Fork a process from the fork server. The arguments are those of
+        ``reactor.spawnProcess`` and the command line must run a Python script:
+        the interpreter options and the script name are dropped, the rest is
+        passed to the fork server's main function as ``sys.argv``.
+
+        :returns: A deferred that fires with the process transport once the
+            process was forked.
+        :rtype: instance of :class:`twisted.internet.defer.Deferred`
+        """
+        if self.lost or self._socket is None:
+            return fail(RuntimeError("fork server is not running"))
+
+        if uid is not None or gid is not None or usePTY:
+            return fail(NotImplementedError("fork server does not support uid, gid or usePTY"))
+
+        if childFDs is None:
+            childFDs = {0: "w", 1: "r", 2: "r"}
+
+        # skip the interpreter and its options
+        argv = list(args[1:])
+        while argv and argv[0].startswith('-'):
+            argv.pop(0)
+
+        helpers = {}
+        theirs = {}
+        try:
+            for childFD, target in childFDs.items():
+                if target == "r":
+                    helpers[childFD], theirs[childFD] = os.pipe()
+                elif target == "w":
+                    theirs[childFD], helpers[childFD] = os.pipe()
+                elif isinstance(target, int):
+                    # an FD of ours (like a socket) the child inherits
+                    theirs[childFD] = os.dup(target)
+                else:
+                    raise ValueError("fork server does not support mapping FD {} to {}".format(childFD, target))
+
+            request = {
+                u'args': argv,
+                u'env': dict(env or {}),
+                u'path': path,
+                u'fds': list(theirs.keys()),
+            }
+            self._send(request, list(theirs.values()))
+        except Exception:
+            for fd in helpers.values():
+                os.close(fd)
+            return fail()
+        finally:
+            for fd in theirs.values():
+                os.close(fd)
+
+        d = Deferred()
+        self._pending.append((d, processProtocol, helpers, childFDs))
+        return d
+
+    def _send(self, request, fds):
+        body = json.dumps(request).encode('utf8')
+        data = self.HEADER.pack(len(body)) + body
+        ancillary = [(socket.SOL_SOCKET, SCM_RIGHTS, struct.pack('{}i'.format(len(fds)), *fds))]
+        sent = sendmsg(self._socket, data, ancillary)
+        if sent < len(data):
+            self._socket.sendall(data[sent:])
+
+    def fileno(self):
+        if self._socket is None:
+            return -1
+        return self._socket.fileno()
+
+    def logPrefix(self):
+        return 'ForkServer'
+
+    def doRead(self):
+        try:
+            data = self._socket.recv(65536)
+        except socket.error:
+            return main.CONNECTION_LOST
+        if not data:
+            return main.CONNECTION_DONE
+
+        self._buffer += data
+        while b'\n' in self._buffer:
+            line, self._buffer = self._buffer.split(b'\n', 1)
+            self._message(json.loads(line.decode('utf8')))
+
+    def _message(self, msg):
+        if u'exited' in msg:
+            process = self._processes.pop(msg[u'exited'], None)
+            if process:
+                process.processEnded(msg[u'status'])
+            return
+
+        d, proto, helpers, childFDs = self._pending.popleft()
+        if u'error' in msg:
+            for fd in helpers.values():
+                os.close(fd)
+            d.errback(RuntimeError("fork server failed to fork: {}".format(msg[u'error'])))
+        else:
+            pid = msg[u'pid']
+            process = ForkedProcess(self._reactor, self, pid, proto, helpers, childFDs)
+            self._processes[pid] = process
+            d.callback(process)
+
+    def connectionLost(self, reason):
+        if self._socket is None:
+            return
+
+        self._socket.close()
+        self._socket = None
+        self.lost = True
+
+        if self._pending or self._processes:
+            self.log.warn("Fork server (PID {pid}) lost", pid=self.pid)
+        else:
+            self.log.info("Fork server (PID {pid}) stopped", pid=self.pid)
+
+        while self._pending:
+            d, proto, helpers, childFDs = self._pending.popleft()
+            for fd in helpers.values():
+                os.close(fd)
+            d.errback(RuntimeError("fork server lost"))
+
+        # the exit status of processes still running won't be reported anymore
+        processes, self._processes = self._processes, {}
+        for process in processes.values():
+            if not process.pipes:
+                process.reapProcess()
@@ -32,23 +32,29 @@ from __future__ import absolute_import
 
 from autobahn.twisted.websocket import WampWebSocketClientFactory, \
     WampWebSocketClientProtocol
+from autobahn.twisted.rawsocket import WampRawSocketClientFactory, \
+    WampRawSocketClientProtocol
 
 from twisted.internet.error import ProcessDone, ProcessTerminated
 from twisted.internet.error import ConnectionDone
 # from twisted.internet.error import ConnectionClosed, ConnectionLost, ConnectionAborted
 
 from crossbar._logging import make_logger
+from crossbar.router.protocol import _create_serializer
 
 
 __all__ = ('create_native_worker_client_factory',)
 
 
-class NativeWorkerClientProtocol(WampWebSocketClientProtocol):
+class _NativeWorkerClientProtocol(object):
+    """
+    Controller side of the management connection to a native worker, common
+    to all transports.
+    """
 
     log = make_logger()
 
-    def connectionMade(self):
-        WampWebSocketClientProtocol.connectionMade(self)
+    def _connection_made(self):
         self._pid = self.transport.pid
         self.factory.proto = self
 
@@ -62,13 +68,7 @@ class NativeWorkerClientProtocol(WampWebSocketClientProtocol):
         # FIXME
         self._transport_info = None
 
-    def connectionLost(self, reason):
-        if isinstance(reason.value, ConnectionDone):
-            self.log.info("Native worker connection closed cleanly.")
-        else:
-            self.log.warn("Native worker connection closed uncleanly: {reason}", reason=reason.value)
-
-        WampWebSocketClientProtocol.connectionLost(self, reason)
+    def _connection_lost(self, reason):
         self.factory.proto = None
 
         if isinstance(reason.value, ProcessTerminated):
@@ -92,6 +92,24 @@ class NativeWorkerClientProtocol(WampWebSocketClientProtocol):
             self.log.error("unhandled code path (3) in WorkerClientProtocol.connectionLost: {reason}", reason=reason.value)
 
 
+class NativeWorkerClientProtocol(_NativeWorkerClientProtocol, WampWebSocketClientProtocol):
+
+    log = make_logger()
+
+    def connectionMade(self):
+        WampWebSocketClientProtocol.connectionMade(self)
+        self._connection_made()
+
+    def connectionLost(self, reason):
+        if isinstance(reason.value, ConnectionDone):
+            self.log.info("Native worker connection closed cleanly.")
+        else:
+            self.log.warn("Native worker connection closed uncleanly: {reason}", reason=reason.value)
+
+        WampWebSocketClientProtocol.connectionLost(self, reason)
+        self._connection_lost(reason)
+
+
 class NativeWorkerClientFactory(WampWebSocketClientFactory):
 
     log = make_logger()
@@ -112,11 +130,61 @@ class NativeWorkerClientFactory(WampWebSocketClientFactory):
             # self.proto.transport.loseConnection()
 
 
-def create_native_worker_client_factory(router_session_factory, on_ready, on_exit):
+class NativeWorkerRawSocketClientProtocol(_NativeWorkerClientProtocol, WampRawSocketClientProtocol):
+    """
+    Controller side of a WAMP-RawSocket-over-STDIO management connection.
+    """
+
+    log = make_logger()
+
+    MAX_LENGTH = 2 ** 24
+
+    def connectionMade(self):
+        WampRawSocketClientProtocol.connectionMade(self)
+        self._connection_made()
+        self._closing = False
+
+    def stringReceived(self, payload):
+        # like WebSocket does once the closing handshake started, ignore
+        # messages still in flight from the worker after we closed
+        if not self._closing:
+            WampRawSocketClientProtocol.stringReceived(self, payload)
+
+    def close(self):
+        self._closing = True
+        WampRawSocketClientProtocol.close(self)
+
+    def connectionLost(self, reason):
+        if isinstance(reason.value, (ProcessDone, ConnectionDone)):
+            self.log.info("Native worker connection closed cleanly.")
+        else:
+            self.log.warn("Native worker connection closed uncleanly: {reason}", reason=reason.value)
+
+        WampRawSocketClientProtocol.connectionLost(self, reason)
+        self._connection_lost(reason)
+
+
+class NativeWorkerRawSocketClientFactory(WampRawSocketClientFactory):
+
+    protocol = NativeWorkerRawSocketClientProtocol
+
+    def __init__(self, *args, **kwargs):
+        WampRawSocketClientFactory.__init__(self, *args, **kwargs)
+        self.proto = None
+
+    def stopFactory(self):
+        WampRawSocketClientFactory.stopFactory(self)
+        if self.proto and self.proto.isOpen():
+            self.proto.close()
+
+
+def create_native_worker_client_factory(router_session_factory, on_ready, on_exit, transport=u'websocket'):
     """
     Create a transport factory for talking to native workers.
 
-    The node controller talks WAMP-WebSocket-over-STDIO with spawned (native) workers.
+    The node controller talks WAMP-WebSocket-over-STDIO (or, with ``transport``
+    ``"rawsocket"``, the more compact WAMP-RawSocket-MsgPack-over-STDIO) with
+    spawned (native) workers.
 
     The node controller runs a client transport factory, and the native worker
     runs a server transport factory. This is a little non-intuitive, but just the
@@ -124,12 +192,17 @@ def create_native_worker_client_factory(router_session_factory, on_ready, on_exi
 
     :param router_session_factory: Router session factory to attach to.
     :type router_session_factory: obj
+    :param transport: The management transport, ``"websocket"`` or ``"rawsocket"``.
+    :type transport: unicode
     """
-    factory = NativeWorkerClientFactory(router_session_factory, "ws://localhost", debug=False)
-
-    # we need to increase the opening handshake timeout in particular, since starting up a worker
-    # on PyPy will take a little (due to JITting)
-    factory.setProtocolOptions(failByDrop=False, openHandshakeTimeout=60, closeHandshakeTimeout=5)
+    if transport == u'rawsocket':
+        factory = NativeWorkerRawSocketClientFactory(router_session_factory, _create_serializer('msgpack'))
+    else:
+        factory = NativeWorkerClientFactory(router_session_factory, "ws://localhost", debug=False)
+
+        # we need to increase the opening handshake timeout in particular, since starting up a worker
+        # on PyPy will take a little (due to JITting)
+        factory.setProtocolOptions(failByDrop=False, openHandshakeTimeout=60, closeHandshakeTimeout=5)
 
     # on_ready is resolved in crossbar/controller/process.py:on_worker_ready around 175
     # after crossbar.node.<ID>.on_worker_ready is published to (in the controller session)
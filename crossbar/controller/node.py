@@ -35,11 +35,13 @@ import re
 import json
 import socket
 import getpass
+import time
 
 import twisted
-from twisted.internet.defer import inlineCallbacks, Deferred
+from twisted.internet.defer import inlineCallbacks, Deferred, DeferredSemaphore
 from twisted.python.failure import Failure
 from twisted.internet.ssl import optionsForClientTLS
+from twisted.python.runtime import platform
 
 from autobahn.util import utcnow
 from autobahn.wamp.types import CallDetails, CallOptions, ComponentConfig
@@ -54,6 +56,8 @@ from crossbar.common import checkconfig
 from crossbar.controller.process import NodeControllerSession
 from crossbar.controller.management import NodeManagementBridgeSession
 from crossbar.controller.management import NodeManagementSession
+from crossbar.controller.startup import DEFAULT_STARTUP_CONCURRENCY, StartupTimeline
+from crossbar.controller.startup import run_all, start_workers, worker_dependencies
 
 from crossbar._logging import make_logger
 
@@ -188,6 +192,9 @@ class Node(object):
         # config of this node.
         self._config = None
 
+        # when each step of starting up the node configuration began and ended
+        self._startup_timeline = None
+
         # node controller session (a singleton ApplicationSession embedded
         # in the local node router)
         self._controller = None
@@ -213,10 +220,11 @@ class Node(object):
             # the following will read the config, check the config and replace
             # environment variable references in configuration values ("${MYVAR}") and
             # finally return the parsed configuration object
+            started = time.time()
             self._config = checkconfig.check_config_file(configpath)
 
-            self.log.info("Node configuration loaded from '{configfile}'",
-                          configfile=configfile)
+            self.log.info("Node configuration loaded from '{configfile}' (checked in {duration} ms)",
+                          configfile=configfile, duration=int((time.time() - started) * 1000))
         else:
             self._config = {
                 u"controller": {
@@ -475,6 +483,38 @@ class Node(object):
         #
         self._controller = NodeControllerSession(self)
 
+        # start the fork server native workers will be forked from
+        #
+        if controller_options.get('fork_server', False):
+            if platform.isWindows():
+                self.log.warn("Fork server not supported on this platform - native workers will be spawned")
+            else:
+                from crossbar.controller.forkserver import ForkServer
+                self._controller._fork_server = ForkServer(self._reactor)
+                self._controller._fork_server.start()
+
+        # the transport for talking to native workers, and whether workers get a separate
+        # channel (a Unix domain socket) for telemetry
+        #
+        self._controller._management_transport = controller_options.get('management_transport', u'websocket')
+        if controller_options.get('telemetry', False):
+            if platform.isWindows():
+                self.log.warn("Telemetry channel not supported on this platform - native workers will publish telemetry over the management transport")
+            else:
+                self._controller._telemetry = True
+
+        # monitor the reactor loop (of the node controller, and of the native workers)
+        #
+        loop_monitor_options = controller_options.get('loop_monitor', False)
+        if loop_monitor_options is True:
+            loop_monitor_options = {}
+        self._controller._loop_monitor_options = loop_monitor_options
+        if loop_monitor_options is not False:
+            from crossbar.common.loopmonitor import LoopMonitor
+            self._controller._loop_monitor = LoopMonitor(self._reactor, **loop_monitor_options)
+            self._controller._loop_monitor.start()
+            self._reactor.addSystemEventTrigger('before', 'shutdown', self._controller._loop_monitor.stop)
+
         # add the node controller singleton session to the router
         #
         self._router_session_factory.add(self._controller, authrole=u'trusted')
@@ -522,275 +562,302 @@ class Node(object):
         if 'manhole' in controller:
             yield self._controller.start_manhole(controller['manhole'], details=call_details)
 
-        # startup all workers
+        # number of workers (and sub-resources per worker) started concurrently
         #
-        worker_no = 1
+        concurrency = controller.get('options', {}).get('startup_concurrency', DEFAULT_STARTUP_CONCURRENCY)
 
-        # FIXME: setup things so we disclose our identity!
-        call_options = CallOptions()
+        # worker IDs are assigned in configuration order
+        #
+        workers = []
+        worker_no = 1
 
         for worker in config.get('workers', []):
-            # worker ID, type and logname
-            #
             if 'id' in worker:
                 worker_id = worker.pop('id')
             else:
                 worker_id = 'worker{}'.format(worker_no)
                 worker_no += 1
+            workers.append((worker_id, worker))
 
-            worker_type = worker['type']
-            worker_options = worker.get('options', {})
-
-            if worker_type == 'router':
-                worker_logname = "Router '{}'".format(worker_id)
+        # startup all workers, each after the workers it depends on
+        #
+        dependencies = worker_dependencies(workers, self._cbdir)
+        for worker_id, _ in workers:
+            if dependencies[worker_id]:
+                self.log.debug("Worker '{worker_id}' will be started after {dependencies}",
+                               worker_id=worker_id, dependencies=', '.join(sorted(dependencies[worker_id])))
 
-            elif worker_type == 'container':
-                worker_logname = "Container '{}'".format(worker_id)
+        self._startup_timeline = StartupTimeline(self._reactor)
 
-            elif worker_type == 'websocket-testee':
-                worker_logname = "WebSocketTestee '{}'".format(worker_id)
+        def start_worker(worker_id, worker):
+            return self._startup_timeline.run(u'worker', worker_id, self._startup_worker, worker_id, worker, concurrency)
 
-            elif worker_type == 'guest':
-                worker_logname = "Guest '{}'".format(worker_id)
+        try:
+            yield start_workers(workers, dependencies, start_worker, concurrency)
+        finally:
+            self._startup_timeline.log_summary()
 
-            else:
-                raise Exception("logic error")
+    @inlineCallbacks
+    def _startup_worker(self, worker_id, worker, concurrency):
+        """
+        Start a worker configured in the node configuration, and everything
+        configured within it.
+        """
+        # fake call details information when calling into
+        # remoted procedure locally
+        #
+        call_details = CallDetails(caller=0)
 
-            # router/container
-            #
-            if worker_type in ['router', 'container', 'websocket-testee']:
+        # FIXME: setup things so we disclose our identity!
+        call_options = CallOptions()
 
-                # start a new native worker process ..
-                #
-                if worker_type == 'router':
-                    yield self._controller.start_router(worker_id, worker_options, details=call_details)
+        timeline = self._startup_timeline
 
-                elif worker_type == 'container':
-                    yield self._controller.start_container(worker_id, worker_options, details=call_details)
+        # bounds the sub-resources of this worker starting at the same time
+        # (shared by all the steps below, which don't nest runs)
+        semaphore = DeferredSemaphore(concurrency)
 
-                elif worker_type == 'websocket-testee':
-                    yield self._controller.start_websocket_testee(worker_id, worker_options, details=call_details)
+        def call(stage, name, procedure, *args, **kwargs):
+            return timeline.run(stage, u'{}/{}'.format(worker_id, name), self._controller.call,
+                                u'crossbar.node.{}.worker.{}.{}'.format(self._node_id, worker_id, procedure),
+                                *args, options=call_options, **kwargs)
 
+        def with_ids(items, prefix):
+            # items configured without an ID are numbered in configuration order
+            result = []
+            item_no = 1
+            for item in items:
+                if 'id' in item:
+                    item_id = item.pop('id')
                 else:
-                    raise Exception("logic error")
+                    item_id = '{}{}'.format(prefix, item_no)
+                    item_no += 1
+                result.append((item_id, item))
+            return result
 
-                # setup native worker generic stuff
-                #
-                if 'pythonpath' in worker_options:
-                    added_paths = yield self._controller.call('crossbar.node.{}.worker.{}.add_pythonpath'.format(self._node_id, worker_id), worker_options['pythonpath'], options=call_options)
-                    self.log.debug("{worker}: PYTHONPATH extended for {paths}",
-                                   worker=worker_logname, paths=added_paths)
-
-                if 'cpu_affinity' in worker_options:
-                    new_affinity = yield self._controller.call('crossbar.node.{}.worker.{}.set_cpu_affinity'.format(self._node_id, worker_id), worker_options['cpu_affinity'], options=call_options)
-                    self.log.debug("{worker}: CPU affinity set to {affinity}",
-                                   worker=worker_logname, affinity=new_affinity)
-
-                if 'manhole' in worker:
-                    yield self._controller.call('crossbar.node.{}.worker.{}.start_manhole'.format(self._node_id, worker_id), worker['manhole'], options=call_options)
-                    self.log.debug("{worker}: manhole started",
-                                   worker=worker_logname)
-
-                # setup router worker
-                #
-                if worker_type == 'router':
-
-                    # start realms on router
-                    #
-                    realm_no = 1
-
-                    for realm in worker.get('realms', []):
-
-                        if 'id' in realm:
-                            realm_id = realm.pop('id')
-                        else:
-                            realm_id = 'realm{}'.format(realm_no)
-                            realm_no += 1
-
-                        # extract schema information from WAMP-flavored Markdown
-                        #
-                        schemas = None
-                        if 'schemas' in realm:
-                            schemas = {}
-                            schema_pat = re.compile(r"```javascript(.*?)```", re.DOTALL)
-                            cnt_files = 0
-                            cnt_decls = 0
-                            for schema_file in realm.pop('schemas'):
-                                schema_file = os.path.join(self._cbdir, schema_file)
-                                self.log.info("{worker}: processing WAMP-flavored Markdown file {schema_file} for WAMP schema declarations",
-                                              worker=worker_logname, schema_file=schema_file)
-                                with open(schema_file, 'r') as f:
-                                    cnt_files += 1
-                                    for d in schema_pat.findall(f.read()):
-                                        try:
-                                            o = json.loads(d)
-                                            if isinstance(o, dict) and '$schema' in o and o['$schema'] == u'http://wamp.ws/schema#':
-                                                uri = o['uri']
-                                                if uri not in schemas:
-                                                    schemas[uri] = {}
-                                                schemas[uri].update(o)
-                                                cnt_decls += 1
-                                        except Exception:
-                                            self.log.failure("{worker}: WARNING - failed to process declaration in {schema_file} - {log_failure.value}",
-                                                             worker=worker_logname, schema_file=schema_file)
-                            self.log.info("{worker}: processed {cnt_files} files extracting {cnt_decls} schema declarations and {len_schemas} URIs",
-                                          worker=worker_logname, cnt_files=cnt_files, cnt_decls=cnt_decls, len_schemas=len(schemas))
-
-                        enable_trace = realm.get('trace', False)
-                        yield self._controller.call('crossbar.node.{}.worker.{}.start_router_realm'.format(self._node_id, worker_id), realm_id, realm, schemas, enable_trace=enable_trace, options=call_options)
-                        self.log.info("{worker}: realm '{realm_id}' (named '{realm_name}') started",
-                                      worker=worker_logname, realm_id=realm_id, realm_name=realm['name'], enable_trace=enable_trace)
-
-                        # add roles to realm
-                        #
-                        role_no = 1
-                        for role in realm.get('roles', []):
-                            if 'id' in role:
-                                role_id = role.pop('id')
-                            else:
-                                role_id = 'role{}'.format(role_no)
-                                role_no += 1
-
-                            yield self._controller.call('crossbar.node.{}.worker.{}.start_router_realm_role'.format(self._node_id, worker_id), realm_id, role_id, role, options=call_options)
-                            self.log.info("{}: role '{}' (named '{}') started on realm '{}'".format(worker_logname, role_id, role['name'], realm_id))
-
-                        # start uplinks for realm
-                        #
-                        uplink_no = 1
-                        for uplink in realm.get('uplinks', []):
-                            if 'id' in uplink:
-                                uplink_id = uplink.pop('id')
-                            else:
-                                uplink_id = 'uplink{}'.format(uplink_no)
-                                uplink_no += 1
-
-                            yield self._controller.call('crossbar.node.{}.worker.{}.start_router_realm_uplink'.format(self._node_id, worker_id), realm_id, uplink_id, uplink, options=call_options)
-                            self.log.info("{}: uplink '{}' started on realm '{}'".format(worker_logname, uplink_id, realm_id))
-
-                    # start connections (such as PostgreSQL database connection pools)
-                    # to run embedded in the router
-                    #
-                    connection_no = 1
+        worker_type = worker['type']
+        worker_options = worker.get('options', {})
 
-                    for connection in worker.get('connections', []):
+        if worker_type == 'router':
+            worker_logname = "Router '{}'".format(worker_id)
 
-                        if 'id' in connection:
-                            connection_id = connection.pop('id')
-                        else:
-                            connection_id = 'connection{}'.format(connection_no)
-                            connection_no += 1
+        elif worker_type == 'container':
+            worker_logname = "Container '{}'".format(worker_id)
 
-                        yield self._controller.call('crossbar.node.{}.worker.{}.start_connection'.format(self._node_id, worker_id), connection_id, connection, options=call_options)
-                        self.log.info("{}: connection '{}' started".format(worker_logname, connection_id))
+        elif worker_type == 'websocket-testee':
+            worker_logname = "WebSocketTestee '{}'".format(worker_id)
 
-                    # start components to run embedded in the router
-                    #
-                    component_no = 1
+        elif worker_type == 'guest':
+            worker_logname = "Guest '{}'".format(worker_id)
 
-                    for component in worker.get('components', []):
+        else:
+            raise Exception("logic error")
 
-                        if 'id' in component:
-                            component_id = component.pop('id')
-                        else:
-                            component_id = 'component{}'.format(component_no)
-                            component_no += 1
+        # router/container
+        #
+        if worker_type in ['router', 'container', 'websocket-testee']:
 
-                        yield self._controller.call('crossbar.node.{}.worker.{}.start_router_component'.format(self._node_id, worker_id), component_id, component, options=call_options)
-                        self.log.info("{}: component '{}' started".format(worker_logname, component_id))
+            # start a new native worker process ..
+            #
+            if worker_type == 'router':
+                yield timeline.run(u'process', worker_id, self._controller.start_router, worker_id, worker_options, details=call_details)
 
-                    # start transports on router
-                    #
-                    transport_no = 1
+            elif worker_type == 'container':
+                yield timeline.run(u'process', worker_id, self._controller.start_container, worker_id, worker_options, details=call_details)
 
-                    for transport in worker['transports']:
+            elif worker_type == 'websocket-testee':
+                yield timeline.run(u'process', worker_id, self._controller.start_websocket_testee, worker_id, worker_options, details=call_details)
 
-                        if 'id' in transport:
-                            transport_id = transport.pop('id')
-                        else:
-                            transport_id = 'transport{}'.format(transport_no)
-                            transport_no += 1
+            else:
+                raise Exception("logic error")
 
-                        yield self._controller.call('crossbar.node.{}.worker.{}.start_router_transport'.format(self._node_id, worker_id), transport_id, transport, options=call_options)
-                        self.log.info("{}: transport '{}' started".format(worker_logname, transport_id))
+            # setup native worker generic stuff
+            #
+            if 'pythonpath' in worker_options:
+                added_paths = yield call(u'pythonpath', u'pythonpath', 'add_pythonpath', worker_options['pythonpath'])
+                self.log.debug("{worker}: PYTHONPATH extended for {paths}",
+                               worker=worker_logname, paths=added_paths)
+
+            if 'cpu_affinity' in worker_options:
+                new_affinity = yield call(u'cpu_affinity', u'cpu_affinity', 'set_cpu_affinity', worker_options['cpu_affinity'])
+                self.log.debug("{worker}: CPU affinity set to {affinity}",
+                               worker=worker_logname, affinity=new_affinity)
+
+            if 'manhole' in worker:
+                yield call(u'manhole', u'manhole', 'start_manhole', worker['manhole'])
+                self.log.debug("{worker}: manhole started",
+                               worker=worker_logname)
+
+            # setup router worker
+            #
+            if worker_type == 'router':
 
-                # setup container worker
+                # start realms on router, then roles and uplinks on the realms
                 #
-                elif worker_type == 'container':
-
-                    component_no = 1
-
-                    # if components exit "very soon after" we try to
-                    # start them, we consider that a failure and shut
-                    # our node down. We remove this subscription 2
-                    # seconds after we're done starting everything
-                    # (see below). This is necessary as
-                    # start_container_component returns as soon as
-                    # we've established a connection to the component
-                    def component_exited(info):
-                        component_id = info.get("id")
-                        self.log.critical("Component '{component_id}' failed to start; shutting down node.", component_id=component_id)
-                        try:
-                            self._reactor.stop()
-                        except twisted.internet.error.ReactorNotRunning:
-                            pass
-                    topic = 'crossbar.node.{}.worker.{}.container.on_component_stop'.format(self._node_id, worker_id)
-                    component_stop_sub = yield self._controller.subscribe(component_exited, topic)
-
-                    # start connections (such as PostgreSQL database connection pools)
-                    # to run embedded in the container
+                @inlineCallbacks
+                def start_realm(item):
+                    realm_id, realm = item
+
+                    # extract schema information from WAMP-flavored Markdown
                     #
-                    connection_no = 1
+                    schemas = None
+                    if 'schemas' in realm:
+                        schemas = {}
+                        schema_pat = re.compile(r"```javascript(.*?)```", re.DOTALL)
+                        cnt_files = 0
+                        cnt_decls = 0
+                        for schema_file in realm.pop('schemas'):
+                            schema_file = os.path.join(self._cbdir, schema_file)
+                            self.log.info("{worker}: processing WAMP-flavored Markdown file {schema_file} for WAMP schema declarations",
+                                          worker=worker_logname, schema_file=schema_file)
+                            with open(schema_file, 'r') as f:
+                                cnt_files += 1
+                                for d in schema_pat.findall(f.read()):
+                                    try:
+                                        o = json.loads(d)
+                                        if isinstance(o, dict) and '$schema' in o and o['$schema'] == u'http://wamp.ws/schema#':
+                                            uri = o['uri']
+                                            if uri not in schemas:
+                                                schemas[uri] = {}
+                                            schemas[uri].update(o)
+                                            cnt_decls += 1
+                                    except Exception:
+                                        self.log.failure("{worker}: WARNING - failed to process declaration in {schema_file} - {log_failure.value}",
+                                                         worker=worker_logname, schema_file=schema_file)
+                        self.log.info("{worker}: processed {cnt_files} files extracting {cnt_decls} schema declarations and {len_schemas} URIs",
+                                      worker=worker_logname, cnt_files=cnt_files, cnt_decls=cnt_decls, len_schemas=len(schemas))
+
+                    enable_trace = realm.get('trace', False)
+                    yield call(u'realm', realm_id, 'start_router_realm', realm_id, realm, schemas, enable_trace=enable_trace)
+                    self.log.info("{worker}: realm '{realm_id}' (named '{realm_name}') started",
+                                  worker=worker_logname, realm_id=realm_id, realm_name=realm['name'], enable_trace=enable_trace)
+
+                realms = with_ids(worker.get('realms', []), 'realm')
+                yield run_all(realms, start_realm, semaphore)
+
+                # add roles to realms
+                #
+                @inlineCallbacks
+                def start_role(item):
+                    realm_id, role_id, role = item
+                    yield call(u'role', u'{}/{}'.format(realm_id, role_id), 'start_router_realm_role', realm_id, role_id, role)
+                    self.log.info("{}: role '{}' (named '{}') started on realm '{}'".format(worker_logname, role_id, role['name'], realm_id))
 
-                    for connection in worker.get('connections', []):
+                roles = [(realm_id, role_id, role) for realm_id, realm in realms
+                         for role_id, role in with_ids(realm.get('roles', []), 'role')]
+                yield run_all(roles, start_role, semaphore)
 
-                        if 'id' in connection:
-                            connection_id = connection.pop('id')
-                        else:
-                            connection_id = 'connection{}'.format(connection_no)
-                            connection_no += 1
+                # start uplinks for realms
+                #
+                @inlineCallbacks
+                def start_uplink(item):
+                    realm_id, uplink_id, uplink = item
+                    yield call(u'uplink', u'{}/{}'.format(realm_id, uplink_id), 'start_router_realm_uplink', realm_id, uplink_id, uplink)
+                    self.log.info("{}: uplink '{}' started on realm '{}'".format(worker_logname, uplink_id, realm_id))
+
+                uplinks = [(realm_id, uplink_id, uplink) for realm_id, realm in realms
+                           for uplink_id, uplink in with_ids(realm.get('uplinks', []), 'uplink')]
+                yield run_all(uplinks, start_uplink, semaphore)
+
+                # start connections (such as PostgreSQL database connection pools)
+                # to run embedded in the router
+                #
+                @inlineCallbacks
+                def start_connection(item):
+                    connection_id, connection = item
+                    yield call(u'connection', connection_id, 'start_connection', connection_id, connection)
+                    self.log.info("{}: connection '{}' started".format(worker_logname, connection_id))
 
-                        yield self._controller.call('crossbar.node.{}.worker.{}.start_connection'.format(self._node_id, worker_id), connection_id, connection, options=call_options)
-                        self.log.info("{}: connection '{}' started".format(worker_logname, connection_id))
+                yield run_all(with_ids(worker.get('connections', []), 'connection'), start_connection, semaphore)
 
-                    # start components to run embedded in the container
-                    #
-                    for component in worker.get('components', []):
+                # start components to run embedded in the router
+                #
+                @inlineCallbacks
+                def start_component(item):
+                    component_id, component = item
+                    yield call(u'component', component_id, 'start_router_component', component_id, component)
+                    self.log.info("{}: component '{}' started".format(worker_logname, component_id))
 
-                        if 'id' in component:
-                            component_id = component.pop('id')
-                        else:
-                            component_id = 'component{}'.format(component_no)
-                            component_no += 1
+                yield run_all(with_ids(worker.get('components', []), 'component'), start_component, semaphore)
 
-                        yield self._controller.call('crossbar.node.{}.worker.{}.start_container_component'.format(self._node_id, worker_id), component_id, component, options=call_options)
-                        self.log.info("{worker}: component '{component_id}' started",
-                                      worker=worker_logname, component_id=component_id)
+                # start transports on router
+                #
+                @inlineCallbacks
+                def start_transport(item):
+                    transport_id, transport = item
+                    yield call(u'transport', transport_id, 'start_router_transport', transport_id, transport)
+                    self.log.info("{}: transport '{}' started".format(worker_logname, transport_id))
 
-                    # after 2 seconds, consider all the application components running
-                    self._reactor.callLater(2, component_stop_sub.unsubscribe)
+                yield run_all(with_ids(worker['transports'], 'transport'), start_transport, semaphore)
+
+            # setup container worker
+            #
+            elif worker_type == 'container':
 
-                # setup websocket-testee worker
+                # if components exit "very soon after" we try to
+                # start them, we consider that a failure and shut
+                # our node down. We remove this subscription 2
+                # seconds after we're done starting everything
+                # (see below). This is necessary as
+                # start_container_component returns as soon as
+                # we've established a connection to the component
+                def component_exited(info):
+                    component_id = info.get("id")
+                    self.log.critical("Component '{component_id}' failed to start; shutting down node.", component_id=component_id)
+                    try:
+                        self._reactor.stop()
+                    except twisted.internet.error.ReactorNotRunning:
+                        pass
+                topic = 'crossbar.node.{}.worker.{}.container.on_component_stop'.format(self._node_id, worker_id)
+                component_stop_sub = yield self._controller.subscribe(component_exited, topic)
+
+                # start connections (such as PostgreSQL database connection pools)
+                # to run embedded in the container
                 #
-                elif worker_type == 'websocket-testee':
+                @inlineCallbacks
+                def start_connection(item):
+                    connection_id, connection = item
+                    yield call(u'connection', connection_id, 'start_connection', connection_id, connection)
+                    self.log.info("{}: connection '{}' started".format(worker_logname, connection_id))
 
-                    # start transports on router
-                    #
-                    transport = worker['transport']
-                    transport_no = 1
-                    transport_id = 'transport{}'.format(transport_no)
+                yield run_all(with_ids(worker.get('connections', []), 'connection'), start_connection, semaphore)
 
-                    yield self._controller.call('crossbar.node.{}.worker.{}.start_websocket_testee_transport'.format(self._node_id, worker_id), transport_id, transport, options=call_options)
-                    self.log.info("{}: transport '{}' started".format(worker_logname, transport_id))
+                # start components to run embedded in the container
+                #
+                @inlineCallbacks
+                def start_component(item):
+                    component_id, component = item
+                    yield call(u'component', component_id, 'start_container_component', component_id, component)
+                    self.log.info("{worker}: component '{component_id}' started",
+                                  worker=worker_logname, component_id=component_id)
 
-                else:
-                    raise Exception("logic error")
+                yield run_all(with_ids(worker.get('components', []), 'component'), start_component, semaphore)
 
-            elif worker_type == 'guest':
+                # after 2 seconds, consider all the application components running
+                self._reactor.callLater(2, component_stop_sub.unsubscribe)
 
-                # start guest worker
+            # setup websocket-testee worker
+            #
+            elif worker_type == 'websocket-testee':
+
+                # start transports on router
                 #
-                yield self._controller.start_guest(worker_id, worker, details=call_details)
-                self.log.info("{worker}: started", worker=worker_logname)
+                transport = worker['transport']
+                transport_no = 1
+                transport_id = 'transport{}'.format(transport_no)
+
+                yield call(u'transport', transport_id, 'start_websocket_testee_transport', transport_id, transport)
+                self.log.info("{}: transport '{}' started".format(worker_logname, transport_id))
 
             else:
                 raise Exception("logic error")
+
+        elif worker_type == 'guest':
+
+            # start guest worker
+            #
+            yield timeline.run(u'process', worker_id, self._controller.start_guest, worker_id, worker, details=call_details)
+            self.log.info("{worker}: started", worker=worker_logname)
+
+        else:
+            raise Exception("logic error")
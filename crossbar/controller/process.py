@@ -32,6 +32,7 @@ from __future__ import absolute_import
 
 import os
 import sys
+import socket
 import pkg_resources
 from datetime import datetime
 # backport of shutil.which
@@ -52,6 +53,7 @@ import crossbar
 from crossbar.common import checkconfig
 from crossbar.twisted.processutil import WorkerProcessEndpoint
 from crossbar.controller.native import create_native_worker_client_factory
+from crossbar.common.telemetry import TELEMETRY_FD, TelemetryReceiverProtocol, connect_telemetry
 from crossbar.controller.guest import create_guest_worker_client_factory
 from crossbar.controller.processtypes import RouterWorkerProcess, \
     ContainerWorkerProcess, \
@@ -101,6 +103,16 @@ class NodeControllerSession(NativeProcessSession):
         # map of worker processes: worker_id -> NativeWorkerProcess
         self._workers = {}
 
+        # fork server native workers are forked from (if enabled)
+        self._fork_server = None
+
+        # transport for talking to native workers, and whether to give workers a telemetry channel
+        self._management_transport = u'websocket'
+        self._telemetry = False
+
+        # reactor loop monitoring options for native workers (False when not monitoring)
+        self._loop_monitor_options = False
+
         self._shutdown_requested = False
 
     def onConnect(self):
@@ -147,6 +159,7 @@ class NodeControllerSession(NativeProcessSession):
         #
         procs = [
             'get_info',
+            'get_startup_timeline',
             'shutdown',
 
             'get_workers',
@@ -196,6 +209,19 @@ class NodeControllerSession(NativeProcessSession):
             u'wamplets': self._get_wamplets()
         }
 
+    def get_startup_timeline(self, details=None):
+        """
+        Return when each step of starting up the node configuration began
+        and ended (in seconds since startup began).
+
+        :returns: List of startup steps.
+        :rtype: list of dict
+        """
+        timeline = getattr(self._node, '_startup_timeline', None)
+        if timeline is None:
+            return []
+        return timeline.marshal()
+
     @inlineCallbacks
     def shutdown(self, restart=False, mode=None, details=None):
         """
@@ -283,11 +309,24 @@ class NodeControllerSession(NativeProcessSession):
                     u'created': utcstr(worker.created),
                     u'started': utcstr(worker.started),
                     u'startup_time': (worker.started - worker.created).total_seconds() if worker.started else None,
+                    u'startup_mode': worker.startup_mode,
                     u'uptime': (now - worker.started).total_seconds() if worker.started else None,
                 }
             )
         return res
 
+    def has_subscribers(self, topic):
+        """
+        Check if any session is subscribed to a topic on the node management router.
+
+        :param topic: The topic URI.
+        :type topic: unicode
+
+        :returns: ``True`` if there are subscribers.
+        :rtype: bool
+        """
+        return self._node._router_factory.get(self._realm).has_subscribers(topic)
+
     def get_worker_log(self, id, limit=None, details=None):
         """
         Get buffered log for a worker.
@@ -413,6 +452,21 @@ class NodeControllerSession(NativeProcessSession):
         args.extend(["--type", wtype])
         args.extend(["--loglevel", _loglevel])
 
+        # management transport, and telemetry channel (if any)
+        #
+        if self._management_transport != u'websocket':
+            args.extend(["--transport", self._management_transport])
+        if self._telemetry:
+            args.extend(["--telemetry-fd", str(TELEMETRY_FD)])
+
+        # reactor loop monitoring
+        #
+        if self._loop_monitor_options is not False:
+            from crossbar.common.loopmonitor import DEFAULT_INTERVAL
+            args.extend(["--loop-interval", str(self._loop_monitor_options.get('interval', DEFAULT_INTERVAL))])
+            if 'threshold' in self._loop_monitor_options:
+                args.extend(["--loop-threshold", str(self._loop_monitor_options['threshold'])])
+
         # allow override worker process title from options
         #
         if options.get('title', None):
@@ -460,11 +514,11 @@ class NodeControllerSession(NativeProcessSession):
         # add worker tracking instance to the worker map ..
         #
         if wtype == 'router':
-            worker = RouterWorkerProcess(self, id, details.caller, keeplog=options.get('traceback', None))
+            worker = RouterWorkerProcess(self, id, details.caller, keeplog=options.get('traceback', None), log_rate=options.get('log_rate', None))
         elif wtype == 'container':
-            worker = ContainerWorkerProcess(self, id, details.caller, keeplog=options.get('traceback', None))
+            worker = ContainerWorkerProcess(self, id, details.caller, keeplog=options.get('traceback', None), log_rate=options.get('log_rate', None))
         elif wtype == 'websocket-testee':
-            worker = WebSocketTesteeWorkerProcess(self, id, details.caller, keeplog=options.get('traceback', None))
+            worker = WebSocketTesteeWorkerProcess(self, id, details.caller, keeplog=options.get('traceback', None), log_rate=options.get('log_rate', None))
         else:
             raise Exception("logic error")
 
@@ -486,9 +540,29 @@ class NodeControllerSession(NativeProcessSession):
             # interfere with the container-controller communication.
             childFDs = {0: "w", 1: "r", 2: "r", 3: "r"}
 
+        # high-volume telemetry (like process statistics) from the worker goes
+        # over a separate socket, so it does not delay management calls
+        #
+        telemetry_sockets = None
+        if self._telemetry:
+            telemetry_sockets = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            childFDs[TELEMETRY_FD] = telemetry_sockets[1].fileno()
+
+        # fork the worker from the fork server (if running), unless the worker
+        # is to run under a different Python or with a different Python startup
+        # environment (like its own PYTHONPATH)
+        #
+        if self._fork_server and not self._fork_server.lost and exe == sys.executable \
+                and self._fork_server.can_fork(worker_env):
+            spawner = self._fork_server.spawnProcess
+            worker.startup_mode = u'fork'
+        else:
+            spawner = None
+            worker.startup_mode = u'spawn'
+
         ep = WorkerProcessEndpoint(
             self._node._reactor, exe, args, env=worker_env, worker=worker,
-            childFDs=childFDs)
+            childFDs=childFDs, spawner=spawner)
 
         # ready handling
         #
@@ -508,6 +582,8 @@ class NodeControllerSession(NativeProcessSession):
                 u'id': worker.id,
                 u'status': worker.status,
                 u'started': utcstr(worker.started),
+                u'startup_time': (worker.started - worker.created).total_seconds(),
+                u'startup_mode': worker.startup_mode,
                 u'who': worker.who,
             }
 
@@ -522,7 +598,7 @@ class NodeControllerSession(NativeProcessSession):
             del self._workers[worker.id]
             emsg = 'Failed to start native worker: {}'.format(err.value)
             self.log.error(emsg)
-            raise ApplicationError(u"crossbar.error.cannot_start", emsg, worker.getlog())
+            raise ApplicationError(u"crossbar.error.cannot_start", emsg, worker.getlog(10))
 
         worker.ready.addCallbacks(on_ready_success, on_ready_error)
 
@@ -576,7 +652,8 @@ class NodeControllerSession(NativeProcessSession):
 
         # create a transport factory for talking WAMP to the native worker
         #
-        transport_factory = create_native_worker_client_factory(self._node._router_session_factory, worker.ready, worker.exit)
+        transport_factory = create_native_worker_client_factory(self._node._router_session_factory, worker.ready, worker.exit,
+                                                                self._management_transport)
         transport_factory.noisy = False
         self._workers[id].factory = transport_factory
 
@@ -635,6 +712,30 @@ class NodeControllerSession(NativeProcessSession):
 
         d.addCallbacks(on_connect_success, on_connect_error)
 
+        if telemetry_sockets:
+            worker_prefix = u'crossbar.node.{}.worker.{}.'.format(self._node_id, id)
+
+            def on_telemetry(topic, args, kwargs):
+                # workers may only publish telemetry on their own topics
+                if topic.startswith(worker_prefix):
+                    self.publish(topic, *args, **kwargs)
+                else:
+                    self.log.warn("Dropping telemetry event on foreign topic {topic} from worker {id}", topic=topic, id=id)
+
+            def connect_telemetry_channel(res):
+                # our ends of the socket pair are closed in any case (also when
+                # the worker could not be started) - the receiver gets a duplicate
+                ours, theirs = telemetry_sockets
+                theirs.close()
+                try:
+                    if worker.pid:
+                        connect_telemetry(self._node._reactor, os.dup(ours.fileno()), TelemetryReceiverProtocol(on_telemetry))
+                finally:
+                    ours.close()
+                return res
+
+            d.addBoth(connect_telemetry_channel)
+
         return worker.ready
 
     @staticmethod
@@ -929,7 +1030,7 @@ class NodeControllerSession(NativeProcessSession):
 
             emsg = 'Failed to start guest worker: {}'.format(err.value)
             self.log.error(emsg)
-            raise ApplicationError(u"crossbar.error.cannot_start", emsg, ep.getlog())
+            raise ApplicationError(u"crossbar.error.cannot_start", emsg, worker.getlog(10))
 
         worker.ready.addCallbacks(on_ready_success, on_ready_error)
 
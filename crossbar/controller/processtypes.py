@@ -43,7 +43,8 @@ from twisted.python.runtime import platform
 from twisted.internet.task import LoopingCall
 
 from crossbar._logging import make_logger, LogLevel, record_separator
-from crossbar._logging import cb_logging_aware, escape_formatting
+from crossbar._logging import cb_logging_aware, cb_logging_framed, escape_formatting
+from crossbar._logging import log_frame_marker, log_frame_header
 
 __all__ = ('RouterWorkerProcess',
            'ContainerWorkerProcess',
@@ -51,6 +52,55 @@ __all__ = ('RouterWorkerProcess',
            'WebSocketTesteeWorkerProcess')
 
 
+# number of log entries buffered per worker (when not configured)
+DEFAULT_KEEPLOG = 100
+
+# log frames larger than this are taken as text not written by the logger
+LOG_FRAME_MAX_SIZE = 16 * 1024 * 1024
+
+_record_separator = record_separator.encode('ascii')
+
+
+class LogRateLimiter(object):
+    """
+    Token bucket limiting the rate of log events from a worker.
+    """
+
+    def __init__(self, rate, burst=None, clock=None):
+        """
+
+        :param rate: Log events allowed per second.
+        :type rate: int
+        :param burst: Log events allowed in a burst (default: ``rate``).
+        :type burst: int or None
+        :param clock: The clock to use (for testing).
+        :type clock: obj
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self._clock = clock
+        self._rate = float(rate)
+        self._burst = float(burst or rate)
+        self._tokens = self._burst
+        self._last = clock.seconds()
+
+    def allow(self):
+        """
+        Take a token from the bucket, if any.
+
+        :returns: ``True`` if the log event is allowed.
+        :rtype: bool
+        """
+        if self._tokens < 1.:
+            now = self._clock.seconds()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            if self._tokens < 1.:
+                return False
+        self._tokens -= 1.
+        return True
+
+
 class WorkerProcess(object):
     """
     Internal run-time representation of a worker process.
@@ -58,7 +108,7 @@ class WorkerProcess(object):
     TYPE = 'worker'
     LOGNAME = 'Worker'
 
-    def __init__(self, controller, id, who, keeplog=None):
+    def __init__(self, controller, id, who, keeplog=None, log_rate=None):
         """
         Ctor.
 
@@ -68,10 +118,12 @@ class WorkerProcess(object):
         :type id: str
         :param who: Who triggered creation of this worker.
         :type who: str
-        :param keeplog: If not `None`, buffer log message received to be later
-                        retrieved via getlog(). If `0`, keep infinite log internally.
-                        If `> 0`, keep at most such many log entries in buffer.
+        :param keeplog: If not `None`, keep at most such many log entries in buffer
+                        (to be later retrieved via getlog()), else `DEFAULT_KEEPLOG`.
         :type keeplog: int or None
+        :param log_rate: If given, log at most such many log events per second (with
+                         bursts of as many), and drop the others.
+        :type log_rate: int or None
         """
         self._logger = make_logger()
 
@@ -86,7 +138,10 @@ class WorkerProcess(object):
         self.connected = None
         self.started = None
 
-        self._log_entries = deque(maxlen=10)
+        # how the worker process was started: "spawn" (fresh process) or "fork" (from the fork server)
+        self.startup_mode = u'spawn'
+
+        self._log_entries = deque(maxlen=keeplog or DEFAULT_KEEPLOG)
 
         if platform.isWindows():
             self._log_fds = [2]
@@ -96,6 +151,15 @@ class WorkerProcess(object):
         self._log_topic = 'crossbar.node.{}.worker.{}.on_log'.format(self._controller._node_id, self.id)
 
         self._log_rich = None  # Does not support rich logs
+        self._log_framed = False
+
+        # received, but not yet processed log data (of rich logs), and the
+        # position up to which it was scanned for a record separator (or frame marker)
+        self._log_data = bytearray()
+        self._log_scanned = 0
+
+        self._log_limiter = LogRateLimiter(log_rate) if log_rate else None
+        self._log_dropped = 0
 
         # track stats for worker->controller traffic
         self._stats = {}
@@ -109,23 +173,104 @@ class WorkerProcess(object):
         self.exit.addBoth(self._dump_remaining_log)
 
     def getlog(self, limit=None):
-        # FIXME: return reversed, limited log
-        return list(self._log_entries)
+        """
+        Get the buffered log entries.
+
+        :param limit: If given, return only the last such many log entries.
+        :type limit: int or None
+
+        :returns: Buffered log entries (oldest first).
+        :rtype: list
+        """
+        if limit is None or limit >= len(self._log_entries):
+            return list(self._log_entries)
+        if limit <= 0:
+            return []
+        entries = []
+        for entry in reversed(self._log_entries):
+            entries.append(entry)
+            if len(entries) == limit:
+                break
+        entries.reverse()
+        return entries
 
     def _dump_remaining_log(self, result):
         """
         If there's anything left in the log buffer, log it out so it's not
         lost.
         """
-        if self._log_rich and self._log_data != u"":
+        if self._log_dropped:
+            self._logger.warn("{count} log events from PID {pid} dropped (rate limit)",
+                              count=self._log_dropped, pid=self.pid)
+            self._log_dropped = 0
+
+        if self._log_rich and self._log_data:
             self._logger.warn("REMAINING LOG BUFFER AFTER EXIT FOR PID {pid}:",
                               pid=self.pid)
 
-            for log in self._log_data.split(os.linesep):
+            for log in self._log_data.decode('utf8', 'replace').split(os.linesep):
                 self._logger.warn(escape_formatting(log))
 
         return result
 
+    def _log_records(self):
+        """
+        Split the received log data into records, keeping incomplete records.
+        """
+        data = self._log_data
+        records = []
+        pos = 0
+        if self._log_framed:
+            header_size = log_frame_header.size
+            scanned = self._log_scanned
+            self._log_scanned = 0
+            while len(data) - pos >= header_size:
+                marker, length = log_frame_header.unpack_from(data, pos)
+                start = pos + header_size
+                end = start + length
+
+                # a frame carries a JSON object, and JSON never contains a raw frame
+                # marker: a marker followed by anything else (e.g. a stray record
+                # separator in other output) is not a frame, and neither is a
+                # pending frame which another marker shows up in
+                is_frame = marker == log_frame_marker and 2 <= length <= LOG_FRAME_MAX_SIZE
+                if is_frame and len(data) > start:
+                    is_frame = data[start:start + 1] == b'{' and \
+                        data.find(log_frame_marker, max(start, scanned), end) == -1
+                scanned = 0
+
+                if not is_frame:
+                    # something else wrote to the log channel, so take the data
+                    # up to the next frame as a record of text
+                    end = data.find(log_frame_marker, pos + 1)
+                    if end == -1:
+                        end = len(data)
+                    records.append((False, bytes(data[pos:end])))
+                    pos = end
+                elif len(data) >= end:
+                    records.append((True, bytes(data[start:end])))
+                    pos = end
+                else:
+                    # wait for the rest of the frame (the data received so far
+                    # need not be checked for markers again)
+                    self._log_scanned = len(data) - pos
+                    break
+        else:
+            end = data.find(_record_separator, self._log_scanned)
+            while end != -1:
+                records.append((True, bytes(data[pos:end])))
+                pos = end + 1
+                end = data.find(_record_separator, pos)
+            self._log_scanned = len(data) - pos
+        del data[:pos]
+        return records
+
+    def _has_log_subscribers(self):
+        has_subscribers = getattr(self._controller, 'has_subscribers', None)
+        if has_subscribers is None:
+            return True
+        return has_subscribers(self._log_topic)
+
     def log(self, childFD, data):
         """
         Handle a log message (or a fragment of such) coming in.
@@ -144,28 +289,44 @@ class WorkerProcess(object):
             self._log_entries.append(repr(data))
             return
 
-        if type(data) != six.text_type:
-            data = data.decode('utf8')
-
         if self._log_rich is None:
             # If it supports rich logging, it will print just the logger aware
             # "magic phrase" as its first message.
-            if data[0:len(cb_logging_aware)] == cb_logging_aware:
-                self._log_rich = True
-                self._log_data = u""  # Log buffer
-                return
+            if type(data) == six.text_type:
+                data = data.encode('utf8')
+            for magic, framed in [(cb_logging_framed, True), (cb_logging_aware, False)]:
+                magic = magic.encode('ascii')
+                if data[0:len(magic)] == magic:
+                    self._log_rich = True
+                    self._log_framed = framed
+                    data = data[len(magic):].lstrip(b'\r\n')
+                    break
             else:
                 self._log_rich = False
 
         if self._log_rich:
             # This guest supports rich logs.
-            self._log_data += data
+            if type(data) == six.text_type:
+                data = data.encode('utf8')
+            self._log_data.extend(data)
+
+            publish = self._log_topic and self._has_log_subscribers()
+
+            for is_json, log in self._log_records():
 
-            while record_separator in self._log_data:
+                if self._log_limiter and not self._log_limiter.allow():
+                    self._log_dropped += 1
+                    continue
 
-                log, self._log_data = self._log_data.split(record_separator, 1)
+                if self._log_dropped:
+                    self._logger.warn("{count} log events dropped (rate limit)",
+                                      count=self._log_dropped, log_system=system)
+                    self._log_dropped = 0
 
+                log = log.decode('utf8', 'replace')
                 try:
+                    if not is_json:
+                        raise ValueError()
                     event = json.loads(log)
                 except ValueError:
                     # If invalid JSON is written out, just output the raw text.
@@ -180,23 +341,31 @@ class WorkerProcess(object):
                                   cb_namespace=event_namespace, **event)
                 self._log_entries.append(event)
 
-                if self._log_topic:
+                if publish:
                     self._controller.publish(self._log_topic, event_text)
 
         else:
             # Rich logs aren't supported
+            if type(data) != six.text_type:
+                data = data.decode('utf8')
             data = escape_formatting(data)
 
+            publish = self._log_topic and self._has_log_subscribers()
+
             for row in data.split(os.linesep):
                 row = row.strip()
 
                 if row == u"":
                     continue
 
+                if self._log_limiter and not self._log_limiter.allow():
+                    self._log_dropped += 1
+                    continue
+
                 self._logger.info(row, log_system=system)
                 self._log_entries.append(row)
 
-                if self._log_topic:
+                if publish:
                     self._controller.publish(self._log_topic, row)
 
     def track_stats(self, fd, dlen):
@@ -236,7 +405,7 @@ class NativeWorkerProcess(WorkerProcess):
     TYPE = 'native'
     LOGNAME = 'Native'
 
-    def __init__(self, controller, id, who, keeplog=None):
+    def __init__(self, controller, id, who, keeplog=None, log_rate=None):
         """
         Ctor.
 
@@ -247,7 +416,7 @@ class NativeWorkerProcess(WorkerProcess):
         :param who: Who triggered creation of this worker.
         :type who: str
         """
-        WorkerProcess.__init__(self, controller, id, who, keeplog)
+        WorkerProcess.__init__(self, controller, id, who, keeplog, log_rate)
 
         self.factory = None
         self.proto = None
@@ -288,7 +457,7 @@ class GuestWorkerProcess(WorkerProcess):
     TYPE = 'guest'
     LOGNAME = 'Guest'
 
-    def __init__(self, controller, id, who, keeplog=None):
+    def __init__(self, controller, id, who, keeplog=None, log_rate=None):
         """
         Ctor.
 
@@ -299,7 +468,7 @@ class GuestWorkerProcess(WorkerProcess):
         :param who: Who triggered creation of this worker.
         :type who: str
         """
-        WorkerProcess.__init__(self, controller, id, who, keeplog)
+        WorkerProcess.__init__(self, controller, id, who, keeplog, log_rate)
 
         self._log_fds = [1, 2]
         self.proto = None
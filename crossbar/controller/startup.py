@@ -0,0 +1,336 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+
+from twisted.internet.defer import Deferred, DeferredList, DeferredSemaphore
+from twisted.internet.defer import FirstError, maybeDeferred
+
+from six.moves.urllib.parse import urlparse
+
+from crossbar._logging import make_logger
+
+__all__ = ('StartupTimeline',
+           'gather',
+           'run_all',
+           'worker_dependencies',
+           'start_workers')
+
+
+log = make_logger()
+
+
+# number of workers (and sub-resources per worker) started concurrently (when not configured)
+DEFAULT_STARTUP_CONCURRENCY = 8
+
+
+def gather(deferreds):
+    """
+    Wait for all Deferreds, failing with the first failure of any of them.
+
+    :param deferreds: The Deferreds to wait for.
+    :type deferreds: list
+
+    :returns: A Deferred firing with the list of results.
+    :rtype: obj
+    """
+    def unwrap(failure):
+        failure.trap(FirstError)
+        return failure.value.subFailure
+
+    d = DeferredList(list(deferreds), fireOnOneErrback=True, consumeErrors=True)
+    d.addCallbacks(lambda results: [result for _, result in results], unwrap)
+    return d
+
+
+def run_all(items, run, semaphore):
+    """
+    Run something for each item, with a bounded number of runs in progress.
+
+    Runs holding a slot of the semaphore must not wait for other runs sharing
+    it (that is, not nest them), or startup might not make progress.
+
+    :param items: The items to run something for.
+    :type items: list
+    :param run: Called with an item, may return a Deferred.
+    :type run: callable
+    :param semaphore: Bounds the number of runs in progress, shared by all the
+        runs (of a worker) that should be bounded together.
+    :type semaphore: obj
+
+    :returns: A Deferred firing with the list of results.
+    :rtype: obj
+    """
+    return gather([semaphore.run(run, item) for item in items])
+
+
+class StartupTimeline(object):
+    """
+    Records when each stage of starting up a node began and ended.
+    """
+
+    log = make_logger()
+
+    def __init__(self, clock):
+        """
+
+        :param clock: The clock to use (usually, the reactor).
+        :type clock: obj
+        """
+        self._clock = clock
+        self._started = clock.seconds()
+
+        # list of [stage, name, began, ended], with times relative to the timeline start
+        self.entries = []
+
+    def run(self, stage, name, f, *args, **kwargs):
+        """
+        Run a startup step and record its time.
+
+        :param stage: The stage, e.g. ``u"worker"`` or ``u"transport"``.
+        :type stage: unicode
+        :param name: The name of the step, e.g. ``u"worker1/transport1"``.
+        :type name: unicode
+        :param f: The function to run, may return a Deferred.
+        :type f: callable
+
+        :returns: A Deferred firing with the result of ``f``.
+        :rtype: obj
+        """
+        entry = [stage, name, self._clock.seconds() - self._started, None]
+        self.entries.append(entry)
+
+        def ended(result):
+            entry[3] = self._clock.seconds() - self._started
+            return result
+
+        return maybeDeferred(f, *args, **kwargs).addBoth(ended)
+
+    def marshal(self):
+        return [
+            {
+                u'stage': stage,
+                u'name': name,
+                u'began': began,
+                u'ended': ended
+            } for stage, name, began, ended in self.entries
+        ]
+
+    def log_summary(self):
+        """
+        Log the time spent per worker (and, on debug, per step).
+        """
+        total = self._clock.seconds() - self._started
+        for stage, name, began, ended in self.entries:
+            duration = int(((ended or total) - began) * 1000)
+            if stage == u'worker':
+                self.log.info("Startup timeline: worker '{name}' ready after {ended} ms (took {duration} ms)",
+                              name=name, ended=int((ended or total) * 1000), duration=duration)
+            else:
+                self.log.debug("Startup timeline: {stage} '{name}' {began} - {ended} ms (took {duration} ms)",
+                               stage=stage, name=name, began=int(began * 1000),
+                               ended=int((ended or total) * 1000), duration=duration)
+        self.log.info("Startup timeline: node ready after {total} ms", total=int(total * 1000))
+
+
+def _endpoint_key(endpoint, cbdir):
+    """
+    Key identifying what a (listening or connecting) endpoint is about: the
+    TCP port or the Unix domain socket path.
+    """
+    if not isinstance(endpoint, dict):
+        return None
+    if endpoint.get('type') == 'tcp' and 'port' in endpoint:
+        return (u'tcp', endpoint['port'])
+    if endpoint.get('type') == 'unix' and 'path' in endpoint:
+        return (u'unix', os.path.abspath(os.path.join(cbdir, endpoint['path'])))
+    return None
+
+
+def _connecting_key(transport, cbdir):
+    """
+    Key identifying what a connecting transport connects to: its endpoint, or
+    else (for uplinks) the TCP port of a WebSocket URL on this host.
+    """
+    if 'endpoint' in transport:
+        return _endpoint_key(transport['endpoint'], cbdir)
+    if 'url' in transport:
+        try:
+            url = urlparse(transport['url'])
+            port = url.port or {u'ws': 80, u'wss': 443}.get(url.scheme, None)
+        except ValueError:
+            return None
+        if port and url.hostname in (u'localhost', u'127.0.0.1', u'::1'):
+            return (u'tcp', port)
+    return None
+
+
+def _depends_on(dependencies, worker_id, other_id):
+    """
+    Check if a worker (transitively) depends on another worker.
+    """
+    seen = set()
+    todo = [worker_id]
+    while todo:
+        current = todo.pop()
+        if current == other_id:
+            return True
+        if current not in seen:
+            seen.add(current)
+            todo.extend(dependencies.get(current, ()))
+    return False
+
+
+def worker_dependencies(workers, cbdir):
+    """
+    Work out which workers need to be started before others can be started.
+
+    Container workers depend on the router workers with a transport listening
+    on an endpoint one of their components connects to. Router workers depend
+    on the router workers their realms have an uplink to (unless that would
+    make them depend on each other). Guest workers might connect to any
+    router, and depend on all router workers.
+
+    :param workers: The workers to start, as (worker ID, worker configuration) pairs.
+    :type workers: list
+    :param cbdir: The node directory (relative Unix socket paths are relative to that).
+    :type cbdir: str
+
+    :returns: Map of worker IDs to the set of worker IDs they depend on.
+    :rtype: dict
+    """
+    # (endpoint key) -> ID of the router worker listening on it
+    listening = {}
+    routers = set()
+    for worker_id, worker in workers:
+        if worker['type'] == 'router':
+            routers.add(worker_id)
+            for transport in worker.get('transports', []):
+                key = _endpoint_key(transport.get('endpoint', None), cbdir)
+                if key:
+                    listening[key] = worker_id
+
+    dependencies = {}
+    for worker_id, worker in workers:
+        depends_on = set()
+        if worker['type'] == 'container':
+            for component in worker.get('components', []):
+                key = _endpoint_key(component.get('transport', {}).get('endpoint', None), cbdir)
+                if key in listening:
+                    depends_on.add(listening[key])
+        elif worker['type'] == 'guest':
+            depends_on.update(routers)
+        dependencies[worker_id] = depends_on
+
+    # uplinks between routers are added in configuration order, leaving out
+    # the ones which would close a cycle (which could never start up)
+    for worker_id, worker in workers:
+        if worker['type'] == 'router':
+            for realm in worker.get('realms', []):
+                for uplink in realm.get('uplinks', []):
+                    key = _connecting_key(uplink.get('transport', {}), cbdir)
+                    if key in listening and not _depends_on(dependencies, listening[key], worker_id):
+                        dependencies[worker_id].add(listening[key])
+
+    for worker_id, depends_on in dependencies.items():
+        depends_on.discard(worker_id)
+    return dependencies
+
+
+def start_workers(workers, dependencies, start_worker, concurrency):
+    """
+    Start workers concurrently, each after the workers it depends on.
+
+    :param workers: The workers to start, as (worker ID, worker configuration) pairs.
+    :type workers: list
+    :param dependencies: Map of worker IDs to the set of worker IDs they depend on.
+    :type dependencies: dict
+    :param start_worker: Called with the worker ID and configuration to start a worker,
+        may return a Deferred.
+    :type start_worker: callable
+    :param concurrency: Maximum number of workers starting at the same time.
+    :type concurrency: int
+
+    :returns: A Deferred firing when all workers have been started.
+    :rtype: obj
+    """
+    semaphore = DeferredSemaphore(concurrency)
+
+    # worker ID -> Deferred firing with True (started) or False (failed to start)
+    ready = {}
+    for worker_id, _ in workers:
+        ready[worker_id] = Deferred()
+
+    def start(worker_id, worker):
+        # wait for our dependencies _before_ taking a slot, so that slots are
+        # only held by workers which can actually make progress
+        depends_on = sorted(dependencies.get(worker_id, ()))
+        d = gather([_chained(ready[dep]) for dep in depends_on])
+
+        def dependencies_ready(started):
+            for dep, ok in zip(depends_on, started):
+                if not ok:
+                    # startup fails with the failure of the dependency anyway
+                    log.warn("Worker '{worker_id}' not started, since worker '{dep}' failed to start",
+                             worker_id=worker_id, dep=dep)
+                    return False
+            return semaphore.run(start_worker, worker_id, worker)
+
+        def done(result):
+            ready[worker_id].callback(result is not False)
+            return result
+
+        def failed(failure):
+            ready[worker_id].callback(False)
+            return failure
+
+        d.addCallback(dependencies_ready)
+        d.addCallbacks(done, failed)
+        return d
+
+    return gather([start(worker_id, worker) for worker_id, worker in workers])
+
+
+def _chained(d):
+    """
+    A new Deferred firing with the result of the given one (which can hence be
+    waited for by any number of dependents).
+    """
+    chained = Deferred()
+
+    def fire(result):
+        chained.callback(result)
+        return result
+
+    d.addCallback(fire)
+    return chained
@@ -0,0 +1,179 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import os
+import sys
+import socket
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.error import ProcessTerminated
+from twisted.internet.protocol import ProcessProtocol
+from twisted.python.runtime import platform
+
+from crossbar.test import TestCase
+
+if not platform.isWindows():
+    from crossbar.controller.forkserver import ForkServer
+
+
+def _echo():
+    """
+    Main function of the forked test processes: echo stdin and the
+    command line argument to FD 3 (and the argument to FD 4, if inherited),
+    and exit with code 3.
+    """
+    data = b''
+    while True:
+        chunk = os.read(0, 1024)
+        if not chunk:
+            break
+        data += chunk
+    os.write(3, data + b' ' + sys.argv[1].encode('utf8'))
+    try:
+        os.write(4, sys.argv[1].encode('utf8'))
+    except OSError:
+        pass
+    os.write(2, b'bye')
+    sys.exit(3)
+
+
+class _Collector(ProcessProtocol):
+
+    def __init__(self):
+        self.received = {}
+        self.reason = None
+        self.ended = Deferred()
+
+    def childDataReceived(self, childFD, data):
+        self.received[childFD] = self.received.get(childFD, b'') + data
+
+    def processEnded(self, reason):
+        self.reason = reason
+        self.ended.callback(None)
+
+
+class ForkServerTests(TestCase):
+    """
+    Tests for crossbar.controller.forkserver.
+    """
+
+    if platform.isWindows():
+        skip = "fork server not supported on Windows"
+
+    def setUp(self):
+        self.server = ForkServer(reactor, main=u'crossbar.controller.test.test_forkserver._echo')
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def _fork(self, arg, extraFDs=None):
+        proto = _Collector()
+        args = [sys.executable, '-u', 'script.py', arg]
+        childFDs = {0: "w", 1: "r", 2: "r", 3: "r"}
+        childFDs.update(extraFDs or {})
+        d = self.server.spawnProcess(proto, sys.executable, args, env=dict(os.environ),
+                                     childFDs=childFDs)
+        return d, proto
+
+    @inlineCallbacks
+    def test_fork(self):
+        """
+        Processes are forked with pipes on the requested FDs, the command line
+        after the script name, and their exit status reported.
+        """
+        d, proto = self._fork(u'hello')
+        process = yield d
+
+        self.assertNotEqual(process.pid, self.server.pid)
+        self.assertIs(proto.transport, process)
+
+        process.write(b'ping')
+        process.closeStdin()
+
+        yield proto.ended
+        self.assertIsInstance(proto.reason.value, ProcessTerminated)
+        self.assertEqual(proto.reason.value.exitCode, 3)
+        self.assertEqual(proto.received[3], b'ping hello')
+        self.assertEqual(proto.received[2], b'bye')
+
+    @inlineCallbacks
+    def test_fork_many(self):
+        """
+        Processes forked concurrently each get their own pipes.
+        """
+        forks = [self._fork(u'{}'.format(i)) for i in range(5)]
+        for d, proto in forks:
+            process = yield d
+            process.closeStdin()
+        for i, (d, proto) in enumerate(forks):
+            yield proto.ended
+            self.assertEqual(proto.received[3], u' {}'.format(i).encode('ascii'))
+
+    @inlineCallbacks
+    def test_fork_inherited_fd(self):
+        """
+        FDs of the node controller (like sockets) can be passed on to forked processes.
+        """
+        ours, theirs = socket.socketpair()
+        self.addCleanup(ours.close)
+
+        d, proto = self._fork(u'hello', {4: theirs.fileno()})
+        theirs.close()
+        process = yield d
+        process.closeStdin()
+
+        yield proto.ended
+        self.assertEqual(ours.recv(1024), b'hello')
+
+    def test_can_fork(self):
+        """
+        Processes can be forked only with the Python startup environment of
+        the fork server.
+        """
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), OTHER=u'other')
+        self.assertTrue(self.server.can_fork(env))
+
+        self.assertFalse(self.server.can_fork(dict(env, PYTHONPATH=u'/elsewhere')))
+        self.assertFalse(self.server.can_fork(dict(env, PYTHONHASHSEED=u'42')))
+        self.assertFalse(self.server.can_fork(dict(env, LD_PRELOAD=u'/lib/other.so')))
+
+    @inlineCallbacks
+    def test_stopped(self):
+        """
+        Once the fork server was stopped, forking fails.
+        """
+        yield self.server.stop()
+        self.assertTrue(self.server.lost)
+
+        d, proto = self._fork(u'hello')
+        yield self.assertFailure(d, RuntimeError)
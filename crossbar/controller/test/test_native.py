@@ -0,0 +1,115 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import struct
+
+from twisted.internet.defer import Deferred
+from twisted.test.proto_helpers import StringTransport
+
+from autobahn.wamp import message
+from autobahn.wamp.serializer import MsgPackSerializer
+
+from crossbar.test import TestCase
+from crossbar.controller.native import create_native_worker_client_factory, \
+    NativeWorkerRawSocketClientFactory
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def onOpen(self, transport):
+        pass
+
+    def onMessage(self, msg):
+        self.messages.append(msg)
+
+    def onClose(self, wasClean):
+        pass
+
+
+class _ProcessTransport(StringTransport):
+    pid = 4242
+
+
+class NativeWorkerRawSocketTests(TestCase):
+    """
+    Tests for the WAMP-RawSocket-MsgPack management transport to native workers.
+    """
+
+    def _connect(self):
+        factory = create_native_worker_client_factory(_Session, Deferred(), Deferred(), u'rawsocket')
+        proto = factory.buildProtocol(None)
+        proto.makeConnection(_ProcessTransport())
+        return factory, proto
+
+    def test_factory(self):
+        """
+        Native workers talking RawSocket are trusted, like with WebSocket.
+        """
+        factory, proto = self._connect()
+        self.assertIsInstance(factory, NativeWorkerRawSocketClientFactory)
+        self.assertIs(factory.proto, proto)
+        self.assertEqual(proto._pid, 4242)
+        self.assertEqual(proto._authrole, u'trusted')
+
+    def test_handshake(self):
+        """
+        The controller requests MsgPack and messages of up to 16MB.
+        """
+        factory, proto = self._connect()
+        self.assertEqual(proto.transport.value(), b'\x7f\xf2\x00\x00')
+
+        proto.dataReceived(b'\x7f\xf2\x00\x00')
+        self.assertIsInstance(proto._session, _Session)
+
+        serializer = MsgPackSerializer()
+        payload, _ = serializer.serialize(message.Publish(1, u'com.example.topic', args=[u'x' * 200000]))
+        proto.dataReceived(struct.pack('!I', len(payload)) + payload)
+        self.assertEqual(proto._session.messages[0].args, [u'x' * 200000])
+
+    def test_closing(self):
+        """
+        Messages still in flight from a worker after the controller closed are ignored.
+        """
+        factory, proto = self._connect()
+        proto.dataReceived(b'\x7f\xf2\x00\x00')
+        session = proto._session
+
+        proto.close()
+        self.assertTrue(proto.transport.disconnecting)
+
+        payload, _ = MsgPackSerializer().serialize(message.Publish(1, u'com.example.topic'))
+        proto.dataReceived(struct.pack('!I', len(payload)) + payload)
+        self.assertEqual(session.messages, [])
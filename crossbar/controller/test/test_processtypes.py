@@ -0,0 +1,159 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import json
+
+from mock import Mock
+
+from twisted.internet.task import Clock
+
+from crossbar.test import TestCase
+from crossbar.controller import processtypes
+from crossbar.controller.processtypes import RouterWorkerProcess, LogRateLimiter
+from crossbar._logging import cb_logging_framed, cb_logging_aware, record_separator, frame_log_record
+
+
+def _event(text, level=u"info"):
+    return json.dumps({u"text": text, u"level": level, u"namespace": u"test"})
+
+
+class WorkerLogTests(TestCase):
+    """
+    Tests for the log handling of crossbar.controller.processtypes.WorkerProcess.
+    """
+
+    def setUp(self):
+        self.controller = Mock()
+        self.controller._node_id = u'node1'
+        self.controller.has_subscribers.return_value = True
+
+    def _worker(self, **kwargs):
+        worker = RouterWorkerProcess(self.controller, u'worker1', u'test', **kwargs)
+        worker._logger = Mock()
+        worker.pid = 123
+        return worker
+
+    def _texts(self, worker):
+        return [e[u'text'] if isinstance(e, dict) and u'text' in e else e for e in worker.getlog()]
+
+    def test_framed(self):
+        """
+        Framed log records are processed once complete, also when split
+        across reads, or interleaved with other output.
+        """
+        worker = self._worker()
+        data = (cb_logging_framed + u"\n").encode('ascii') + frame_log_record(_event(u"one")) + \
+            b"stray output" + frame_log_record(_event(u"two"))
+
+        worker.log(2, data[:-5])
+        self.assertEqual(worker._logger.emit.call_count, 2)
+        worker.log(2, data[-5:])
+
+        texts = [call[0][1] for call in worker._logger.emit.call_args_list]
+        self.assertEqual(texts, [u"one", u"INVALID JSON: stray output", u"two"])
+        self.assertEqual(len(worker._log_data), 0)
+        self.assertEqual(self.controller.publish.call_count, 3)
+
+    def test_framed_stray_marker(self):
+        """
+        A stray frame marker in other output does not stall the log records
+        behind it, also when it happens to look like the start of a frame.
+        """
+        worker = self._worker()
+        worker.log(2, (cb_logging_framed + u"\n").encode('ascii'))
+
+        # marker and length, but not followed by a JSON object
+        worker.log(2, b"\x1e\x00\x00\x10\x00 stray")
+        worker.log(2, frame_log_record(_event(u"one")))
+
+        # marker, length and a brace, followed by a frame (split across reads)
+        data = b"\x1e\x00\x00\x10\x00{ stray" + frame_log_record(_event(u"two"))
+        worker.log(2, data[:10])
+        worker.log(2, data[10:])
+
+        texts = [call[0][1] for call in worker._logger.emit.call_args_list]
+        self.assertEqual(texts, [u"INVALID JSON: \x1e\x00\x00\x10\x00 stray", u"one",
+                                 u"INVALID JSON: \x1e\x00\x00\x10\x00{{ stray", u"two"])
+        self.assertEqual(len(worker._log_data), 0)
+
+    def test_record_separator(self):
+        """
+        Log records separated by record separators (legacy rich logging) are still supported.
+        """
+        worker = self._worker()
+        worker.log(2, cb_logging_aware + u"\n")
+        data = (_event(u"one") + record_separator + _event(u"two") + record_separator).encode('utf8')
+        for i in range(len(data)):
+            worker.log(2, data[i:i + 1])
+
+        texts = [call[0][1] for call in worker._logger.emit.call_args_list]
+        self.assertEqual(texts, [u"one", u"two"])
+
+    def test_publish_only_subscribed(self):
+        self.controller.has_subscribers.return_value = False
+        worker = self._worker()
+        worker.log(2, cb_logging_framed.encode('ascii') + frame_log_record(_event(u"one")))
+
+        self.assertEqual(worker._logger.emit.call_count, 1)
+        self.assertFalse(self.controller.publish.called)
+
+    def test_getlog_limit(self):
+        """
+        The log buffer is bounded, and getlog returns the last log entries.
+        """
+        worker = self._worker(keeplog=5)
+        worker.log(2, u"\n".join(u"line {}".format(i) for i in range(10)))
+
+        self.assertEqual(worker.getlog(), [u"line {}".format(i) for i in range(5, 10)])
+        self.assertEqual(worker.getlog(2), [u"line 8", u"line 9"])
+        self.assertEqual(worker.getlog(0), [])
+
+    def test_rate_limit(self):
+        """
+        Log events beyond the rate limit are dropped, and the drops reported.
+        """
+        clock = Clock()
+        self.patch(processtypes, 'LogRateLimiter', lambda rate: LogRateLimiter(rate, clock=clock))
+        worker = self._worker(log_rate=2)
+        data = cb_logging_framed.encode('ascii')
+        for i in range(5):
+            data += frame_log_record(_event(u"event {}".format(i)))
+        worker.log(2, data)
+        self.assertEqual(worker._logger.emit.call_count, 2)
+        self.assertEqual(worker._log_dropped, 3)
+
+        clock.advance(1)
+        worker.log(2, frame_log_record(_event(u"event 5")))
+        self.assertEqual(worker._log_dropped, 0)
+        self.assertEqual(worker._logger.warn.call_args[1][u'count'], 3)
+        self.assertEqual(worker._logger.emit.call_count, 3)
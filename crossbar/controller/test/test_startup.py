@@ -0,0 +1,204 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+from twisted.internet.defer import Deferred, DeferredSemaphore
+from twisted.internet.task import Clock
+
+from crossbar.test import TestCase
+from crossbar.controller.startup import StartupTimeline, run_all
+from crossbar.controller.startup import start_workers, worker_dependencies
+
+
+def _router(port):
+    return {
+        u"type": u"router",
+        u"transports": [{u"type": u"websocket", u"endpoint": {u"type": u"tcp", u"port": port}}]
+    }
+
+
+def _container(port):
+    return {
+        u"type": u"container",
+        u"components": [{
+            u"type": u"class",
+            u"transport": {
+                u"type": u"websocket",
+                u"endpoint": {u"type": u"tcp", u"host": u"127.0.0.1", u"port": port}
+            }
+        }]
+    }
+
+
+class WorkerDependenciesTests(TestCase):
+
+    def test_dependencies(self):
+        """
+        Containers depend on the router listening where their components
+        connect to, guests on all routers.
+        """
+        workers = [
+            (u"container1", _container(8080)),
+            (u"router1", _router(8080)),
+            (u"router2", _router(8081)),
+            (u"container2", _container(9000)),
+            (u"guest1", {u"type": u"guest"}),
+        ]
+        self.assertEqual(worker_dependencies(workers, u"/tmp"), {
+            u"container1": set([u"router1"]),
+            u"router1": set(),
+            u"router2": set(),
+            u"container2": set(),
+            u"guest1": set([u"router1", u"router2"]),
+        })
+
+    def test_uplink_dependencies(self):
+        """
+        Routers depend on the local routers their realms have an uplink to,
+        as long as that doesn't make routers depend on each other.
+        """
+        def uplink(router, url):
+            router[u"realms"] = [{u"name": u"realm1", u"uplinks": [{u"transport": {u"url": url}}]}]
+            return router
+
+        workers = [
+            (u"router1", uplink(_router(8080), u"ws://127.0.0.1:8081/ws")),
+            (u"router2", uplink(_router(8081), u"ws://localhost:8080/ws")),
+            (u"router3", uplink(_router(8082), u"ws://localhost:8081/ws")),
+            (u"router4", uplink(_router(8083), u"ws://example.com:8080/ws")),
+        ]
+        self.assertEqual(worker_dependencies(workers, u"/tmp"), {
+            u"router1": set([u"router2"]),
+            u"router2": set(),
+            u"router3": set([u"router2"]),
+            u"router4": set(),
+        })
+
+
+class StartWorkersTests(TestCase):
+
+    def setUp(self):
+        self.starting = {}
+        return super(StartWorkersTests, self).setUp()
+
+    def _start_worker(self, worker_id, worker):
+        self.starting[worker_id] = Deferred()
+        return self.starting[worker_id]
+
+    def test_order(self):
+        """
+        Workers are started after their dependencies, independent workers
+        concurrently up to the concurrency limit.
+        """
+        workers = [(u"a", {}), (u"b", {}), (u"c", {}), (u"d", {})]
+        dependencies = {u"a": set([u"b"]), u"b": set(), u"c": set(), u"d": set()}
+        d = start_workers(workers, dependencies, self._start_worker, 2)
+        self.assertEqual(sorted(self.starting), [u"b", u"c"])
+
+        # "d" was waiting for a slot before "a" was ready to start
+        self.starting[u"b"].callback(None)
+        self.assertEqual(sorted(self.starting), [u"b", u"c", u"d"])
+
+        self.starting[u"c"].callback(None)
+        self.assertEqual(sorted(self.starting), [u"a", u"b", u"c", u"d"])
+
+        self.starting[u"d"].callback(None)
+        self.assertNoResult(d)
+
+        self.starting[u"a"].callback(None)
+        self.successResultOf(d)
+
+    def test_failure(self):
+        """
+        When a worker fails to start, startup fails with that failure, and
+        workers depending on it aren't started.
+        """
+        workers = [(u"a", {}), (u"b", {})]
+        d = start_workers(workers, {u"a": set([u"b"])}, self._start_worker, 2)
+        self.starting[u"b"].errback(RuntimeError("boom"))
+        self.failureResultOf(d, RuntimeError)
+        self.assertEqual(list(self.starting), [u"b"])
+
+
+class RunAllTests(TestCase):
+
+    def test_shared_semaphore(self):
+        """
+        Runs sharing a semaphore are bounded together.
+        """
+        started = []
+
+        def start(item):
+            d = Deferred()
+            started.append(d)
+            return d
+
+        semaphore = DeferredSemaphore(2)
+        d1 = run_all([u"r1", u"r2"], start, semaphore)
+        d2 = run_all([u"c1", u"c2"], start, semaphore)
+        self.assertEqual(len(started), 2)
+
+        started[0].callback(None)
+        started[1].callback(None)
+        self.successResultOf(d1)
+        self.assertEqual(len(started), 4)
+
+        started[2].callback(None)
+        started[3].callback(None)
+        self.successResultOf(d2)
+
+
+class StartupTimelineTests(TestCase):
+
+    def test_run(self):
+        clock = Clock()
+        timeline = StartupTimeline(clock)
+        clock.advance(1)
+
+        started = []
+
+        def start(item):
+            d = Deferred()
+            started.append(d)
+            return timeline.run(u"component", item, lambda: d)
+
+        d = run_all([u"c1", u"c2"], start, DeferredSemaphore(1))
+        clock.advance(2)
+        started[0].callback(None)
+        clock.advance(3)
+        started[1].callback(None)
+        self.successResultOf(d)
+
+        self.assertEqual(timeline.marshal(), [
+            {u"stage": u"component", u"name": u"c1", u"began": 1, u"ended": 3},
+            {u"stage": u"component", u"name": u"c2", u"began": 3, u"ended": 6},
+        ])
@@ -0,0 +1,223 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+from __future__ import absolute_import
+
+from collections import deque
+
+from twisted.internet.defer import Deferred, succeed, fail
+
+from crossbar._logging import make_logger
+
+__all__ = (
+    'HandshakeAdmission',
+    'AdmissionRejected',
+)
+
+
+class AdmissionRejected(Exception):
+    """
+    A handshake was rejected by admission control.
+    """
+
+    def __init__(self, reason, retry_after):
+        Exception.__init__(self, reason)
+        self.retry_after = retry_after
+
+
+class HandshakeAdmission(object):
+    """
+    Admission control for WAMP opening handshakes on a transport.
+
+    At most ``max_pending`` handshakes (from HELLO until WELCOME or ABORT) are
+    processed concurrently. Further handshakes wait in a FIFO queue of at most
+    ``max_queued`` entries, for at most ``queue_timeout`` seconds. Handshakes
+    which find the queue full, or time out waiting, are rejected with a hint
+    to retry after ``retry_after`` seconds.
+
+    An admitted handshake that does not finish within ``handshake_timeout``
+    seconds (e.g. a client never answering a CHALLENGE) is aborted by its
+    session, which frees the slot.
+    """
+
+    log = make_logger()
+
+    def __init__(self, max_pending=100, max_queued=1000, queue_timeout=10, retry_after=5,
+                 handshake_timeout=30, clock=None):
+        """
+
+        :param max_pending: Maximum number of concurrently pending handshakes.
+        :type max_pending: int
+        :param max_queued: Maximum number of handshakes waiting to be admitted.
+        :type max_queued: int
+        :param queue_timeout: Maximum time in seconds a handshake waits to be admitted.
+        :type queue_timeout: int
+        :param retry_after: Time in seconds after which rejected clients should retry.
+        :type retry_after: int
+        :param handshake_timeout: Maximum time in seconds an admitted handshake may take (0 for no limit).
+        :type handshake_timeout: int
+        :param clock: The clock (reactor) to use.
+        :type clock: obj
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self._clock = clock
+
+        self.max_pending = max_pending
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.handshake_timeout = handshake_timeout
+
+        self._pending = 0
+
+        # FIFO of (Deferred, timeout call) of waiting handshakes; entries of
+        # handshakes that timed out or were cancelled are skipped
+        self._queue = deque()
+        self._queued = 0
+
+        # counters
+        self._cnt_admitted = 0
+        self._cnt_queued = 0
+        self._cnt_rejected = 0
+        self._cnt_timed_out = 0
+        self._cnt_expired = 0
+
+    @staticmethod
+    def from_config(config):
+        """
+        Create admission control from a transport's ``admission`` configuration.
+        """
+        return HandshakeAdmission(max_pending=config.get('max_pending', 100),
+                                  max_queued=config.get('max_queued', 1000),
+                                  queue_timeout=config.get('queue_timeout', 10),
+                                  retry_after=config.get('retry_after', 5),
+                                  handshake_timeout=config.get('handshake_timeout', 30))
+
+    def acquire(self):
+        """
+        Acquire a slot for a pending handshake. Every successful acquire must be
+        followed by exactly one :meth:`release`.
+
+        :returns: A Deferred that fires when the handshake is admitted, or fails
+            with :class:`AdmissionRejected`. Cancelling the Deferred withdraws
+            a waiting handshake.
+        :rtype: instance of :tx:`twisted.internet.defer.Deferred`
+        """
+        if self._pending < self.max_pending:
+            self._pending += 1
+            self._cnt_admitted += 1
+            return succeed(None)
+
+        if self._queued >= self.max_queued:
+            self._cnt_rejected += 1
+            return fail(AdmissionRejected(u"too many pending handshakes", self.retry_after))
+
+        def withdraw(d):
+            if timeout.active():
+                timeout.cancel()
+            self._queued -= 1
+
+        # entries of cancelled handshakes might be anywhere in the queue, so
+        # compact it before they outnumber the handshakes that can be waiting
+        if len(self._queue) > 2 * self.max_queued:
+            self._queue = deque(entry for entry in self._queue if not entry[0].called)
+
+        d = Deferred(canceller=withdraw)
+        timeout = self._clock.callLater(self.queue_timeout, self._timeout, d)
+        self._queue.append((d, timeout))
+        self._queued += 1
+        self._cnt_queued += 1
+        return d
+
+    def _timeout(self, d):
+        self._queued -= 1
+        self._cnt_timed_out += 1
+        d.errback(AdmissionRejected(u"timeout waiting for handshake admission", self.retry_after))
+
+        # handshakes time out in the order they were queued
+        while self._queue and self._queue[0][0].called:
+            self._queue.popleft()
+
+    def deadline(self, expire):
+        """
+        Schedule the deadline of an admitted handshake.
+
+        :param expire: Called when the handshake did not finish in time. It must
+            abort the handshake and :meth:`release` its slot.
+        :type expire: callable
+
+        :returns: The scheduled call (to be cancelled when the handshake finishes),
+            or ``None`` if handshakes have no time limit.
+        :rtype: instance of :tx:`twisted.internet.interfaces.IDelayedCall` or None
+        """
+        if not self.handshake_timeout:
+            return None
+
+        def expired():
+            self._cnt_expired += 1
+            expire()
+
+        return self._clock.callLater(self.handshake_timeout, expired)
+
+    def release(self):
+        """
+        Release the slot of a handshake that finished (or was aborted).
+        """
+        self._pending -= 1
+        while self._queue and self._pending < self.max_pending:
+            d, timeout = self._queue.popleft()
+            if d.called:
+                # timed out or cancelled meanwhile
+                continue
+            timeout.cancel()
+            self._queued -= 1
+            self._pending += 1
+            self._cnt_admitted += 1
+            d.callback(None)
+
+    def stats(self):
+        """
+        Get admission control statistics.
+
+        :returns: Current queue state and counters.
+        :rtype: dict
+        """
+        return {
+            u'pending': self._pending,
+            u'queued': self._queued,
+            u'max_pending': self.max_pending,
+            u'max_queued': self.max_queued,
+            u'admitted': self._cnt_admitted,
+            u'delayed': self._cnt_queued,
+            u'rejected': self._cnt_rejected,
+            u'timed_out': self._cnt_timed_out,
+            u'expired': self._cnt_expired,
+        }
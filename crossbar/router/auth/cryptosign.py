@@ -32,6 +32,7 @@ from __future__ import absolute_import
 
 import os
 import binascii
+import collections
 
 import six
 
@@ -39,6 +40,9 @@ import nacl
 from nacl.signing import VerifyKey
 from nacl.exceptions import BadSignatureError
 
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
 from autobahn import util
 from autobahn.wamp import types
 
@@ -48,6 +52,69 @@ from crossbar.router.auth.pending import PendingAuth
 __all__ = ('PendingAuthCryptosign',)
 
 
+# maximum number of parsed public keys to keep
+VERIFY_KEY_CACHE_SIZE = 100000
+
+# parsed public keys (hex pubkey -> VerifyKey), in least recently used order
+_verify_keys = collections.OrderedDict()
+
+
+def _get_verify_key(pubkey):
+    """
+    Get the (cached) parsed public key for a HEX encoded Ed25519 public key.
+    """
+    verify_key = _verify_keys.pop(pubkey, None)
+    if verify_key is None:
+        verify_key = VerifyKey(pubkey, encoder=nacl.encoding.HexEncoder)
+        if len(_verify_keys) >= VERIFY_KEY_CACHE_SIZE:
+            _verify_keys.popitem(last=False)
+    _verify_keys[pubkey] = verify_key
+    return verify_key
+
+
+# marks a pubkey authorized for more than one authid in a pubkey index
+_AMBIGUOUS = object()
+
+# pubkey indexes of static principal databases: id(principals) -> (principals, index)
+_pubkey_indexes = {}
+
+
+def _get_pubkey_index(principals):
+    """
+    Get the index (pubkey -> authid) of a static principal database, which is
+    built once per database.
+    """
+    entry = _pubkey_indexes.get(id(principals), None)
+    if entry is None or entry[0] is not principals:
+        index = {}
+        for authid, principal in principals.items():
+            for pubkey in principal[u'authorized_keys']:
+                if index.get(pubkey, authid) != authid:
+                    index[pubkey] = _AMBIGUOUS
+                else:
+                    index[pubkey] = authid
+        entry = (principals, index)
+        _pubkey_indexes[id(principals)] = entry
+    return entry[1]
+
+
+# thread pools for verifying signatures (per number of threads, so transports
+# configured with a different number of threads do not share a pool)
+_verify_pools = {}
+
+
+def _get_verify_pool(threads):
+    pool = _verify_pools.get(threads, None)
+    if pool is None:
+        from twisted.internet import reactor
+        pool = ThreadPool(minthreads=0, maxthreads=threads,
+                          name='crossbar_cryptosign_threadpool_{}'.format(threads))
+        reactor.addSystemEventTrigger('before', 'shutdown', pool.stop)
+        pool.start()
+        _verify_pools[threads] = pool
+    return pool
+
+
 class PendingAuthCryptosign(PendingAuth):
     """
     Pending Cryptosign authentication.
@@ -70,14 +137,6 @@ class PendingAuthCryptosign(PendingAuth):
         self._challenge = None
         self._expected_signed_message = None
 
-        # create a map: pubkey -> authid
-        # this is to allow clients to authenticate without specifying an authid
-        if config['type'] == 'static':
-            self._pubkey_to_authid = {}
-            for authid, principal in self._config.get(u'principals', {}).items():
-                for pubkey in principal[u'authorized_keys']:
-                    self._pubkey_to_authid[pubkey] = authid
-
     def _compute_challenge(self):
         self._challenge = os.urandom(32)
 
@@ -117,18 +176,15 @@ class PendingAuthCryptosign(PendingAuth):
             # there is a 1:1 relation between authid's and pubkey's !! see below (*)
             if self._authid is None:
                 if pubkey:
-                    # we do a naive search, but that is ok, since "static mode" is from
-                    # node configuration, and won't contain a lot principals anyway
-                    for _authid, _principal in self._config.get(u'principals', {}).items():
-                        if _principal[u'pubkey'] == pubkey:
-                            # (*): this is necessary to detect multiple authid's having the same pubkey
-                            # in which case we couldn't reliably map the authid from the pubkey
-                            if self._authid is None:
-                                self._authid = _authid
-                            else:
-                                return types.Deny(message=u'cannot infer client identity from pubkey: multiple authids in principal database have this pubkey')
-                    if self._authid is None:
+                    # look up the pubkey in the index of the principal database
+                    _authid = _get_pubkey_index(self._config.get(u'principals', {})).get(pubkey, None)
+                    if _authid is _AMBIGUOUS:
+                        # (*): multiple authid's have the same pubkey, so we can't
+                        # reliably map the authid from the pubkey
+                        return types.Deny(message=u'cannot infer client identity from pubkey: multiple authids in principal database have this pubkey')
+                    if _authid is None:
                         return types.Deny(message=u'cannot identify client: no authid requested and no principal found for provided extra.pubkey')
+                    self._authid = _authid
                 else:
                     return types.Deny(message=u'cannot identify client: no authid requested and no extra.pubkey provided')
 
@@ -139,11 +195,17 @@ class PendingAuthCryptosign(PendingAuth):
                 if pubkey and (pubkey not in principal[u'authorized_keys']):
                     return types.Deny(message=u'extra.pubkey provided does not match any one of authorized_keys for the principal')
 
+                if not pubkey:
+                    # without the client telling, we only know which key to expect if there is just one
+                    if len(principal[u'authorized_keys']) != 1:
+                        return types.Deny(message=u'cannot authenticate client: no extra.pubkey provided, and principal has multiple authorized_keys')
+                    pubkey = principal[u'authorized_keys'][0]
+
                 error = self._assign_principal(principal)
                 if error:
                     return error
 
-                self._verify_key = VerifyKey(pubkey, encoder=nacl.encoding.HexEncoder)
+                self._verify_key = _get_verify_key(pubkey)
 
                 extra = self._compute_challenge()
                 return types.Challenge(self._authmethod, extra)
@@ -158,14 +220,14 @@ class PendingAuthCryptosign(PendingAuth):
             if error:
                 return error
 
-            d = self._authenticator_session.call(self._authenticator, realm, details.authid, self._session_details)
+            d = self._call_dynamic_authenticator(realm, details.authid)
 
             def on_authenticate_ok(principal):
                 error = self._assign_principal(principal)
                 if error:
                     return error
 
-                self._verify_key = VerifyKey(principal[u'pubkey'], encoder=nacl.encoding.HexEncoder)
+                self._verify_key = _get_verify_key(principal[u'pubkey'])
 
                 extra = self._compute_challenge()
                 return types.Challenge(self._authmethod, extra)
@@ -199,20 +261,36 @@ class PendingAuthCryptosign(PendingAuth):
                 return types.Deny(message=u'signed message has invalid length (was {}, but should have been 96)'.format(len(signed_message)))
 
             # now verify the signed message versus the client public key ..
+            threads = self._config.get(u'verify-threads', 0)
+            if threads:
+                # .. on the thread pool
+                from twisted.internet import reactor
+                d = deferToThreadPool(reactor, _get_verify_pool(threads), self._verify_key.verify, signed_message)
+                d.addCallbacks(self._verified, self._verify_failed)
+                return d
+
             try:
                 message = self._verify_key.verify(signed_message)
             except BadSignatureError:
                 return types.Deny(message=u'signed message has invalid signature')
 
-            # .. and check that the message signed by the client is really what we expect
-            if message != self._expected_signed_message:
-                return types.Deny(message=u'message signed is bogus')
-
-            # signature was valid _and_ the message that was signed is equal to
-            # what we expected => accept the client
-            return self._accept()
+            return self._verified(message)
 
         except Exception as e:
 
             # should not arrive here .. but who knows
             return types.Deny(message=u'internal error: {}'.format(e))
+
+    def _verified(self, message):
+        # check that the message signed by the client is really what we expect
+        if message != self._expected_signed_message:
+            return types.Deny(message=u'message signed is bogus')
+
+        # signature was valid _and_ the message that was signed is equal to
+        # what we expected => accept the client
+        return self._accept()
+
+    def _verify_failed(self, err):
+        if err.check(BadSignatureError):
+            return types.Deny(message=u'signed message has invalid signature')
+        return types.Deny(message=u'internal error: {}'.format(err.value))
@@ -30,12 +30,98 @@
 
 from __future__ import absolute_import
 
+import collections
+
 import six
 
+from twisted.internet.defer import Deferred, maybeDeferred, succeed
+
 from autobahn.wamp import types
 from autobahn.wamp.exception import ApplicationError
 
-__all__ = ('PendingAuth',)
+__all__ = ('PendingAuth', 'AuthenticatorCache')
+
+
+class AuthenticatorCache(object):
+    """
+    A bounded cache of principals returned by a dynamic authenticator, which
+    expire after a time-to-live. Concurrent lookups for the same key (while the
+    authenticator is being called) share the result of one authenticator call.
+    """
+
+    def __init__(self, ttl, size=10000, clock=None):
+        """
+
+        :param ttl: Time-to-live of cached principals in seconds.
+        :type ttl: int
+        :param size: Maximum number of cached principals.
+        :type size: int
+        :param clock: The clock (reactor) to use.
+        :type clock: obj
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self._clock = clock
+        self._ttl = ttl
+        self._size = size
+
+        # key -> (expires, principal), in least recently used order
+        self._entries = collections.OrderedDict()
+
+        # key -> list of Deferreds waiting for an authenticator call in flight
+        self._pending = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, call):
+        """
+        Get the principal for a key, calling the authenticator when it is not cached.
+
+        :param key: The cache key.
+        :type key: tuple
+        :param call: Callable (without arguments) calling the authenticator.
+        :type call: callable
+
+        :returns: A Deferred that fires with the principal.
+        :rtype: instance of :tx:`twisted.internet.defer.Deferred`
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[0] > self._clock.seconds():
+            self._entries[key] = entry
+            self.hits += 1
+            return succeed(entry[1])
+
+        if key in self._pending:
+            self.hits += 1
+            d = Deferred()
+            self._pending[key].append(d)
+            return d
+
+        self.misses += 1
+        self._pending[key] = []
+
+        def done(result, cache):
+            waiters = self._pending.pop(key)
+            if cache:
+                self._entries[key] = (self._clock.seconds() + self._ttl, result)
+                while len(self._entries) > self._size:
+                    self._entries.popitem(last=False)
+            for d in waiters:
+                if cache:
+                    d.callback(result)
+                else:
+                    d.errback(result)
+            return result
+
+        d = maybeDeferred(call)
+        d.addCallbacks(done, done, callbackArgs=(True,), errbackArgs=(False,))
+        return d
+
+
+# caches of dynamic authenticators (per authentication method, authenticator realm and URI,
+# and cache time-to-live and size, so transports configured differently do not share a cache)
+_authenticator_caches = {}
 
 
 class PendingAuth:
@@ -159,6 +245,29 @@ class PendingAuth:
 
         self._authenticator_session = self._router_factory.get(authenticator_realm)._realm.session
 
+        # optionally, principals returned by the authenticator are cached
+        self._authenticator_cache = None
+        ttl = self._config.get(u'authenticator-cache-ttl', 0)
+        if ttl:
+            size = self._config.get(u'authenticator-cache-size', 10000)
+            cache_key = (self._authmethod, authenticator_realm, self._authenticator, ttl, size)
+            if cache_key not in _authenticator_caches:
+                _authenticator_caches[cache_key] = AuthenticatorCache(ttl, size)
+            self._authenticator_cache = _authenticator_caches[cache_key]
+
+    def _call_dynamic_authenticator(self, *args):
+        """
+        Call the dynamic authenticator with the given arguments (followed by the
+        session details), or get the principal from the authenticator cache when
+        enabled (the cache is keyed by the arguments only).
+        """
+        def call():
+            return self._authenticator_session.call(self._authenticator, *(args + (self._session_details,)))
+
+        if self._authenticator_cache:
+            return self._authenticator_cache.get(args, call)
+        return call()
+
     def _marshal_dynamic_authenticator_error(self, err):
         error = ApplicationError.AUTHENTICATION_FAILED
         message = u'dynamic authenticator failed: {}'.format(err.value)
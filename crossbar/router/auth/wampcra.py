@@ -130,7 +130,7 @@ class PendingAuthWampCra(PendingAuth):
             if error:
                 return error
 
-            d = self._authenticator_session.call(self._authenticator, realm, details.authid, self._session_details)
+            d = self._call_dynamic_authenticator(realm, details.authid)
 
             def on_authenticate_ok(principal):
                 error = self._assign_principal(principal)
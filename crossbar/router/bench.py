@@ -0,0 +1,757 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+
+import crossbar
+
+from twisted.internet import task
+from twisted.internet.defer import Deferred, DeferredList, DeferredSemaphore, \
+    gatherResults, inlineCallbacks, maybeDeferred, returnValue
+from twisted.internet.endpoints import TCP4ServerEndpoint, TCP4ClientEndpoint, \
+    UNIXServerEndpoint, UNIXClientEndpoint
+from twisted.internet.protocol import ProcessProtocol
+
+from autobahn.twisted.wamp import ApplicationSession
+from autobahn.twisted.websocket import WampWebSocketClientFactory
+from autobahn.wamp.types import ComponentConfig, SubscribeOptions
+
+from crossbar.router.router import RouterFactory
+from crossbar.router.session import RouterSessionFactory
+from crossbar.router.service import RouterServiceSession
+from crossbar.router.role import RouterRoleStaticAuth, RouterPermissions
+from crossbar.router.protocol import WampWebSocketServerFactory, WampRawSocketServerFactory, \
+    WampRawSocketClientFactory, _create_serializer
+from crossbar.worker.router import RouterRealm
+
+__all__ = ('Bench', 'SCENARIOS', 'run_benchmarks', 'compare_results')
+
+
+REALM = u'realm1'
+TOPIC = u'com.bench.topic'
+PROCEDURE = u'com.bench.echo'
+
+
+class BenchSession(ApplicationSession):
+    """
+    A client session of a benchmark.
+    """
+
+    def __init__(self, config=None):
+        ApplicationSession.__init__(self, config)
+        self.joined = Deferred()
+        self.disconnected = Deferred()
+
+    def onJoin(self, details):
+        self.joined.callback(self)
+
+    def onDisconnect(self):
+        if not self.joined.called:
+            self.joined.errback(Exception("connection lost before session joined"))
+        self.disconnected.callback(None)
+
+
+def _track_connections(factory, connections):
+    """
+    Keep track of the connections (protocol instances) of a factory, without
+    adding any overhead while connected.
+    """
+    base = factory.protocol
+
+    class TrackedProtocol(base):
+
+        def connectionMade(self):
+            connections.add(self)
+            base.connectionMade(self)
+
+        def connectionLost(self, reason):
+            connections.discard(self)
+            base.connectionLost(self, reason)
+
+    factory.protocol = TrackedProtocol
+
+
+class Bench(object):
+    """
+    A router running in-process, listening on loopback with a real WAMP
+    transport, and client sessions connecting to it.
+
+    Client sessions and the router share the process (and reactor), so latencies
+    include the work on both sides. They are meant to compare runs against each
+    other, not to predict the latencies of a production deployment.
+    """
+
+    def __init__(self, reactor, transport=u'rawsocket', serializer=u'msgpack', endpoint=u'tcp'):
+        """
+
+        :param reactor: The reactor to run on.
+        :type reactor: obj
+        :param transport: The WAMP transport, ``u'websocket'`` or ``u'rawsocket'``.
+        :type transport: unicode
+        :param serializer: The WAMP serializer, ``u'json'``, ``u'msgpack'`` or ``u'cbor'``.
+        :type serializer: unicode
+        :param endpoint: Listen on ``u'tcp'`` (loopback) or ``u'unix'`` (a Unix domain socket).
+        :type endpoint: unicode
+        """
+        self._reactor = reactor
+        self._transport = transport
+        self._serializer = serializer
+        self._endpoint = endpoint
+
+        self._port = None
+        self._path = None
+        self._sessions = []
+
+        # where the router listens (the TCP port or the path of the Unix domain socket)
+        self.address = None
+
+        # server side connections (to wait for them to be gone when stopping)
+        self._connections = set()
+
+    @inlineCallbacks
+    def start(self):
+        """
+        Start the router and listen for client connections.
+        """
+        router_factory = RouterFactory(u'bench')
+        router_factory.start_realm(RouterRealm(None, {u'name': REALM}))
+
+        # allow everything
+        router = router_factory.get(REALM)
+        permissions = RouterPermissions(u'', True, True, True, True, True)
+        router.add_role(RouterRoleStaticAuth(router, u'anonymous', default_permissions=permissions))
+
+        session_factory = RouterSessionFactory(router_factory)
+
+        # like a node, keep a service session on the realm (the router drops a realm
+        # when its last session leaves)
+        session_factory.add(RouterServiceSession(ComponentConfig(REALM), router), authrole=u'trusted')
+
+        config = {
+            u'type': self._transport,
+            u'serializers': [self._serializer],
+        }
+        if self._transport == u'websocket':
+            factory = WampWebSocketServerFactory(session_factory, u'.', config, None)
+        elif self._transport == u'rawsocket':
+            factory = WampRawSocketServerFactory(session_factory, config)
+        else:
+            raise Exception("invalid transport '{}'".format(self._transport))
+        _track_connections(factory, self._connections)
+
+        if self._endpoint == u'unix':
+            self._path = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+            endpoint = UNIXServerEndpoint(self._reactor, self._path)
+        else:
+            endpoint = TCP4ServerEndpoint(self._reactor, 0, interface='127.0.0.1')
+        self._port = yield endpoint.listen(factory)
+        self.address = self._path if self._endpoint == u'unix' else self._port.getHost().port
+
+    @inlineCallbacks
+    def stop(self):
+        """
+        Disconnect all client sessions and stop listening.
+        """
+        yield self.disconnect(list(self._sessions))
+
+        # wait for the router side of the connections to be gone
+        for i in range(500):
+            if not self._connections:
+                break
+            yield task.deferLater(self._reactor, 0.01, lambda: None)
+
+        if self._port:
+            yield self._port.stopListening()
+            self._port = None
+
+        if self._path:
+            os.rmdir(os.path.dirname(self._path))
+            self._path = None
+
+    @inlineCallbacks
+    def connect(self):
+        """
+        Connect a client session to the router.
+
+        :returns: The session, once it has joined.
+        :rtype: instance of :class:`BenchSession`
+        """
+        session = BenchSession(ComponentConfig(realm=REALM))
+
+        if self._transport == u'websocket':
+            factory = WampWebSocketClientFactory(lambda: session, url=u'ws://127.0.0.1',
+                                                 serializers=[_create_serializer(self._serializer)])
+        else:
+            factory = WampRawSocketClientFactory(lambda: session, {u'serializer': self._serializer})
+
+        if self._endpoint == u'unix':
+            endpoint = UNIXClientEndpoint(self._reactor, self.address)
+        else:
+            endpoint = TCP4ClientEndpoint(self._reactor, '127.0.0.1', int(self.address))
+
+        yield endpoint.connect(factory)
+        yield session.joined
+        self._sessions.append(session)
+        returnValue(session)
+
+    def disconnect(self, sessions):
+        """
+        Disconnect client sessions.
+
+        :param sessions: The sessions to disconnect.
+        :type sessions: list of :class:`BenchSession`
+
+        :returns: Fires when all sessions are disconnected.
+        :rtype: instance of :tx:`twisted.internet.defer.Deferred`
+        """
+        for session in sessions:
+            self._sessions.remove(session)
+            session.disconnect()
+        return DeferredList([session.disconnected for session in sessions])
+
+
+@inlineCallbacks
+def publish_fanout(bench, subscribers=10, events=1000):
+    """
+    Publish events to a topic with many subscribers, one event at a time.
+
+    The latency is from publishing an event to its receipt by a subscriber.
+    """
+    publisher = yield bench.connect()
+    sessions = yield gatherResults([bench.connect() for i in range(subscribers)])
+
+    latencies = []
+    state = {}
+
+    def on_event(published):
+        latencies.append(time.time() - published)
+        state[u'remaining'] -= 1
+        if not state[u'remaining']:
+            state[u'received'].callback(None)
+
+    yield gatherResults([session.subscribe(on_event, TOPIC) for session in sessions])
+
+    started = time.time()
+    for i in range(events):
+        state[u'remaining'] = subscribers
+        state[u'received'] = Deferred()
+        publisher.publish(TOPIC, time.time())
+        yield state[u'received']
+    duration = time.time() - started
+
+    yield bench.disconnect([publisher] + sessions)
+    returnValue((latencies, duration))
+
+
+@inlineCallbacks
+def rpc_latency(bench, calls=2000, concurrency=1):
+    """
+    Call a procedure (returning its argument) from concurrent callers, each
+    calling one call after the other.
+
+    The latency is the round-trip time of a call.
+    """
+    callee = yield bench.connect()
+    yield callee.register(lambda value: value, PROCEDURE)
+    callers = yield gatherResults([bench.connect() for i in range(concurrency)])
+
+    latencies = []
+
+    @inlineCallbacks
+    def call(caller):
+        for i in range(calls // concurrency):
+            called = time.time()
+            yield caller.call(PROCEDURE, i)
+            latencies.append(time.time() - called)
+
+    started = time.time()
+    yield gatherResults([call(caller) for caller in callers])
+    duration = time.time() - started
+
+    yield bench.disconnect([callee] + callers)
+    returnValue((latencies, duration))
+
+
+# topics subscribed (and published to) by match policy. the numbers are of
+# fixed width, so no topic is a prefix of another
+_SUBSCRIPTION_TOPICS = {
+    u'exact': (u'com.bench.exact{:06d}', u'com.bench.exact{:06d}'),
+    u'prefix': (u'com.bench.prefix{:06d}', u'com.bench.prefix{:06d}.event'),
+    u'wildcard': (u'com.bench..wildcard{:06d}', u'com.bench.event.wildcard{:06d}'),
+}
+
+
+@inlineCallbacks
+def subscription_scaling(bench, subscriptions=1000, match=u'prefix', events=1000):
+    """
+    Publish events to a router with many subscriptions of a match policy (``u'exact'``,
+    ``u'prefix'`` or ``u'wildcard'``), each event matching one subscription.
+
+    The latency is from publishing an event to its receipt by the subscriber.
+    """
+    if match not in _SUBSCRIPTION_TOPICS:
+        raise Exception("invalid match policy '{}'".format(match))
+    subscribed, published = _SUBSCRIPTION_TOPICS[match]
+
+    subscriber = yield bench.connect()
+    publisher = yield bench.connect()
+
+    latencies = []
+    state = {}
+
+    def on_event(published):
+        latencies.append(time.time() - published)
+        state[u'received'].callback(None)
+
+    options = SubscribeOptions(match=match)
+    yield gatherResults([subscriber.subscribe(on_event, subscribed.format(i), options=options)
+                         for i in range(subscriptions)])
+
+    started = time.time()
+    for i in range(events):
+        state[u'received'] = Deferred()
+        publisher.publish(published.format(i % subscriptions), time.time())
+        yield state[u'received']
+    duration = time.time() - started
+
+    yield bench.disconnect([subscriber, publisher])
+    returnValue((latencies, duration))
+
+
+@inlineCallbacks
+def join_storm(bench, sessions=200, concurrency=50):
+    """
+    Connect and join many sessions at once (up to ``concurrency`` at a time).
+
+    The latency is from starting to connect to the session having joined.
+    """
+    latencies = []
+    joined = []
+
+    @inlineCallbacks
+    def join():
+        connected = time.time()
+        session = yield bench.connect()
+        latencies.append(time.time() - connected)
+        joined.append(session)
+
+    semaphore = DeferredSemaphore(concurrency)
+    started = time.time()
+    yield gatherResults([semaphore.run(join) for i in range(sessions)])
+    duration = time.time() - started
+
+    yield bench.disconnect(joined)
+    returnValue((latencies, duration))
+
+
+# Python code run by the worker processes of the startup benchmark
+_STARTUP_PROBE = 'from crossbar.router.bench import startup_probe; startup_probe()'
+
+
+def startup_probe():
+    """
+    Main function of the worker processes started by :func:`worker_startup`: import
+    what a native worker imports, install a reactor, join the router of the benchmark,
+    and report being ready on stdout.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transport', default=u'rawsocket')
+    parser.add_argument('--serializer', default=u'msgpack')
+    parser.add_argument('--endpoint', default=u'tcp')
+    parser.add_argument('--address', required=True)
+    options = parser.parse_args()
+
+    # already imported when forked from a fork server
+    from crossbar.worker.forkserver import preload, PRELOAD_MODULES
+    preload(PRELOAD_MODULES)
+
+    from autobahn.twisted.choosereactor import install_reactor
+    install_reactor()
+
+    import txaio
+    txaio.use_twisted()
+
+    @inlineCallbacks
+    def join(reactor):
+        bench = Bench(reactor, transport=options.transport, serializer=options.serializer, endpoint=options.endpoint)
+        bench.address = options.address
+        session = yield bench.connect()
+        os.write(1, b'ready\n')
+        yield bench.disconnect([session])
+
+    task.react(join)
+
+
+class _StartupProbeProtocol(ProcessProtocol):
+    """
+    Tracks a worker process of the startup benchmark until it is ready and has ended.
+    """
+
+    def __init__(self):
+        self.ready = Deferred()
+        self.ended = Deferred()
+        self._errors = b''
+
+    def outReceived(self, data):
+        if not self.ready.called and b'ready' in data:
+            self.ready.callback(time.time())
+
+    def errReceived(self, data):
+        self._errors += data
+
+    def processEnded(self, reason):
+        if not self.ready.called:
+            self.ready.errback(Exception("worker process failed: {}".format(self._errors.decode('utf8', 'replace'))))
+        self.ended.callback(None)
+
+
+@inlineCallbacks
+def worker_startup(bench, workers=8, mode=u'fork'):
+    """
+    Start worker processes all at once, forked from a fork server (``mode``
+    ``u'fork'``) or each spawned as a fresh Python (``u'spawn'``). Each imports
+    what a native worker imports and joins the router, like a native worker
+    joins the node controller.
+
+    The latency is from starting a process to its session having joined (created
+    to ready). The fork server is started, and has forked a first process, before
+    measuring, as it is started once per node.
+    """
+    reactor = bench._reactor
+    args = [sys.executable, '-u', '-c', _STARTUP_PROBE,
+            '--transport', bench._transport, '--serializer', bench._serializer,
+            '--endpoint', bench._endpoint, '--address', u'{}'.format(bench.address)]
+
+    # see ForkServer.start()
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(crossbar.__file__)))] + sys.path)
+
+    fork_server = None
+    if mode == u'fork':
+        from crossbar.controller.forkserver import ForkServer
+        fork_server = ForkServer(reactor, main=u'crossbar.router.bench.startup_probe')
+        fork_server.start()
+        spawn = fork_server.spawnProcess
+    elif mode == u'spawn':
+        spawn = reactor.spawnProcess
+    else:
+        raise Exception("invalid startup mode '{}'".format(mode))
+
+    @inlineCallbacks
+    def start():
+        proto = _StartupProbeProtocol()
+        created = time.time()
+        yield maybeDeferred(spawn, proto, sys.executable, args, env=env)
+        try:
+            ready = yield proto.ready
+        finally:
+            yield proto.ended
+        returnValue((created, ready))
+
+    try:
+        if fork_server:
+            yield start()
+        started = time.time()
+        # wait for all processes to end, even when some failed
+        results = yield DeferredList([start() for i in range(workers)], consumeErrors=True)
+        for success, result in results:
+            if not success:
+                result.raiseException()
+        times = [result for success, result in results]
+    finally:
+        if fork_server:
+            yield fork_server.stop()
+
+    latencies = [ready - created for created, ready in times]
+    duration = max(ready for created, ready in times) - started
+    returnValue((latencies, duration))
+
+
+# benchmark scenarios and their default parameters
+SCENARIOS = {
+    u'publish_fanout': (publish_fanout, {u'subscribers': 10, u'events': 1000}),
+    u'rpc_latency': (rpc_latency, {u'calls': 2000, u'concurrency': 1}),
+    u'subscription_scaling': (subscription_scaling, {u'subscriptions': 1000, u'match': u'prefix', u'events': 1000}),
+    u'join_storm': (join_storm, {u'sessions': 200, u'concurrency': 50}),
+    u'worker_startup': (worker_startup, {u'workers': 8, u'mode': u'fork'}),
+}
+
+
+def percentile(latencies, p):
+    """
+    Get a percentile (nearest rank) of sorted latencies.
+
+    :param latencies: The latencies, sorted ascending.
+    :type latencies: list of float
+    :param p: The percentile, e.g. ``0.99``.
+    :type p: float
+
+    :returns: The latency (``0`` without latencies).
+    :rtype: float
+    """
+    if not latencies:
+        return 0.
+    rank = int(math.ceil(p * len(latencies)))
+    return latencies[min(max(rank, 1), len(latencies)) - 1]
+
+
+@inlineCallbacks
+def run_benchmarks(reactor, scenarios, transport=u'rawsocket', serializer=u'msgpack', endpoint=u'tcp', params=None,
+                   repeat=1):
+    """
+    Run benchmark scenarios, each on a fresh router.
+
+    :param reactor: The reactor to run on.
+    :type reactor: obj
+    :param scenarios: The names of the scenarios to run (see :data:`SCENARIOS`).
+    :type scenarios: list of unicode
+    :param transport: The WAMP transport, ``u'websocket'`` or ``u'rawsocket'``.
+    :type transport: unicode
+    :param serializer: The WAMP serializer, ``u'json'``, ``u'msgpack'`` or ``u'cbor'``.
+    :type serializer: unicode
+    :param endpoint: ``u'tcp'`` (loopback) or ``u'unix'``.
+    :type endpoint: unicode
+    :param params: Parameters overriding the defaults of the scenarios (parameters
+        not taken by a scenario are ignored for it).
+    :type params: dict
+    :param repeat: Run each benchmark this many times, and report the median of
+        each metric (tail latencies in particular vary from run to run).
+    :type repeat: int
+
+    :returns: The results by benchmark (a scenario with its parameters), with
+        throughput (operations per second) and latencies in seconds.
+    :rtype: dict
+    """
+    results = {}
+    for name in scenarios:
+        if name not in SCENARIOS:
+            raise Exception("invalid benchmark scenario '{}'".format(name))
+        scenario, defaults = SCENARIOS[name]
+        kwargs = dict(defaults)
+        for key, value in (params or {}).items():
+            if key in kwargs:
+                kwargs[key] = value
+
+        key = u'{}[{}]'.format(name, u','.join(
+            [transport, serializer, endpoint] + [u'{}={}'.format(k, v) for k, v in sorted(kwargs.items())]))
+
+        runs = []
+        for i in range(repeat):
+            bench = Bench(reactor, transport=transport, serializer=serializer, endpoint=endpoint)
+            yield bench.start()
+            try:
+                latencies, duration = yield scenario(bench, **kwargs)
+            finally:
+                yield bench.stop()
+
+            latencies.sort()
+            runs.append({
+                u'count': len(latencies),
+                u'duration': duration,
+                u'throughput': len(latencies) / duration if duration else 0.,
+                u'p50': percentile(latencies, 0.5),
+                u'p99': percentile(latencies, 0.99),
+                u'p999': percentile(latencies, 0.999),
+            })
+
+        results[key] = {metric: sorted(run[metric] for run in runs)[len(runs) // 2] for metric in runs[0]}
+        results[key][u'runs'] = len(runs)
+    returnValue(results)
+
+
+# metrics compared against a baseline: whether higher is better, and whether it's a tail latency
+_METRICS = ((u'throughput', True, False), (u'p50', False, False), (u'p99', False, True), (u'p999', False, True))
+
+
+def compare_results(results, baseline, tolerance=0.1, tail_tolerance=0.5):
+    """
+    Compare benchmark results against a baseline (previously saved results).
+
+    :param results: The results of :func:`run_benchmarks`.
+    :type results: dict
+    :param baseline: The baseline results.
+    :type baseline: dict
+    :param tolerance: The relative change of a metric tolerated before it's a regression.
+    :type tolerance: float
+    :param tail_tolerance: The same for tail latencies (p99 and p999), which vary much
+        more from run to run.
+    :type tail_tolerance: float
+
+    :returns: The comparisons (benchmark, metric, baseline value, value, relative change,
+        regressed), for the benchmarks in both.
+    :rtype: list of tuple
+    """
+    res = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        for metric, higher_is_better, tail in _METRICS:
+            base = baseline[key][metric]
+            value = results[key][metric]
+            change = (value - base) / base if base else 0.
+            if higher_is_better:
+                regressed = change < -tolerance
+            else:
+                regressed = change > (tail_tolerance if tail else tolerance)
+            res.append((key, metric, base, value, change, regressed))
+    return res
+
+
+def format_results(results, comparisons=None):
+    """
+    Format benchmark results (and comparisons) as a table.
+
+    :returns: The formatted lines.
+    :rtype: list of str
+    """
+    lines = [u'{:<88} {:>12} {:>10} {:>10} {:>10}'.format(u'benchmark', u'ops/s', u'p50 [ms]', u'p99 [ms]', u'p999 [ms]')]
+    for key in sorted(results):
+        r = results[key]
+        lines.append(u'{:<88} {:>12.1f} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+            key, r[u'throughput'], r[u'p50'] * 1000., r[u'p99'] * 1000., r[u'p999'] * 1000.))
+    if comparisons:
+        lines.append(u'')
+        lines.append(u'{:<88} {:>12} {:>12} {:>12} {:>8}'.format(u'benchmark', u'metric', u'baseline', u'current', u'change'))
+        for key, metric, base, value, change, regressed in comparisons:
+            if metric != u'throughput':
+                metric, base, value = u'{} [ms]'.format(metric), base * 1000., value * 1000.
+            lines.append(u'{:<88} {:>12} {:>12.3f} {:>12.3f} {:>+7.1f}%{}'.format(
+                key, metric, base, value, change * 100., u'  REGRESSION' if regressed else u''))
+    return lines
+
+
+def _parse_param(text):
+    key, value = text.split(u'=', 1)
+    try:
+        value = int(value)
+    except ValueError:
+        pass
+    return key, value
+
+
+@inlineCallbacks
+def _main(reactor, options):
+    params = dict(options.param or [])
+    results = yield run_benchmarks(reactor, options.scenario or sorted(SCENARIOS), transport=options.transport,
+                                   serializer=options.serializer, endpoint=options.endpoint, params=params,
+                                   repeat=options.repeat)
+
+    comparisons = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            comparisons = compare_results(results, json.load(f), options.tolerance, options.tail_tolerance)
+
+    for line in format_results(results, comparisons):
+        print(line)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if comparisons and any(c[5] for c in comparisons):
+        raise SystemExit(1)
+
+
+def main(argv=None):
+    """
+    Run WAMP routing benchmarks against an in-process router::
+
+        python -m crossbar.router.bench --transport websocket --serializer json --save baseline.json
+        python -m crossbar.router.bench --transport websocket --serializer json --baseline baseline.json
+
+    The exit code is 1 when a benchmark regressed against the baseline.
+    """
+    parser = argparse.ArgumentParser(description='Crossbar.io WAMP routing benchmarks')
+
+    parser.add_argument('--scenario',
+                        action='append',
+                        choices=sorted(SCENARIOS),
+                        help='Scenario to run (default: all). Can be given multiple times.')
+
+    parser.add_argument('--transport',
+                        default=u'rawsocket',
+                        choices=[u'websocket', u'rawsocket'],
+                        help='WAMP transport (default: rawsocket).')
+
+    parser.add_argument('--serializer',
+                        default=u'msgpack',
+                        choices=[u'json', u'msgpack', u'cbor'],
+                        help='WAMP serializer (default: msgpack).')
+
+    parser.add_argument('--endpoint',
+                        default=u'tcp',
+                        choices=[u'tcp', u'unix'],
+                        help='Connect over TCP loopback or a Unix domain socket (default: tcp).')
+
+    parser.add_argument('--param',
+                        action='append',
+                        type=_parse_param,
+                        help='Scenario parameter, e.g. "subscribers=100". Can be given multiple times.')
+
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=3,
+                        help='Run each benchmark this many times and report the medians (default: 3).')
+
+    parser.add_argument('--save',
+                        help='Save the results to this file (JSON), e.g. as a baseline.')
+
+    parser.add_argument('--baseline',
+                        help='Compare the results against the baseline in this file.')
+
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=0.1,
+                        help='Relative change of a metric tolerated before it is a regression (default: 0.1).')
+
+    parser.add_argument('--tail-tolerance',
+                        type=float,
+                        default=0.5,
+                        help='Relative change of p99/p999 latencies tolerated before it is a regression (default: 0.5).')
+
+    options = parser.parse_args(argv)
+
+    import txaio
+    txaio.use_twisted()
+
+    task.react(_main, (options,))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -132,6 +132,21 @@ class Broker(object):
         else:
             raise Exception("session with ID {} not attached".format(session._session_id))
 
+    def has_subscribers(self, topic):
+        """
+        Check if any session is subscribed to a topic (by any match policy).
+
+        :param topic: The topic URI.
+        :type topic: unicode
+
+        :returns: ``True`` if there are subscribers.
+        :rtype: bool
+        """
+        for subscription in self._subscription_map.match_observations(topic):
+            if subscription.observers:
+                return True
+        return False
+
     def processPublish(self, session, publish):
         """
         Implements :func:`crossbar.router.interfaces.IBroker.processPublish`
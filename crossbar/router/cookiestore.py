@@ -30,9 +30,17 @@
 
 import os
 import json
+import time
+import heapq
+import calendar
+import collections
 
 from six.moves import http_cookies
 
+from twisted.internet.defer import succeed
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThreadPool
+
 from autobahn import util
 
 from crossbar._logging import make_logger
@@ -43,9 +51,50 @@ __all__ = (
 )
 
 
+class _Cookie(object):
+    """
+    Tracking data of a cookie.
+    """
+
+    __slots__ = (
+        # UTC timestamp (ISO 8601) when the cookie was created
+        'created',
+
+        # maximum lifetime of the tracking/authenticating cookie
+        'max_age',
+
+        # Unix time when the cookie expires
+        'expires',
+
+        # when a cookie has been set, and the WAMP session
+        # was successfully authenticated thereafter, the latter
+        # auth info is store here
+        'authid',
+        'authrole',
+        'authmethod',
+
+        # set of WAMP transports (WebSocket connections) this
+        # cookie is currently used on (None when there are none)
+        'connections',
+    )
+
+    def __init__(self, created, max_age, expires, authid=None, authrole=None, authmethod=None):
+        self.created = created
+        self.max_age = max_age
+        self.expires = expires
+        self.authid = authid
+        self.authrole = authrole
+        self.authmethod = authmethod
+        self.connections = None
+
+
 class CookieStore(object):
     """
     Cookie store common base.
+
+    Cookies are dropped when expired (``max_age`` after creation) and not in use.
+    When a maximum number of entries is configured, unauthenticated cookies not in
+    use are evicted in least recently used order to make room for new cookies.
     """
 
     log = make_logger()
@@ -68,11 +117,122 @@ class CookieStore(object):
         # lifetime of the cookie in seconds (http://tools.ietf.org/html/rfc6265#page-20)
         self._cookie_max_age = int(config.get('max_age', 86400 * 7))
 
-        # transient cookie database
+        # maximum number of cookies in the store (0: unlimited)
+        self._max_entries = int(config.get('store', {}).get('max_entries', 0))
+
+        # transient cookie database: cookie ID -> _Cookie
         self._cookies = {}
 
+        # heap of (expires, cookie ID) for expiring cookies
+        self._expiry = []
+
+        # unauthenticated cookies in least recently used order
+        self._anonymous = collections.OrderedDict()
+
+        # counters
+        self._cnt_created = 0
+        self._cnt_expired = 0
+        self._cnt_evicted = 0
+
         self.log.debug("Cookie stored created with config {config}", config=config)
 
+    def _add(self, cbtid, cookie):
+        """
+        Add (or replace) a cookie in the store.
+        """
+        self._cookies[cbtid] = cookie
+
+        # entries of cookies dropped (or replaced) before they expired stay on
+        # the heap, so rebuild it before they outnumber the cookies
+        if len(self._expiry) > 2 * len(self._cookies) + 100:
+            self._rebuild_expiry()
+        heapq.heappush(self._expiry, (cookie.expires, cbtid))
+        if cookie.authid is None:
+            self._anonymous.pop(cbtid, None)
+            self._anonymous[cbtid] = None
+        else:
+            self._anonymous.pop(cbtid, None)
+
+    def _rebuild_expiry(self):
+        self._expiry = [(c.expires, id) for id, c in self._cookies.items()]
+        heapq.heapify(self._expiry)
+
+    def _remove(self, cbtid):
+        del self._cookies[cbtid]
+        self._anonymous.pop(cbtid, None)
+
+    def _touch(self, cbtid):
+        """
+        Mark an unauthenticated cookie as recently used.
+        """
+        if cbtid in self._anonymous:
+            del self._anonymous[cbtid]
+            self._anonymous[cbtid] = None
+
+    def _get(self, cbtid):
+        """
+        Get a cookie (or None), dropping it when expired and not in use.
+        """
+        cookie = self._cookies.get(cbtid, None)
+        if cookie is not None and cookie.expires <= time.time() and not cookie.connections:
+            self._remove(cbtid)
+            self._cnt_expired += 1
+            return None
+        return cookie
+
+    def expire(self, now=None):
+        """
+        Drop all expired cookies not in use.
+
+        :returns: The number of cookies dropped.
+        :rtype: int
+        """
+        if now is None:
+            now = time.time()
+        dropped = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, cbtid = heapq.heappop(self._expiry)
+            cookie = self._cookies.get(cbtid, None)
+
+            # skip stale heap entries, and keep cookies in use (these are dropped
+            # when their last connection goes away)
+            if cookie is not None and cookie.expires == expires and not cookie.connections:
+                self._remove(cbtid)
+                dropped += 1
+        self._cnt_expired += dropped
+        return dropped
+
+    def _evict(self):
+        """
+        Evict unauthenticated cookies not in use while the store is over its maximum size.
+        """
+        if self._max_entries and len(self._cookies) > self._max_entries:
+            in_use = []
+            while len(self._cookies) > self._max_entries and self._anonymous:
+                cbtid, _ = self._anonymous.popitem(last=False)
+                if self._cookies[cbtid].connections:
+                    in_use.append(cbtid)
+                else:
+                    del self._cookies[cbtid]
+                    self._cnt_evicted += 1
+            for cbtid in in_use:
+                self._anonymous[cbtid] = None
+
+    def stats(self):
+        """
+        Get cookie store statistics.
+
+        :returns: Store size and counters.
+        :rtype: dict
+        """
+        return {
+            u'size': len(self._cookies),
+            u'max_entries': self._max_entries,
+            u'created': self._cnt_created,
+            u'expired': self._cnt_expired,
+            u'evicted': self._cnt_evicted,
+        }
+
     def parse(self, headers):
         """
         Parse HTTP header for cookie. If cookie is found, return cookie ID,
@@ -90,7 +250,8 @@ class CookieStore(object):
             else:
                 if self._cookie_id_field in cookie:
                     cbtid = cookie[self._cookie_id_field].value
-                    if cbtid in self._cookies:
+                    if self._get(cbtid) is not None:
+                        self._touch(cbtid)
                         return cbtid
         return None
 
@@ -105,39 +266,25 @@ class CookieStore(object):
         cbtid = util.newid(self._cookie_id_field_length)
 
         # cookie tracking data
-        cbtData = {
-            # UTC timestamp when the cookie was created
-            'created': util.utcnow(),
-
-            # maximum lifetime of the tracking/authenticating cookie
-            'max_age': self._cookie_max_age,
-
-            # when a cookie has been set, and the WAMP session
-            # was successfully authenticated thereafter, the latter
-            # auth info is store here
-            'authid': None,
-            'authrole': None,
-            'authmethod': None,
-
-            # set of WAMP transports (WebSocket connections) this
-            # cookie is currently used on
-            'connections': set()
-        }
+        cookie = _Cookie(util.utcnow(), self._cookie_max_age, time.time() + self._cookie_max_age)
 
-        self._cookies[cbtid] = cbtData
+        self.expire()
+        self._add(cbtid, cookie)
+        self._cnt_created += 1
+        self._evict()
 
         self.log.debug("New cookie {cbtid} created", cbtid=cbtid)
 
         # do NOT add the "secure" cookie attribute! "secure" refers to the
         # scheme of the Web page that triggered the WS, not WS itself!!
         #
-        return cbtid, '%s=%s;max-age=%d' % (self._cookie_id_field, cbtid, cbtData['max_age'])
+        return cbtid, '%s=%s;max-age=%d' % (self._cookie_id_field, cbtid, cookie.max_age)
 
     def exists(self, cbtid):
         """
         Check if cookie with given ID exists.
         """
-        cookie_exists = cbtid in self._cookies
+        cookie_exists = self._get(cbtid) is not None
         self.log.debug("Cookie {cbtid} exists = {cookie_exists}", cbtid=cbtid, cookie_exists=cookie_exists)
         return cookie_exists
 
@@ -145,9 +292,9 @@ class CookieStore(object):
         """
         Return `(authid, authrole, authmethod)` triple given cookie ID.
         """
-        if cbtid in self._cookies:
-            c = self._cookies[cbtid]
-            cookie_auth_info = c['authid'], c['authrole'], c['authmethod']
+        c = self._get(cbtid)
+        if c is not None:
+            cookie_auth_info = c.authid, c.authrole, c.authmethod
         else:
             cookie_auth_info = None, None, None
 
@@ -159,11 +306,17 @@ class CookieStore(object):
         """
         Set `(authid, authrole, authmethod)` triple for given cookie ID.
         """
-        if cbtid in self._cookies:
-            c = self._cookies[cbtid]
-            c['authid'] = authid
-            c['authrole'] = authrole
-            c['authmethod'] = authmethod
+        c = self._get(cbtid)
+        if c is not None:
+            c.authid = authid
+            c.authrole = authrole
+            c.authmethod = authmethod
+
+            # only unauthenticated cookies are subject to eviction
+            if authid is None:
+                self._anonymous[cbtid] = None
+            else:
+                self._anonymous.pop(cbtid, None)
 
     def addProto(self, cbtid, proto):
         """
@@ -173,9 +326,13 @@ class CookieStore(object):
         """
         self.log.debug("Adding proto {proto} to cookie {cbtid}", proto=proto, cbtid=cbtid)
 
-        if cbtid in self._cookies:
-            self._cookies[cbtid]['connections'].add(proto)
-            return len(self._cookies[cbtid]['connections'])
+        c = self._get(cbtid)
+        if c is not None:
+            if c.connections is None:
+                c.connections = set()
+            c.connections.add(proto)
+            self._touch(cbtid)
+            return len(c.connections)
         else:
             return 0
 
@@ -189,9 +346,16 @@ class CookieStore(object):
 
         # remove this WebSocket connection from the set of connections
         # associated with the same cookie
-        if cbtid in self._cookies:
-            self._cookies[cbtid]['connections'].discard(proto)
-            return len(self._cookies[cbtid]['connections'])
+        c = self._cookies.get(cbtid, None)
+        if c is not None and c.connections:
+            c.connections.discard(proto)
+            if not c.connections:
+                c.connections = None
+
+                # drop the cookie now if it expired while in use
+                self._get(cbtid)
+                return 0
+            return len(c.connections)
         else:
             return 0
 
@@ -199,8 +363,9 @@ class CookieStore(object):
         """
         Get all WebSocket connections currently associated with the cookie.
         """
-        if cbtid in self._cookies:
-            return self._cookies[cbtid]['connections']
+        c = self._cookies.get(cbtid, None)
+        if c is not None and c.connections:
+            return c.connections
         else:
             return []
 
@@ -211,20 +376,47 @@ class CookieStoreMemoryBacked(CookieStore):
     """
 
 
+def _expires(created, max_age):
+    """
+    Get the expiration time (Unix time) of a cookie created at the given UTC timestamp (ISO 8601).
+    """
+    return calendar.timegm(time.strptime(created[:19], "%Y-%m-%dT%H:%M:%S")) + max_age
+
+
 class CookieStoreFileBacked(CookieStore):
     """
     A persistent, file-backed cookie store.
 
     This cookie store is backed by a file, which is written to in append-only mode.
-    Hence, the file is "growing forever". Whenever information attached to a cookie
-    is changed (such as a previously anonymous cookie is authenticated), a new cookie
-    record is appended. When the store is booting, the file is sequentially scanned.
-    The last record for a given cookie ID is remembered in memory.
+    Whenever information attached to a cookie is changed (such as a previously
+    anonymous cookie is authenticated), a new cookie record is appended. When the
+    store is booting, the file is sequentially scanned. The last record for a given
+    cookie ID is remembered in memory.
+
+    Appended records are group-committed: records are buffered for ``commit_interval``
+    seconds, and then written with one write and one ``fsync``.
+
+    The file is compacted (rewritten in the background with one record per live,
+    unexpired cookie) at startup and every ``compact_interval`` seconds when it
+    holds expired or superseded records. Hence, booting loads a compact snapshot
+    followed by a tail of records appended since the last compaction.
     """
 
-    def __init__(self, cookie_file_name, config):
+    def __init__(self, cookie_file_name, config, reactor=None):
         CookieStore.__init__(self, config)
 
+        if reactor is None:
+            from twisted.internet import reactor
+        self._reactor = reactor
+
+        store_config = config.get('store', {})
+
+        # buffer records for this many seconds before writing (0: write every record immediately)
+        self._commit_interval = store_config.get('commit_interval', 0.1)
+
+        # check whether the store needs compaction every this many seconds (0: only at startup)
+        self._compact_interval = store_config.get('compact_interval', 3600)
+
         self._cookie_file_name = cookie_file_name
 
         if not os.path.isfile(self._cookie_file_name):
@@ -234,41 +426,175 @@ class CookieStoreFileBacked(CookieStore):
 
         self._cookie_file = open(self._cookie_file_name, 'a')
 
+        # records waiting to be committed and the pending commit call
+        self._pending = []
+        self._commit_call = None
+
+        # number of records in the file
+        self._record_count = 0
+
+        # while compacting, the records committed meanwhile (to be appended to the compacted file)
+        self._compacting = None
+
         # initialize cookie database
         self._init_store()
 
+        self._shutdown_trigger = self._reactor.addSystemEventTrigger('before', 'shutdown', self.flush)
+
+        self._compact_loop = None
+        if self._compact_interval:
+            self._compact_loop = LoopingCall(self._maybe_compact)
+            self._compact_loop.clock = self._reactor
+            self._compact_loop.start(self._compact_interval, now=False)
+
+        self._maybe_compact()
+
     def _iter_persisted(self):
         with open(self._cookie_file_name, 'r') as f:
-            for c in f.readlines():
-                d = json.loads(c)
+            for line in f:
+                try:
+                    d = json.loads(line)
+                except ValueError:
+                    # a partially written record (e.g. when crashing while writing)
+                    self.log.warn("Skipping invalid cookie record in {filename}", filename=self._cookie_file_name)
+                    continue
+
+                # the timestamp of when the cookie was created is stored under
+                # "modified" in records for changed cookies
+                created = d['created'] if 'created' in d else d['modified']
 
                 # we do not persist the connections
-                # here make sure the cookie loaded has a
-                # default connections key to avoid key errors
-                # other keys that aren't persisted should be set here
-                d['connections'] = set()
+                cookie = _Cookie(created, d['max_age'], _expires(created, d['max_age']),
+                                 d['authid'], d['authrole'], d['authmethod'])
+
+                yield d['id'], cookie
 
-                yield d
+    def _record(self, id, c, status='created'):
+        return json.dumps({
+            'id': id, status: c.created, 'max_age': c.max_age,
+            'authid': c.authid, 'authrole': c.authrole,
+            'authmethod': c.authmethod
+        }) + '\n'
 
     def _persist(self, id, c, status='created'):
+        self._pending.append(self._record(id, c, status))
+
+        if not self._commit_interval:
+            self.flush()
+        elif self._commit_call is None:
+            self._commit_call = self._reactor.callLater(self._commit_interval, self.flush)
+
+    def flush(self):
+        """
+        Write (and fsync) all buffered cookie records.
+        """
+        if self._commit_call is not None:
+            if self._commit_call.active():
+                self._commit_call.cancel()
+            self._commit_call = None
+
+        if self._pending:
+            records, self._pending = self._pending, []
+
+            self._cookie_file.write(''.join(records))
+            self._cookie_file.flush()
+            os.fsync(self._cookie_file.fileno())
+            self._record_count += len(records)
+
+            if self._compacting is not None:
+                self._compacting.extend(records)
 
-        self._cookie_file.write(json.dumps({
-            'id': id, status: c['created'], 'max_age': c['max_age'],
-            'authid': c['authid'], 'authrole': c['authrole'],
-            'authmethod': c['authmethod']
-        }) + '\n')
-        self._cookie_file.flush()
-        os.fsync(self._cookie_file.fileno())
+            self.log.debug("Committed {cnt} cookie records", cnt=len(records))
 
     def _init_store(self):
         n = 0
-        for cookie in self._iter_persisted():
-            id = cookie.pop('id')
-            self._cookies[id] = cookie
+        now = time.time()
+        for id, cookie in self._iter_persisted():
+            if cookie.expires > now:
+                self._add(id, cookie)
+            elif id in self._cookies:
+                self._remove(id)
             n += 1
+        self._record_count = n
+
+        # the heap may hold many stale entries for cookies with more than one record
+        self._rebuild_expiry()
+        self._evict()
 
         self.log.info("Loaded {cnt_cookie_records} cookie records from file. Cookie store has {cnt_cookies} entries.", cnt_cookie_records=n, cnt_cookies=len(self._cookies))
 
+    def _maybe_compact(self):
+        self.expire()
+
+        if self._record_count > len(self._cookies):
+            return self.compact()
+        return succeed(None)
+
+    def compact(self):
+        """
+        Compact the cookie file in the background: the file is rewritten with one
+        record for each cookie in the store.
+
+        :returns: A Deferred that fires when compaction is done.
+        :rtype: instance of :tx:`twisted.internet.defer.Deferred`
+        """
+        if self._compacting is not None:
+            return succeed(None)
+
+        self.flush()
+
+        records = [self._record(id, c) for id, c in self._cookies.items()]
+        self._compacting = []
+
+        tmp_file_name = self._cookie_file_name + '.tmp'
+
+        def write_snapshot():
+            with open(tmp_file_name, 'w') as f:
+                f.write(''.join(records))
+                f.flush()
+                os.fsync(f.fileno())
+
+        def done(_):
+            tail, self._compacting = self._compacting, None
+
+            # records committed while writing the snapshot go after it
+            with open(tmp_file_name, 'a') as f:
+                f.write(''.join(tail))
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._cookie_file.close()
+            if os.name == 'nt':
+                # rename doesn't replace existing files on Windows
+                os.remove(self._cookie_file_name)
+            os.rename(tmp_file_name, self._cookie_file_name)
+            self._cookie_file = open(self._cookie_file_name, 'a')
+
+            self.log.info("Compacted cookie store file from {cnt_before} to {cnt_after} records",
+                          cnt_before=self._record_count, cnt_after=len(records) + len(tail))
+            self._record_count = len(records) + len(tail)
+
+        def failed(err):
+            self._compacting = None
+            if os.path.exists(tmp_file_name):
+                os.remove(tmp_file_name)
+            self.log.failure("Failed to compact cookie store file: {log_failure.value}", failure=err)
+
+        d = deferToThreadPool(self._reactor, self._reactor.getThreadPool(), write_snapshot)
+        d.addCallbacks(done, failed)
+        return d
+
+    def close(self):
+        """
+        Write all buffered cookie records and stop compaction.
+        """
+        self.flush()
+        if self._compact_loop is not None and self._compact_loop.running:
+            self._compact_loop.stop()
+        if self._shutdown_trigger is not None:
+            self._reactor.removeSystemEventTrigger(self._shutdown_trigger)
+            self._shutdown_trigger = None
+
     def create(self):
         cbtid, header = CookieStore.create(self)
 
@@ -287,6 +613,6 @@ class CookieStoreFileBacked(CookieStore):
             cookie = self._cookies[cbtid]
 
             # only set the changes and write them to the file if any of the values changed
-            if authid != cookie['authid'] or authrole != cookie['authrole'] or authmethod != cookie['authmethod']:
+            if authid != cookie.authid or authrole != cookie.authrole or authmethod != cookie.authmethod:
                 CookieStore.setAuth(self, cbtid, authid, authrole, authmethod)
                 self._persist(cbtid, cookie, status='modified')
@@ -31,12 +31,14 @@
 from __future__ import absolute_import
 
 import json
+import math
 import binascii
 
 from collections import deque
 
 import six
 
+from twisted.internet.task import LoopingCall
 from twisted.web.resource import Resource, NoResource
 
 # Each of the following 2 trigger a reactor import at module level
@@ -56,12 +58,97 @@ __all__ = (
     'WampLongPollResource',
 )
 
+# policies for a receive queue exceeding its limits
+QUEUE_DROP_POLICIES = (u'kill', u'drop_oldest', u'drop_newest')
+
+
+class TimerWheel(object):
+    """
+    A hashed timer wheel: timers are kept in a ring of slots (one slot per
+    tick), and a single periodic call fires the timers of the current slot.
+
+    The periodic call only runs while timers are pending. Delays beyond the
+    wheel's span are capped to the span, so callbacks for long delays should
+    check and reschedule themselves.
+    """
+
+    def __init__(self, reactor, tick=1., slots=64):
+        """
+
+        :param reactor: The Twisted reactor (or clock) to run under.
+        :type reactor: obj
+        :param tick: The timer resolution in seconds.
+        :type tick: float
+        :param slots: The number of slots in the wheel.
+        :type slots: int
+        """
+        self._tick = tick
+        self._slots = [{} for _ in range(slots)]
+        self._position = 0
+        self._index = {}
+
+        self._loop = LoopingCall.withCount(self._advance)
+        self._loop.clock = reactor
+
+    def __len__(self):
+        return len(self._index)
+
+    def schedule(self, key, delay, callback):
+        """
+        Schedule (or reschedule) a timer.
+
+        :param key: The key identifying the timer.
+        :type key: obj
+        :param delay: Delay in seconds after which to fire the timer.
+        :type delay: float
+        :param callback: The callable to fire (without arguments).
+        :type callback: callable
+        """
+        self.cancel(key)
+
+        offset = min(max(1, int(math.ceil(float(delay) / self._tick))), len(self._slots) - 1)
+        slot = (self._position + offset) % len(self._slots)
+        self._slots[slot][key] = callback
+        self._index[key] = slot
+
+        if not self._loop.running:
+            self._loop.start(self._tick, now=False)
+
+    def cancel(self, key):
+        """
+        Cancel a timer (if scheduled).
+
+        :param key: The key identifying the timer.
+        :type key: obj
+        """
+        slot = self._index.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+            if not self._index and self._loop.running:
+                self._loop.stop()
+
+    def _advance(self, ticks):
+        # when the reactor was blocked, more than one tick may have elapsed
+        for _ in range(min(ticks, len(self._slots))):
+            self._position = (self._position + 1) % len(self._slots)
+            due, self._slots[self._position] = self._slots[self._position], {}
+            for key, callback in due.items():
+                del self._index[key]
+                try:
+                    callback()
+                except Exception:
+                    WampLongPollResource.log.failure()
+        if not self._index and self._loop.running:
+            self._loop.stop()
+
 
 class WampLongPollResourceSessionSend(Resource):
     """
     A Web resource for sending via XHR that is part of :class:`autobahn.twisted.longpoll.WampLongPollResourceSession`.
     """
 
+    log = make_logger()
+
     def __init__(self, parent):
         """
 
@@ -93,7 +180,7 @@ class WampLongPollResourceSessionSend(Resource):
         else:
             request.setResponseCode(http.NO_CONTENT)
             self._parent._parent._setStandardHeaders(request)
-            self._parent._isalive = True
+            self._parent._touch()
             return b""
 
 
@@ -115,25 +202,45 @@ class WampLongPollResourceSessionReceive(Resource):
         self.reactor = self._parent._parent.reactor
 
         self._queue = deque()
+        self._queue_bytes = 0
         self._request = None
         self._killed = False
 
-        # FIXME: can we read the loglevel from self.log currently set?
-        if False:
-            def logqueue():
-                if not self._killed:
-                    self.log.debug("WampLongPoll: transport '{0}' - currently polled {1}, pending messages {2}".format(self._parent._transport_id, self._request is not None, len(self._queue)))
-                    self.reactor.callLater(1, logqueue)
-            logqueue()
+        # number of messages dropped because the queue was full
+        self.dropped = 0
 
     def queue(self, data):
         """
         Enqueue data to be received by client.
 
+        When the queue is full (exceeds the queue limits of the long-poll
+        resource), the drop policy of the resource applies: the transport
+        is killed, or the oldest or newest message is dropped.
+
         :param data: The data to be received by the client.
         :type data: bytes
         """
+        resource = self._parent._parent
+        if (resource._queueLimitMessages and len(self._queue) >= resource._queueLimitMessages) or \
+           (resource._queueLimitBytes and self._queue_bytes + len(data) > resource._queueLimitBytes):
+
+            if resource._queueDropPolicy == u'drop_newest':
+                self.dropped += 1
+                return
+
+            elif resource._queueDropPolicy == u'drop_oldest':
+                while self._queue and ((resource._queueLimitMessages and len(self._queue) >= resource._queueLimitMessages) or
+                                       (resource._queueLimitBytes and self._queue_bytes + len(data) > resource._queueLimitBytes)):
+                    self._queue_bytes -= len(self._queue.popleft())
+                    self.dropped += 1
+
+            else:
+                self.log.debug("WampLongPoll: killing transport '{0}' - receive queue limits exceeded ({1} messages, {2} bytes pending)".format(self._parent._transport_id, len(self._queue), self._queue_bytes))
+                self._parent._kill(u"receive queue limits exceeded")
+                return
+
         self._queue.append(data)
+        self._queue_bytes += len(data)
         self._trigger()
 
     def _kill(self):
@@ -143,6 +250,8 @@ class WampLongPollResourceSessionReceive(Resource):
         if self._request:
             self._request.finish()
             self._request = None
+        self._queue.clear()
+        self._queue_bytes = 0
         self._killed = True
 
     def _trigger(self):
@@ -151,14 +260,16 @@ class WampLongPollResourceSessionReceive(Resource):
         """
         if self._request and len(self._queue):
 
-            if self._parent._serializer._serializer._batched:
-                # in batched mode, write all pending messages
-                while len(self._queue) > 0:
-                    msg = self._queue.popleft()
-                    self._request.write(msg)
+            if self._parent._batched:
+                # in batched mode, write all pending messages (framed by the serializer) at once
+                msgs = b''.join(self._queue)
+                self._queue.clear()
+                self._queue_bytes = 0
+                self._request.write(msgs)
             else:
                 # in unbatched mode, only write 1 pending message
                 msg = self._queue.popleft()
+                self._queue_bytes -= len(msg)
                 if type(msg) == six.binary_type:
                     self._request.write(msg)
                 else:
@@ -190,7 +301,7 @@ class WampLongPollResourceSessionReceive(Resource):
 
         request.notifyFinish().addErrback(cancel)
 
-        self._parent._isalive = True
+        self._parent._touch()
         self._trigger()
 
         return NOT_DONE_YET
@@ -201,6 +312,8 @@ class WampLongPollResourceSessionClose(Resource):
     A Web resource for closing the Long-poll session WampLongPollResourceSession.
     """
 
+    log = make_logger()
+
     def __init__(self, parent):
         """
 
@@ -254,6 +367,15 @@ class WampLongPollResourceSession(Resource):
         self._serializer = transport_details['serializer']
         self._session = None
 
+        # when receiving in batches, queued messages are serialized (and framed) by
+        # the batched variant of the serializer, so a poll can drain all of them. messages
+        # sent by the client are still unserialized by the serializer negotiated
+        self._send_serializer = self._serializer
+        self._batched = self._serializer._serializer._batched
+        if transport_details.get('batched_receive', False) and not self._batched:
+            self._send_serializer = self._serializer.__class__(batched=True)
+            self._batched = True
+
         # session authentication information
         #
         self._authid = None
@@ -269,27 +391,13 @@ class WampLongPollResourceSession(Resource):
         self.putChild(b"receive", self._receive)
         self.putChild(b"close", self._close)
 
-        self._isalive = False
+        self._last_activity = self.reactor.seconds()
 
-        # kill inactive sessions after this timeout
+        # kill inactive sessions after this timeout (the timers of all transports
+        # of the resource are kept on one timer wheel)
         #
-        killAfter = self._parent._killAfter
-        if killAfter > 0:
-            def killIfDead():
-                if not self._isalive:
-                    self.log.debug("WampLongPoll: killing inactive WAMP session with transport '{0}'".format(self._transport_id))
-
-                    self.onClose(False, 5000, "session inactive")
-                    self._receive._kill()
-                    if self._transport_id in self._parent._transports:
-                        del self._parent._transports[self._transport_id]
-                else:
-                    self.log.debug("WampLongPoll: transport '{0}' is still alive".format(self._transport_id))
-
-                    self._isalive = False
-                    self.reactor.callLater(killAfter, killIfDead)
-
-            self.reactor.callLater(killAfter, killIfDead)
+        if self._parent._killAfter > 0:
+            self._parent._reaper.schedule(self._transport_id, self._parent._killAfter, self._killIfDead)
         else:
             self.log.debug("WampLongPoll: transport '{0}' automatic killing of inactive session disabled".format(self._transport_id))
 
@@ -297,14 +405,43 @@ class WampLongPollResourceSession(Resource):
 
         self.onOpen()
 
+    def _touch(self):
+        """
+        Mark the transport as active (and hence alive).
+        """
+        self._last_activity = self.reactor.seconds()
+
+    def _killIfDead(self):
+        """
+        Kill the transport if it has been inactive for the kill timeout, or
+        reschedule the check for when it would be.
+        """
+        idle = self.reactor.seconds() - self._last_activity
+        if idle >= self._parent._killAfter:
+            self.log.debug("WampLongPoll: killing inactive WAMP session with transport '{0}'".format(self._transport_id))
+            self._kill(u"session inactive")
+        else:
+            self._parent._reaper.schedule(self._transport_id, self._parent._killAfter - idle, self._killIfDead)
+
+    def _kill(self, reason):
+        """
+        Kill the transport (not cleanly).
+        """
+        self.onClose(False, 5000, reason)
+        self._cleanup()
+
+    def _cleanup(self):
+        self._receive._kill()
+        self._parent._reaper.cancel(self._transport_id)
+        self._parent._transports.pop(self._transport_id, None)
+
     def close(self):
         """
         Implements :func:`autobahn.wamp.interfaces.ITransport.close`
         """
         if self.isOpen():
             self.onClose(True, 1000, u"session closed")
-            self._receive._kill()
-            del self._parent._transports[self._transport_id]
+            self._cleanup()
         else:
             raise TransportLost()
 
@@ -314,8 +451,7 @@ class WampLongPollResourceSession(Resource):
         """
         if self.isOpen():
             self.onClose(True, 1000, u"session aborted")
-            self._receive._kill()
-            del self._parent._transports[self._transport_id]
+            self._cleanup()
         else:
             raise TransportLost()
 
@@ -359,7 +495,7 @@ class WampLongPollResourceSession(Resource):
         if self.isOpen():
             try:
                 self.log.debug("WampLongPoll: TX {0}".format(msg))
-                payload, isBinary = self._serializer.serialize(msg)
+                payload, isBinary = self._send_serializer.serialize(msg)
             except Exception as e:
                 # all exceptions raised from above should be serialization errors ..
                 raise SerializationError("unable to serialize WAMP application payload ({0})".format(e))
@@ -380,6 +516,8 @@ class WampLongPollResourceOpen(Resource):
     A Web resource for creating new WAMP sessions.
     """
 
+    log = make_logger()
+
     def __init__(self, parent):
         """
 
@@ -420,7 +558,7 @@ class WampLongPollResourceOpen(Resource):
                 break
 
         if protocol is None:
-            return self.__failRequest(request, "no common protocol to speak (I speak: {0})".format(["wamp.2.{0}".format(s) for s in self._parent._serializers.keys()]))
+            return self._parent._failRequest(request, "no common protocol to speak (I speak: {0})".format(["wamp.2.{0}".format(s) for s in self._parent._serializers.keys()]))
 
         # make up new transport ID
         #
@@ -444,7 +582,8 @@ class WampLongPollResourceOpen(Resource):
             u'protocol': protocol,
             u'peer': request.getClientIP(),
             u'http_headers_received': http_headers_received,
-            u'http_headers_sent': None
+            u'http_headers_sent': None,
+            u'batched_receive': bool(options.get(u'batched_receive', False))
         }
 
         # create instance of WampLongPollResourceSession or subclass thereof ..
@@ -460,6 +599,8 @@ class WampLongPollResourceOpen(Resource):
             u'transport': transport,
             u'protocol': protocol
         }
+        if transport_details[u'batched_receive']:
+            result[u'batched_receive'] = True
 
         payload = json.dumps(result)
 
@@ -498,8 +639,9 @@ class WampLongPollResource(Resource):
                  serializers=None,
                  timeout=10,
                  killAfter=30,
-                 queueLimitBytes=128 * 1024,
-                 queueLimitMessages=100,
+                 queueLimitBytes=0,
+                 queueLimitMessages=0,
+                 queueDropPolicy=u'kill',
                  debug=False,
                  debug_transport_id=None,
                  reactor=None):
@@ -514,10 +656,15 @@ class WampLongPollResource(Resource):
         :type timeout: int
         :param killAfter: Kill WAMP session after inactivity in seconds.
         :type killAfter: int
-        :param queueLimitBytes: Kill WAMP session after accumulation of this many bytes in send queue (XHR poll).
+        :param queueLimitBytes: Kill WAMP session after accumulation of this many bytes in send queue (XHR poll),
+            ``0`` for no limit.
         :type queueLimitBytes: int
-        :param queueLimitMessages: Kill WAMP session after accumulation of this many message in send queue (XHR poll).
+        :param queueLimitMessages: Kill WAMP session after accumulation of this many message in send queue (XHR poll),
+            ``0`` for no limit.
         :type queueLimitMessages: int
+        :param queueDropPolicy: What to do when a send queue exceeds its limits: ``u'kill'`` the WAMP session,
+            or drop the oldest (``u'drop_oldest'``) or newest (``u'drop_newest'``) messages.
+        :type queueDropPolicy: unicode
         :param debug: Enable debug logging.
         :type debug: bool
         :param debug_transport_id: If given, use this fixed transport ID.
@@ -542,6 +689,13 @@ class WampLongPollResource(Resource):
         self._queueLimitBytes = queueLimitBytes
         self._queueLimitMessages = queueLimitMessages
 
+        if queueDropPolicy not in QUEUE_DROP_POLICIES:
+            raise Exception("invalid queue drop policy '{0}'".format(queueDropPolicy))
+        self._queueDropPolicy = queueDropPolicy
+
+        # one timer wheel (with 1s resolution) for reaping inactive transports
+        self._reaper = TimerWheel(self.reactor, tick=1., slots=min(max(killAfter, 0), 3600) + 2)
+
         if serializers is None:
             serializers = []
 
@@ -31,6 +31,7 @@
 from __future__ import absolute_import
 
 import os
+import socket
 
 from twisted.python.failure import Failure
 
@@ -41,6 +42,7 @@ from autobahn.websocket.compress import *  # noqa
 import crossbar
 
 from crossbar.router.cookiestore import CookieStoreMemoryBacked, CookieStoreFileBacked
+from crossbar.router.admission import HandshakeAdmission
 from crossbar._logging import make_logger
 
 log = make_logger()
@@ -395,10 +397,69 @@ class WampWebSocketServerFactory(websocket.WampWebSocketServerFactory):
         else:
             self._cookiestore = None
 
+        # handshake admission control
+        if 'admission' in config:
+            self._admission = HandshakeAdmission.from_config(config['admission'])
+        else:
+            self._admission = None
+
         # set WebSocket options
         set_websocket_options(self, options)
 
 
+def _create_serializer(serid):
+    """
+    Create a WAMP serializer for use on a RawSocket transport.
+
+    :param serid: The serializer, one of ``"json"``, ``"msgpack"`` or ``"cbor"``.
+    :type serid: str
+    """
+    if serid == 'json':
+        # try JSON WAMP serializer
+        try:
+            from autobahn.wamp.serializer import JsonSerializer
+            return JsonSerializer()
+        except ImportError:
+            raise Exception("could not load WAMP-JSON serializer")
+
+    elif serid == 'msgpack':
+        # try MsgPack WAMP serializer
+        try:
+            from autobahn.wamp.serializer import MsgPackSerializer
+            serializer = MsgPackSerializer()
+            serializer._serializer.ENABLE_V5 = False  # FIXME
+            return serializer
+        except ImportError:
+            raise Exception("could not load WAMP-MsgPack serializer")
+
+    elif serid == 'cbor':
+        # try CBOR WAMP serializer
+        try:
+            from autobahn.wamp.serializer import CBORSerializer
+            return CBORSerializer()
+        except ImportError:
+            raise Exception("could not load WAMP-CBOR serializer")
+
+    else:
+        raise Exception("invalid WAMP serializer '{}'".format(serid))
+
+
+def _set_buffer_size(transport, size):
+    """
+    Set the socket send and receive buffers, and the read chunk size of a
+    transport, so bursts of messages (e.g. between workers on the same host
+    over Unix domain sockets) are moved with fewer system calls.
+    """
+    transport.bufferSize = size
+    sock = getattr(transport, 'socket', None)
+    if sock is not None:
+        for option in [socket.SO_RCVBUF, socket.SO_SNDBUF]:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, option, size)
+            except socket.error as e:
+                log.warn("Could not set socket buffer size to {size} bytes: {error}", size=size, error=e)
+
+
 class WampRawSocketServerProtocol(rawsocket.WampRawSocketServerProtocol):
 
     """
@@ -409,6 +470,9 @@ class WampRawSocketServerProtocol(rawsocket.WampRawSocketServerProtocol):
     def connectionMade(self):
         rawsocket.WampRawSocketServerProtocol.connectionMade(self)
 
+        if self.factory._buffer_size:
+            _set_buffer_size(self.transport, self.factory._buffer_size)
+
         # transport authentication
         #
         self._authid = None
@@ -450,6 +514,13 @@ class WampRawSocketServerFactory(rawsocket.WampRawSocketServerFactory):
         #
         self._config = config
 
+        # handshake admission control
+        #
+        if 'admission' in config:
+            self._admission = HandshakeAdmission.from_config(config['admission'])
+        else:
+            self._admission = None
+
         # explicit list of WAMP serializers
         #
         if 'serializers' in config:
@@ -501,6 +572,10 @@ class WampRawSocketServerFactory(rawsocket.WampRawSocketServerFactory):
         #
         self._max_message_size = config.get('max_message_size', 128 * 1024)  # default is 128kB
 
+        # socket buffer and read size (default: system defaults)
+        #
+        self._buffer_size = config.get('buffer_size', None)
+
         rawsocket.WampRawSocketServerFactory.__init__(self, factory, serializers)
 
         self.log.debug("RawSocket transport factory created using {serializers} serializers, max. message size {maxsize}",
@@ -539,6 +614,13 @@ class WampRawSocketClientProtocol(rawsocket.WampRawSocketClientProtocol):
     Crossbar.io WAMP-over-RawSocket client protocol.
     """
 
+    def connectionMade(self):
+        rawsocket.WampRawSocketClientProtocol.connectionMade(self)
+
+        buffer_size = self.factory._config.get('buffer_size', None)
+        if buffer_size:
+            _set_buffer_size(self.transport, buffer_size)
+
 
 class WampRawSocketClientFactory(rawsocket.WampRawSocketClientFactory):
 
@@ -557,24 +639,6 @@ class WampRawSocketClientFactory(rawsocket.WampRawSocketClientFactory):
         #
         serid = config.get('serializer', 'msgpack')
 
-        if serid == 'json':
-            # try JSON WAMP serializer
-            try:
-                from autobahn.wamp.serializer import JsonSerializer
-                serializer = JsonSerializer()
-            except ImportError:
-                raise Exception("could not load WAMP-JSON serializer")
-
-        elif serid == 'msgpack':
-            # try MsgPack WAMP serializer
-            try:
-                from autobahn.wamp.serializer import MsgPackSerializer
-                serializer = MsgPackSerializer()
-                serializer._serializer.ENABLE_V5 = False  # FIXME
-            except ImportError:
-                raise Exception("could not load WAMP-MsgPack serializer")
-
-        else:
-            raise Exception("invalid WAMP serializer '{}'".format(serid))
+        serializer = _create_serializer(serid)
 
         rawsocket.WampRawSocketClientFactory.__init__(self, factory, serializer)
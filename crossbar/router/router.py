@@ -32,6 +32,8 @@ from __future__ import absolute_import, division, print_function
 
 import six
 
+from bisect import bisect_right
+
 from autobahn.wamp import message
 from autobahn.wamp.exception import ProtocolError
 
@@ -39,6 +41,7 @@ from crossbar.router import RouterOptions, RouterAction
 from crossbar.router.realmstore import HAS_LMDB, LmdbRealmStore, MemoryRealmStore
 from crossbar.router.broker import Broker
 from crossbar.router.dealer import Dealer
+from crossbar.router.schema import SchemaIndex
 from crossbar.router.role import RouterRole, \
     RouterTrustedRole, RouterRoleStaticAuth, \
     RouterRoleDynamicAuth
@@ -95,9 +98,25 @@ class Router(object):
         self._trace_traffic_roles_include = None
         self._trace_traffic_roles_exclude = [u'trusted']
 
+        # compiled schemas for validating application payloads
+        self._schemas = SchemaIndex()
+        self._validate = realm.config.get('validate', False)
+
         # map: session_id -> session
         self._session_id_to_session = {}
 
+        # attach sequence numbers of client sessions, ascending (may contain
+        # sequence numbers of detached sessions, which are compacted lazily)
+        self._session_seq = 0
+        self._session_order = []
+
+        # map: attach sequence number -> session, and: session_id -> attach sequence number
+        self._seq_to_session = {}
+        self._session_id_to_seq = {}
+
+        # map: authrole -> number of client sessions attached
+        self._authrole_session_count = {}
+
         self._broker = self.broker(self, self._options)
         self._dealer = self.dealer(self, self._options)
         self._attached = 0
@@ -113,6 +132,14 @@ class Router(object):
         if session._session_id not in self._session_id_to_session:
             if _is_client_session(session):
                 self._session_id_to_session[session._session_id] = session
+
+                self._session_seq += 1
+                self._session_order.append(self._session_seq)
+                self._seq_to_session[self._session_seq] = session
+                self._session_id_to_seq[session._session_id] = self._session_seq
+
+                count = self._authrole_session_count
+                count[session._authrole] = count.get(session._authrole, 0) + 1
             else:
                 self.log.debug("attaching non-client session {session}",
                                session=session)
@@ -135,6 +162,15 @@ class Router(object):
 
         if session._session_id in self._session_id_to_session:
             del self._session_id_to_session[session._session_id]
+
+            del self._seq_to_session[self._session_id_to_seq.pop(session._session_id)]
+            if len(self._session_order) > 2 * len(self._seq_to_session) + 1000:
+                self._session_order = [seq for seq in self._session_order if seq in self._seq_to_session]
+
+            count = self._authrole_session_count
+            count[session._authrole] -= 1
+            if not count[session._authrole]:
+                del count[session._authrole]
         else:
             if _is_client_session(session):
                 raise Exception("session with ID {} not attached".format(session._session_id))
@@ -143,6 +179,36 @@ class Router(object):
         if not self._attached:
             self._factory.onLastDetach(self)
 
+    def iter_sessions(self, after=None):
+        """
+        Iterate over the client sessions attached, in the order they attached.
+
+        :param after: If given, start after the session with this attach sequence number.
+        :type after: int or None
+
+        :returns: Generator of pairs (attach sequence number, session).
+        :rtype: generator
+        """
+        order = self._session_order
+        i = bisect_right(order, after) if after is not None else 0
+        while i < len(order):
+            session = self._seq_to_session.get(order[i], None)
+            if session is not None:
+                yield order[i], session
+            i += 1
+
+    def has_subscribers(self, topic):
+        """
+        Check if any session is subscribed to a topic on this router.
+
+        :param topic: The topic URI.
+        :type topic: unicode
+
+        :returns: ``True`` if there are subscribers.
+        :rtype: bool
+        """
+        return self._broker.has_subscribers(topic)
+
     def _check_trace(self, session, msg):
         if not self._trace_traffic:
             return False
@@ -270,8 +336,10 @@ class Router(object):
         """
         Implements :func:`autobahn.wamp.interfaces.IRouter.validate`
         """
-        self.log.debug("Validate '{payload_type}' for '{uri}'",
-                       payload_type=payload_type, uri=uri, cb_level="trace")
+        if self._validate:
+            self.log.debug("Validate '{payload_type}' for '{uri}'",
+                           payload_type=payload_type, uri=uri, cb_level="trace")
+            self._schemas.validate(payload_type, uri, args, kwargs)
 
 
 class RouterFactory(object):
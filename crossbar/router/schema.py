@@ -0,0 +1,375 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import re
+
+import six
+
+from crossbar._logging import make_logger
+
+__all__ = (
+    'SchemaIndex',
+    'InvalidSchema',
+    'InvalidPayload',
+    'compile_schema',
+)
+
+
+class InvalidSchema(Exception):
+    """
+    A schema uses an unsupported or malformed construct.
+    """
+
+
+class InvalidPayload(Exception):
+    """
+    An application payload does not conform to its schema.
+    """
+
+
+_TYPES = {
+    u'null': lambda value: value is None,
+    u'boolean': lambda value: type(value) == bool,
+    u'integer': lambda value: isinstance(value, six.integer_types) and type(value) != bool,
+    u'number': lambda value: isinstance(value, six.integer_types + (float,)) and type(value) != bool,
+    u'string': lambda value: isinstance(value, six.string_types),
+    u'array': lambda value: isinstance(value, (list, tuple)),
+    u'object': lambda value: isinstance(value, dict),
+}
+
+
+def _all(checks):
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(value, path):
+        for c in checks:
+            c(value, path)
+    return check
+
+
+def compile_schema(schema, path=u'$'):
+    """
+    Compile a (JSON Schema like) schema into a validator, which is a callable
+    ``validator(value, path)`` raising :class:`InvalidPayload`.
+
+    Supported are ``type``, ``enum``, ``minimum``, ``maximum``, ``minLength``,
+    ``maxLength``, ``pattern``, ``items`` (a schema for all items, or a list of
+    schemas for positional items), ``additionalItems``, ``minItems``, ``maxItems``,
+    ``properties``, ``required`` and ``additionalProperties``. Other attributes
+    (like ``title`` or ``description``) are ignored.
+
+    :param schema: The schema to compile.
+    :type schema: dict
+    :param path: Path of the schema within the enclosing schema (for error messages).
+    :type path: unicode
+
+    :returns: The validator, or ``None`` when the schema accepts any value.
+    :rtype: callable or None
+    """
+    if not isinstance(schema, dict):
+        raise InvalidSchema(u"{}: schema must be a dict, not {}".format(path, type(schema)))
+
+    checks = []
+
+    if u'type' in schema:
+        types = schema[u'type']
+        if isinstance(types, six.string_types):
+            types = [types]
+        for t in types:
+            if t not in _TYPES:
+                raise InvalidSchema(u"{}: unknown type '{}'".format(path, t))
+        type_checks = [_TYPES[t] for t in types]
+
+        def check_type(value, path):
+            for type_check in type_checks:
+                if type_check(value):
+                    return
+            raise InvalidPayload(u"{}: expected {}, got {}".format(path, u' or '.join(types), type(value).__name__))
+        checks.append(check_type)
+
+    if u'enum' in schema:
+        enum = schema[u'enum']
+
+        def check_enum(value, path):
+            if value not in enum:
+                raise InvalidPayload(u"{}: value {!r} not one of {!r}".format(path, value, enum))
+        checks.append(check_enum)
+
+    number = _TYPES[u'number']
+    if u'minimum' in schema:
+        minimum = schema[u'minimum']
+
+        def check_minimum(value, path):
+            if number(value) and value < minimum:
+                raise InvalidPayload(u"{}: value {} is less than {}".format(path, value, minimum))
+        checks.append(check_minimum)
+
+    if u'maximum' in schema:
+        maximum = schema[u'maximum']
+
+        def check_maximum(value, path):
+            if number(value) and value > maximum:
+                raise InvalidPayload(u"{}: value {} is greater than {}".format(path, value, maximum))
+        checks.append(check_maximum)
+
+    string = _TYPES[u'string']
+    if u'minLength' in schema or u'maxLength' in schema:
+        min_length = schema.get(u'minLength', 0)
+        max_length = schema.get(u'maxLength', None)
+
+        def check_length(value, path):
+            if string(value) and (len(value) < min_length or (max_length is not None and len(value) > max_length)):
+                raise InvalidPayload(u"{}: string length {} out of range".format(path, len(value)))
+        checks.append(check_length)
+
+    if u'pattern' in schema:
+        try:
+            pattern = re.compile(schema[u'pattern'])
+        except re.error as e:
+            raise InvalidSchema(u"{}: invalid pattern: {}".format(path, e))
+
+        def check_pattern(value, path):
+            if string(value) and not pattern.search(value):
+                raise InvalidPayload(u"{}: string does not match pattern '{}'".format(path, pattern.pattern))
+        checks.append(check_pattern)
+
+    array = _TYPES[u'array']
+    if u'minItems' in schema or u'maxItems' in schema:
+        min_items = schema.get(u'minItems', 0)
+        max_items = schema.get(u'maxItems', None)
+
+        def check_count(value, path):
+            if array(value) and (len(value) < min_items or (max_items is not None and len(value) > max_items)):
+                raise InvalidPayload(u"{}: {} items out of range".format(path, len(value)))
+        checks.append(check_count)
+
+    if u'items' in schema:
+        items = schema[u'items']
+        if isinstance(items, list):
+            item_checks = [compile_schema(item, u'{}[{}]'.format(path, i)) for i, item in enumerate(items)]
+            additional = schema.get(u'additionalItems', True)
+            if isinstance(additional, dict):
+                additional = compile_schema(additional, u'{}[]'.format(path)) or True
+
+            def check_items(value, path):
+                if not array(value):
+                    return
+                for i, item in enumerate(value):
+                    if i < len(item_checks):
+                        if item_checks[i]:
+                            item_checks[i](item, u'{}[{}]'.format(path, i))
+                    elif additional is False:
+                        raise InvalidPayload(u"{}: at most {} items allowed".format(path, len(item_checks)))
+                    elif additional is not True:
+                        additional(item, u'{}[{}]'.format(path, i))
+            checks.append(check_items)
+        else:
+            item_check = compile_schema(items, u'{}[]'.format(path))
+            if item_check:
+                def check_items(value, path):
+                    if array(value):
+                        for i, item in enumerate(value):
+                            item_check(item, u'{}[{}]'.format(path, i))
+                checks.append(check_items)
+
+    obj = _TYPES[u'object']
+    if u'required' in schema:
+        required = schema[u'required']
+
+        def check_required(value, path):
+            if obj(value):
+                for k in required:
+                    if k not in value:
+                        raise InvalidPayload(u"{}: missing required property '{}'".format(path, k))
+        checks.append(check_required)
+
+    if u'properties' in schema or u'additionalProperties' in schema:
+        properties = {}
+        for k, v in schema.get(u'properties', {}).items():
+            properties[k] = compile_schema(v, u'{}.{}'.format(path, k))
+        additional = schema.get(u'additionalProperties', True)
+        if isinstance(additional, dict):
+            additional = compile_schema(additional, u'{}.*'.format(path)) or True
+
+        def check_properties(value, path):
+            if not obj(value):
+                return
+            for k, v in value.items():
+                if k in properties:
+                    if properties[k]:
+                        properties[k](v, u'{}.{}'.format(path, k))
+                elif additional is False:
+                    raise InvalidPayload(u"{}: unexpected property '{}'".format(path, k))
+                elif additional is not True:
+                    additional(v, u'{}.{}'.format(path, k))
+        checks.append(check_properties)
+
+    return _all(checks)
+
+
+# the parts of a schema declaration that apply to a payload type
+_PAYLOAD_SCHEMAS = {
+    u'event': lambda decl: decl,
+    u'call': lambda decl: decl,
+    u'call_result': lambda decl: decl.get(u'result', None),
+    u'call_error': lambda decl: decl.get(u'error', None),
+}
+
+
+def _compile_declaration(decl):
+    """
+    Compile a WAMP schema declaration into a map: payload type -> (args validator,
+    kwargs validator), leaving out payload types without validators.
+    """
+    if not isinstance(decl, dict):
+        raise InvalidSchema(u"schema declaration must be a dict, not {}".format(type(decl)))
+    validators = {}
+    for payload_type, get in _PAYLOAD_SCHEMAS.items():
+        schema = get(decl)
+        if schema:
+            args = compile_schema(schema[u'args'], u'args') if u'args' in schema else None
+            kwargs = compile_schema(schema[u'kwargs'], u'kwargs') if u'kwargs' in schema else None
+            if args or kwargs:
+                validators[payload_type] = (args, kwargs)
+    return validators
+
+
+class SchemaIndex(object):
+    """
+    Index of compiled WAMP schema declarations of a realm.
+
+    Declarations are compiled into validators once, when defined. A declaration
+    applies to the URI it is defined for, or (with ``"match": "prefix"``) to all
+    URIs starting with the URI, where the longest matching prefix wins. Validating
+    a payload for a URI without a declaration costs a dictionary lookup.
+    """
+
+    log = make_logger()
+
+    # number of URIs for which lookup results are cached
+    LOOKUP_CACHE_SIZE = 10000
+
+    def __init__(self):
+        # URI -> compiled declaration
+        self._exact = {}
+
+        # prefix URI -> compiled declaration
+        self._prefix = {}
+
+        # distinct lengths of prefix URIs, longest first
+        self._prefix_lengths = []
+
+        # URI -> compiled declaration (or None), for URIs looked up
+        self._lookup = {}
+
+    def __len__(self):
+        return len(self._exact) + len(self._prefix)
+
+    def define(self, uri, decl):
+        """
+        Compile and add (or replace) the schema declaration for a URI.
+
+        :param uri: The URI (or URI prefix) of the declaration.
+        :type uri: unicode
+        :param decl: The WAMP schema declaration.
+        :type decl: dict
+        """
+        validators = _compile_declaration(decl)
+        self.undefine(uri)
+        if decl.get(u'match', u'exact') == u'prefix':
+            self._prefix[uri] = validators
+            self._prefix_lengths = sorted(set(len(p) for p in self._prefix), reverse=True)
+        else:
+            self._exact[uri] = validators
+        self._lookup.clear()
+        self.log.debug("schema for URI '{uri}' compiled ({count} payload types)", uri=uri, count=len(validators))
+
+    def undefine(self, uri):
+        """
+        Remove the schema declaration for a URI (or URI prefix).
+
+        :param uri: The URI (or URI prefix) of the declaration.
+        :type uri: unicode
+        """
+        if uri in self._exact:
+            del self._exact[uri]
+        if uri in self._prefix:
+            del self._prefix[uri]
+            self._prefix_lengths = sorted(set(len(p) for p in self._prefix), reverse=True)
+        self._lookup.clear()
+
+    def _find(self, uri):
+        try:
+            return self._lookup[uri]
+        except KeyError:
+            pass
+        validators = self._exact.get(uri, None)
+        if validators is None:
+            for length in self._prefix_lengths:
+                validators = self._prefix.get(uri[:length], None)
+                if validators is not None:
+                    break
+        if len(self._lookup) >= self.LOOKUP_CACHE_SIZE:
+            self._lookup.clear()
+        self._lookup[uri] = validators
+        return validators
+
+    def validate(self, payload_type, uri, args, kwargs):
+        """
+        Validate an application payload.
+
+        :param payload_type: The payload type: one of ``"event"``, ``"call"``,
+            ``"call_result"`` or ``"call_error"``.
+        :type payload_type: unicode
+        :param uri: The URI of the topic or procedure.
+        :type uri: unicode
+        :param args: The positional payload.
+        :type args: list or None
+        :param kwargs: The keyword payload.
+        :type kwargs: dict or None
+
+        :raises: :class:`InvalidPayload` if the payload does not conform to the schema.
+        """
+        if not (self._exact or self._prefix):
+            return
+        validators = self._find(uri)
+        if validators:
+            validator = validators.get(payload_type, None)
+            if validator:
+                if validator[0]:
+                    validator[0](args or [], u'args')
+                if validator[1]:
+                    validator[1](kwargs or {}, u'kwargs')
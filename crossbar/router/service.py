@@ -32,20 +32,77 @@ from __future__ import absolute_import
 
 import json
 
-from twisted.internet.defer import inlineCallbacks
+import six
+
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from autobahn import wamp
 from autobahn.wamp.exception import ApplicationError
+from autobahn.wamp.types import RegisterOptions
 from autobahn.twisted.wamp import ApplicationSession
+from autobahn.twisted.util import sleep
 
 from crossbar.router.observation import is_protected_uri
+from crossbar.router.schema import InvalidSchema
 from crossbar._logging import make_logger
 
 __all__ = ('RouterServiceSession',)
 
 
+# authroles of sessions not visible in the meta API
+_RESTRICTED_AUTHROLES = (None, u'trusted')
+
+
 def _is_restricted_session(session):
-    return session._authrole is None or session._authrole == u'trusted'
+    return session._authrole in _RESTRICTED_AUTHROLES
+
+
+# number of items per progressive result of listings
+LISTING_CHUNK_SIZE = 1000
+
+# default (and maximum) number of sessions per page of wamp.session.page
+SESSION_PAGE_SIZE = 1000
+SESSION_PAGE_SIZE_MAX = 10000
+
+
+def _chunked(items, size):
+    """
+    Split an iterable into lists of (at most) the given size. Yields at least one list.
+    """
+    chunk = []
+    empty = True
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+            empty = False
+    if chunk or empty:
+        yield chunk
+
+
+def _observation_chunks(observation_map, wildcard=True, size=LISTING_CHUNK_SIZE):
+    """
+    Split the (not protected) observation IDs of an observation map into dicts of
+    lists per match policy, with (at most) the given number of IDs each.
+    """
+    matches = [(u'exact', observation_map._observations_exact),
+               (u'prefix', observation_map._observations_prefix)]
+    if wildcard:
+        matches.append((u'wildcard', observation_map._observations_wildcard))
+
+    chunk = {u'exact': [], u'prefix': [], u'wildcard': []}
+    count = 0
+    for match, observations in matches:
+        for observation in list(observations.values()):
+            if not is_protected_uri(observation.uri):
+                chunk[match].append(observation.id)
+                count += 1
+                if count == size:
+                    yield chunk
+                    chunk = {u'exact': [], u'prefix': [], u'wildcard': []}
+                    count = 0
+    yield chunk
 
 
 class RouterServiceSession(ApplicationSession):
@@ -74,6 +131,11 @@ class RouterServiceSession(ApplicationSession):
         self._schemas = {}
         if schemas:
             self._schemas.update(schemas)
+            for uri, schema in schemas.items():
+                try:
+                    self._router._schemas.define(uri, schema)
+                except InvalidSchema as e:
+                    self.log.warn("schema for URI '{uri}' will not be validated: {error}", uri=uri, error=e)
             self.log.info('initialized schemas cache with {} entries'.format(len(self._schemas)))
 
     @inlineCallbacks
@@ -81,6 +143,14 @@ class RouterServiceSession(ApplicationSession):
         self.log.debug('Router service session attached: {}'.format(details))
 
         regs = yield self.register(self)
+
+        # listings which can return progressive results need the call details
+        for proc, uri in [(self.session_list, u'wamp.session.list'),
+                          (self.registration_list, u'wamp.registration.list'),
+                          (self.subscription_list, u'wamp.subscription.list')]:
+            reg = yield self.register(proc, uri, options=RegisterOptions(details_arg='details'))
+            regs.append(reg)
+
         self.log.debug('Registered {} procedures'.format(len(regs)))
 
         if self.config.extra and 'onready' in self.config.extra:
@@ -95,24 +165,88 @@ class RouterServiceSession(ApplicationSession):
         if not isinstance(failure.value, ApplicationError):
             super(RouterServiceSession, self).onUserError(failure, msg)
 
-    @wamp.register(u'wamp.session.list')
-    def session_list(self, filter_authroles=None):
+    @inlineCallbacks
+    def _progressive(self, chunks, details):
+        """
+        Return the last of the chunks as the call result, and the chunks before as
+        progressive results, yielding to the reactor in between.
+        """
+        last = None
+        for chunk in chunks:
+            if last is not None:
+                details.progress(last)
+                yield sleep(0)
+            last = chunk
+        returnValue(last)
+
+    def _session_ids(self, filter_authroles=None, cursor=None):
+        for seq, session in self._router.iter_sessions(after=cursor):
+            if not _is_restricted_session(session):
+                if filter_authroles is None or session._authrole in filter_authroles:
+                    yield seq, session._session_id
+
+    def session_list(self, filter_authroles=None, details=None):
         """
         Get list of session IDs of sessions currently joined on the router.
 
+        When the caller requests progressive results, the list is returned in
+        chunks of ``LISTING_CHUNK_SIZE`` session IDs.
+
         :param filter_authroles: If provided, only return sessions with an authrole from this list.
         :type filter_authroles: None or list
 
-        :returns: List of WAMP session IDs (order undefined).
+        :returns: List of WAMP session IDs (in the order the sessions joined).
         :rtype: list
         """
         assert(filter_authroles is None or type(filter_authroles) == list)
-        session_ids = []
-        for session in self._router._session_id_to_session.values():
-            if not _is_restricted_session(session):
-                if filter_authroles is None or session._session_details[u'authrole'] in filter_authroles:
-                    session_ids.append(session._session_id)
-        return session_ids
+        session_ids = (session_id for _, session_id in self._session_ids(filter_authroles))
+        if details and details.progress:
+            return self._progressive(_chunked(session_ids, LISTING_CHUNK_SIZE), details)
+        return list(session_ids)
+
+    @wamp.register(u'wamp.session.page')
+    def session_page(self, filter_authroles=None, cursor=None, limit=None):
+        """
+        Get a page of session IDs of sessions currently joined on the router.
+
+        :param filter_authroles: If provided, only return sessions with an authrole from this list.
+        :type filter_authroles: None or list
+        :param cursor: The cursor returned with the previous page, or ``None`` for the first page.
+        :type cursor: int or None
+        :param limit: The maximum number of session IDs to return (default
+            ``SESSION_PAGE_SIZE``, at most ``SESSION_PAGE_SIZE_MAX``).
+        :type limit: int or None
+
+        :returns: A dict with the list of WAMP session IDs (``sessions``, in the order
+            the sessions joined), and the cursor for the next page (``cursor``, which
+            is ``None`` on the last page).
+        :rtype: dict
+        """
+        assert(filter_authroles is None or type(filter_authroles) == list)
+        if limit is None:
+            limit = SESSION_PAGE_SIZE
+        if type(limit) not in six.integer_types or limit < 1 or limit > SESSION_PAGE_SIZE_MAX:
+            raise ApplicationError(
+                ApplicationError.INVALID_ARGUMENT,
+                u'invalid limit {} - must be an integer from 1 to {}'.format(limit, SESSION_PAGE_SIZE_MAX),
+            )
+
+        # get one more than the limit, to know whether there is a next page
+        page = []
+        for seq_and_session_id in self._session_ids(filter_authroles, cursor):
+            page.append(seq_and_session_id)
+            if len(page) > limit:
+                break
+
+        next_cursor = None
+        if len(page) > limit:
+            page.pop()
+            next_cursor = page[-1][0]
+
+        return {
+            u'sessions': [session_id for _, session_id in page],
+            u'cursor': next_cursor,
+        }
 
     @wamp.register(u'wamp.session.count')
     def session_count(self, filter_authroles=None):
@@ -126,11 +260,13 @@ class RouterServiceSession(ApplicationSession):
         :rtype: int
         """
         assert(filter_authroles is None or type(filter_authroles) == list)
+        authrole_session_count = self._router._authrole_session_count
+        if filter_authroles is None:
+            filter_authroles = authrole_session_count.keys()
         session_count = 0
-        for session in self._router._session_id_to_session.values():
-            if not _is_restricted_session(session):
-                if filter_authroles is None or session._session_details[u'authrole'] in filter_authroles:
-                    session_count += 1
+        for authrole in set(filter_authroles):
+            if authrole not in _RESTRICTED_AUTHROLES:
+                session_count += authrole_session_count.get(authrole, 0)
         return session_count
 
     @wamp.register(u'wamp.session.get')
@@ -294,70 +430,45 @@ class RouterServiceSession(ApplicationSession):
                 u'no subscription with ID {} exists on this broker'.format(subscription_id),
             )
 
-    @wamp.register(u'wamp.registration.list')
-    def registration_list(self):
+    def registration_list(self, details=None):
         """
         List current registrations.
 
+        When the caller requests progressive results, the lists are returned in
+        chunks of ``LISTING_CHUNK_SIZE`` registration IDs.
+
         :returns: A dictionary with three entries for the match policies 'exact', 'prefix'
             and 'wildcard', with a list of registration IDs for each.
         :rtype: dict
         """
-        registration_map = self._router._dealer._registration_map
+        chunks = _observation_chunks(self._router._dealer._registration_map)
+        if details and details.progress:
+            return self._progressive(chunks, details)
+        return self._merge_observation_chunks(chunks)
 
-        registrations_exact = []
-        for registration in registration_map._observations_exact.values():
-            if not is_protected_uri(registration.uri):
-                registrations_exact.append(registration.id)
-
-        registrations_prefix = []
-        for registration in registration_map._observations_prefix.values():
-            if not is_protected_uri(registration.uri):
-                registrations_prefix.append(registration.id)
-
-        registrations_wildcard = []
-        for registration in registration_map._observations_wildcard.values():
-            if not is_protected_uri(registration.uri):
-                registrations_wildcard.append(registration.id)
-
-        return {
-            u'exact': registrations_exact,
-            u'prefix': registrations_prefix,
-            u'wildcard': registrations_wildcard,
-        }
-
-    @wamp.register(u'wamp.subscription.list')
-    def subscription_list(self):
+    def subscription_list(self, details=None):
         """
         List current subscriptions.
 
+        When the caller requests progressive results, the lists are returned in
+        chunks of ``LISTING_CHUNK_SIZE`` subscription IDs.
+
         :returns: A dictionary with three entries for the match policies 'exact', 'prefix'
             and 'wildcard', with a list of subscription IDs for each.
         :rtype: dict
         """
-        subscription_map = self._router._broker._subscription_map
-
-        subscriptions_exact = []
-        for subscription in subscription_map._observations_exact.values():
-            if not is_protected_uri(subscription.uri):
-                subscriptions_exact.append(subscription.id)
-
-        subscriptions_prefix = []
-        for subscription in subscription_map._observations_prefix.values():
-            if not is_protected_uri(subscription.uri):
-                subscriptions_prefix.append(subscription.id)
+        # FIXME: wildcard subscriptions
+        chunks = _observation_chunks(self._router._broker._subscription_map, wildcard=False)
+        if details and details.progress:
+            return self._progressive(chunks, details)
+        return self._merge_observation_chunks(chunks)
 
-        subscriptions_wildcard = []
-        # FIXME
-        # for subscription in subscription_map._observations_wildcard.values():
-        #     if not is_protected_uri(subscription.uri):
-        #         subscriptions_wildcard.append(subscription.id)
-
-        return {
-            u'exact': subscriptions_exact,
-            u'prefix': subscriptions_prefix,
-            u'wildcard': subscriptions_wildcard,
-        }
+    def _merge_observation_chunks(self, chunks):
+        result = {u'exact': [], u'prefix': [], u'wildcard': []}
+        for chunk in chunks:
+            for match, ids in chunk.items():
+                result[match].extend(ids)
+        return result
 
     @wamp.register(u'wamp.registration.match')
     def registration_match(self, procedure):
@@ -613,7 +724,8 @@ class RouterServiceSession(ApplicationSession):
         """
         if not schema:
             if uri in self._schemas:
-                del self._schemas
+                del self._schemas[uri]
+                self._router._schemas.undefine(uri)
                 self.publish(u'wamp.schema.on_undefine', uri)
                 return uri
             else:
@@ -630,6 +742,10 @@ class RouterServiceSession(ApplicationSession):
                 was_modified = False
 
         if was_new or was_modified:
+            try:
+                self._router._schemas.define(uri, schema)
+            except InvalidSchema as e:
+                raise ApplicationError(ApplicationError.INVALID_ARGUMENT, u"invalid schema for URI '{}': {}".format(uri, e))
             self._schemas[uri] = schema
             self.publish(u'wamp.schema.on_define', uri, schema, was_new)
             return was_new
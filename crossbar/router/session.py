@@ -35,6 +35,8 @@ import six
 
 import txaio
 
+from twisted.internet.defer import CancelledError
+
 from autobahn import util
 from autobahn.websocket.compress import *  # noqa
 
@@ -49,6 +51,7 @@ from autobahn.wamp.interfaces import ITransportHandler
 
 from crossbar._logging import make_logger
 from crossbar.twisted.endpoint import extract_peer_certificate
+from crossbar.router.admission import HandshakeAdmission, AdmissionRejected
 from crossbar.router.auth import PendingAuthWampCra, PendingAuthTicket
 from crossbar.router.auth import AUTHMETHODS, AUTHMETHOD_MAP
 
@@ -309,6 +312,69 @@ class RouterSession(BaseSession):
         # the service session to be used eg for WAMP metaevents
         self._service_session = None
 
+        # handshake admission control of the transport (if any)
+        admission = getattr(getattr(self._transport, 'factory', None), '_admission', None)
+        self._admission = admission if isinstance(admission, HandshakeAdmission) else None
+        self._admission_wait = None
+        self._admission_deadline = None
+        self._admission_expired = False
+        self._admitted = False
+
+    def _release_admission(self):
+        """
+        Release the admission slot of this session's handshake (if holding one).
+        """
+        if self._admitted:
+            self._admitted = False
+            if self._admission_deadline is not None:
+                if self._admission_deadline.active():
+                    self._admission_deadline.cancel()
+                self._admission_deadline = None
+            self._admission.release()
+
+    def _expire_admission(self):
+        """
+        Abort a handshake which did not finish within the admission control deadline.
+        """
+        self._admission_deadline = None
+        self._admission_expired = True
+        self._release_admission()
+        self._pending_session_id = None
+
+        if self._transport:
+            self.log.debug("Handshake timed out - aborting")
+            self._transport.send(message.Abort(u'crossbar.error.handshake_timeout',
+                                               u'handshake did not finish in time'))
+            self._transport.close()
+
+    def _hello(self, realm, details):
+        """
+        Process HELLO (once admitted by the transport's handshake admission control).
+        """
+        if not self._admission:
+            return txaio.as_future(self.onHello, realm, details)
+
+        def admitted(_):
+            self._admission_wait = None
+            self._admitted = True
+            self._admission_deadline = self._admission.deadline(self._expire_admission)
+            return txaio.as_future(self.onHello, realm, details)
+
+        def rejected(err):
+            self._admission_wait = None
+            if err.check(CancelledError):
+                # the transport went away while waiting
+                return None
+            err.trap(AdmissionRejected)
+            self.log.debug("Handshake rejected by admission control: {reason}", reason=err.value)
+            return types.Deny(u'crossbar.error.handshake_rejected',
+                              message=u'{} - retry after {} seconds'.format(err.value, err.value.retry_after))
+
+        self._admission_wait = self._admission.acquire()
+        d = self._admission_wait
+        d.addCallbacks(admitted, rejected)
+        return d
+
     def onMessage(self, msg):
         """
         Implements :func:`autobahn.wamp.interfaces.ITransportHandler.onMessage`
@@ -362,11 +428,15 @@ class RouterSession(BaseSession):
                                              session_roles=msg.roles,
                                              pending_session=self._pending_session_id)
 
-                d = txaio.as_future(self.onHello, msg.realm, details)
+                d = self._hello(msg.realm, details)
 
                 def success(res):
+                    if self._admission_expired:
+                        # the handshake was aborted meanwhile
+                        return
                     msg = None
                     if isinstance(res, types.Accept):
+                        self._release_admission()
                         custom = {
                             u'x_cb_node_id': self._router_factory._node_id
                         }
@@ -376,6 +446,7 @@ class RouterSession(BaseSession):
                         msg = message.Challenge(res.method, res.extra)
 
                     elif isinstance(res, types.Deny):
+                        self._release_admission()
                         msg = message.Abort(res.reason, res.message)
 
                     else:
@@ -391,6 +462,10 @@ class RouterSession(BaseSession):
                 d = txaio.as_future(self.onAuthenticate, msg.signature, {})
 
                 def success(res):
+                    if self._admission_expired:
+                        # the handshake was aborted meanwhile
+                        return
+                    self._release_admission()
                     msg = None
                     if isinstance(res, types.Accept):
                         custom = {
@@ -411,6 +486,8 @@ class RouterSession(BaseSession):
 
             elif isinstance(msg, message.Abort):
 
+                self._release_admission()
+
                 # fire callback and close the transport
                 self.onLeave(types.CloseDetails(msg.reason, msg.message))
 
@@ -484,6 +561,10 @@ class RouterSession(BaseSession):
         """
         self._transport = None
 
+        if self._admission_wait is not None:
+            self._admission_wait.cancel()
+        self._release_admission()
+
         if self._session_id:
 
             # fire callback and close the transport
@@ -528,6 +609,8 @@ class RouterSession(BaseSession):
         """
         self.log.failure("Internal error (2): {log_failure.value}", failure=fail)
 
+        self._release_admission()
+
         # tell other side we're done
         reply = message.Abort(u"wamp.error.authorization_failed", u"Internal server error")
         self._transport.send(reply)
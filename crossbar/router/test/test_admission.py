@@ -0,0 +1,141 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+from twisted.internet.task import Clock
+
+from crossbar.test import TestCase
+from crossbar.router.admission import HandshakeAdmission, AdmissionRejected
+
+
+class HandshakeAdmissionTests(TestCase):
+    """
+    Tests for crossbar.router.admission.HandshakeAdmission.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.admission = HandshakeAdmission(max_pending=2, max_queued=2, queue_timeout=10,
+                                            retry_after=5, clock=self.clock)
+
+    def test_fifo(self):
+        """
+        Handshakes beyond the pending limit wait, and are admitted in order.
+        """
+        self.successResultOf(self.admission.acquire())
+        self.successResultOf(self.admission.acquire())
+
+        admitted = []
+        d1 = self.admission.acquire()
+        d1.addCallback(lambda _: admitted.append(1))
+        d2 = self.admission.acquire()
+        d2.addCallback(lambda _: admitted.append(2))
+        self.assertEqual(admitted, [])
+
+        self.admission.release()
+        self.assertEqual(admitted, [1])
+        self.admission.release()
+        self.assertEqual(admitted, [1, 2])
+
+        stats = self.admission.stats()
+        self.assertEqual((stats[u'pending'], stats[u'queued'], stats[u'admitted'], stats[u'delayed']), (2, 0, 4, 2))
+
+    def test_reject(self):
+        """
+        Handshakes finding the queue full are rejected with a retry hint.
+        """
+        for i in range(4):
+            self.admission.acquire()
+
+        f = self.failureResultOf(self.admission.acquire(), AdmissionRejected)
+        self.assertEqual(f.value.retry_after, 5)
+        self.assertEqual(self.admission.stats()[u'rejected'], 1)
+
+    def test_timeout(self):
+        """
+        Handshakes waiting longer than the queue timeout are rejected, and
+        cancelled handshakes give up their place.
+        """
+        self.admission.acquire()
+        self.admission.acquire()
+        d1 = self.admission.acquire()
+        d2 = self.admission.acquire()
+        d2.cancel()
+        self.failureResultOf(d2)
+        self.assertEqual(self.admission.stats()[u'queued'], 1)
+
+        self.clock.advance(10)
+        self.failureResultOf(d1, AdmissionRejected)
+        self.assertEqual(self.admission.stats()[u'timed_out'], 1)
+
+        # the next free slot goes to a new handshake directly
+        self.admission.release()
+        self.successResultOf(self.admission.acquire())
+        self.assertEqual(self.admission.stats()[u'pending'], 2)
+
+    def test_queue_bounded(self):
+        """
+        Entries of handshakes that timed out or were cancelled don't pile up
+        in the queue while no slot is released.
+        """
+        self.admission.acquire()
+        self.admission.acquire()
+        for i in range(10):
+            d = self.admission.acquire()
+            self.clock.advance(10)
+            self.failureResultOf(d, AdmissionRejected)
+        self.assertEqual(len(self.admission._queue), 0)
+
+        for i in range(10):
+            d = self.admission.acquire()
+            d.cancel()
+            self.failureResultOf(d)
+        self.assertLessEqual(len(self.admission._queue), 2 * self.admission.max_queued + 1)
+        self.assertEqual(self.admission.stats()[u'queued'], 0)
+
+    def test_deadline(self):
+        """
+        The deadline of an admitted handshake fires after the handshake timeout.
+        """
+        admission = HandshakeAdmission(handshake_timeout=30, clock=self.clock)
+        expired = []
+        call = admission.deadline(lambda: expired.append(True))
+        self.clock.advance(29)
+        self.assertEqual(expired, [])
+        self.clock.advance(1)
+        self.assertEqual(expired, [True])
+        self.assertFalse(call.active())
+        self.assertEqual(admission.stats()[u'expired'], 1)
+
+        # no deadline without a handshake timeout
+        admission = HandshakeAdmission(handshake_timeout=0, clock=self.clock)
+        self.assertIsNone(admission.deadline(lambda: None))
@@ -0,0 +1,262 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import binascii
+
+from mock import MagicMock
+
+from nacl.signing import SigningKey
+from nacl.encoding import HexEncoder
+
+from twisted.internet.defer import Deferred, succeed
+from twisted.internet.task import Clock
+
+from autobahn.wamp import types
+
+from crossbar.test import TestCase
+from crossbar.router.auth import cryptosign, ticket
+from crossbar.router.auth.pending import AuthenticatorCache
+
+
+class AuthenticatorCacheTests(TestCase):
+    """
+    Tests for crossbar.router.auth.pending.AuthenticatorCache.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.calls = []
+
+    def _call(self, result=u'user'):
+        def call():
+            self.calls.append(result)
+            return succeed(result)
+        return call
+
+    def test_ttl(self):
+        """
+        Principals are cached for the time-to-live.
+        """
+        cache = AuthenticatorCache(60, clock=self.clock)
+        self.assertEqual(self.successResultOf(cache.get((u'realm1', u'alice'), self._call())), u'user')
+        self.assertEqual(self.successResultOf(cache.get((u'realm1', u'alice'), self._call())), u'user')
+        self.assertEqual(len(self.calls), 1)
+
+        self.clock.advance(61)
+        self.successResultOf(cache.get((u'realm1', u'alice'), self._call()))
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_size(self):
+        """
+        The least recently used principals are dropped beyond the cache size.
+        """
+        cache = AuthenticatorCache(60, size=2, clock=self.clock)
+        for authid in [u'alice', u'bob', u'alice', u'carol', u'alice', u'bob']:
+            self.successResultOf(cache.get((u'realm1', authid), self._call()))
+        self.assertEqual(len(self.calls), 4)
+
+    def test_concurrent(self):
+        """
+        Concurrent lookups share one authenticator call, and errors are not cached.
+        """
+        cache = AuthenticatorCache(60, clock=self.clock)
+        pending = Deferred()
+        calls = []
+
+        def call():
+            calls.append(1)
+            return pending
+
+        d1 = cache.get((u'realm1', u'alice'), call)
+        d2 = cache.get((u'realm1', u'alice'), call)
+        pending.errback(Exception("authenticator failed"))
+        self.failureResultOf(d1)
+        self.failureResultOf(d2)
+
+        d3 = cache.get((u'realm1', u'alice'), self._call())
+        self.assertEqual(self.successResultOf(d3), u'user')
+        self.assertEqual(len(calls) + len(self.calls), 2)
+
+
+class PendingAuthCacheTests(TestCase):
+    """
+    Tests for the authenticator caches of crossbar.router.auth.pending.PendingAuth.
+    """
+
+    def _cache(self, ttl, size=None):
+        config = {
+            u'type': u'dynamic',
+            u'authenticator': u'com.example.authenticate',
+            u'authenticator-cache-ttl': ttl,
+        }
+        if size:
+            config[u'authenticator-cache-size'] = size
+        session = MagicMock()
+        session._transport._transport_info = {}
+        session._router_factory = {u'realm1': MagicMock()}
+        pending = ticket.PendingAuthTicket(session, config)
+        pending._realm = u'realm1'
+        pending._init_dynamic_authenticator()
+        return pending._authenticator_cache
+
+    def test_shared(self):
+        """
+        Pending authentications with the same authenticator and cache configuration share a cache.
+        """
+        self.assertIs(self._cache(60), self._cache(60))
+
+    def test_configuration(self):
+        """
+        Caches configured with a different time-to-live or size are separate.
+        """
+        cache = self._cache(60)
+        self.assertIsNot(self._cache(30), cache)
+        self.assertIsNot(self._cache(60, size=10), cache)
+        self.assertEqual(self._cache(30)._ttl, 30)
+        self.assertEqual(self._cache(60, size=10)._size, 10)
+
+
+class PendingAuthCryptosignTests(TestCase):
+    """
+    Tests for crossbar.router.auth.cryptosign.PendingAuthCryptosign.
+    """
+
+    def setUp(self):
+        self.alice = SigningKey.generate()
+        self.bob = SigningKey.generate()
+        self.config = {
+            u'type': u'static',
+            u'principals': {
+                u'alice': {
+                    u'authorized_keys': [self._pubkey(self.alice)],
+                    u'role': u'user',
+                },
+                u'bob': {
+                    u'authorized_keys': [self._pubkey(self.bob)],
+                    u'role': u'user',
+                },
+            }
+        }
+
+    def _pubkey(self, key):
+        return key.verify_key.encode(encoder=HexEncoder).decode('ascii')
+
+    def _pending(self):
+        session = MagicMock()
+        session._transport._transport_info = {}
+        session._router_factory = {u'realm1': MagicMock()}
+        return cryptosign.PendingAuthCryptosign(session, self.config)
+
+    def _hello(self, pending, authid=None, pubkey=None):
+        authextra = {u'pubkey': pubkey} if pubkey else {}
+        return pending.hello(u'realm1', types.HelloDetails(authid=authid, authextra=authextra))
+
+    def _sign(self, key, challenge):
+        signed = key.sign(binascii.a2b_hex(challenge))
+        return binascii.b2a_hex(signed.signature + signed.message).decode('ascii')
+
+    def test_pubkey_index(self):
+        """
+        The authid is inferred from the pubkey through an index built once per
+        principal database.
+        """
+        pending = self._pending()
+        challenge = self._hello(pending, pubkey=self._pubkey(self.bob))
+        self.assertIsInstance(challenge, types.Challenge)
+        self.assertEqual(pending._authid, u'bob')
+
+        index = cryptosign._get_pubkey_index(self.config[u'principals'])
+        self.assertIs(cryptosign._get_pubkey_index(self.config[u'principals']), index)
+
+        welcome = pending.authenticate(self._sign(self.bob, challenge.extra[u'challenge']))
+        self.assertIsInstance(welcome, types.Accept)
+        self.assertEqual(welcome.authid, u'bob')
+
+    def test_pubkey_ambiguous(self):
+        """
+        A pubkey authorized for multiple authids does not identify the client.
+        """
+        self.config[u'principals'][u'bob'][u'authorized_keys'].append(self._pubkey(self.alice))
+        result = self._hello(self._pending(), pubkey=self._pubkey(self.alice))
+        self.assertIsInstance(result, types.Deny)
+
+    def test_authid_without_pubkey(self):
+        """
+        A client only giving its authid is verified against the single
+        authorized key of the principal.
+        """
+        pending = self._pending()
+        challenge = self._hello(pending, authid=u'alice')
+        self.assertIsInstance(challenge, types.Challenge)
+
+        denied = pending.authenticate(self._sign(self.bob, challenge.extra[u'challenge']))
+        self.assertIsInstance(denied, types.Deny)
+
+    def test_verify_key_cache(self):
+        """
+        Parsed public keys are cached, with the least recently used dropped.
+        """
+        self.patch(cryptosign, 'VERIFY_KEY_CACHE_SIZE', 1)
+        self.patch(cryptosign, '_verify_keys', cryptosign._verify_keys.__class__())
+        alice = cryptosign._get_verify_key(self._pubkey(self.alice))
+        self.assertIs(cryptosign._get_verify_key(self._pubkey(self.alice)), alice)
+        cryptosign._get_verify_key(self._pubkey(self.bob))
+        self.assertEqual(list(cryptosign._verify_keys), [self._pubkey(self.bob)])
+
+    def test_verify_threads(self):
+        """
+        Signatures are verified on the thread pool when configured.
+        """
+        self.config[u'verify-threads'] = 1
+        pending = self._pending()
+        challenge = self._hello(pending, pubkey=self._pubkey(self.alice))
+
+        d = pending.authenticate(self._sign(self.alice, challenge.extra[u'challenge']))
+        d.addCallback(self.assertIsInstance, types.Accept)
+        return d
+
+    def test_verify_pools(self):
+        """
+        Transports configured with a different number of verify threads do not
+        share a thread pool.
+        """
+        pools = {}
+        self.patch(cryptosign, '_verify_pools', pools)
+        self.patch(cryptosign.ThreadPool, 'start', lambda pool: None)
+
+        one = cryptosign._get_verify_pool(1)
+        self.assertIs(cryptosign._get_verify_pool(1), one)
+        four = cryptosign._get_verify_pool(4)
+        self.assertIsNot(four, one)
+        self.assertEqual((one.max, four.max), (1, 4))
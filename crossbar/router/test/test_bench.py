@@ -0,0 +1,135 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+from twisted.internet import reactor
+from twisted.python.runtime import platform
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from crossbar.router.bench import SCENARIOS, run_benchmarks, compare_results, percentile
+
+# small workloads, to test the scenarios (not to measure anything)
+_PARAMS = {
+    u'subscribers': 3,
+    u'events': 20,
+    u'calls': 20,
+    u'concurrency': 2,
+    u'subscriptions': 10,
+    u'sessions': 6,
+    u'workers': 2,
+    # there is no fork server on Windows
+    u'mode': u'spawn' if platform.isWindows() else u'fork',
+}
+
+
+class BenchTests(unittest.TestCase):
+    """
+    Tests for crossbar.router.bench.
+    """
+
+    @inlineCallbacks
+    def _run_scenarios(self, **kwargs):
+        results = yield run_benchmarks(reactor, sorted(SCENARIOS), params=_PARAMS, **kwargs)
+        self.assertEqual(len(results), len(SCENARIOS))
+
+        counts = {key.split(u'[')[0]: result[u'count'] for key, result in results.items()}
+        self.assertEqual(counts, {
+            u'publish_fanout': 3 * 20,
+            u'rpc_latency': 20,
+            u'subscription_scaling': 20,
+            u'join_storm': 6,
+            u'worker_startup': 2,
+        })
+        for result in results.values():
+            self.assertTrue(result[u'throughput'] > 0)
+            self.assertTrue(0 < result[u'p50'] <= result[u'p99'] <= result[u'p999'])
+
+    def test_rawsocket(self):
+        """
+        All scenarios run over RawSocket (TCP).
+        """
+        return self._run_scenarios(transport=u'rawsocket', serializer=u'msgpack')
+
+    def test_websocket_unix(self):
+        """
+        All scenarios run over WebSocket on a Unix domain socket.
+        """
+        return self._run_scenarios(transport=u'websocket', serializer=u'json', endpoint=u'unix')
+
+    @inlineCallbacks
+    def test_wildcard(self):
+        """
+        Subscription scaling runs with wildcard subscriptions.
+        """
+        params = dict(_PARAMS, match=u'wildcard')
+        results = yield run_benchmarks(reactor, [u'subscription_scaling'], params=params, repeat=2)
+        [(key, result)] = results.items()
+        self.assertTrue(u'match=wildcard' in key)
+        self.assertEqual(result[u'count'], 20)
+        self.assertEqual(result[u'runs'], 2)
+
+    @inlineCallbacks
+    def test_worker_startup_spawn(self):
+        """
+        Worker startup runs with spawned (not forked) worker processes.
+        """
+        params = dict(_PARAMS, mode=u'spawn')
+        results = yield run_benchmarks(reactor, [u'worker_startup'], params=params)
+        [(key, result)] = results.items()
+        self.assertTrue(u'mode=spawn' in key)
+        self.assertEqual(result[u'count'], 2)
+
+    def test_percentile(self):
+        """
+        Percentiles are the nearest rank.
+        """
+        latencies = [float(i) for i in range(1, 1001)]
+        self.assertEqual(percentile(latencies, 0.5), 500.)
+        self.assertEqual(percentile(latencies, 0.99), 990.)
+        self.assertEqual(percentile(latencies, 0.999), 999.)
+        self.assertEqual(percentile([3.], 0.999), 3.)
+        self.assertEqual(percentile([], 0.5), 0.)
+
+    def test_compare(self):
+        """
+        Lower throughput or higher latencies beyond the tolerance are regressions.
+        """
+        baseline = {u'a': {u'throughput': 1000., u'p50': 1., u'p99': 2., u'p999': 4.},
+                    u'b': {u'throughput': 1000., u'p50': 1., u'p99': 2., u'p999': 4.}}
+        results = {u'a': {u'throughput': 850., u'p50': 1.05, u'p99': 3.2, u'p999': 4.},
+                   u'c': {u'throughput': 1000., u'p50': 1., u'p99': 2., u'p999': 4.}}
+
+        comparisons = compare_results(results, baseline, tolerance=0.1, tail_tolerance=0.5)
+        regressed = {(key, metric) for key, metric, base, value, change, regressed in comparisons if regressed}
+        self.assertEqual(len(comparisons), 4)
+        self.assertEqual(regressed, {(u'a', u'throughput'), (u'a', u'p99')})
@@ -268,6 +268,27 @@ class TestBrokerPublish(unittest.TestCase):
         self.assertEquals(session1._transport.method_calls, [])
 
 
+class TestBroker(unittest.TestCase):
+    """
+    Tests for crossbar.router.broker.Broker
+    """
+
+    def test_has_subscribers(self):
+        """
+        A topic has subscribers while a session is subscribed to it, by any match policy.
+        """
+        broker = Broker(mock.MagicMock())
+        session = mock.MagicMock()
+        self.assertFalse(broker.has_subscribers(u'com.example.topic'))
+
+        subscription, _, _ = broker._subscription_map.add_observer(session, u'com.example', u'prefix')
+        self.assertTrue(broker.has_subscribers(u'com.example.topic'))
+        self.assertFalse(broker.has_subscribers(u'com.other.topic'))
+
+        broker._subscription_map.drop_observer(session, subscription)
+        self.assertFalse(broker.has_subscribers(u'com.example.topic'))
+
+
 class TestRouterSession(unittest.TestCase):
     """
     Tests for crossbar.router.session.RouterSession
@@ -0,0 +1,196 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+from __future__ import absolute_import
+
+import os
+import json
+import time
+
+from twisted.internet import reactor
+from twisted.test.proto_helpers import MemoryReactorClock
+
+from crossbar.test import TestCase
+from crossbar.router.cookiestore import CookieStoreMemoryBacked, CookieStoreFileBacked
+
+
+class CookieStoreTests(TestCase):
+    """
+    Tests for crossbar.router.cookiestore.CookieStore.
+    """
+
+    def test_expire(self):
+        """
+        Expired cookies are dropped, unless in use.
+        """
+        store = CookieStoreMemoryBacked({'max_age': 60})
+        cbtid1, _ = store.create()
+        cbtid2, _ = store.create()
+        store.addProto(cbtid2, object())
+
+        self.assertEqual(store.expire(time.time() + 61), 1)
+        self.assertFalse(store.exists(cbtid1))
+        self.assertTrue(store.exists(cbtid2))
+        self.assertEqual(store.stats()[u'expired'], 1)
+
+    def test_expire_in_use(self):
+        """
+        A cookie that expired while in use is dropped with its last connection.
+        """
+        store = CookieStoreMemoryBacked({'max_age': 60})
+        cbtid, _ = store.create()
+        proto = object()
+        store.addProto(cbtid, proto)
+        store._cookies[cbtid].expires = time.time() - 1
+
+        self.assertTrue(store.exists(cbtid))
+        self.assertEqual(store.dropProto(cbtid, proto), 0)
+        self.assertFalse(store.exists(cbtid))
+
+    def test_evict(self):
+        """
+        Over the maximum number of entries, the least recently used
+        unauthenticated cookies are evicted.
+        """
+        store = CookieStoreMemoryBacked({'store': {'type': u'memory', 'max_entries': 3}})
+        cbtid1, _ = store.create()
+        cbtid2, _ = store.create()
+        cbtid3, _ = store.create()
+        store.setAuth(cbtid1, u'alice', u'user', u'wampcra')
+        store.parse({'cookie': 'cbtid={}'.format(cbtid2)})
+
+        cbtid4, _ = store.create()
+        self.assertEqual([store.exists(c) for c in [cbtid1, cbtid2, cbtid3, cbtid4]], [True, True, False, True])
+
+        cbtid5, _ = store.create()
+        self.assertEqual([store.exists(c) for c in [cbtid1, cbtid2, cbtid4, cbtid5]], [True, False, True, True])
+
+        stats = store.stats()
+        self.assertEqual(stats[u'size'], 3)
+        self.assertEqual(stats[u'created'], 5)
+        self.assertEqual(stats[u'evicted'], 2)
+
+    def test_evict_expiry_bounded(self):
+        """
+        Evicted cookies don't leave their expiry behind, so the store stays bounded.
+        """
+        store = CookieStoreMemoryBacked({'store': {'type': u'memory', 'max_entries': 10}})
+        for i in range(5000):
+            store.create()
+
+        self.assertEqual(store.stats()[u'size'], 10)
+        self.assertTrue(len(store._expiry) <= 2 * 11 + 101)
+
+        # the entries left are those of the cookies in the store
+        self.assertEqual(store.expire(time.time() + 86400 * 7 + 1), 10)
+        self.assertEqual(store.stats()[u'size'], 0)
+
+
+class CookieStoreFileBackedTests(TestCase):
+    """
+    Tests for crossbar.router.cookiestore.CookieStoreFileBacked.
+    """
+
+    def setUp(self):
+        self.filename = self.mktemp()
+
+    def _records(self):
+        with open(self.filename) as f:
+            return [json.loads(line) for line in f]
+
+    def test_group_commit(self):
+        """
+        Records are buffered for the commit interval and then written at once.
+        """
+        clock = MemoryReactorClock()
+        store = CookieStoreFileBacked(self.filename, {'store': {'commit_interval': 0.5}}, reactor=clock)
+
+        cbtid1, _ = store.create()
+        cbtid2, _ = store.create()
+        self.assertEqual(self._records(), [])
+
+        clock.advance(0.5)
+        self.assertEqual([r['id'] for r in self._records()], [cbtid1, cbtid2])
+
+        # buffered records are written on shutdown
+        store.setAuth(cbtid1, u'alice', u'user', u'wampcra')
+        self.assertEqual(len(self._records()), 2)
+        clock.triggers['before']['shutdown'][0][0]()
+        self.assertEqual(self._records()[-1]['authid'], u'alice')
+
+    def test_load(self):
+        """
+        The last record of a cookie wins, and expired cookies are not loaded.
+        """
+        clock = MemoryReactorClock()
+        config = {'store': {'commit_interval': 0, 'compact_interval': 0}}
+        store = CookieStoreFileBacked(self.filename, config, reactor=clock)
+        cbtid, _ = store.create()
+        store.setAuth(cbtid, u'alice', u'user', u'wampcra')
+        store.close()
+
+        with open(self.filename, 'a') as f:
+            f.write(json.dumps({'id': 'expired', 'created': '2015-01-01T00:00:00.000Z', 'max_age': 60,
+                                'authid': None, 'authrole': None, 'authmethod': None}) + '\n')
+
+        store = CookieStoreFileBacked(self.filename, config, reactor=reactor)
+        self.addCleanup(store.close)
+        self.assertEqual(store.getAuth(cbtid), (u'alice', u'user', u'wampcra'))
+        self.assertFalse(store.exists('expired'))
+
+    def test_compact(self):
+        """
+        Compaction rewrites the file with one record per live cookie.
+        """
+        config = {'store': {'commit_interval': 0, 'compact_interval': 0}}
+        store = CookieStoreFileBacked(self.filename, config, reactor=reactor)
+        self.addCleanup(store.close)
+
+        cbtids = [store.create()[0] for i in range(3)]
+        for cbtid in cbtids:
+            store.setAuth(cbtid, u'alice', u'user', u'wampcra')
+        self.assertEqual(len(self._records()), 6)
+
+        d = store.compact()
+
+        # a record committed while compacting is kept
+        cbtid, _ = store.create()
+
+        def check(_):
+            records = self._records()
+            self.assertEqual(len(records), 4)
+            self.assertEqual(sorted(r['id'] for r in records), sorted(cbtids + [cbtid]))
+            self.assertFalse(os.path.exists(self.filename + '.tmp'))
+
+            # the store keeps appending to the compacted file
+            store.create()
+            self.assertEqual(len(self._records()), 5)
+        d.addCallback(check)
+        return d
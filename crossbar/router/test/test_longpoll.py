@@ -0,0 +1,198 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+from __future__ import absolute_import
+
+import json
+
+from twisted.internet.task import Clock
+
+# the long-poll transport uses the WebSocket protocol, which calls
+# txaio.make_logger() on import, so the framework must be selected before
+import txaio
+txaio.use_twisted()  # noqa
+
+from autobahn.wamp import message  # noqa
+from autobahn.wamp.serializer import JsonSerializer  # noqa
+
+from crossbar.test import TestCase  # noqa
+from crossbar.router.longpoll import WampLongPollResource  # noqa
+from crossbar.adapter.rest.test._request import request as make_request  # noqa
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.closed = None
+
+    def onOpen(self, transport):
+        self.transport = transport
+
+    def onClose(self, wasClean):
+        self.closed = wasClean
+
+    def onMessage(self, msg):
+        pass
+
+
+class LongPollTests(TestCase):
+    """
+    Tests for crossbar.router.longpoll.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.sessions = []
+
+    def _factory(self):
+        session = _Session()
+        self.sessions.append(session)
+        return session
+
+    def _resource(self, **kwargs):
+        serializers = [JsonSerializer(batched=True), JsonSerializer()]
+        return WampLongPollResource(self._factory, serializers=serializers, reactor=self.clock, **kwargs)
+
+    def _open(self, resource, protocol=u"wamp.2.json", **options):
+        options[u'protocols'] = [protocol]
+        request = make_request(b"/open", method=b"POST", body=json.dumps(options).encode('utf8'))
+        result = json.loads(resource.children[b"open"].render_POST(request))
+        return resource._transports[result[u'transport']], result
+
+    def _poll(self, transport):
+        request = make_request(b"/receive", method=b"POST")
+        transport._receive.render_POST(request)
+        return request
+
+    def test_reap_inactive(self):
+        """
+        Inactive transports are killed after the kill timeout, while transports
+        which are polled stay alive. All transports share one timer.
+        """
+        resource = self._resource(killAfter=10)
+        idle, _ = self._open(resource)
+        active, _ = self._open(resource)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+
+        for i in range(4):
+            self.clock.advance(4)
+            self._poll(active)
+
+        self.assertNotIn(idle._transport_id, resource._transports)
+        self.assertIs(self.sessions[0].closed, False)
+        self.assertIn(active._transport_id, resource._transports)
+        self.assertIs(self.sessions[1].closed, None)
+
+        # timers stop when no transport is left
+        active.close()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_unbatched_receive(self):
+        """
+        Without batching, one message is received per poll.
+        """
+        resource = self._resource()
+        transport, _ = self._open(resource)
+        transport.send(message.Publish(1, u"com.example.topic1"))
+        transport.send(message.Publish(2, u"com.example.topic2"))
+
+        request = self._poll(transport)
+        self.assertEqual(json.loads(request.get_written_data().decode('utf8'))[1], 1)
+        request = self._poll(transport)
+        self.assertEqual(json.loads(request.get_written_data().decode('utf8'))[1], 2)
+
+    def test_batched_receive(self):
+        """
+        With batched receive requested at open, all pending messages are
+        received in one poll, framed like the batched serializer does.
+        """
+        resource = self._resource()
+        transport, result = self._open(resource, batched_receive=True)
+        self.assertTrue(result[u'batched_receive'])
+
+        transport.send(message.Publish(1, u"com.example.topic1"))
+        transport.send(message.Publish(2, u"com.example.topic2"))
+
+        request = self._poll(transport)
+        msgs = JsonSerializer(batched=True).unserialize(request.get_written_data())
+        self.assertEqual([msg.request for msg in msgs], [1, 2])
+
+    def test_batched_receive_unbatched_send(self):
+        """
+        With batched receive, messages sent by the client are still unbatched.
+        """
+        received = []
+        resource = self._resource()
+        transport, _ = self._open(resource, batched_receive=True)
+        self.sessions[0].onMessage = received.append
+
+        body = json.dumps([1, u"realm1", {u"roles": {u"subscriber": {}}}]).encode('utf8')
+        request = make_request(b"/send", method=b"POST", body=body)
+        transport._send.render_POST(request)
+
+        self.assertEqual(request.code, 204)
+        self.assertEqual(len(received), 1)
+        self.assertTrue(isinstance(received[0], message.Hello))
+
+    def test_queue_unlimited(self):
+        """
+        By default, the receive queue is not limited.
+        """
+        resource = self._resource()
+        transport, _ = self._open(resource)
+        for i in range(500):
+            transport.send(message.Publish(i, u"com.example.topic"))
+        self.assertIn(transport._transport_id, resource._transports)
+        self.assertEqual(len(transport._receive._queue), 500)
+
+    def test_queue_limit_kill(self):
+        """
+        By default, a transport exceeding the receive queue limits is killed.
+        """
+        resource = self._resource(queueLimitMessages=2)
+        transport, _ = self._open(resource)
+        for i in range(3):
+            transport.send(message.Publish(i, u"com.example.topic"))
+        self.assertNotIn(transport._transport_id, resource._transports)
+        self.assertIs(self.sessions[0].closed, False)
+
+    def test_queue_limit_drop_oldest(self):
+        """
+        With the 'drop_oldest' policy, the oldest messages are dropped.
+        """
+        resource = self._resource(queueLimitMessages=2, queueDropPolicy=u'drop_oldest')
+        transport, _ = self._open(resource, batched_receive=True)
+        for i in range(5):
+            transport.send(message.Publish(i, u"com.example.topic"))
+        self.assertEqual(transport._receive.dropped, 3)
+
+        request = self._poll(transport)
+        msgs = JsonSerializer(batched=True).unserialize(request.get_written_data())
+        self.assertEqual([msg.request for msg in msgs], [3, 4])
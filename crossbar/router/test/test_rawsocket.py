@@ -0,0 +1,96 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+import socket
+
+from twisted.trial import unittest
+from twisted.test.proto_helpers import StringTransport
+
+from autobahn.wamp import message
+
+from crossbar.router.protocol import WampRawSocketClientFactory
+from crossbar.router.protocol import _set_buffer_size
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def onMessage(self, msg):
+        self.messages.append(msg)
+
+
+class RawSocketClientTests(unittest.TestCase):
+
+    def test_serializer_cbor(self):
+        """
+        Client transports can use the CBOR serializer.
+        """
+        factory = WampRawSocketClientFactory(_Session, {u'serializer': u'cbor'})
+        self.assertEqual(factory._serializer.SERIALIZER_ID, u'cbor')
+
+        payload, binary = factory._serializer.serialize(message.Call(1, u'com.example.echo', args=[23]))
+        self.assertTrue(binary)
+        [msg] = factory._serializer.unserialize(payload)
+        self.assertEqual(msg.procedure, u'com.example.echo')
+        self.assertEqual(msg.args, [23])
+
+    def test_connection_buffer_size(self):
+        """
+        Client transports configured with a buffer size apply it once connected.
+        """
+        sock, other = socket.socketpair()
+        self.addCleanup(sock.close)
+        self.addCleanup(other.close)
+
+        factory = WampRawSocketClientFactory(_Session, {u'serializer': u'json', u'buffer_size': 256 * 1024})
+        proto = factory.buildProtocol(None)
+        proto.transport = StringTransport()
+        proto.transport.socket = sock
+        proto.connectionMade()
+
+        self.assertEqual(proto.transport.bufferSize, 256 * 1024)
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) >= 256 * 1024)
+
+    def test_buffer_size(self):
+        sock, other = socket.socketpair()
+        self.addCleanup(sock.close)
+        self.addCleanup(other.close)
+
+        transport = StringTransport()
+        transport.socket = sock
+        _set_buffer_size(transport, 256 * 1024)
+
+        self.assertEqual(transport.bufferSize, 256 * 1024)
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) >= 256 * 1024)
@@ -31,6 +31,7 @@
 from __future__ import absolute_import
 
 from twisted.trial import unittest
+from twisted.internet.task import Clock
 
 import txaio
 import mock
@@ -40,6 +41,7 @@ from autobahn.wamp import message
 from autobahn.wamp import role
 from autobahn.twisted.wamp import ApplicationSession
 
+from crossbar.router.admission import HandshakeAdmission
 from crossbar.router.router import RouterFactory
 from crossbar.router.session import RouterSessionFactory
 from crossbar.worker.router import RouterRealm
@@ -183,6 +185,74 @@ class TestEmbeddedSessions(unittest.TestCase):
             self.assertTrue('failure' in call[2])
             self.assertEqual(call[2]['failure'].value, the_exception)
 
+    def test_router_session_admission(self):
+        """
+        With handshake admission control on the transport, HELLOs beyond
+        the configured limits are answered with ABORT, and a finished
+        handshake frees its slot.
+        """
+        admission = HandshakeAdmission(max_pending=1, max_queued=0)
+
+        def hello(session):
+            transport = mock.MagicMock()
+            transport.get_channel_id = mock.MagicMock(return_value=b'deadbeef')
+            transport.factory._admission = admission
+            session.onOpen(transport)
+            session.onMessage(message.Hello(u'realm1', dict(caller=role.RoleCallerFeatures())))
+            return transport
+
+        # the first session gets a pending handshake
+        session1 = self.session_factory()
+        session1.onHello = lambda realm, details: txaio.create_future()
+        hello(session1)
+        self.assertEqual(admission.stats()[u'pending'], 1)
+
+        # .. so the second is rejected
+        session2 = self.session_factory()
+        transport2 = hello(session2)
+        msg = transport2.send.call_args[0][0]
+        self.assertIsInstance(msg, message.Abort)
+        self.assertEqual(msg.reason, u'crossbar.error.handshake_rejected')
+
+        # closing the first transport frees the slot
+        session1.onClose(False)
+        self.assertEqual(admission.stats()[u'pending'], 0)
+
+    def test_router_session_admission_deadline(self):
+        """
+        A handshake not finished within the handshake timeout (here: a
+        CHALLENGE never answered) is aborted, and its slot freed.
+        """
+        clock = Clock()
+        admission = HandshakeAdmission(max_pending=1, handshake_timeout=30, clock=clock)
+
+        transport = mock.MagicMock()
+        transport.get_channel_id = mock.MagicMock(return_value=b'deadbeef')
+        transport.factory._admission = admission
+
+        session = self.session_factory()
+        session.onHello = lambda realm, details: types.Challenge(u'ticket')
+        session.onOpen(transport)
+        session.onMessage(message.Hello(u'realm1', dict(caller=role.RoleCallerFeatures())))
+        self.assertIsInstance(transport.send.call_args[0][0], message.Challenge)
+        self.assertEqual(admission.stats()[u'pending'], 1)
+
+        clock.advance(30)
+        msg = transport.send.call_args[0][0]
+        self.assertIsInstance(msg, message.Abort)
+        self.assertEqual(msg.reason, u'crossbar.error.handshake_timeout')
+        self.assertTrue(transport.close.called)
+        self.assertEqual(admission.stats()[u'pending'], 0)
+        self.assertEqual(admission.stats()[u'expired'], 1)
+
+        # a late answer is ignored, and the slot is not released twice
+        session.onAuthenticate = lambda signature, extra: types.Accept(realm=u'realm1')
+        transport.send.reset_mock()
+        session.onMessage(message.Authenticate(u'secret'))
+        self.assertFalse(transport.send.called)
+        session.onClose(False)
+        self.assertEqual(admission.stats()[u'pending'], 0)
+
     def test_add_and_subscribe(self):
         """
         Create an application session that subscribes to some
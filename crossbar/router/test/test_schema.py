@@ -0,0 +1,161 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+from mock import patch
+
+from crossbar.test import TestCase
+from crossbar.worker.router import RouterRealm
+from crossbar.router.router import RouterFactory
+from crossbar.router.schema import SchemaIndex, InvalidSchema, InvalidPayload, compile_schema
+
+_DECL = {
+    u'type': u'topic',
+    u'args': {
+        u'type': u'array',
+        u'items': [
+            {u'type': u'integer', u'minimum': 0},
+            {u'type': u'string', u'maxLength': 3},
+        ],
+        u'additionalItems': False,
+    },
+    u'kwargs': {
+        u'type': u'object',
+        u'properties': {
+            u'tag': {u'enum': [u'a', u'b']},
+        },
+        u'required': [u'tag'],
+    },
+}
+
+
+class CompileSchemaTests(TestCase):
+    """
+    Tests for crossbar.router.schema.compile_schema.
+    """
+
+    def test_accept_any(self):
+        """
+        Schemas only carrying annotations compile to no validator.
+        """
+        self.assertIsNone(compile_schema({u'title': u'Anything', u'description': u'Goes'}))
+
+    def test_validate(self):
+        validator = compile_schema(_DECL[u'args'])
+        validator([1, u'abc'], u'args')
+        for value in [[-1, u'abc'], [1, u'abcd'], [1, u'abc', 2], [True], {}]:
+            self.assertRaises(InvalidPayload, validator, value, u'args')
+
+    def test_invalid_schema(self):
+        self.assertRaises(InvalidSchema, compile_schema, {u'type': u'thing'})
+        self.assertRaises(InvalidSchema, compile_schema, {u'properties': {u'x': []}})
+
+
+class SchemaIndexTests(TestCase):
+    """
+    Tests for crossbar.router.schema.SchemaIndex.
+    """
+
+    def test_exact(self):
+        index = SchemaIndex()
+        index.define(u'com.example.topic1', _DECL)
+
+        index.validate(u'event', u'com.example.topic1', [1, u'x'], {u'tag': u'a'})
+        self.assertRaises(InvalidPayload, index.validate, u'event', u'com.example.topic1', [1, u'x'], {})
+
+        # URIs without a schema aren't validated
+        index.validate(u'event', u'com.example.topic2', [u'anything'], None)
+
+        index.undefine(u'com.example.topic1')
+        index.validate(u'event', u'com.example.topic1', [u'anything'], None)
+
+    def test_prefix(self):
+        """
+        The longest matching prefix declaration applies.
+        """
+        index = SchemaIndex()
+        index.define(u'com.example.', dict(_DECL, match=u'prefix'))
+        index.define(u'com.example.free.', {u'match': u'prefix', u'args': {u'type': u'array'}})
+
+        self.assertRaises(InvalidPayload, index.validate, u'event', u'com.example.topic1', [u'x'], None)
+        index.validate(u'event', u'com.example.free.topic1', [u'x'], None)
+        index.validate(u'event', u'com.other.topic1', [u'x'], None)
+
+    def test_payload_types(self):
+        """
+        Call results are validated against the result schema of the declaration.
+        """
+        index = SchemaIndex()
+        index.define(u'com.example.add2', {
+            u'type': u'procedure',
+            u'args': {u'type': u'array', u'items': {u'type': u'number'}},
+            u'result': {u'args': {u'type': u'array', u'items': {u'type': u'integer'}}},
+        })
+        index.validate(u'call', u'com.example.add2', [1, 2.5], None)
+        self.assertRaises(InvalidPayload, index.validate, u'call_result', u'com.example.add2', [3.5], None)
+        index.validate(u'call_error', u'com.example.add2', [u'oops'], None)
+
+
+class RouterValidateTests(TestCase):
+    """
+    Tests for the cost of crossbar.router.router.Router.validate on the publish path.
+    """
+
+    def _router(self, validate):
+        router_factory = RouterFactory(u'mynode')
+        router_factory.start_realm(RouterRealm(None, {u'name': u'realm1', u'validate': validate}))
+        router = router_factory.get(u'realm1')
+        router._schemas.define(u'com.example.topic1', _DECL)
+        return router
+
+    def test_disabled(self):
+        """
+        Without validation enabled on the realm, schemas are not looked up.
+        """
+        router = self._router(False)
+        with patch.object(SchemaIndex, '_find') as find:
+            router.validate(u'event', u'com.example.topic1', [u'invalid'], None)
+        self.assertFalse(find.called)
+
+    def test_enabled(self):
+        router = self._router(True)
+        self.assertRaises(InvalidPayload, router.validate, u'event', u'com.example.topic1', [u'invalid'], None)
+        router.validate(u'event', u'com.example.topic1', [1, u'x'], {u'tag': u'b'})
+
+    def test_enabled_without_schema(self):
+        """
+        Topics without schemas only cost a (cached) lookup.
+        """
+        router = self._router(True)
+        for i in range(3):
+            router.validate(u'event', u'com.example.topic2', [u'anything'], None)
+        self.assertEqual(router._schemas._lookup, {u'com.example.topic2': None})
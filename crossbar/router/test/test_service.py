@@ -0,0 +1,133 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import
+
+from mock import MagicMock
+
+from autobahn.wamp import types
+from autobahn.wamp.exception import ApplicationError
+
+from crossbar.test import TestCase
+from crossbar.worker.router import RouterRealm
+from crossbar.router.router import RouterFactory
+from crossbar.router import service
+from crossbar.router.service import RouterServiceSession
+
+
+class FakeSession(object):
+
+    def __init__(self, session_id, authrole):
+        self._session_id = session_id
+        self._authrole = authrole
+        self._session_details = {u'session': session_id, u'authrole': authrole}
+
+
+class SessionListingTests(TestCase):
+    """
+    Tests for the session listing procedures of crossbar.router.service.RouterServiceSession.
+    """
+
+    def setUp(self):
+        router_factory = RouterFactory(u'mynode')
+        router_factory.start_realm(RouterRealm(None, {u'name': u'realm1'}))
+        self.router = router_factory.get(u'realm1')
+        self.service = RouterServiceSession(types.ComponentConfig(u'realm1'), self.router)
+
+        self.sessions = []
+        for i in range(10):
+            self._attach(i + 1, [u'user', u'admin'][i % 2])
+        self._attach(100, u'trusted')
+
+    def _attach(self, session_id, authrole):
+        session = FakeSession(session_id, authrole)
+        self.router.attach(session)
+        self.sessions.append(session)
+        return session
+
+    def test_count(self):
+        """
+        Sessions are counted per authrole as they attach and detach.
+        """
+        self.assertEqual(self.service.session_count(), 10)
+        self.assertEqual(self.service.session_count([u'admin', u'trusted']), 5)
+
+        self.router.detach(self.sessions[1])
+        self.assertEqual(self.service.session_count([u'admin']), 4)
+        self.assertEqual(self.router._authrole_session_count, {u'user': 5, u'admin': 4, u'trusted': 1})
+
+    def test_page(self):
+        """
+        Paging through the sessions returns every session once, in the order
+        they joined, also with sessions joining and leaving in between.
+        """
+        page = self.service.session_page(limit=4)
+        self.assertEqual(page[u'sessions'], [1, 2, 3, 4])
+
+        self.router.detach(self.sessions[4])
+        self._attach(11, u'user')
+
+        page = self.service.session_page(cursor=page[u'cursor'], limit=4)
+        self.assertEqual(page[u'sessions'], [6, 7, 8, 9])
+
+        page = self.service.session_page(cursor=page[u'cursor'], limit=4)
+        self.assertEqual(page, {u'sessions': [10, 11], u'cursor': None})
+
+        page = self.service.session_page([u'admin'], limit=10)
+        self.assertEqual(page, {u'sessions': [2, 4, 6, 8, 10], u'cursor': None})
+
+        self.assertRaises(ApplicationError, self.service.session_page, limit=0)
+
+    def test_compaction(self):
+        """
+        The attach order is compacted when many sessions have left.
+        """
+        for i in range(2000):
+            self.router.detach(self._attach(1000 + i, u'user'))
+        self.assertTrue(len(self.router._session_order) < 2000)
+        self.assertEqual(self.service.session_list(), list(range(1, 11)))
+
+    def test_list_progressive(self):
+        """
+        Large session lists are returned as progressive results.
+        """
+        self.patch(service, 'LISTING_CHUNK_SIZE', 4)
+        progress = []
+        details = MagicMock()
+        details.progress = progress.append
+
+        d = self.service.session_list(details=details)
+
+        def check(result):
+            self.assertEqual(progress, [[1, 2, 3, 4], [5, 6, 7, 8]])
+            self.assertEqual(result, [9, 10])
+        d.addCallback(check)
+        return d
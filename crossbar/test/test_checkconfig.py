@@ -308,3 +308,63 @@ class CheckRealmTests(TestCase):
             checkconfig.InvalidConfigException,
             checkconfig.check_router_realm, config_realm,
         )
+
+
+class ValidationCacheTests(TestCase):
+    """
+    Tests for remembering successful checks of configuration items.
+    """
+    def setUp(self):
+        checkconfig.clear_validation_cache()
+        self.addCleanup(checkconfig.clear_validation_cache)
+        return super(ValidationCacheTests, self).setUp()
+
+    def test_cached(self):
+        """
+        Checking an equal configuration item again is a cache hit, while
+        checking a changed item is checked again.
+        """
+        config_role = {
+            u"name": u"backend",
+            u"permissions": [{u"uri": u"com.example.", u"call": True}]
+        }
+        checkconfig.check_router_realm_role(config_role)
+        checkconfig.check_router_realm_role(json.loads(json.dumps(config_role)))
+        self.assertEqual(checkconfig.validation_cache_info()[u'hits'], 1)
+
+        config_role[u"permissions"][0][u"call"] = u"yes"
+        self.assertRaises(
+            checkconfig.InvalidConfigException,
+            checkconfig.check_router_realm_role, config_role,
+        )
+
+    def test_invalid_not_cached(self):
+        config_role = {u"name": u"backend", u"permissions": {}}
+        for i in range(2):
+            self.assertRaises(
+                checkconfig.InvalidConfigException,
+                checkconfig.check_router_realm_role, config_role,
+            )
+        self.assertEqual(checkconfig.validation_cache_info(), {u'hits': 0, u'misses': 2, u'size': 0})
+
+    def test_environment_not_cached(self):
+        """
+        Checks depending on environment variables are not remembered.
+        """
+        config_transport = {
+            u"type": u"websocket",
+            u"endpoint": {u"type": u"tcp", u"port": 8080},
+            u"auth": {
+                u"ticket": {
+                    u"type": u"static",
+                    u"principals": {u"joe": {u"ticket": u"${CROSSBAR_TEST_TICKET}"}}
+                }
+            }
+        }
+        checkconfig.check_router_transport(config_transport)
+        self.assertEqual(checkconfig.validation_cache_info()[u'size'], 0)
+
+        del config_transport[u"auth"]
+        checkconfig.check_router_transport(config_transport)
+        checkconfig.check_router_transport(config_transport)
+        self.assertEqual(checkconfig.validation_cache_info()[u'hits'], 1)
@@ -34,7 +34,7 @@ import json
 
 from six import StringIO as NativeStringIO, PY3
 
-from io import StringIO
+from io import StringIO, BytesIO
 
 from mock import Mock
 
@@ -352,6 +352,53 @@ class JSONObserverTests(TestCase):
         self.assertEqual(log_entry["level"], u"critical")
 
 
+class FramedJSONObserverTests(TestCase):
+
+    def _frames(self, data):
+        frames = []
+        header = _logging.log_frame_header
+        while data:
+            marker, length = header.unpack_from(data)
+            self.assertEqual(marker, _logging.log_frame_marker)
+            frames.append(json.loads(data[header.size:header.size + length].decode('utf8')))
+            data = data[header.size + length:]
+        return frames
+
+    def test_batching(self):
+        """
+        Once started, log events are written once per reactor iteration,
+        except for warnings.
+        """
+        stream = BytesIO()
+        observer = _logging.FramedJSONObserver(stream)
+        reactor = Mock()
+        reactor.running = True
+        observer.start(reactor)
+        log = make_logger(observer=observer)
+
+        log.info("Hello")
+        log.info("World")
+        self.assertEqual(stream.getvalue(), b"")
+        self.assertEqual(reactor.callFromThread.call_count, 1)
+
+        observer.flush()
+        self.assertEqual([e["text"] for e in self._frames(stream.getvalue())], [u"Hello", u"World"])
+
+        log.warn("Oops")
+        self.assertEqual(self._frames(stream.getvalue())[-1]["level"], u"warn")
+
+    def test_not_started(self):
+        """
+        Until started, log events are written right away.
+        """
+        stream = BytesIO()
+        log = make_logger(observer=_logging.FramedJSONObserver(stream))
+
+        log.info("Hello")
+
+        self.assertEqual(self._frames(stream.getvalue())[0]["text"], u"Hello")
+
+
 class StdoutObserverTests(TestCase):
 
     def test_basic(self):
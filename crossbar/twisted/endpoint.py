@@ -32,7 +32,9 @@ from __future__ import absolute_import, division
 
 import six
 import os
+import json
 from os import environ
+from weakref import WeakKeyDictionary
 from os.path import join, abspath
 
 from twisted.internet import defer
@@ -53,7 +55,7 @@ from crossbar.twisted.sharedport import SharedPort, SharedTLSPort
 try:
     from twisted.internet.endpoints import SSL4ServerEndpoint, \
         SSL4ClientEndpoint
-    from OpenSSL import crypto
+    from OpenSSL import crypto, SSL
     from OpenSSL.SSL import TLSv1_2_METHOD
     from twisted.internet.interfaces import ISSLTransport
 
@@ -124,10 +126,185 @@ def extract_peer_certificate(transport):
         return result
 
 
+# default lifetime of cached TLS sessions (seconds)
+DEFAULT_TLS_SESSION_TIMEOUT = 300
+
+# default interval for rotating TLS session ticket keys (seconds)
+DEFAULT_TLS_SESSION_KEY_ROTATION = 3600
+
+
+class TlsServerOptions(CertificateOptions):
+    """
+    TLS server context factory with a configurable session cache and session
+    tickets for resuming TLS sessions.
+
+    OpenSSL generates random session ticket keys per context, and the session
+    cache lives in the context too. Keys are rotated by creating a fresh context
+    for new connections, which invalidates all sessions and tickets issued before.
+
+    Handshakes are counted from the info callback of the context: a handshake
+    where the server sends no certificate is an abbreviated (resumed) one.
+    """
+
+    def __init__(self, session_cache=False, session_timeout=None, session_key_rotation=None, clock=None, **kwargs):
+        """
+
+        :param session_cache: Enable the server-side TLS session cache.
+        :type session_cache: bool
+        :param session_timeout: Lifetime of cached sessions and tickets in seconds.
+        :type session_timeout: int
+        :param session_key_rotation: Rotate session ticket keys (and drop the session cache)
+            after this many seconds.
+        :type session_key_rotation: int
+        :param clock: The clock to use (for testing).
+        :type clock: obj
+        """
+        # a session ID context is required for resuming sessions of verified peers
+        enableSessions = session_cache or kwargs.get('enableSessionTickets', False)
+        CertificateOptions.__init__(self, enableSessions=enableSessions, **kwargs)
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self._clock = clock
+        self._session_cache = session_cache
+        self._session_timeout = session_timeout
+        self._session_key_rotation = session_key_rotation
+        self._rotate_at = None
+        self.rotations = 0
+
+        # handshakes started, completed and resumed
+        self._accept = 0
+        self._accept_good = 0
+        self._resumed = 0
+
+        # connections in a handshake: connection -> server certificate sent
+        self._handshakes = WeakKeyDictionary()
+
+    def getContext(self):
+        if self._context is not None and self._rotate_at is not None and self._clock.seconds() >= self._rotate_at:
+            self.rotate()
+        if self._context is None:
+            self._context = self._makeContext()
+            if self._session_key_rotation and (self._session_cache or self.enableSessionTickets):
+                self._rotate_at = self._clock.seconds() + self._session_key_rotation
+        return self._context
+
+    def _makeContext(self):
+        ctx = CertificateOptions._makeContext(self)
+        if self._session_cache:
+            ctx.set_session_cache_mode(SSL.SESS_CACHE_SERVER)
+        else:
+            ctx.set_session_cache_mode(SSL.SESS_CACHE_OFF)
+        if self._session_timeout:
+            # this also limits the lifetime of session tickets
+            ctx.set_timeout(self._session_timeout)
+        ctx.set_info_callback(self._info_callback)
+        return ctx
+
+    def _info_callback(self, connection, where, ret):
+        # exceptions raised here would be swallowed by OpenSSL (and break the handshake)
+        try:
+            if where & SSL.SSL_CB_HANDSHAKE_START:
+                if connection not in self._handshakes:
+                    self._handshakes[connection] = False
+                    self._accept += 1
+            elif where & SSL.SSL_CB_ACCEPT_LOOP:
+                if connection.get_state_string() == b'SSLv3/TLS write certificate':
+                    self._handshakes[connection] = True
+            elif where & SSL.SSL_CB_HANDSHAKE_DONE:
+                # only count the first handshake of a connection
+                certificate_sent = self._handshakes.get(connection, None)
+                if certificate_sent is not None:
+                    self._handshakes[connection] = None
+                    self._accept_good += 1
+                    if not certificate_sent:
+                        self._resumed += 1
+        except Exception:
+            pass
+
+    def rotate(self):
+        """
+        Rotate the session ticket keys, dropping the session cache.
+        """
+        if self._context is not None:
+            self._context = None
+            self._rotate_at = None
+            self.rotations += 1
+
+    def session_stats(self):
+        """
+        Get TLS handshake and session resumption statistics (across key rotations).
+
+        :returns: Handshakes started (``accept``), completed (``accept_good``),
+            resumed (``resumed``) and full (``full``), and the number of key rotations.
+        :rtype: dict
+        """
+        return {
+            u'accept': self._accept,
+            u'accept_good': self._accept_good,
+            u'resumed': self._resumed,
+            u'full': self._accept_good - self._resumed,
+            u'rotations': self.rotations,
+        }
+
+
+# TLS server contexts, shared by listening endpoints with the same TLS configuration:
+# maps the TLS configuration to the modification times of the files it refers to
+# and the context created from them
+_tls_server_contexts = {}
+
+# maximum number of TLS server contexts kept around for sharing
+_TLS_SERVER_CONTEXTS_MAX = 32
+
+
+def _tls_server_context_key(config, cbdir):
+    """
+    Key of a TLS server context: the node directory and the TLS configuration.
+    """
+    return (abspath(cbdir), json.dumps(config, sort_keys=True))
+
+
+def _tls_server_context_mtimes(config, cbdir):
+    """
+    Modification times of the files a TLS configuration refers to (so renewed
+    certificates are picked up).
+    """
+    fnames = [config.get(k) for k in ['key', 'certificate', 'dhparam']]
+    fnames.extend(config.get('chain_certificates', []))
+    fnames.extend(config.get('ca_certificates', []))
+    mtimes = []
+    for fname in fnames:
+        if fname:
+            try:
+                mtimes.append(os.stat(abspath(join(cbdir, fname))).st_mtime)
+            except OSError:
+                mtimes.append(None)
+    return tuple(mtimes)
+
+
 def _create_tls_server_context(config, cbdir, log):
     """
     Create a CertificateOptions object for use with TLS listening endpoints.
+
+    Listening endpoints with the same TLS configuration share the context (and
+    hence the TLS session cache). When the files it refers to have changed, the
+    context is replaced by a new one.
     """
+    key = _tls_server_context_key(config, cbdir)
+    mtimes = _tls_server_context_mtimes(config, cbdir)
+    entry = _tls_server_contexts.get(key, None)
+    if entry is not None and entry[0] == mtimes:
+        log.debug("Reusing TLS server context")
+        return entry[1]
+
+    ctx = _make_tls_server_context(config, cbdir, log)
+    if entry is None and len(_tls_server_contexts) >= _TLS_SERVER_CONTEXTS_MAX:
+        # only listening endpoints created from now on will share contexts again
+        _tls_server_contexts.clear()
+    _tls_server_contexts[key] = (mtimes, ctx)
+    return ctx
+
+
+def _make_tls_server_context(config, cbdir, log):
     # server private key
     key_filepath = abspath(join(cbdir, config['key']))
     log.info("Loading server TLS key from {key_filepath}", key_filepath=key_filepath)
@@ -209,9 +386,19 @@ def _create_tls_server_context(config, cbdir, log):
         dh_params = None
         log.warn("No OpenSSL DH parameter file set - DH cipher modes will be deactive!")
 
+    # TLS session resumption
+    session_cache = config.get('session_cache', False)
+    session_tickets = config.get('session_tickets', False)
+    if session_cache or session_tickets:
+        log.info("TLS session resumption active (session cache {session_cache}, session tickets {session_tickets})",
+                 session_cache=session_cache, session_tickets=session_tickets)
+
     # create a TLS context factory
     # see: https://twistedmatrix.com/documents/current/api/twisted.internet.ssl.CertificateOptions.html
-    ctx = CertificateOptions(
+    ctx = TlsServerOptions(
+        session_cache=session_cache,
+        session_timeout=config.get('session_timeout', DEFAULT_TLS_SESSION_TIMEOUT),
+        session_key_rotation=config.get('session_key_rotation', DEFAULT_TLS_SESSION_KEY_ROTATION),
         privateKey=key,
         certificate=cert,
         extraCertChain=extra_certs,
@@ -223,8 +410,7 @@ def _create_tls_server_context(config, cbdir, log):
         # TLS hardening
         method=TLSv1_2_METHOD,
         enableSingleUseKeys=True,
-        enableSessions=False,
-        enableSessionTickets=False,
+        enableSessionTickets=session_tickets,
         fixBrokenPeers=False,
     )
 
@@ -33,17 +33,386 @@ import json
 import cgi  # for POST Request Header decoding
 import shutil
 
+from twisted.internet.defer import Deferred, DeferredLock, inlineCallbacks, maybeDeferred
+from twisted.internet.threads import deferToThreadPool
 from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET
 
 from autobahn.wamp.types import PublishOptions
 
 from crossbar._logging import make_logger
 
+_TEMP_PREFIX = '#kfhf3kz412uru578e38viokbjhfvz4w__'
+"""
+Prefix for files in the temp directory that are not yet complete.
+"""
+
+_DATA_FILE = 'data'
+"""
+Name of the (preallocated) file within the temp directory of a multi-chunk
+upload that chunks are written to at their final offset.
+"""
+
+_BITMAP_FILE = 'chunks'
+"""
+Name of the file within the temp directory of a multi-chunk upload that
+persists the bitmap of received chunks (so uploads can be resumed).
+"""
+
+_COPY_BLOCK_SIZE = 256 * 1024
+"""
+Block size used when scanning and copying chunk data, so memory use does not
+depend on chunk size.
+"""
+
+_MAX_PART_HEADERS = 16 * 1024
+"""
+Maximum size of the headers of a part of a multipart request body.
+"""
+
+_MAX_FIELD_SIZE = 64 * 1024
+"""
+Maximum size of a (non-file) form field of an upload request.
+"""
+
+
+def _bitmap_get(bitmap, index):
+    return bool(bitmap[index >> 3] & (1 << (index & 7)))
+
+
+def _bitmap_set(bitmap, index):
+    bitmap[index >> 3] |= (1 << (index & 7))
+
+
+def _bitmap_clear(bitmap, index):
+    bitmap[index >> 3] &= ~(1 << (index & 7))
+
+
+def _bitmap_count(bitmap):
+    return sum(bin(b).count('1') for b in bitmap)
+
+
+def _preallocate(fd, size):
+    """
+    Preallocate ``size`` bytes for the file open on ``fd``.
+    """
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        # not available on this platform/file system: fall back to
+        # (possibly sparse) extending the file
+        os.ftruncate(fd, size)
+
+
+def _copy_to_offset(part, fd, offset):
+    """
+    Copy the body of the request part ``part`` to the file open on ``fd`` starting
+    at ``offset``, without reading the data into memory as a whole.
+
+    :returns: Number of bytes copied.
+    :rtype: int
+    """
+    content = part.content
+    try:
+        in_fd = content.fileno()
+    except (AttributeError, IOError, ValueError):
+        in_fd = None
+
+    if in_fd is not None and hasattr(os, 'sendfile'):
+        # copy within the kernel
+        content.flush()
+        os.lseek(fd, offset, os.SEEK_SET)
+        copied = 0
+        while copied < part.length:
+            sent = os.sendfile(fd, in_fd, part.start + copied, part.length - copied)
+            if sent == 0:
+                break
+            copied += sent
+        return copied
+
+    content.seek(part.start)
+    copied = 0
+    while copied < part.length:
+        block = content.read(min(_COPY_BLOCK_SIZE, part.length - copied))
+        if not block:
+            break
+        if hasattr(os, 'pwrite'):
+            os.pwrite(fd, block, offset + copied)
+        else:
+            os.lseek(fd, offset + copied, os.SEEK_SET)
+            os.write(fd, block)
+        copied += len(block)
+    return copied
+
+
+class _FormPart(object):
+    """
+    A part of a multipart/form-data request body. The body of a part stays in the
+    request body, where it is referenced by position (it is not copied out).
+    """
+
+    def __init__(self, content, start, length, filename=None, value=None):
+        self.content = content
+        self.start = start
+        self.length = length
+        self.filename = filename
+        self.value = value
+
+
+def _find_markers(content, marker):
+    """
+    Find all positions of ``marker`` in the file-like object ``content``, reading
+    it block by block.
+    """
+    positions = []
+    content.seek(0)
+    base = 0
+    buf = b''
+    while True:
+        block = content.read(_COPY_BLOCK_SIZE)
+        if not block:
+            break
+        buf += block
+        start = 0
+        while True:
+            i = buf.find(marker, start)
+            if i < 0:
+                break
+            positions.append(base + i)
+            start = i + len(marker)
+        # keep what may be the beginning of a marker continued in the next block
+        keep = max(len(buf) - len(marker) + 1, start)
+        base += keep
+        buf = buf[keep:]
+    return positions
+
+
+def _parse_multipart(content, content_type):
+    """
+    Parse a multipart/form-data request body. Only the headers of the parts and the
+    values of form fields are read into memory: file parts (the chunk data) are
+    referenced within the request body, so they can be copied from there straight
+    to their final place.
+
+    :param content: The request body.
+    :type content: file-like object
+    :param content_type: The value of the ``Content-Type`` header of the request.
+    :type content_type: str
+
+    :returns: Map of form field name to part.
+    :rtype: dict of :class:`_FormPart`
+    """
+    ctype, params = cgi.parse_header(content_type)
+    if ctype != 'multipart/form-data' or not params.get('boundary', None):
+        # 400 Bad Request
+        raise _UploadError(400, "Upload request is not multipart/form-data")
+    marker = b'\r\n--' + params['boundary'].encode('iso-8859-1')
+
+    # the first delimiter is at the very beginning of the body (without a CRLF
+    # before it), unless there is a preamble
+    delimiters = _find_markers(content, marker)
+    content.seek(0)
+    if content.read(len(marker) - 2) == marker[2:]:
+        delimiters.insert(0, -2)
+
+    parts = {}
+    for pos, end in zip(delimiters, delimiters[1:]):
+        pos += len(marker)
+        head = b''
+        if end - pos > 0:
+            content.seek(pos)
+            head = content.read(min(end - pos, _MAX_PART_HEADERS))
+
+        # skip the rest of the delimiter line, then the part headers follow
+        i = head.find(b'\r\n')
+        j = head.find(b'\r\n\r\n', i) if i >= 0 else -1
+        if j < 0:
+            # 400 Bad Request
+            raise _UploadError(400, "Invalid multipart/form-data upload request")
+
+        disposition = {}
+        for line in head[i + 2:j].split(b'\r\n'):
+            name, _, value = line.decode('iso-8859-1').partition(':')
+            if name.strip().lower() == 'content-disposition':
+                disposition = cgi.parse_header(value.strip())[1]
+
+        name = disposition.get('name', None)
+        if name is None or name in parts:
+            continue
+
+        part = _FormPart(content, pos + j + 4, end - (pos + j + 4), filename=disposition.get('filename', None))
+        if part.filename is None:
+            if part.length > _MAX_FIELD_SIZE:
+                # 400 Bad Request
+                raise _UploadError(400, "Form field '{}' of upload request too large".format(name))
+            content.seek(part.start)
+            part.value = content.read(part.length).decode('utf8')
+        parts[name] = part
+
+    return parts
+
+
+def _write_chunk(temp_dir, part, offset, total_size):
+    """
+    Write a chunk of a multi-chunk upload directly to its final offset within
+    the preallocated data file of the upload (so no merging of chunk files is
+    needed at the end).
+
+    :returns: Number of bytes written.
+    :rtype: int
+    """
+    if not os.path.isdir(temp_dir):
+        os.makedirs(temp_dir)
+
+    fd = os.open(os.path.join(temp_dir, _DATA_FILE), os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        if os.fstat(fd).st_size < total_size:
+            _preallocate(fd, total_size)
+        return _copy_to_offset(part, fd, offset)
+    finally:
+        os.close(fd)
+
+
+def _write_bitmap(temp_dir, bitmap, index):
+    """
+    Persist the byte of the received chunks bitmap containing chunk ``index``.
+    """
+    fd = os.open(os.path.join(temp_dir, _BITMAP_FILE), os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        os.lseek(fd, index >> 3, os.SEEK_SET)
+        os.write(fd, bytes(bitmap[index >> 3:(index >> 3) + 1]))
+    finally:
+        os.close(fd)
+
+
+def _read_bitmap(temp_dir):
+    """
+    Read the persisted bitmap of received chunks of an upload, or ``None``
+    if there is none.
+    """
+    data_file = os.path.join(temp_dir, _DATA_FILE)
+    bitmap_file = os.path.join(temp_dir, _BITMAP_FILE)
+    if not os.path.isfile(data_file) or not os.path.isfile(bitmap_file):
+        return None
+    with open(bitmap_file, 'rb') as f:
+        bitmap = bytearray(f.read())
+    if not _bitmap_count(bitmap):
+        return None
+    return bitmap
+
+
+def _scan_temp_directory(temp_root):
+    """
+    Scan the temp dir for uploaded chunks so existing uploads can be resumed.
+    All other remains are purged.
+
+    :returns: Map of upload file ID to received chunks bitmap.
+    :rtype: dict
+    """
+    uploads = {}
+    for _fileTempDir in os.listdir(temp_root):
+        fileTempDir = os.path.join(temp_root, _fileTempDir)
+        fileTempName = os.path.basename(fileTempDir)
+        if os.path.isdir(fileTempDir):
+            bitmap = _read_bitmap(fileTempDir)
+            if bitmap is None:
+                # no chunks detected, remove remains completely
+                shutil.rmtree(fileTempDir)
+            else:
+                for fn in os.listdir(fileTempDir):
+                    if fn not in [_DATA_FILE, _BITMAP_FILE]:
+                        path = os.path.join(fileTempDir, fn)
+                        if os.path.isdir(path):
+                            shutil.rmtree(path)
+                        else:
+                            os.remove(path)
+                uploads[fileTempName] = bitmap
+        else:  # fileTempDir is a file remaining from a single chunk upload
+            os.remove(fileTempDir)
+    return uploads
+
+
+def _remove_stale_uploads(temp_root, uploads):
+    """
+    Remove temp dirs in ``temp_root`` of uploads not (or no longer) in ``uploads``.
+
+    This only works if there is a temp folder exclusive for crossbar file uploads
+    if the system temp folder is used then crossbar creates a "crossbar-uploads" there and
+    uses that as the temp folder for uploads
+    If you don't clean up regularly an attacker could fill up the OS file system
+    """
+    for _fileTempDir in os.listdir(temp_root):
+        fileTempDir = os.path.join(temp_root, _fileTempDir)
+        if os.path.isdir(fileTempDir) and os.path.basename(fileTempDir) not in uploads:
+            shutil.rmtree(fileTempDir)
+
+
+def _chmod(filename, permissions):
+    if permissions:
+        try:
+            os.chmod(filename, int(permissions, 8))
+        except Exception as e:
+            raise _UploadError(500, "Could not change file permissions of uploaded file: {}".format(e))
+
+
+def _store_file(temp_root, final_name, part, permissions):
+    """
+    Store the complete file of a single-chunk upload.
+    """
+    _finalFileName = os.path.join(temp_root, _TEMP_PREFIX + os.path.basename(final_name))
+    with open(_finalFileName, 'wb') as _finalFile:
+        _copy_to_offset(part, _finalFile.fileno(), 0)
+    try:
+        _chmod(_finalFileName, permissions)
+    except _UploadError:
+        os.remove(_finalFileName)
+        raise
+    os.rename(_finalFileName, final_name)
+
+
+def _finish_upload(temp_dir, final_name, permissions):
+    """
+    Move the (complete) data file of a multi-chunk upload into the upload directory
+    and remove the temp dir of the upload.
+    """
+    _finalFileName = os.path.join(temp_dir, _DATA_FILE)
+    try:
+        _chmod(_finalFileName, permissions)
+        # the data file already is the complete file: just move it
+        os.rename(_finalFileName, final_name)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+class _UploadError(Exception):
+    """
+    An error processing an upload, to be reported with the given HTTP status code.
+    """
+
+    def __init__(self, code, msg):
+        Exception.__init__(self, msg)
+        self.code = code
+        self.msg = msg
+
 
 class FileUploadResource(Resource):
 
     """
     Twisted Web resource that handles file uploads over `HTTP/POST` requests.
+
+    Chunks of a multi-chunk upload are written directly to their final offset
+    within a file preallocated in the temp directory, and received chunks are
+    tracked in a bitmap (persisted next to the file, so uploads can be resumed
+    after a restart). When the last chunk arrives, the file is moved into the
+    upload directory - there is no merging pass over chunk files.
+
+    Chunk data is copied straight from the request body to its place (with
+    ``sendfile`` where the body was spooled to a file), and is not spooled once
+    more while parsing the request.
+
+    When a thread pool is given, all file system access (including parsing of
+    the request body) runs on that pool, and the reactor thread only does the
+    bookkeeping of uploads.
     """
 
     log = make_logger()
@@ -53,7 +422,9 @@ class FileUploadResource(Resource):
                  temp_directory,
                  form_fields,
                  upload_session,
-                 options=None):
+                 options=None,
+                 reactor=None,
+                 thread_pool=None):
         """
 
         :param upload_directory: The target directory where uploaded files will be stored.
@@ -66,6 +437,11 @@ class FileUploadResource(Resource):
         :type upload_session: obj
         :param options: Options for file upload.
         :type options: dict or None
+        :param reactor: The reactor (only used with ``thread_pool``).
+        :type reactor: obj or None
+        :param thread_pool: A (bounded, started) thread pool to run file I/O on. When ``None``,
+            file I/O runs synchronously.
+        :type thread_pool: instance of :class:`twisted.python.threadpool.ThreadPool` or None
         """
 
         Resource.__init__(self)
@@ -78,44 +454,85 @@ class FileUploadResource(Resource):
         self._fileTypes = self._options.get('file_types', None)
         self._file_permissions = self._options.get('file_permissions', None)
 
+        if thread_pool and not reactor:
+            from twisted.internet import reactor
+        self._reactor = reactor
+        self._thread_pool = thread_pool
+
         # track uploaded files / chunks
         self._uploads = {}
 
         self.log.info('Upload Resource started.')
 
         # scan the temp dir for uploaded chunks and fill the _uploads dict with it
-        # so existing uploads can be resumed
-        # all other remains will be purged
-        for _fileTempDir in os.listdir(self._tempDirRoot):
-            fileTempDir = os.path.join(self._tempDirRoot, _fileTempDir)
-            fileTempName = os.path.basename(fileTempDir)
-            if os.path.isdir(fileTempDir):
-                self._uploads[fileTempName] = {'chunk_list': [], 'origin': 'startup'}
-                for chunk in os.listdir(fileTempDir):
-                    if chunk[:6] == 'chunk_':
-                        self._uploads[fileTempName]['chunk_list'].append(int(chunk[6:]))
-                    else:
-                        os.remove(os.path.join(fileTempDir, chunk))
-                # if no chunks detected then remove remains completely
-                if len(self._uploads[fileTempName]['chunk_list']) == 0:
-                    shutil.rmtree(fileTempDir)
-                    self._uploads.pop(fileTempName, None)
-            else:  # fileTempDir is a file remaining from a single chunk upload
-                os.remove(fileTempDir)
-
-        self.log.debug("Scanned pending uploads: {uploads}", uploads=self._uploads)
+        # so existing uploads can be resumed - requests wait for the scan to finish
+        self._scanned = self._run(_scan_temp_directory, self._tempDirRoot)
+
+        def scanned(uploads):
+            for fileId, bitmap in uploads.items():
+                if fileId not in self._uploads:
+                    self._uploads[fileId] = {'chunks': bitmap, 'received': None, 'origin': 'startup', 'lock': DeferredLock(),
+                                             'finishing': False}
+            self.log.debug("Scanned pending uploads: {uploads}", uploads=list(uploads.keys()))
+
+        def error(err):
+            self.log.failure("Failed to scan pending uploads: {log_failure.value}", failure=err)
+
+        self._scanned.addCallbacks(scanned, error)
+
+    def _run(self, fun, *args, **kwargs):
+        """
+        Run a function doing file I/O, on the thread pool if we have one.
+
+        :returns: A Deferred that fires with the result of the function.
+        :rtype: instance of :class:`twisted.internet.defer.Deferred`
+        """
+        if self._thread_pool:
+            return deferToThreadPool(self._reactor, self._thread_pool, fun, *args, **kwargs)
+        else:
+            return maybeDeferred(fun, *args, **kwargs)
 
     def render_POST(self, request):
         headers = {x.decode('iso-8859-1'): y.decode('iso-8859-1')
                    for x, y in request.getAllHeaders().items()}
 
-        origin = headers['host']
-
-        postFields = cgi.FieldStorage(
-            fp=request.content,
-            headers=headers,
-            environ={"REQUEST_METHOD": "POST"})
-
+        def parse(_):
+            return self._run(_parse_multipart, request.content, headers.get('content-type', ''))
+
+        # the connection may be lost while we process the chunk off the reactor thread
+        finished = []
+        request.notifyFinish().addBoth(finished.append)
+
+        def success(_):
+            if not finished:
+                request.setResponseCode(200)
+                request.finish()
+
+        def failed(err):
+            if finished:
+                self.log.debug("File upload failed after request finished: {error}", error=err.value)
+                return
+            if err.check(_UploadError):
+                self.log.debug(err.value.msg)
+                msg = err.value.msg.encode('utf8')
+                request.setResponseCode(err.value.code, msg)
+            else:
+                self.log.failure("File upload failed: {log_failure.value}", failure=err)
+                msg = b"file upload failed"
+                request.setResponseCode(500, msg)
+            request.write(msg)
+            request.finish()
+
+        d = Deferred()
+        self._scanned.addBoth(lambda res: d.callback(None) or res)
+        d.addCallback(parse)
+        d.addCallback(self._process_chunk, headers['host'])
+        d.addCallbacks(success, failed)
+
+        return NOT_DONE_YET
+
+    @inlineCallbacks
+    def _process_chunk(self, postFields, origin):
         f = self._form_fields
 
         filename = postFields[f['file_name']].value
@@ -123,7 +540,10 @@ class FileUploadResource(Resource):
         totalChunks = int(postFields[f['total_chunks']].value)
         chunkSize = int(postFields[f['chunk_size']].value)
         chunkNumber = int(postFields[f['chunk_number']].value)
-        fileContent = postFields[f['content']].value
+
+        # the chunk data, within the request body: we copy from there to the final
+        # place, and never read the chunk into memory at once
+        fileContent = postFields[f['content']]
 
         if 'chunk_extra' in f and f['chunk_extra'] in postFields:
             chunk_extra = json.loads(postFields[f['chunk_extra']].value)
@@ -186,7 +606,7 @@ class FileUploadResource(Resource):
         # Register upload right at the start to avoid overlapping upload conflicts
         #
         if fileId not in self._uploads:
-            self._uploads[fileId] = {'chunk_list': [], 'origin': origin}
+            self._uploads[fileId] = {'chunks': None, 'received': 0, 'origin': origin, 'lock': DeferredLock(), 'finishing': False}
             chunk_is_first = True
             self.log.debug('Started upload of file: file_name={file_name}, total_size={total_size}, total_chunks={total_chunks}, chunk_size={chunk_size}, chunk_number={chunk_number}',
                            file_name=fileId, total_size=totalSize, total_chunks=totalChunks, chunk_size=chunkSize, chunk_number=chunkNumber)
@@ -195,6 +615,9 @@ class FileUploadResource(Resource):
             # If the chunks are read at startup of crossbar any client may claim and resume the pending upload !
             #
             upl = self._uploads[fileId]
+            if upl['finishing']:
+                # 409 Conflict
+                raise _UploadError(409, "File being uploaded is just being finished.")
             if upl['origin'] == 'startup':
                 self.log.debug('Will try to resume upload of file: file_name={file_name}, total_size={total_size}, total_chunks={total_chunks}, chunk_size={chunk_size}, chunk_number={chunk_number}',
                                file_name=fileId, total_size=totalSize, total_chunks=totalChunks, chunk_size=chunkSize, chunk_number=chunkNumber)
@@ -203,98 +626,48 @@ class FileUploadResource(Resource):
                 # check if another session is uploading this file already
                 #
                 if upl['origin'] != origin:
-                    msg = "File being uploaded is already uploaded in a different session."
-                    self.log.debug(msg)
                     # 409 Conflict
-                    request.setResponseCode(409, msg.encode('utf8'))
-                    return msg.encode('utf8')
+                    raise _UploadError(409, "File being uploaded is already uploaded in a different session.")
                 else:
                     # check if the chunk is being uploaded in this very session already
                     # this should never happen !
-                    if chunkNumber in upl['chunk_list']:
+                    if upl['chunks'] is not None and _bitmap_get(upl['chunks'], chunkNumber - 1):
                         msg = "Chunk beeing uploaded is already uploading."
                         self.log.debug(msg)
                         # Don't throw a conflict. This may be a wanted behaviour.
                         # Even if an upload would be resumable, you don't have to resume.
-                        # 409 Conflict
-                        # request.setResponseCode(409, msg.encode('utf8'))
-                        # return msg.encode('utf8')
 
         # check file size
         #
         if totalSize > self._max_file_size:
-            msg = "Size {} of file to be uploaded exceeds maximum {}".format(totalSize, self._max_file_size)
-            self.log.debug(msg)
             # 413 Request Entity Too Large
-            request.setResponseCode(413, msg.encode('utf8'))
-            return msg.encode('utf8')
+            raise _UploadError(413, "Size {} of file to be uploaded exceeds maximum {}".format(totalSize, self._max_file_size))
 
         # check file extensions
         #
         extension = os.path.splitext(filename)[1]
         if self._fileTypes and extension not in self._fileTypes:
-            msg = "Type '{}' of file to be uploaded is in allowed types {}".format(extension, self._fileTypes)
-            self.log.debug(msg)
             # 415 Unsupported Media Type
-            request.setResponseCode(415, msg.encode('utf8'))
-            return msg.encode('utf8')
+            raise _UploadError(415, "Type '{}' of file to be uploaded is in allowed types {}".format(extension, self._fileTypes))
+
+        # check chunk number and size
+        #
+        if totalChunks < 1 or chunkNumber < 1 or chunkNumber > totalChunks or chunkSize < 1:
+            self._uploads.pop(fileId, None)
+            # 400 Bad Request
+            raise _UploadError(400, "Invalid chunk {} of {} chunks with chunk size {}".format(chunkNumber, totalChunks, chunkSize))
+
+        chunkOffset = (chunkNumber - 1) * chunkSize
+        chunkLength = fileContent.length
+        if chunkOffset + chunkLength > totalSize:
+            self._uploads.pop(fileId, None)
+            # 400 Bad Request
+            raise _UploadError(400, "Chunk {} of {} bytes at offset {} exceeds total size {}".format(chunkNumber, chunkLength, chunkOffset, totalSize))
 
         # TODO: check mime type
         #
         fileTempDir = os.path.join(self._tempDirRoot, fileId)
-        chunkName = os.path.join(fileTempDir, 'chunk_' + str(chunkNumber))
-        _chunkName = os.path.join(fileTempDir, '#kfhf3kz412uru578e38viokbjhfvz4w__' + 'chunk_' + str(chunkNumber))
-
-        def mergeFile():
-            # every chunk has to check if it is the last chunk written, except in a single chunk scenario
-            if totalChunks > 1 and len(self._uploads[fileId]['chunk_list']) >= totalChunks:
-                # last chunk
-                self.log.debug('Finished file upload after chunk {chunk_number} with chunk_list {chunk_list}', chunk_number=chunkNumber, chunk_list=self._uploads)
-
-                # Merge all files into one file and remove the temp files
-                # TODO: How to avoid the extra file IO ?
-                finalFileName = os.path.join(self._uploadRoot, fileId)
-                _finalFileName = os.path.join(fileTempDir, '#kfhf3kz412uru578e38viokbjhfvz4w__' + fileId)
-                with open(_finalFileName, 'wb') as _finalFile:
-                    for cn in range(1, totalChunks + 1):
-                        with open(os.path.join(fileTempDir, 'chunk_' + str(cn)), 'rb') as ff:
-                            _finalFile.write(ff.read())
-
-                os.rename(_finalFileName, finalFileName)
-
-                if self._file_permissions:
-                    perm = int(self._file_permissions, 8)
-                    try:
-                        os.chmod(finalFileName, perm)
-                    except Exception as e:
-                        msg = "file upload resource - could not change file permissions of uploaded file"
-                        self.log.debug(msg)
-                        self.log.debug(e)
-                        self._uploads.pop(fileId, None)
-                        request.setResponseCode(500, msg.encode('utf8'))
-                        return msg.encode('utf8')
-                    else:
-                        self.log.debug("Changed permissions on {file_name} to {permissions}", file_name=finalFileName, permissions=self._file_permissions)
-
-                # remove the file temp folder
-                shutil.rmtree(fileTempDir)
-
-                self._uploads.pop(fileId, None)
-
-                # publish file upload progress to file_progress_URI
-                fileupload_publish(
-                    {
-                        u"id": fileId,
-                        u"chunk": chunkNumber,
-                        u"name": filename,
-                        u"total": totalSize,
-                        u"remaining": 0,
-                        u"status": "finished",
-                        u"progress": 1.,
-                        u"finish_extra": finish_extra,
-                        u"chunk_extra": chunk_extra,
-                    }
-                )
+        finalFileName = os.path.join(self._uploadRoot, fileId)
 
         if chunk_is_first:
             # first chunk of file
@@ -314,33 +687,93 @@ class FileUploadResource(Resource):
                 }
             )
 
-            if totalChunks == 1:
-                # only one chunk overall -> write file directly
-                finalFileName = os.path.join(self._uploadRoot, fileId)
-                _finalFileName = os.path.join(self._tempDirRoot, '#kfhf3kz412uru578e38viokbjhfvz4w__' + fileId)
+        if totalChunks == 1:
+            # only one chunk overall -> write file directly
+            try:
+                yield self._run(_store_file, self._tempDirRoot, finalFileName, fileContent, self._file_permissions)
+            finally:
+                self._uploads.pop(fileId, None)
 
-                with open(_finalFileName, 'wb') as _finalFile:
-                    _finalFile.write(fileContent)
+            # publish file upload progress to file_progress_URI
+            fileupload_publish(
+                {
+                    u"id": fileId,
+                    u"chunk": chunkNumber,
+                    u"name": filename,
+                    u"total": totalSize,
+                    u"remaining": 0,
+                    u"status": "finished",
+                    u"progress": 1.,
+                    u"finish_extra": finish_extra,
+                    u"chunk_extra": chunk_extra,
+                }
+            )
 
-                if self._file_permissions:
-                    perm = int(self._file_permissions, 8)
-                    try:
-                        os.chmod(_finalFileName, perm)
-                    except Exception as e:
-                        # finalFileName.remove()
-                        msg = "Could not change file permissions of uploaded file"
-                        self.log.debug(msg)
-                        self.log.debug(e)
-                        request.setResponseCode(500, msg.encode('utf8'))
-                        return msg.encode('utf8')
-                    else:
-                        self.log.debug("Changed permissions on {file_name} to {permissions}", file_name=finalFileName, permissions=self._file_permissions)
+        else:
+            upl = self._uploads[fileId]
+            if upl['chunks'] is None or len(upl['chunks']) * 8 < totalChunks:
+                chunks = bytearray((totalChunks + 7) // 8)
+                if upl['chunks'] is not None:
+                    chunks[:len(upl['chunks'])] = upl['chunks']
+                upl['chunks'] = chunks
+            if upl['received'] is None:
+                # resumed after a restart: approximate from the chunks received
+                upl['received'] = min(_bitmap_count(upl['chunks']) * chunkSize, totalSize)
+
+            # write the chunk directly at its offset in the final file - chunks
+            # of the same upload are written concurrently (to different offsets)
+            written = yield self._run(_write_chunk, fileTempDir, fileContent, chunkOffset, totalSize)
+            self.log.debug("Chunk {chunk_number} ({written} bytes) written at offset {offset} of {file_name}",
+                           chunk_number=chunkNumber, written=written, offset=chunkOffset, file_name=fileId)
+
+            if self._uploads.get(fileId, None) is not upl or upl['finishing']:
+                # upload was finished (or discarded) while we were writing
+                return
+
+            if not _bitmap_get(upl['chunks'], chunkNumber - 1):
+                _bitmap_set(upl['chunks'], chunkNumber - 1)
+                upl['received'] += written
+
+                # bitmap updates of an upload (and finishing it) are serialized, as
+                # several chunks may share the same bitmap byte
+                try:
+                    yield upl['lock'].run(self._run, _write_bitmap, fileTempDir, upl['chunks'], chunkNumber - 1)
+                except Exception:
+                    # the chunk was not received as far as a resumed upload is concerned
+                    _bitmap_clear(upl['chunks'], chunkNumber - 1)
+                    upl['received'] -= written
+                    raise
+
+            # publish file upload progress
+            #
+            fileupload_publish(
+                {
+                    u"id": fileId,
+                    u"chunk": chunkNumber,
+                    u"name": filename,
+                    u"total": totalSize,
+                    u"remaining": totalSize - upl['received'],
+                    u"status": "progress",
+                    u"progress": round(float(upl['received']) / float(totalSize), 3),
+                    u"chunk_extra": chunk_extra,
+                }
+            )
 
-                os.rename(_finalFileName, finalFileName)
-                if chunkNumber not in self._uploads[fileId]['chunk_list']:
-                    self._uploads[fileId]['chunk_list'].append(chunkNumber)
+            # every chunk has to check if it is the last chunk written
+            if _bitmap_count(upl['chunks']) >= totalChunks:
+                # last chunk
+                self.log.debug('Finished file upload after chunk {chunk_number}', chunk_number=chunkNumber)
 
-                self._uploads.pop(fileId, None)
+                # the upload stays registered until its temp dir is gone, so the
+                # cleanup of stale uploads (running concurrently) leaves it alone
+                upl['finishing'] = True
+                try:
+                    yield upl['lock'].run(self._run, _finish_upload, fileTempDir, finalFileName, self._file_permissions)
+                finally:
+                    self._uploads.pop(fileId, None)
+
+                if self._file_permissions:
+                    self.log.debug("Changed permissions on {file_name} to {permissions}", file_name=finalFileName, permissions=self._file_permissions)
 
                 # publish file upload progress to file_progress_URI
                 fileupload_publish(
@@ -357,80 +790,10 @@ class FileUploadResource(Resource):
                     }
                 )
 
-            else:
-                # first of more chunks
-                # fileTempDir.remove()  # any potential conflict should have been resolved above. This should not be necessary!
-                if not os.path.isdir(fileTempDir):
-                    os.makedirs(fileTempDir)
-
-                with open(_chunkName, 'wb') as chunk:
-                    chunk.write(fileContent)
-                os.rename(_chunkName, chunkName)  # atomic file system operation
-                self.log.debug('chunk_' + str(chunkNumber) + ' written and moved to ' + chunkName)
-                # publish file upload progress
-                #
-                fileupload_publish(
-                    {
-                        u"id": fileId,
-                        u"chunk": chunkNumber,
-                        u"name": filename,
-                        u"total": totalSize,
-                        u"remaining": totalSize - chunkSize,
-                        u"status": "progress",
-                        u"progress": round(float(chunkSize) / float(totalSize), 3),
-                        u"chunk_extra": chunk_extra,
-                    }
-                )
-                if chunkNumber not in self._uploads[fileId]['chunk_list']:
-                    self._uploads[fileId]['chunk_list'].append(chunkNumber)
-                mergeFile()
+        if chunk_is_first:
             # clean the temp dir once per file upload
-            self._remove_stale_uploads()
-
-        else:
-            # intermediate chunk
-            if not os.path.isdir(fileTempDir):
-                os.makedirs(fileTempDir)
-
-            with open(_chunkName, 'wb') as chunk:
-                chunk.write(fileContent)
-            os.rename(_chunkName, chunkName)
-            self.log.debug('chunk_' + str(chunkNumber) + ' written and moved to ' + chunkName)
-
-            if chunkNumber not in self._uploads[fileId]['chunk_list']:
-                self._uploads[fileId]['chunk_list'].append(chunkNumber)
-
-            received = sum(os.path.getsize(os.path.join(fileTempDir, f)) for f in os.listdir(fileTempDir))
-
-            fileupload_publish(
-                {
-                    u"id": fileId,
-                    u"chunk": chunkNumber,
-                    u"name": filename,
-                    u"total": totalSize,
-                    u"remaining": totalSize - received,
-                    u"status": "progress",
-                    u"progress": round(float(received) / float(totalSize), 3),
-                    u"chunk_extra": chunk_extra,
-                }
-            )
-            mergeFile()
-        # no errors encountered -> respond success
-        request.setResponseCode(200)
-        return b''
-
-    def _remove_stale_uploads(self):
-        """
-        This only works if there is a temp folder exclusive for crossbar file uploads
-        if the system temp folder is used then crossbar creates a "crossbar-uploads" there and
-        uses that as the temp folder for uploads
-        If you don't clean up regularly an attacker could fill up the OS file system
-        """
-        for _fileTempDir in os.listdir(self._tempDirRoot):
-            fileTempDir = os.path.join(self._tempDirRoot, _fileTempDir)
-            self.log.debug('REMOVE STALE UPLOADS ' + str(os.path.basename(fileTempDir)))
-            if os.path.isdir(fileTempDir) and os.path.basename(fileTempDir) not in self._uploads:
-                shutil.rmtree(fileTempDir)
+            # note: we pass the live dict, so uploads started meanwhile are not purged
+            yield self._run(_remove_stale_uploads, self._tempDirRoot, self._uploads)
 
     def render_GET(self, request):
         """
@@ -450,7 +813,8 @@ class FileUploadResource(Resource):
         chunk_number = int(request.args[self._form_fields['chunk_number'].encode('iso-8859-1')][0].decode('utf8'))
 
         # a complete upload will be repeated an incomplete upload will be resumed
-        if file_name in self._uploads and chunk_number in self._uploads[file_name]['chunk_list']:
+        upl = self._uploads.get(file_name, None)
+        if upl and upl['chunks'] is not None and 0 < chunk_number <= len(upl['chunks']) * 8 and _bitmap_get(upl['chunks'], chunk_number - 1):
             self.log.debug("Skipping chunk upload {file_name} of chunk {chunk_number}", file_name=file_name, chunk_number=chunk_number)
             msg = b"chunk of file already uploaded"
             request.setResponseCode(200, msg)
@@ -98,9 +98,15 @@ class WorkerProcessEndpoint(ProcessEndpoint):
 
         :param worker: The worker this endpoint is being used for.
         :type worker: instance of WorkerProcess
+        :param spawner: Optional replacement for ``reactor.spawnProcess``, which may
+            return a deferred (e.g. :meth:`crossbar.controller.forkserver.ForkServer.spawnProcess`).
+        :type spawner: callable
         """
         self._worker = kwargs.pop('worker')
+        spawner = kwargs.pop('spawner', None)
         ProcessEndpoint.__init__(self, *args, **kwargs)
+        if spawner is not None:
+            self._spawnProcess = spawner
 
     def connect(self, protocolFactory):
         """
@@ -110,12 +116,12 @@ class WorkerProcessEndpoint(ProcessEndpoint):
         try:
             wrapped = _WorkerWrapIProtocol(proto, self._executable, self._errFlag)
             wrapped._worker = self._worker
-
-            self._spawnProcess(wrapped,
-                               self._executable, self._args, self._env,
-                               self._path, self._uid, self._gid, self._usePTY,
-                               self._childFDs)
         except:
             return defer.fail()
-        else:
-            return defer.succeed(proto)
+
+        d = defer.maybeDeferred(self._spawnProcess, wrapped,
+                                self._executable, self._args, self._env,
+                                self._path, self._uid, self._gid, self._usePTY,
+                                self._childFDs)
+        d.addCallback(lambda _: proto)
+        return d
@@ -30,14 +30,24 @@
 
 import os
 
+import collections
+import errno
+import gzip
+import hashlib
+import io
 import json
+import stat
 import time
 
+from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThreadPool
 from twisted.web import http, server
 from twisted.web.http import NOT_FOUND
 from twisted.web.resource import Resource, NoResource
-from twisted.web.static import File
-from twisted.python.filepath import FilePath
+from twisted.web.static import File, getTypeAndEncoding
+from twisted.python.compat import networkString
+from twisted.python.failure import Failure
+from twisted.python.filepath import FilePath, InsecurePath
 
 import crossbar
 from crossbar._compat import native_string
@@ -54,6 +64,13 @@ except (ImportError, SyntaxError):
     _HAS_CGI = False
 
 
+def _gzip(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
 class JsonResource(Resource):
     """
     Static Twisted Web resource that renders to a JSON document.
@@ -159,13 +176,270 @@ class RedirectResource(Resource):
         return server.NOT_DONE_YET
 
 
+class StaticFileCache(object):
+    """
+    A bounded LRU memory cache for static files, keyed by file path (and
+    validated against modification time and size of the file).
+
+    Entries hold the file content, a strong ETag and compressed variants of
+    the content (from precompressed ``.gz``/``.br`` files next to the file, or
+    compressed when the file is cached).
+    """
+
+    def __init__(self, max_size=64 * 1024 * 1024, max_file_size=1024 * 1024, compress=True, compress_min_size=256):
+        """
+
+        :param max_size: Maximum total size in bytes of cached content (including compressed variants).
+        :type max_size: int
+        :param max_file_size: Files larger than this are not cached.
+        :type max_file_size: int
+        :param compress: Whether to compress (and cache compressed variants of) files
+            when no precompressed variant exists.
+        :type compress: bool
+        :param compress_min_size: Files smaller than this are not compressed.
+        :type compress_min_size: int
+        """
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self.compress = compress
+        self.compress_min_size = compress_min_size
+
+        self._entries = collections.OrderedDict()
+        self._size = 0
+
+        # loads in flight: (path, mtime, size) -> list of Deferreds waiting for the entry
+        self._loading = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path, mtime, size):
+        """
+        Get the cache entry for the file, or ``None`` if the file is not cached
+        or changed since it was cached.
+        """
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            if entry.mtime == mtime and entry.size == size:
+                # move to the most recently used end
+                self._entries[path] = entry
+                self.hits += 1
+                return entry
+            self._size -= entry.cost
+        self.misses += 1
+        return None
+
+    def put(self, path, entry):
+        old = self._entries.pop(path, None)
+        if old is not None:
+            self._size -= old.cost
+        if entry.cost > self.max_size:
+            return
+        self._entries[path] = entry
+        self._size += entry.cost
+        self._evict()
+
+    def load(self, path, mtime, size, loader):
+        """
+        Load a file into the cache (after a miss). Concurrent misses of the same
+        file share one load.
+
+        :param loader: Function called (without arguments) to load the file,
+            returning a Deferred that fires with the cache entry.
+        :type loader: callable
+
+        :returns: A Deferred that fires with the cache entry.
+        :rtype: instance of :class:`twisted.internet.defer.Deferred`
+        """
+        key = (path, mtime, size)
+        waiting = self._loading.get(key, None)
+        if waiting is None:
+            waiting = self._loading[key] = []
+
+            def loaded(res):
+                del self._loading[key]
+                if not isinstance(res, Failure):
+                    self.put(path, res)
+                for d in waiting:
+                    if isinstance(res, Failure):
+                        d.errback(res)
+                    else:
+                        d.callback(res)
+
+            loader().addBoth(loaded)
+
+        d = Deferred()
+        waiting.append(d)
+        return d
+
+    def _evict(self):
+        while self._size > self.max_size and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.cost
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            u'entries': len(self._entries),
+            u'size': self._size,
+            u'max_size': self.max_size,
+            u'hits': self.hits,
+            u'misses': self.misses,
+            u'evictions': self.evictions,
+        }
+
+
+class _StaticFileCacheEntry(object):
+
+    __slots__ = ('path', 'mtime', 'size', 'content', 'etag', 'variants', 'cost')
+
+    def __init__(self, path, mtime, size, content):
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.content = content
+        self.etag = b'"' + hashlib.sha1(content).hexdigest().encode('ascii') + b'"'
+
+        # map of content coding (e.g. b'gzip') -> (content, etag)
+        self.variants = {}
+
+        self.cost = len(content)
+
+
+_ENCODING_SUFFIXES = [(b'br', '.br'), (b'gzip', '.gz')]
+
+_COMPRESSIBLE_TYPES = set([
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+    'text/javascript',
+])
+
+
+def _load_cache_entry(path, mtime, size, compressible, max_file_size, compress_min_size):
+    """
+    Read a file (and its precompressed variants) for the static file cache, and
+    compress it if there is no precompressed variant. This does blocking I/O, and
+    may run on a thread pool.
+
+    :param compressible: Whether to compress the file (if there is no precompressed variant).
+    :type compressible: bool
+
+    :returns: The cache entry.
+    :rtype: instance of :class:`_StaticFileCacheEntry`
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    entry = _StaticFileCacheEntry(path, mtime, size, content)
+
+    # use precompressed variants, if present and not older than the file
+    for coding, suffix in _ENCODING_SUFFIXES:
+        variant = path + suffix.encode('ascii') if isinstance(path, bytes) else path + suffix
+        try:
+            st = os.stat(variant)
+        except OSError:
+            continue
+        if st.st_mtime >= mtime and st.st_size <= max_file_size:
+            with open(variant, 'rb') as f:
+                data = f.read()
+            entry.variants[coding] = (data, entry.etag[:-1] + b'-' + coding + b'"')
+            entry.cost += len(data)
+
+    if compressible and b'gzip' not in entry.variants and len(content) >= compress_min_size:
+        data = _gzip(content)
+        if len(data) < len(content):
+            entry.variants[b'gzip'] = (data, entry.etag[:-1] + b'-gzip"')
+            entry.cost += len(data)
+
+    return entry
+
+
+def _accepted_encodings(request):
+    """
+    Parse the Accept-Encoding header of a request into a set of acceptable content codings.
+    """
+    accepted = set()
+    header = request.getHeader(b'accept-encoding')
+    if header:
+        for item in header.split(b','):
+            parts = item.strip().split(b';')
+            coding = parts[0].strip().lower()
+            q = 1.
+            for param in parts[1:]:
+                param = param.strip()
+                if param.startswith(b'q='):
+                    try:
+                        q = float(param[2:])
+                    except ValueError:
+                        q = 0.
+            if q > 0:
+                accepted.add(coding)
+    return accepted
+
+
+def _parse_range(header, size):
+    """
+    Parse a (single) byte range header.
+
+    :returns: Tuple ``(start, end)`` (inclusive), ``None`` if the header should be
+        ignored (serve the whole content), or ``False`` if the range is not satisfiable.
+    """
+    if not header or not header.startswith(b'bytes='):
+        return None
+    spec = header[6:].strip()
+    if b',' in spec:
+        # multiple ranges: we just serve the whole content
+        return None
+    try:
+        start, end = spec.split(b'-', 1)
+        if not start:
+            # suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return False
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
 class StaticResource(File):
     """
     Resource for static assets from file system.
+
+    When a thread pool is given, files are stat'ed on that pool (rather than on
+    the reactor thread), and files of at least ``io_thread_min_size`` bytes are
+    opened there too.
+
+    When a cache (:class:`StaticFileCache`) is given, files up to the cache's
+    maximum file size are served from memory: in (precompressed or lazily
+    compressed) variants according to ``Accept-Encoding``, with strong ETags
+    (answering ``If-None-Match`` with 304) and single byte range support.
     """
 
+    log = make_logger()
+
     def __init__(self, *args, **kwargs):
         self._cache_timeout = kwargs.pop('cache_timeout', None)
+        self._thread_pool = kwargs.pop('thread_pool', None)
+        self._io_thread_min_size = kwargs.pop('io_thread_min_size', 0)
+        self._reactor = kwargs.pop('reactor', None)
+        self._cache = kwargs.pop('cache', None)
+        if self._thread_pool and not self._reactor:
+            from twisted.internet import reactor
+            self._reactor = reactor
+
+        # stat result of the file, when stat'ed while looking it up
+        self._file_stat = kwargs.pop('file_stat', None)
+
         File.__init__(self, *args, **kwargs)
 
     def render_GET(self, request):
@@ -173,18 +447,274 @@ class StaticResource(File):
             request.setHeader(b'cache-control', u'max-age={}, public'.format(self._cache_timeout).encode('utf8'))
             request.setHeader(b'expires', http.datetimeToString(time.time() + self._cache_timeout))
 
+        if self._thread_pool:
+            return self._render_GET_threaded(request)
+
+        file_stat = self._file_stat
+        if file_stat is None and self._cache:
+            try:
+                file_stat = os.stat(self.path)
+            except OSError:
+                pass
+
+        if self._cache and file_stat is not None and stat.S_ISREG(file_stat.st_mode) and \
+                file_stat.st_size <= self._cache.max_file_size:
+            return self._render_GET_cached(request, file_stat.st_mtime, file_stat.st_size)
+
         return File.render_GET(self, request)
 
-    def createSimilarFile(self, *args, **kwargs):
+    render_HEAD = render_GET
+
+    def _variant(self, entry, accepted):
+        """
+        Select the (cached) content variant to send according to accepted content codings.
+
+        :returns: Tuple ``(coding, content, etag)``, where coding is ``None`` for identity.
+        """
+        for coding, _ in _ENCODING_SUFFIXES:
+            if coding in accepted and coding in entry.variants:
+                content, etag = entry.variants[coding]
+                return coding, content, etag
+        return None, entry.content, entry.etag
+
+    def _render_GET_cached(self, request, mtime, size):
+        """
+        Serve the file from the memory cache. On a cache miss, the file is read (and
+        compressed) on the thread pool, if there is one.
+        """
+        if self.type is None:
+            self.type, self.encoding = getTypeAndEncoding(self.basename(),
+                                                          self.contentTypes,
+                                                          self.contentEncodings,
+                                                          self.defaultType)
+
+        entry = self._cache.get(self.path, mtime, size)
+        if entry is not None:
+            return self._render_cache_entry(request, entry)
+
+        compressible = self._cache.compress and not self.encoding and \
+            (self.type.startswith('text/') or self.type in _COMPRESSIBLE_TYPES)
+        args = (self.path, mtime, size, compressible, self._cache.max_file_size, self._cache.compress_min_size)
+
+        if not self._thread_pool:
+            try:
+                entry = _load_cache_entry(*args)
+            except IOError as e:
+                if e.errno == errno.EACCES:
+                    return self.forbidden.render(request)
+                raise
+            self._cache.put(self.path, entry)
+            return self._render_cache_entry(request, entry)
+
+        finished = []
+        request.notifyFinish().addBoth(finished.append)
+
+        def loaded(entry):
+            if not finished:
+                request.write(self._render_cache_entry(request, entry))
+                request.finish()
+
+        def failed(err):
+            if finished:
+                return
+            if err.check(IOError) and err.value.errno == errno.EACCES:
+                request.write(self.forbidden.render(request))
+            else:
+                self.log.failure("Failed to read static file: {log_failure.value}", failure=err)
+                request.setResponseCode(http.INTERNAL_SERVER_ERROR)
+            request.finish()
+
+        d = self._cache.load(self.path, mtime, size,
+                             lambda: deferToThreadPool(self._reactor, self._thread_pool, _load_cache_entry, *args))
+        d.addCallbacks(loaded, failed)
+
+        return server.NOT_DONE_YET
+
+    def _render_cache_entry(self, request, entry):
+        """
+        Render the response for a cached file.
+        """
+        if self.encoding:
+            # the file itself is encoded (e.g. "foo.js.gz"): serve as is
+            coding, content, etag = None, entry.content, entry.etag
+        else:
+            coding, content, etag = self._variant(entry, _accepted_encodings(request))
+            request.setHeader(b'vary', b'accept-encoding')
+
+        request.setHeader(b'etag', etag)
+        request.setHeader(b'accept-ranges', b'bytes')
+        request.setHeader(b'content-type', networkString(self.type))
+        if coding:
+            request.setHeader(b'content-encoding', coding)
+        elif self.encoding:
+            request.setHeader(b'content-encoding', networkString(self.encoding))
+
+        # conditional requests
+        if_none_match = request.getHeader(b'if-none-match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(b',')]
+            if etag in tags or b'*' in tags:
+                request.setResponseCode(http.NOT_MODIFIED)
+                return b''
+            # If-Modified-Since is ignored when If-None-Match is present
+            request.setLastModified(entry.mtime)
+        elif request.setLastModified(entry.mtime) is http.CACHED:
+            return b''
+
+        # range requests (only on the identity variant)
+        if coding is None:
+            byte_range = _parse_range(request.getHeader(b'range'), len(content))
+            if byte_range is False:
+                request.setResponseCode(http.REQUESTED_RANGE_NOT_SATISFIABLE)
+                request.setHeader(b'content-range', networkString('bytes */{}'.format(len(content))))
+                request.setHeader(b'content-length', b'0')
+                return b''
+            elif byte_range is not None:
+                start, end = byte_range
+                request.setResponseCode(http.PARTIAL_CONTENT)
+                request.setHeader(b'content-range', networkString('bytes {}-{}/{}'.format(start, end, len(content))))
+                content = content[start:end + 1]
+
+        request.setHeader(b'content-length', networkString(str(len(content))))
+
+        if request.method == b'HEAD':
+            return b''
+
+        return content
+
+    def _render_GET_threaded(self, request):
+        """
+        Like :meth:`twisted.web.static.File.render_GET`, but with the stat of the
+        file (and the open of larger files) done on the thread pool.
+        """
+        cache = self._cache
+        min_size = self._io_thread_min_size
+
+        def stat_file():
+            self.restat(False)
+            if not self.exists():
+                return None, None
+            if self.isdir():
+                return stat.S_IFDIR, None
+            if cache and self.getsize() <= cache.max_file_size:
+                return stat.S_IFREG, None
+            if self.getsize() < min_size:
+                return stat.S_IFREG, None
+            return stat.S_IFREG, self.openForReading()
+
+        finished = []
+        request.notifyFinish().addBoth(finished.append)
+
+        def respond(body):
+            if body is not server.NOT_DONE_YET:
+                request.write(body)
+                request.finish()
+
+        def opened(res):
+            file_type, fileForReading = res
+            if finished:
+                if fileForReading:
+                    fileForReading.close()
+                return
+
+            if file_type is None:
+                respond(self.childNotFound.render(request))
+                return
+
+            if file_type == stat.S_IFDIR:
+                respond(self.redirect(request))
+                return
+
+            # the stat info of the file is cached by the restat above
+            size = self.getsize()
+            if cache and size <= cache.max_file_size:
+                respond(self._render_GET_cached(request, self.getModificationTime(), size))
+                return
+
+            if self.type is None:
+                self.type, self.encoding = getTypeAndEncoding(self.basename(),
+                                                              self.contentTypes,
+                                                              self.contentEncodings,
+                                                              self.defaultType)
+
+            request.setHeader(b'accept-ranges', b'bytes')
+
+            if fileForReading is None:
+                # smaller files are opened right here
+                try:
+                    fileForReading = self.openForReading()
+                except IOError as e:
+                    if e.errno == errno.EACCES:
+                        respond(self.forbidden.render(request))
+                        return
+                    raise
+
+            if request.setLastModified(self.getModificationTime()) is http.CACHED:
+                fileForReading.close()
+                request.finish()
+                return
+
+            if request.method == b'HEAD':
+                self._setContentHeaders(request)
+                fileForReading.close()
+                request.finish()
+                return
+
+            producer = self.makeProducer(request, fileForReading)
+            producer.start()
+
+        def failed(err):
+            if finished:
+                return
+            if err.check(IOError) and err.value.errno == errno.EACCES:
+                request.write(self.forbidden.render(request))
+            else:
+                self.log.failure("Failed to open static file: {log_failure.value}", failure=err)
+                request.setResponseCode(http.INTERNAL_SERVER_ERROR)
+            request.finish()
+
+        d = deferToThreadPool(self._reactor, self._thread_pool, stat_file)
+        d.addCallback(opened)
+        d.addErrback(failed)
+
+        return server.NOT_DONE_YET
+
+    def getChild(self, path, request):
+        # files looked up by name (the common case) are handled here: with a thread
+        # pool, the file is stat'ed only when rendered (on the pool), and otherwise,
+        # the stat done here is passed on to the child resource
+        if not path or self.processors or self.ignoredExts:
+            return File.getChild(self, path, request)
+
+        try:
+            child = self.child(path)
+        except InsecurePath:
+            return self.childNotFound
+
+        if self._thread_pool:
+            return self.createSimilarFile(child.path)
+
+        try:
+            file_stat = os.stat(child.path)
+        except OSError:
+            return self.childNotFound
+        return self.createSimilarFile(child.path, file_stat=file_stat)
+
+    def createSimilarFile(self, path, file_stat=None):
         #
         # File.getChild uses File.createSimilarFile to make a new resource of the same class to serve actual files under
         # a directory. We need to override that to also set the cache timeout on the child.
         #
 
-        similar_file = File.createSimilarFile(self, *args, **kwargs)
+        similar_file = File.createSimilarFile(self, path)
 
         # need to manually set this - above explicitly enumerates constructor args
         similar_file._cache_timeout = self._cache_timeout
+        similar_file._thread_pool = self._thread_pool
+        similar_file._io_thread_min_size = self._io_thread_min_size
+        similar_file._reactor = self._reactor
+        similar_file._cache = self._cache
+        similar_file._file_stat = file_stat
 
         return similar_file
 
@@ -35,13 +35,17 @@ import shutil
 
 from uuid import uuid4
 
+from OpenSSL import crypto, SSL
+
 from twisted.internet.endpoints import UNIXServerEndpoint
 from twisted.internet.selectreactor import SelectReactor
 from twisted.internet.protocol import Factory
+from twisted.internet.task import Clock
 from twisted.protocols.wire import Echo
 from twisted.python.runtime import platform
 
 from crossbar.test import TestCase
+from crossbar.twisted import endpoint as _endpoint
 from crossbar.twisted.endpoint import create_listening_endpoint_from_config
 from crossbar._logging import make_logger
 
@@ -142,3 +146,153 @@ class ListeningEndpointTests(TestCase):
         test_unix_already_listening.skip = _
         test_unix_already_listening_cant_delete.skip = _
         del _
+
+
+def _write_key_and_certificate(cbdir):
+    key = crypto.PKey()
+    key.generate_key(crypto.TYPE_RSA, 2048)
+    cert = crypto.X509()
+    cert.get_subject().CN = u'localhost'
+    cert.set_serial_number(1)
+    cert.gmtime_adj_notBefore(0)
+    cert.gmtime_adj_notAfter(3600)
+    cert.set_issuer(cert.get_subject())
+    cert.set_pubkey(key)
+    cert.sign(key, 'sha256')
+    with open(os.path.join(cbdir, 'server.key'), 'wb') as f:
+        f.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, key))
+    with open(os.path.join(cbdir, 'server.crt'), 'wb') as f:
+        f.write(crypto.dump_certificate(crypto.FILETYPE_PEM, cert))
+
+
+def _handshake(server_context, session=None):
+    """
+    Do a TLS handshake over memory BIOs, returning the client connection.
+    """
+    server = SSL.Connection(server_context, None)
+    server.set_accept_state()
+    client = SSL.Connection(SSL.Context(SSL.TLSv1_2_METHOD), None)
+    client.set_connect_state()
+    if session is not None:
+        client.set_session(session)
+
+    done = set()
+    while len(done) < 2:
+        for conn, peer in [(client, server), (server, client)]:
+            try:
+                conn.do_handshake()
+                done.add(conn)
+            except SSL.WantReadError:
+                pass
+            try:
+                peer.bio_write(conn.bio_read(65536))
+            except SSL.WantReadError:
+                pass
+
+    # OpenSSL drops sessions of connections not shut down properly
+    server.shutdown()
+    return client
+
+
+class TlsServerContextTests(TestCase):
+
+    log = make_logger()
+
+    def setUp(self):
+        self.cbdir = self.mktemp()
+        os.makedirs(self.cbdir)
+        _write_key_and_certificate(self.cbdir)
+        self.patch(_endpoint, '_tls_server_contexts', {})
+        self.config = {
+            u'key': u'server.key',
+            u'certificate': u'server.crt',
+            u'session_cache': True,
+        }
+        return super(TlsServerContextTests, self).setUp()
+
+    def test_context_reuse(self):
+        """
+        Listening endpoints with the same TLS configuration share the context.
+        """
+        ctx = _endpoint._create_tls_server_context(self.config, self.cbdir, self.log)
+        self.assertIs(_endpoint._create_tls_server_context(dict(self.config), self.cbdir, self.log), ctx)
+
+        self.config[u'session_cache'] = False
+        self.assertIsNot(_endpoint._create_tls_server_context(self.config, self.cbdir, self.log), ctx)
+
+    def test_context_replaced(self):
+        """
+        A context is replaced (not added to) when the certificate changes.
+        """
+        ctx = _endpoint._create_tls_server_context(self.config, self.cbdir, self.log)
+        cert = os.path.join(self.cbdir, u'server.crt')
+        mtime = os.stat(cert).st_mtime + 10
+        os.utime(cert, (mtime, mtime))
+
+        new_ctx = _endpoint._create_tls_server_context(self.config, self.cbdir, self.log)
+        self.assertIsNot(new_ctx, ctx)
+        self.assertIs(_endpoint._create_tls_server_context(self.config, self.cbdir, self.log), new_ctx)
+        self.assertEqual(len(_endpoint._tls_server_contexts), 1)
+
+    def test_contexts_bounded(self):
+        """
+        The number of contexts kept around for sharing is bounded.
+        """
+        self.patch(_endpoint, '_TLS_SERVER_CONTEXTS_MAX', 3)
+        for timeout in range(10):
+            self.config[u'session_timeout'] = 60 + timeout
+            _endpoint._create_tls_server_context(self.config, self.cbdir, self.log)
+            self.assertLessEqual(len(_endpoint._tls_server_contexts), 3)
+
+    def test_session_resumption(self):
+        """
+        Clients resume TLS sessions from the session cache.
+        """
+        ctx = _endpoint._create_tls_server_context(self.config, self.cbdir, self.log)
+        client = _handshake(ctx.getContext())
+        _handshake(ctx.getContext(), client.get_session())
+
+        stats = ctx.session_stats()
+        self.assertEqual((stats[u'accept'], stats[u'accept_good']), (2, 2))
+        self.assertEqual((stats[u'full'], stats[u'resumed']), (1, 1))
+
+    def test_session_cache_off(self):
+        """
+        Without the session cache, every handshake is a full handshake.
+        """
+        self.config[u'session_cache'] = False
+        ctx = _endpoint._create_tls_server_context(self.config, self.cbdir, self.log)
+        client = _handshake(ctx.getContext())
+        _handshake(ctx.getContext(), client.get_session())
+
+        stats = ctx.session_stats()
+        self.assertEqual((stats[u'full'], stats[u'resumed']), (2, 0))
+
+    def test_session_key_rotation(self):
+        """
+        Clients resume TLS sessions from session tickets, until the ticket keys
+        are rotated.
+        """
+        self.config[u'session_cache'] = False
+        self.config[u'session_tickets'] = True
+        ctx = _endpoint._create_tls_server_context(self.config, self.cbdir, self.log)
+        ctx._clock = Clock()
+        client = _handshake(ctx.getContext())
+        _handshake(ctx.getContext(), client.get_session())
+
+        ctx._clock.advance(_endpoint.DEFAULT_TLS_SESSION_KEY_ROTATION)
+        _handshake(ctx.getContext(), client.get_session())
+
+        stats = ctx.session_stats()
+        self.assertEqual((stats[u'full'], stats[u'resumed'], stats[u'rotations']), (2, 1, 1))
+
+    def test_session_timeout(self):
+        """
+        The session timeout is set on the context, also after a key rotation.
+        """
+        self.config[u'session_timeout'] = 60
+        ctx = _endpoint._create_tls_server_context(self.config, self.cbdir, self.log)
+        self.assertEqual(ctx.getContext().get_timeout(), 60)
+        ctx.rotate()
+        self.assertEqual(ctx.getContext().get_timeout(), 60)
+        self.assertEqual(ctx.session_stats()[u'rotations'], 1)
@@ -30,9 +30,15 @@
 
 from __future__ import absolute_import, division, print_function
 
+import io
 import os
+import tempfile
+
+from twisted.internet import reactor
+from twisted.python.threadpool import ThreadPool
 
 from crossbar.adapter.rest.test import renderResource
+from crossbar.twisted import fileupload
 from crossbar.twisted.fileupload import FileUploadResource
 from crossbar.test import TestCase
 
@@ -170,11 +176,14 @@ class FileUploadTests(TestCase):
         self.assertEqual(res.code, 200)
 
         # One directory in the temp dir, nothing in the upload dir, temp dir
-        # contains one chunk
+        # contains the preallocated file (with the first chunk written at its
+        # offset) and the bitmap of received chunks
         self.assertEqual(len(os.listdir(temp_dir)), 1)
-        self.assertEqual(len(os.listdir(os.path.join(temp_dir, "examplefile.txt"))), 1)
-        with open(os.path.join(temp_dir, "examplefile.txt", "chunk_1"), "rb") as f:
-            self.assertEqual(f.read(), b"hello Cros")
+        self.assertEqual(sorted(os.listdir(os.path.join(temp_dir, "examplefile.txt"))), ["chunks", "data"])
+        with open(os.path.join(temp_dir, "examplefile.txt", "data"), "rb") as f:
+            data = f.read()
+            self.assertEqual(len(data), 16)
+            self.assertEqual(data[:10], b"hello Cros")
         self.assertEqual(len(os.listdir(upload_dir)), 0)
 
         #
@@ -298,11 +307,14 @@ class FileUploadTests(TestCase):
         self.assertEqual(res.code, 200)
 
         # One directory in the temp dir, nothing in the upload dir, temp dir
-        # contains one chunk
+        # contains the preallocated file (with the first chunk written at its
+        # offset) and the bitmap of received chunks
         self.assertEqual(len(os.listdir(temp_dir)), 1)
-        self.assertEqual(len(os.listdir(os.path.join(temp_dir, "examplefile.txt"))), 1)
-        with open(os.path.join(temp_dir, "examplefile.txt", "chunk_1"), "rb") as f:
-            self.assertEqual(f.read(), b"hello Cros")
+        self.assertEqual(sorted(os.listdir(os.path.join(temp_dir, "examplefile.txt"))), ["chunks", "data"])
+        with open(os.path.join(temp_dir, "examplefile.txt", "data"), "rb") as f:
+            data = f.read()
+            self.assertEqual(len(data), 16)
+            self.assertEqual(data[:10], b"hello Cros")
         self.assertEqual(len(os.listdir(upload_dir)), 0)
 
         del resource
@@ -421,11 +433,12 @@ class FileUploadTests(TestCase):
         self.assertEqual(res.code, 200)
 
         # One directory in the temp dir, nothing in the upload dir, temp dir
-        # contains one chunk
+        # contains the preallocated file with the second chunk written at its
+        # offset
         self.assertEqual(len(os.listdir(temp_dir)), 1)
-        self.assertEqual(len(os.listdir(os.path.join(temp_dir, "examplefile.txt"))), 1)
-        with open(os.path.join(temp_dir, "examplefile.txt", "chunk_2"), "rb") as f:
-            self.assertEqual(f.read(), b"sbar!\n")
+        self.assertEqual(sorted(os.listdir(os.path.join(temp_dir, "examplefile.txt"))), ["chunks", "data"])
+        with open(os.path.join(temp_dir, "examplefile.txt", "data"), "rb") as f:
+            self.assertEqual(f.read()[10:], b"sbar!\n")
         self.assertEqual(len(os.listdir(upload_dir)), 0)
         #
         # Chunk 1
@@ -520,3 +533,280 @@ class FileUploadTests(TestCase):
 
         with open(os.path.join(upload_dir, "examplefile.txt"), "rb") as f:
             self.assertEqual(f.read(), b"hello Crossbar!\n")
+
+    def test_multichunk_large(self):
+        """
+        Uploading larger chunks (spooled to disk while parsing) out of order
+        writes them at their offsets, and received chunks can be queried.
+        """
+        upload_dir = self.mktemp()
+        os.makedirs(upload_dir)
+        temp_dir = self.mktemp()
+        os.makedirs(temp_dir)
+
+        fields = {
+            "file_name": "resumableFilename",
+            "mime_type": "resumableType",
+            "total_size": "resumableTotalSize",
+            "chunk_number": "resumableChunkNumber",
+            "chunk_size": "resumableChunkSize",
+            "total_chunks": "resumableTotalChunks",
+            "content": "file",
+        }
+
+        resource = FileUploadResource(upload_dir, temp_dir, fields, Mock())
+
+        chunk_size = 65536
+        chunks = [os.urandom(chunk_size), os.urandom(chunk_size), os.urandom(1000)]
+        total_size = sum(len(chunk) for chunk in chunks)
+
+        for chunk_number in [3, 1, 2]:
+            mp = Multipart()
+            mp.add_part(b"resumableChunkNumber", str(chunk_number).encode('ascii'))
+            mp.add_part(b"resumableChunkSize", str(chunk_size).encode('ascii'))
+            mp.add_part(b"resumableTotalSize", str(total_size).encode('ascii'))
+            mp.add_part(b"resumableFilename", b"bigfile.bin")
+            mp.add_part(b"resumableTotalChunks", b"3")
+            mp.add_part(b"file", chunks[chunk_number - 1],
+                        content_type=b"application/octet-stream",
+                        filename=b"blob")
+            body, headers = mp.render()
+
+            d = renderResource(
+                resource, b"/", method="POST",
+                headers=headers,
+                body=body
+            )
+
+            res = self.successResultOf(d)
+            self.assertEqual(res.code, 200)
+
+            if chunk_number == 3:
+                d = renderResource(
+                    resource, b"/", method="GET",
+                    params={b"resumableFilename": [b"bigfile.bin"], b"resumableChunkNumber": [b"3"]}
+                )
+                self.assertEqual(self.successResultOf(d).code, 200)
+
+                d = renderResource(
+                    resource, b"/", method="GET",
+                    params={b"resumableFilename": [b"bigfile.bin"], b"resumableChunkNumber": [b"1"]}
+                )
+                self.assertEqual(self.successResultOf(d).code, 404)
+
+        self.assertEqual(len(os.listdir(temp_dir)), 0)
+        with open(os.path.join(upload_dir, "bigfile.bin"), "rb") as f:
+            self.assertEqual(f.read(), b"".join(chunks))
+
+    def test_thread_pool(self):
+        """
+        With a thread pool, file I/O runs off the reactor thread and the
+        request is finished asynchronously.
+        """
+        upload_dir = self.mktemp()
+        os.makedirs(upload_dir)
+        temp_dir = self.mktemp()
+        os.makedirs(temp_dir)
+
+        fields = {
+            "file_name": "resumableFilename",
+            "mime_type": "resumableType",
+            "total_size": "resumableTotalSize",
+            "chunk_number": "resumableChunkNumber",
+            "chunk_size": "resumableChunkSize",
+            "total_chunks": "resumableTotalChunks",
+            "content": "file",
+        }
+
+        pool = ThreadPool(minthreads=0, maxthreads=2)
+        pool.start()
+        self.addCleanup(pool.stop)
+
+        resource = FileUploadResource(upload_dir, temp_dir, fields, Mock(),
+                                      reactor=reactor, thread_pool=pool)
+
+        chunks = [b"hello Cros", b"sbar!\n"]
+
+        def upload(chunk_number):
+            mp = Multipart()
+            mp.add_part(b"resumableChunkNumber", str(chunk_number).encode('ascii'))
+            mp.add_part(b"resumableChunkSize", b"10")
+            mp.add_part(b"resumableTotalSize", b"16")
+            mp.add_part(b"resumableFilename", b"examplefile.txt")
+            mp.add_part(b"resumableTotalChunks", b"2")
+            mp.add_part(b"file", chunks[chunk_number - 1],
+                        content_type=b"application/octet-stream",
+                        filename=b"blob")
+            body, headers = mp.render()
+
+            return renderResource(
+                resource, b"/", method="POST",
+                headers=headers,
+                body=body
+            )
+
+        def check(res):
+            self.assertEqual(res.code, 200)
+            self.assertEqual(len(os.listdir(temp_dir)), 0)
+            with open(os.path.join(upload_dir, "examplefile.txt"), "rb") as f:
+                self.assertEqual(f.read(), b"hello Crossbar!\n")
+
+        d = upload(1)
+        d.addCallback(lambda res: self.assertEqual(res.code, 200))
+        d.addCallback(lambda _: upload(2))
+        d.addCallback(check)
+        return d
+
+    def test_stale_cleanup_while_finishing(self):
+        """
+        Cleaning up stale uploads (on the first chunk of another upload) while
+        an upload is being finished leaves the finishing upload alone.
+        """
+        upload_dir = self.mktemp()
+        os.makedirs(upload_dir)
+        temp_dir = self.mktemp()
+        os.makedirs(temp_dir)
+
+        fields = {
+            "file_name": "resumableFilename",
+            "mime_type": "resumableType",
+            "total_size": "resumableTotalSize",
+            "chunk_number": "resumableChunkNumber",
+            "chunk_size": "resumableChunkSize",
+            "total_chunks": "resumableTotalChunks",
+            "content": "file",
+        }
+
+        resource = FileUploadResource(upload_dir, temp_dir, fields, Mock())
+
+        # run the cleanup right when the upload is being finished (as another
+        # upload on another thread of the pool could)
+        finish_upload = fileupload._finish_upload
+
+        def _finish_upload(temp_dir_, final_name, permissions):
+            fileupload._remove_stale_uploads(temp_dir, resource._uploads)
+            finish_upload(temp_dir_, final_name, permissions)
+
+        self.patch(fileupload, '_finish_upload', _finish_upload)
+
+        chunks = [b"hello Cros", b"sbar!\n"]
+        for chunk_number in [1, 2]:
+            mp = Multipart()
+            mp.add_part(b"resumableChunkNumber", str(chunk_number).encode('ascii'))
+            mp.add_part(b"resumableChunkSize", b"10")
+            mp.add_part(b"resumableTotalSize", b"16")
+            mp.add_part(b"resumableFilename", b"examplefile.txt")
+            mp.add_part(b"resumableTotalChunks", b"2")
+            mp.add_part(b"file", chunks[chunk_number - 1],
+                        content_type=b"application/octet-stream",
+                        filename=b"blob")
+            body, headers = mp.render()
+
+            d = renderResource(
+                resource, b"/", method="POST",
+                headers=headers,
+                body=body
+            )
+            self.assertEqual(self.successResultOf(d).code, 200)
+
+        self.assertEqual(resource._uploads, {})
+        self.assertEqual(len(os.listdir(temp_dir)), 0)
+        with open(os.path.join(upload_dir, "examplefile.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"hello Crossbar!\n")
+
+    def test_bitmap_write_failed(self):
+        """
+        When the bitmap of received chunks can't be written, the chunk fails
+        and is not taken as received.
+        """
+        upload_dir = self.mktemp()
+        os.makedirs(upload_dir)
+        temp_dir = self.mktemp()
+        os.makedirs(temp_dir)
+
+        fields = {
+            "file_name": "resumableFilename",
+            "mime_type": "resumableType",
+            "total_size": "resumableTotalSize",
+            "chunk_number": "resumableChunkNumber",
+            "chunk_size": "resumableChunkSize",
+            "total_chunks": "resumableTotalChunks",
+            "content": "file",
+        }
+
+        resource = FileUploadResource(upload_dir, temp_dir, fields, Mock())
+
+        def _write_bitmap(temp_dir, bitmap, index):
+            raise OSError("disk full")
+
+        self.patch(fileupload, '_write_bitmap', _write_bitmap)
+
+        mp = Multipart()
+        mp.add_part(b"resumableChunkNumber", b"1")
+        mp.add_part(b"resumableChunkSize", b"10")
+        mp.add_part(b"resumableTotalSize", b"16")
+        mp.add_part(b"resumableFilename", b"examplefile.txt")
+        mp.add_part(b"resumableTotalChunks", b"2")
+        mp.add_part(b"file", b"hello Cros",
+                    content_type=b"application/octet-stream",
+                    filename=b"blob")
+        body, headers = mp.render()
+
+        d = renderResource(
+            resource, b"/", method="POST",
+            headers=headers,
+            body=body
+        )
+        self.assertEqual(self.successResultOf(d).code, 500)
+        self.assertEqual(len(self.flushLoggedErrors(OSError)), 1)
+
+        d = renderResource(
+            resource, b"/", method="GET",
+            params={b"resumableFilename": [b"examplefile.txt"], b"resumableChunkNumber": [b"1"]}
+        )
+        self.assertEqual(self.successResultOf(d).code, 404)
+        self.assertEqual(resource._uploads["examplefile.txt"]["received"], 0)
+
+    def test_parse_multipart(self):
+        """
+        Request bodies are parsed with file parts referenced within the body (also
+        when delimiters span the blocks read), and copied from there.
+        """
+        self.patch(fileupload, '_COPY_BLOCK_SIZE', 7)
+
+        data = os.urandom(1000)
+        mp = Multipart()
+        mp.add_part(b"resumableChunkNumber", b"2")
+        mp.add_part(b"resumableFilename", b"bigfile.bin")
+        mp.add_part(b"file", data,
+                    content_type=b"application/octet-stream",
+                    filename=b"blob")
+        body, headers = mp.render()
+
+        body_file = tempfile.TemporaryFile()
+        self.addCleanup(body_file.close)
+        body_file.write(body)
+
+        parts = fileupload._parse_multipart(body_file, headers[b"content-type"][0].decode('ascii'))
+        self.assertEqual(sorted(parts.keys()), ["file", "resumableChunkNumber", "resumableFilename"])
+        self.assertEqual(parts["resumableChunkNumber"].value, u"2")
+        self.assertEqual(parts["resumableFilename"].value, u"bigfile.bin")
+        self.assertEqual(parts["file"].filename, "blob")
+        self.assertEqual(parts["file"].length, len(data))
+
+        target = self.mktemp()
+        fd = os.open(target, os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            self.assertEqual(fileupload._copy_to_offset(parts["file"], fd, 10), len(data))
+        finally:
+            os.close(fd)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"\0" * 10 + data)
+
+    def test_parse_multipart_invalid(self):
+        """
+        Request bodies not multipart/form-data are rejected.
+        """
+        with self.assertRaises(fileupload._UploadError) as e:
+            fileupload._parse_multipart(io.BytesIO(b"hello"), "text/plain")
+        self.assertEqual(e.exception.code, 400)
@@ -27,3 +27,261 @@
 #  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
 #
 #####################################################################################
+
+from __future__ import absolute_import, division, print_function
+
+import gzip
+import io
+import os
+import threading
+
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.task import deferLater
+from twisted.python import filepath
+from twisted.python.threadpool import ThreadPool
+from twisted.web.test._util import _render
+
+from crossbar.adapter.rest.test._request import request as make_request
+from crossbar.twisted import resource as _resource
+from crossbar.twisted.resource import StaticFileCache, StaticResource
+from crossbar.test import TestCase
+
+
+def _drive(request):
+    """
+    Drive the producer registered by a file resource until the response is
+    complete (the dummy transport does not pull from producers by itself).
+    """
+    while not request.finished:
+        producer, streaming = request.channel.transport.producers[-1]
+        producer.resumeProducing()
+
+
+class StaticResourceTests(TestCase):
+    """
+    Tests for crossbar.twisted.resource.StaticResource.
+    """
+
+    def _make_dir(self):
+        static_dir = self.mktemp()
+        os.makedirs(static_dir)
+        with open(os.path.join(static_dir, "small.txt"), "wb") as f:
+            f.write(b"hello")
+        with open(os.path.join(static_dir, "large.txt"), "wb") as f:
+            f.write(b"x" * 100000)
+        return static_dir
+
+    @inlineCallbacks
+    def _get(self, resource, name, headers={}):
+        request = make_request(b"/" + name, headers=headers)
+        d = _render(resource.getChild(name, request), request)
+
+        # wait for the file to be opened (possibly on the thread pool)
+        while not request.finished and not request.channel.transport.producers:
+            yield deferLater(reactor, 0.01, lambda: None)
+        _drive(request)
+
+        yield d
+        returnValue(request)
+
+    def test_sync(self):
+        """
+        Without a thread pool, files are served from the reactor thread.
+        """
+        resource = StaticResource(self._make_dir().encode('utf8'))
+        request = self.successResultOf(self._get(resource, b"small.txt"))
+        self.assertEqual(request.code, 200)
+        self.assertEqual(request.get_written_data(), b"hello")
+
+    def test_thread_pool(self):
+        """
+        With a thread pool, files are stat'ed (and larger files opened) off the
+        reactor thread, and not stat'ed at all when looked up.
+        """
+        pool = ThreadPool(minthreads=0, maxthreads=2)
+        pool.start()
+        self.addCleanup(pool.stop)
+
+        stat_threads = []
+        os_stat, filepath_stat = os.stat, filepath.stat
+
+        def recording(stat):
+            def _stat(path, *args, **kwargs):
+                stat_threads.append(threading.current_thread())
+                return stat(path, *args, **kwargs)
+            return _stat
+
+        resource = StaticResource(self._make_dir().encode('utf8'), reactor=reactor,
+                                  thread_pool=pool, io_thread_min_size=1000)
+        self.patch(os, 'stat', recording(os_stat))
+        self.patch(filepath, 'stat', recording(filepath_stat))
+
+        @inlineCallbacks
+        def check():
+            # small file: opened on the reactor thread after the stat
+            request = yield self._get(resource, b"small.txt")
+            self.assertEqual(request.code, 200)
+            self.assertEqual(request.get_written_data(), b"hello")
+
+            # large file: served after opening on the pool
+            request = yield self._get(resource, b"large.txt")
+            self.assertEqual(request.code, 200)
+            self.assertEqual(request.get_written_data(), b"x" * 100000)
+
+            # missing file: stat'ed on the pool too
+            request = yield self._get(resource, b"missing.txt")
+            self.assertEqual(request.code, 404)
+
+            self.assertTrue(stat_threads)
+            self.assertNotIn(threading.current_thread(), stat_threads)
+
+        return check()
+
+    def test_cache(self):
+        """
+        Cached files are served from memory with a strong ETag, and answered
+        with 304 on a matching If-None-Match.
+        """
+        cache = StaticFileCache()
+        resource = StaticResource(self._make_dir().encode('utf8'), cache=cache)
+
+        request = self.successResultOf(self._get(resource, b"small.txt"))
+        self.assertEqual(request.code, 200)
+        self.assertEqual(request.get_written_data(), b"hello")
+        etag = request.responseHeaders.getRawHeaders(b"etag")[0]
+        self.assertEqual(cache.stats()[u'misses'], 1)
+
+        request = self.successResultOf(self._get(resource, b"small.txt",
+                                                 {b"if-none-match": [etag]}))
+        self.assertEqual(request.code, 304)
+        self.assertEqual(request.get_written_data(), b"")
+        self.assertEqual(cache.stats()[u'hits'], 1)
+
+    def test_cache_modified(self):
+        """
+        A cached file is re-read when it changes on disk.
+        """
+        static_dir = self._make_dir()
+        cache = StaticFileCache()
+        resource = StaticResource(static_dir.encode('utf8'), cache=cache)
+
+        request = self.successResultOf(self._get(resource, b"small.txt"))
+        self.assertEqual(request.get_written_data(), b"hello")
+
+        path = os.path.join(static_dir, "small.txt")
+        with open(path, "wb") as f:
+            f.write(b"hello world")
+        os.utime(path, (0, 0))
+
+        request = self.successResultOf(self._get(resource, b"small.txt"))
+        self.assertEqual(request.get_written_data(), b"hello world")
+        self.assertEqual(cache.stats()[u'misses'], 2)
+
+    def test_cache_thread_pool(self):
+        """
+        With a thread pool, cache misses are read (and compressed) off the reactor
+        thread, once for concurrent misses of the same file.
+        """
+        pool = ThreadPool(minthreads=0, maxthreads=2)
+        pool.start()
+        self.addCleanup(pool.stop)
+
+        threads = []
+        load_cache_entry = _resource._load_cache_entry
+
+        def _load_cache_entry(*args):
+            threads.append(threading.current_thread())
+            return load_cache_entry(*args)
+
+        self.patch(_resource, '_load_cache_entry', _load_cache_entry)
+
+        cache = StaticFileCache()
+        resource = StaticResource(self._make_dir().encode('utf8'), cache=cache,
+                                  reactor=reactor, thread_pool=pool)
+
+        @inlineCallbacks
+        def check():
+            # concurrent misses of the same file share one load
+            d1 = self._get(resource, b"large.txt")
+            request = yield self._get(resource, b"large.txt", {b"accept-encoding": [b"gzip"]})
+            self.assertEqual((yield d1).get_written_data(), b"x" * 100000)
+            self.assertEqual(request.code, 200)
+            self.assertEqual(request.responseHeaders.getRawHeaders(b"content-encoding"), [b"gzip"])
+            data = request.get_written_data()
+            self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(data)).read(), b"x" * 100000)
+
+            # served from the cache
+            request = yield self._get(resource, b"large.txt")
+            self.assertEqual(request.get_written_data(), b"x" * 100000)
+
+            self.assertEqual(len(threads), 1)
+            self.assertIsNot(threads[0], threading.current_thread())
+            self.assertEqual(cache.stats()[u'misses'], 2)
+            self.assertEqual(cache.stats()[u'hits'], 1)
+
+        return check()
+
+    def test_cache_gzip(self):
+        """
+        Compressible files are compressed when cached, and served compressed
+        when the client accepts gzip.
+        """
+        cache = StaticFileCache()
+        resource = StaticResource(self._make_dir().encode('utf8'), cache=cache)
+
+        request = self.successResultOf(self._get(resource, b"large.txt",
+                                                 {b"accept-encoding": [b"gzip, deflate"]}))
+        self.assertEqual(request.code, 200)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b"content-encoding"), [b"gzip"])
+        data = request.get_written_data()
+        self.assertTrue(len(data) < 100000)
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(data)).read(), b"x" * 100000)
+
+        # gzip explicitly refused
+        request = self.successResultOf(self._get(resource, b"large.txt",
+                                                 {b"accept-encoding": [b"gzip;q=0"]}))
+        self.assertEqual(request.responseHeaders.getRawHeaders(b"content-encoding"), None)
+        self.assertEqual(request.get_written_data(), b"x" * 100000)
+
+    def test_cache_precompressed(self):
+        """
+        A precompressed .gz variant next to the file is served as is.
+        """
+        static_dir = self._make_dir()
+        with open(os.path.join(static_dir, "small.txt.gz"), "wb") as f:
+            f.write(b"precompressed")
+        resource = StaticResource(static_dir.encode('utf8'), cache=StaticFileCache())
+
+        request = self.successResultOf(self._get(resource, b"small.txt",
+                                                 {b"accept-encoding": [b"gzip"]}))
+        self.assertEqual(request.responseHeaders.getRawHeaders(b"content-encoding"), [b"gzip"])
+        self.assertEqual(request.get_written_data(), b"precompressed")
+
+    def test_cache_range(self):
+        """
+        Single byte ranges are served from the cache with 206.
+        """
+        resource = StaticResource(self._make_dir().encode('utf8'), cache=StaticFileCache())
+
+        request = self.successResultOf(self._get(resource, b"small.txt",
+                                                 {b"range": [b"bytes=1-3"]}))
+        self.assertEqual(request.code, 206)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b"content-range"), [b"bytes 1-3/5"])
+        self.assertEqual(request.get_written_data(), b"ell")
+
+        request = self.successResultOf(self._get(resource, b"small.txt",
+                                                 {b"range": [b"bytes=10-"]}))
+        self.assertEqual(request.code, 416)
+
+    def test_cache_eviction(self):
+        """
+        The cache is bounded by total size, evicting least recently used files.
+        """
+        cache = StaticFileCache(max_size=100001, compress=False)
+        resource = StaticResource(self._make_dir().encode('utf8'), cache=cache)
+
+        self.successResultOf(self._get(resource, b"large.txt"))
+        self.successResultOf(self._get(resource, b"small.txt"))
+        self.assertEqual(cache.stats()[u'entries'], 1)
+        self.assertEqual(cache.stats()[u'evictions'], 1)
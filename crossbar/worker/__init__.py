@@ -30,7 +30,6 @@
 
 import sys
 import importlib
-import pkg_resources
 
 from autobahn.twisted.wamp import ApplicationSession
 from autobahn.wamp.exception import ApplicationError
@@ -82,6 +81,8 @@ def _appsession_loader(config):
 
             log.debug("Starting WAMPlet '{}/{}'".format(dist, name))
 
+            import pkg_resources
+
             # component is supposed to make instances of ApplicationSession
             component = pkg_resources.load_entry_point(
                 dist, 'autobahn.twisted.wamplet', name)
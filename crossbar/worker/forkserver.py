@@ -0,0 +1,266 @@
+#####################################################################################
+#
+#  Copyright (C) Tavendo GmbH
+#
+#  Unless a separate license agreement exists between you and Tavendo GmbH (e.g. you
+#  have purchased a commercial license), the license terms below apply.
+#
+#  Should you enter into a separate license agreement after having received a copy of
+#  this software, then the terms of such license agreement replace the terms below at
+#  the time at which such license agreement becomes effective.
+#
+#  In case a separate license agreement ends, and such agreement ends without being
+#  replaced by another separate license agreement, the license terms below apply
+#  from the time at which said agreement ends.
+#
+#  LICENSE TERMS
+#
+#  This program is free software: you can redistribute it and/or modify it under the
+#  terms of the GNU Affero General Public License, version 3, as published by the
+#  Free Software Foundation. This program is distributed in the hope that it will be
+#  useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  See the GNU Affero General Public License Version 3 for more details.
+#
+#  You should have received a copy of the GNU Affero General Public license along
+#  with this program. If not, see <http://www.gnu.org/licenses/agpl-3.0.en.html>.
+#
+#####################################################################################
+
+
+from __future__ import absolute_import, print_function
+
+__all__ = ('run',)
+
+
+# modules imported once in the fork server, and hence already imported
+# in every worker forked from it. none of these may install a reactor,
+# since every worker installs its own reactor after it has been forked.
+PRELOAD_MODULES = [
+    'twisted.internet.epollreactor',
+    'twisted.internet.kqreactor',
+    'twisted.internet.pollreactor',
+    'twisted.internet.selectreactor',
+    'twisted.internet.stdio',
+    'autobahn.twisted.choosereactor',
+    'autobahn.twisted.wamp',
+    'autobahn.twisted.websocket',
+    'crossbar.worker.process',
+    'crossbar.worker.router',
+    'crossbar.worker.container',
+    'crossbar.worker.testee',
+]
+
+
+def preload(modules):
+    """
+    Import modules which would otherwise be imported by every single worker.
+
+    :param modules: The fully qualified names of the modules to import.
+    :type modules: list of str
+    """
+    import sys
+    import importlib
+
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # e.g. a reactor not available on this platform
+            pass
+
+    if 'twisted.internet.reactor' in sys.modules:
+        raise RuntimeError("preloading modules installed a Twisted reactor")
+
+
+def run():
+    """
+    Entry point into the fork server: a template process, started by the node
+    controller, which imports the modules needed by native workers once, and
+    then forks workers on request.
+
+    Requests are read from the control socket (a UNIX domain socket on FD 3).
+    Each request consists of a length prefixed JSON body with the worker command
+    line and environment, and carries the worker's ends of the pipes to the node
+    controller, which are moved to the FDs a spawned worker would have them on.
+
+    The fork server replies (one JSON object per line) with the PID of the forked
+    worker (or an error), and reports the exit status of workers that have ended.
+    """
+    import os
+    import sys
+    import json
+    import errno
+    import fcntl
+    import random
+    import select
+    import signal
+    import socket
+    import struct
+    import argparse
+    import traceback
+
+    from twisted.python.reflect import namedAny
+    from twisted.python.sendmsg import recvmsg, SCM_RIGHTS
+
+    # see crossbar.worker.process.run(): signals sent to the whole process group
+    # are for the workers, and we need to stay to report the workers' exit status
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--main',
+                        default='crossbar.worker.process.run',
+                        help='Fully qualified name of the worker entry point (optional).')
+
+    parser.add_argument('--control-fd',
+                        type=int,
+                        default=3,
+                        help='FD of the control socket connected to the node controller (optional).')
+
+    options = parser.parse_args()
+
+    preload(PRELOAD_MODULES)
+    main = namedAny(options.main)
+
+    try:
+        import setproctitle
+    except ImportError:
+        pass
+    else:
+        setproctitle.setproctitle('crossbar-forkserver')
+
+    header = struct.Struct('>I')
+
+    sock = socket.fromfd(options.control_fd, socket.AF_UNIX, socket.SOCK_STREAM)
+    os.close(options.control_fd)
+
+    # wake up from select() whenever a worker ended
+    wakeup_r, wakeup_w = os.pipe()
+    for fd in (wakeup_r, wakeup_w):
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    def send(obj):
+        try:
+            sock.sendall(json.dumps(obj).encode('utf8') + b'\n')
+        except socket.error:
+            # the node controller is gone
+            sys.exit(0)
+
+    def recv_exactly(size, data=b''):
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def recv_request():
+        msg = recvmsg(sock, maxSize=header.size)
+        if not msg.data:
+            return None, []
+        fds = []
+        for level, kind, payload in msg.ancillary:
+            if level == socket.SOL_SOCKET and kind == SCM_RIGHTS:
+                fds.extend(struct.unpack('{}i'.format(len(payload) // 4), payload))
+        data = recv_exactly(header.size, msg.data)
+        body = recv_exactly(header.unpack(data)[0]) if data else None
+        if body is None:
+            return None, fds
+        return json.loads(body.decode('utf8')), fds
+
+    def child(request, fds):
+        code = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            sock.close()
+            os.close(wakeup_r)
+            os.close(wakeup_w)
+
+            # move the pipes to the FDs the worker expects them on
+            targets = request[u'fds']
+            moved = [fcntl.fcntl(fd, fcntl.F_DUPFD, max(targets) + 1) for fd in fds]
+            for fd in fds:
+                os.close(fd)
+            for target, fd in zip(targets, moved):
+                os.dup2(fd, target)
+                os.close(fd)
+
+            os.environ.clear()
+            os.environ.update(request[u'env'])
+            if request.get(u'path', None):
+                os.chdir(request[u'path'])
+            sys.argv = request[u'args']
+
+            # don't share the state of the PRNG with all the other workers
+            random.seed()
+
+            main()
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+
+    children = set()
+
+    def reap():
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno != errno.ECHILD:
+                    raise
+                break
+            if not pid:
+                break
+            children.discard(pid)
+            send({u'exited': pid, u'status': status})
+
+    while True:
+        try:
+            readable = select.select([sock, wakeup_r], [], [])[0]
+        except (select.error, OSError) as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+
+        if wakeup_r in readable:
+            try:
+                while os.read(wakeup_r, 512):
+                    pass
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+            reap()
+
+        if sock in readable:
+            request, fds = recv_request()
+            if request is None:
+                # the node controller is gone
+                break
+            try:
+                pid = os.fork()
+            except OSError as e:
+                send({u'error': u'{}'.format(e)})
+            else:
+                if pid == 0:
+                    child(request, fds)
+                children.add(pid)
+                send({u'pid': pid})
+            finally:
+                for fd in fds:
+                    os.close(fd)
+
+
+if __name__ == '__main__':
+    run()
@@ -100,6 +100,26 @@ def run():
                         choices=['router', 'container', 'websocket-testee'],
                         help='Worker type (required).')
 
+    parser.add_argument('--transport',
+                        default='websocket',
+                        choices=['websocket', 'rawsocket'],
+                        help='Transport to talk to the node controller over (optional).')
+
+    parser.add_argument('--telemetry-fd',
+                        type=int,
+                        default=None,
+                        help='FD of the socket to send telemetry to the node controller over (optional).')
+
+    parser.add_argument('--loop-interval',
+                        type=float,
+                        default=None,
+                        help='Reactor loop monitor heartbeat interval in seconds (optional, default: no monitoring).')
+
+    parser.add_argument('--loop-threshold',
+                        type=float,
+                        default=None,
+                        help='Reactor loop stall threshold in seconds, 0 to not watch for stalls (optional).')
+
     parser.add_argument('--title',
                         type=six.text_type,
                         default=None,
@@ -109,7 +129,7 @@ def run():
 
     # make sure logging to something else than stdio is setup _first_
     #
-    from crossbar._logging import make_JSON_observer, cb_logging_aware
+    from crossbar._logging import FramedJSONObserver, cb_logging_framed
     from crossbar._logging import make_logger, start_logging, set_global_log_level
     from twisted.logger import globalLogPublisher
 
@@ -119,11 +139,11 @@ def run():
     log = make_logger()
 
     # Print a magic phrase that tells the capturing logger that it supports
-    # Crossbar's rich logging
-    print(cb_logging_aware, file=sys.__stderr__)
+    # Crossbar's rich logging (with framed log records)
+    print(cb_logging_framed, file=sys.__stderr__)
     sys.__stderr__.flush()
 
-    flo = make_JSON_observer(sys.__stderr__)
+    flo = FramedJSONObserver(sys.__stderr__)
     globalLogPublisher.addObserver(flo)
     start_logging()
 
@@ -132,6 +152,9 @@ def run():
     from autobahn.twisted.choosereactor import install_reactor
     reactor = install_reactor(options.reactor)
 
+    # batch writing log records once the reactor runs
+    flo.start(reactor)
+
     from twisted.python.reflect import qual
     log.info("Worker process starting ({python}-{reactor}) ..",
              python=platform.python_implementation(),
@@ -160,60 +183,95 @@ def run():
     os.chdir(options.cbdir)
     # log.msg("Starting from node directory {}".format(options.cbdir))
 
-    from crossbar.worker.router import RouterWorkerSession
-    from crossbar.worker.container import ContainerWorkerSession
-    from crossbar.worker.testee import WebSocketTesteeWorkerSession
-
-    WORKER_TYPE_TO_CLASS = {
-        'router': RouterWorkerSession,
-        'container': ContainerWorkerSession,
-        'websocket-testee': WebSocketTesteeWorkerSession
-    }
+    # only import the worker type actually run (the others pull in stuff not needed here)
+    if options.type == 'router':
+        from crossbar.worker.router import RouterWorkerSession as WorkerSession
+    elif options.type == 'container':
+        from crossbar.worker.container import ContainerWorkerSession as WorkerSession
+    else:
+        from crossbar.worker.testee import WebSocketTesteeWorkerSession as WorkerSession
 
     from twisted.internet.error import ConnectionDone
-    from autobahn.twisted.websocket import WampWebSocketServerProtocol
 
-    class WorkerServerProtocol(WampWebSocketServerProtocol):
+    def controller_connection_lost(reason):
+        # the behavior here differs slightly whether we're shutting down orderly
+        # or shutting down because of "issues"
+        was_clean = isinstance(reason.value, ConnectionDone)
 
-        def connectionLost(self, reason):
-            # the behavior here differs slightly whether we're shutting down orderly
-            # or shutting down because of "issues"
-            if isinstance(reason.value, ConnectionDone):
-                was_clean = True
+        # this log message is unlikely to reach the controller (unless
+        # only stdin/stdout pipes were lost, but not stderr)
+        try:
+            if was_clean:
+                log.info("Connection to node controller closed cleanly")
             else:
-                was_clean = False
-
-            try:
-                # this log message is unlikely to reach the controller (unless
-                # only stdin/stdout pipes were lost, but not stderr)
-                if was_clean:
-                    log.info("Connection to node controller closed cleanly")
-                else:
-                    log.warn("Connection to node controller lost: {reason}", reason=reason)
-
-                # give the WAMP transport a change to do it's thing
-                WampWebSocketServerProtocol.connectionLost(self, reason)
-            except:
-                # we're in the process of shutting down .. so ignore ..
-                pass
-            finally:
-                # after the connection to the node controller is gone,
-                # the worker is "orphane", and should exit
-
-                # determine process exit code
-                if was_clean:
-                    exit_code = 0
-                else:
-                    exit_code = 1
-
-                # exit the whole worker process when the reactor has stopped
-                reactor.addSystemEventTrigger('after', 'shutdown', os._exit, exit_code)
-
-                # stop the reactor
+                log.warn("Connection to node controller lost: {reason}", reason=reason)
+        except:
+            pass
+
+        return was_clean
+
+    def exit_worker(was_clean):
+        # after the connection to the node controller is gone,
+        # the worker is "orphane", and should exit
+
+        # determine process exit code
+        if was_clean:
+            exit_code = 0
+        else:
+            exit_code = 1
+
+        # exit the whole worker process when the reactor has stopped
+        reactor.addSystemEventTrigger('after', 'shutdown', os._exit, exit_code)
+
+        # stop the reactor
+        try:
+            reactor.stop()
+        except ReactorNotRunning:
+            pass
+
+    if options.transport == 'rawsocket':
+        from twisted.internet.defer import Deferred
+        from autobahn.twisted.rawsocket import WampRawSocketServerProtocol, WampRawSocketServerFactory
+        from crossbar.router.protocol import _create_serializer
+
+        class WorkerServerProtocol(WampRawSocketServerProtocol):
+
+            MAX_LENGTH = 2 ** 24
+
+            def connectionMade(self):
+                WampRawSocketServerProtocol.connectionMade(self)
+
+                # fires when the connection is gone (used by ApplicationSession.leave(),
+                # but only provided by the WebSocket transports of Autobahn)
+                self.is_closed = Deferred()
+
+            def connectionLost(self, reason):
+                was_clean = controller_connection_lost(reason)
+                self.is_closed.callback(self)
                 try:
-                    reactor.stop()
-                except ReactorNotRunning:
+                    # give the WAMP transport a change to do it's thing
+                    WampRawSocketServerProtocol.connectionLost(self, reason)
+                except:
+                    # we're in the process of shutting down .. so ignore ..
                     pass
+                finally:
+                    exit_worker(was_clean)
+
+    else:
+        from autobahn.twisted.websocket import WampWebSocketServerProtocol
+
+        class WorkerServerProtocol(WampWebSocketServerProtocol):
+
+            def connectionLost(self, reason):
+                was_clean = controller_connection_lost(reason)
+                try:
+                    # give the WAMP transport a change to do it's thing
+                    WampWebSocketServerProtocol.connectionLost(self, reason)
+                except:
+                    # we're in the process of shutting down .. so ignore ..
+                    pass
+                finally:
+                    exit_worker(was_clean)
 
     try:
         # create a WAMP application session factory
@@ -221,16 +279,39 @@ def run():
         from autobahn.twisted.wamp import ApplicationSessionFactory
         from autobahn.wamp.types import ComponentConfig
 
+        # connect the telemetry channel to the node controller (if any)
+        #
+        options.telemetry = None
+        if options.telemetry_fd is not None:
+            from crossbar.common.telemetry import TelemetrySenderProtocol, connect_telemetry
+            options.telemetry = connect_telemetry(reactor, options.telemetry_fd, TelemetrySenderProtocol())
+
+        # monitor the latency of the reactor loop
+        #
+        options.loop_monitor = None
+        if options.loop_interval:
+            from crossbar.common.loopmonitor import LoopMonitor, DEFAULT_THRESHOLD
+            options.loop_monitor = LoopMonitor(
+                reactor,
+                interval=options.loop_interval,
+                threshold=DEFAULT_THRESHOLD if options.loop_threshold is None else options.loop_threshold)
+            reactor.callWhenRunning(options.loop_monitor.start)
+            reactor.addSystemEventTrigger('before', 'shutdown', options.loop_monitor.stop)
+
         session_config = ComponentConfig(realm=options.realm, extra=options)
         session_factory = ApplicationSessionFactory(session_config)
-        session_factory.session = WORKER_TYPE_TO_CLASS[options.type]
+        session_factory.session = WorkerSession
 
-        # create a WAMP-over-WebSocket transport server factory
+        # create a WAMP-over-RawSocket (MsgPack) or WAMP-over-WebSocket transport server factory
         #
-        from autobahn.twisted.websocket import WampWebSocketServerFactory
-        transport_factory = WampWebSocketServerFactory(session_factory, u'ws://localhost')
-        transport_factory.protocol = WorkerServerProtocol
-        transport_factory.setProtocolOptions(failByDrop=False)
+        if options.transport == 'rawsocket':
+            transport_factory = WampRawSocketServerFactory(session_factory, [_create_serializer('msgpack')])
+            transport_factory.protocol = WorkerServerProtocol
+        else:
+            from autobahn.twisted.websocket import WampWebSocketServerFactory
+            transport_factory = WampWebSocketServerFactory(session_factory, u'ws://localhost')
+            transport_factory.protocol = WorkerServerProtocol
+            transport_factory.setProtocolOptions(failByDrop=False)
 
         # create a protocol instance and wire up to stdio
         #
@@ -33,7 +33,6 @@ from __future__ import absolute_import
 import os
 import sys
 import importlib
-import pkg_resources
 import tempfile
 import six
 
@@ -48,8 +47,6 @@ from autobahn.util import utcstr
 from autobahn.twisted.wamp import ApplicationSession
 from autobahn.wamp.exception import ApplicationError
 
-from crossbar.twisted.resource import StaticResource, StaticResourceNoListing
-
 from crossbar.router import uplink
 from crossbar.router.session import RouterSessionFactory
 from crossbar.router.service import RouterServiceSession
@@ -66,58 +63,34 @@ from crossbar.twisted.endpoint import create_listening_port_from_config
 
 from autobahn.wamp.types import RegisterOptions, PublishOptions
 
-try:
-    from twisted.web.wsgi import WSGIResource
-    _HAS_WSGI = True
-except (ImportError, SyntaxError):
-    # Twisted hasn't ported this to Python 3 yet
-    _HAS_WSGI = False
-
-from autobahn.twisted.resource import WebSocketResource, WSGIRootResource
-
-from crossbar.twisted.resource import WampLongPollResource, \
-    SchemaDocResource
-
-from twisted.web.server import Site
-
-import twisted
 import crossbar
 
-from crossbar.twisted.site import createHSTSRequestFactory
-
-from crossbar.twisted.resource import JsonResource, \
-    Resource404, \
-    RedirectResource
-
-from crossbar.twisted.fileupload import FileUploadResource
-
-from crossbar.twisted.flashpolicy import FlashPolicyFactory
-
 from autobahn.wamp.types import ComponentConfig
 
 from crossbar.worker.worker import NativeWorkerSession
 
 from crossbar.common import checkconfig
-from crossbar.twisted.site import patchFileContentTypes
 
-from crossbar.twisted.resource import _HAS_CGI
-
-from crossbar.adapter.rest import PublisherResource, CallerResource
-from crossbar.adapter.rest import WebhookResource
-
-if _HAS_CGI:
-    from crossbar.twisted.resource import CgiDirectory
+# Note: Twisted Web, the Web resources and the REST bridge are imported on first
+# use, since only routers running Web transports need them
 
 __all__ = ('RouterWorkerSession',)
 
 
-# monkey patch the Twisted Web server identification
-twisted.web.server.version = "Crossbar/{}".format(crossbar.__version__)
-
-
 # 12 hours as default cache timeout for static resources
 DEFAULT_CACHE_TIMEOUT = 12 * 60 * 60
 
+# default number of threads for file I/O of file upload resources
+DEFAULT_UPLOAD_IO_THREADS = 4
+
+# static files of at least this size are opened off the reactor thread
+# (when static resources are configured to use I/O threads)
+DEFAULT_STATIC_IO_THREAD_MIN_SIZE = 1024 * 1024
+
+# defaults for the memory cache of static resources (when enabled)
+DEFAULT_STATIC_CACHE_MAX_SIZE = 64 * 1024 * 1024
+DEFAULT_STATIC_CACHE_MAX_FILE_SIZE = 1024 * 1024
+
 EXTRA_MIME_TYPES = {
     '.svg': 'image/svg+xml',
     '.jgz': 'text/javascript'
@@ -713,11 +686,18 @@ class RouterWorkerSession(NativeWorkerSession):
 
         res = []
         for transport in sorted(self.transports.values(), key=lambda c: c.created):
-            res.append({
+            transport_info = {
                 u'id': transport.id,
                 u'created': utcstr(transport.created),
                 u'config': transport.config,
-            })
+            }
+            admission = getattr(transport.factory, '_admission', None)
+            if admission:
+                transport_info[u'admission'] = admission.stats()
+            tls_context = getattr(transport.port, 'ctxFactory', None)
+            if hasattr(tls_context, 'session_stats'):
+                transport_info[u'tls'] = tls_context.session_stats()
+            res.append(transport_info)
         return res
 
     def start_router_transport(self, id, config, details=None):
@@ -768,6 +748,8 @@ class RouterWorkerSession(NativeWorkerSession):
         #
         elif config['type'] == 'flashpolicy':
 
+            from crossbar.twisted.flashpolicy import FlashPolicyFactory
+
             transport_factory = FlashPolicyFactory(config.get('allowed_domain', None), config.get('allowed_ports', None))
 
         # WebSocket testee pseudo transport
@@ -786,6 +768,13 @@ class RouterWorkerSession(NativeWorkerSession):
         #
         elif config['type'] == 'web':
 
+            from twisted.web import server
+            from crossbar.twisted.resource import Resource404
+            from crossbar.twisted.site import createHSTSRequestFactory
+
+            # monkey patch the Twisted Web server identification
+            server.version = "Crossbar/{}".format(crossbar.__version__)
+
             options = config.get('options', {})
 
             # create Twisted Web root resource
@@ -802,7 +791,7 @@ class RouterWorkerSession(NativeWorkerSession):
 
             # create the actual transport factory
             #
-            transport_factory = Site(root)
+            transport_factory = server.Site(root)
             transport_factory.noisy = False
 
             # Web access logging
@@ -878,6 +867,11 @@ class RouterWorkerSession(NativeWorkerSession):
 
         :returns: Resource -- the new child resource
         """
+        from autobahn.twisted.resource import WebSocketResource, WSGIRootResource
+        from crossbar.twisted.resource import StaticResource, StaticResourceNoListing, StaticFileCache, \
+            WampLongPollResource, SchemaDocResource, JsonResource, Resource404, RedirectResource
+        from crossbar.twisted.site import patchFileContentTypes
+
         # WAMP-WebSocket resource
         #
         if path_config['type'] == 'websocket':
@@ -912,6 +906,7 @@ class RouterWorkerSession(NativeWorkerSession):
                     raise ApplicationError(u"crossbar.error.invalid_configuration", emsg)
                 else:
                     try:
+                        import pkg_resources
                         static_dir = os.path.abspath(pkg_resources.resource_filename(path_config['package'], path_config['resource']))
                     except Exception as e:
                         emsg = "Could not import resource {} from package {}: {}".format(path_config['resource'], path_config['package'], e)
@@ -933,7 +928,29 @@ class RouterWorkerSession(NativeWorkerSession):
 
             cache_timeout = static_options.get('cache_timeout', DEFAULT_CACHE_TIMEOUT)
 
-            static_resource = static_resource_class(static_dir, cache_timeout=cache_timeout)
+            # optionally stat/open larger files on a thread pool
+            io_threads = static_options.get('io_threads', 0)
+            if io_threads:
+                pool = ThreadPool(maxthreads=io_threads,
+                                  minthreads=0,
+                                  name="crossbar_static_threadpool")
+                self._reactor.addSystemEventTrigger('before', 'shutdown', pool.stop)
+                pool.start()
+            else:
+                pool = None
+
+            # optionally serve (smaller) files from a memory cache
+            cache_config = static_options.get('memory_cache', None)
+            if cache_config is not None:
+                cache = StaticFileCache(max_size=cache_config.get('max_size', DEFAULT_STATIC_CACHE_MAX_SIZE),
+                                        max_file_size=cache_config.get('max_file_size', DEFAULT_STATIC_CACHE_MAX_FILE_SIZE),
+                                        compress=cache_config.get('compress', True))
+            else:
+                cache = None
+
+            static_resource = static_resource_class(static_dir, cache_timeout=cache_timeout,
+                                                    reactor=self._reactor, thread_pool=pool, cache=cache,
+                                                    io_thread_min_size=static_options.get('io_thread_min_size', DEFAULT_STATIC_IO_THREAD_MIN_SIZE))
 
             # set extra MIME types
             #
@@ -952,7 +969,10 @@ class RouterWorkerSession(NativeWorkerSession):
         #
         elif path_config['type'] == 'wsgi':
 
-            if not _HAS_WSGI:
+            try:
+                from twisted.web.wsgi import WSGIResource
+            except (ImportError, SyntaxError):
+                # Twisted hasn't ported this to Python 3 yet
                 raise ApplicationError(u"crossbar.error.invalid_configuration", "WSGI unsupported")
 
             if 'module' not in path_config:
@@ -1009,6 +1029,8 @@ class RouterWorkerSession(NativeWorkerSession):
         #
         elif path_config['type'] == 'cgi':
 
+            from crossbar.twisted.resource import CgiDirectory
+
             cgi_processor = path_config['processor']
             cgi_directory = os.path.abspath(os.path.join(self.config.extra.cbdir, path_config['directory']))
             cgi_directory = cgi_directory.encode('ascii', 'ignore')  # http://stackoverflow.com/a/20433918/884770
@@ -1021,11 +1043,21 @@ class RouterWorkerSession(NativeWorkerSession):
 
             path_options = path_config.get('options', {})
 
+            # receive queue limits were accepted, but not enforced, by earlier versions: so
+            # only enforce them (with the defaults for what is not set) when configured
+            if set(path_options) & set(['queue_limit_bytes', 'queue_limit_messages', 'queue_drop_policy']):
+                queue_limit_bytes = path_options.get('queue_limit_bytes', 128 * 1024)
+                queue_limit_messages = path_options.get('queue_limit_messages', 100)
+            else:
+                queue_limit_bytes = 0
+                queue_limit_messages = 0
+
             lp_resource = WampLongPollResource(self._router_session_factory,
                                                timeout=path_options.get('request_timeout', 10),
                                                killAfter=path_options.get('session_timeout', 30),
-                                               queueLimitBytes=path_options.get('queue_limit_bytes', 128 * 1024),
-                                               queueLimitMessages=path_options.get('queue_limit_messages', 100),
+                                               queueLimitBytes=queue_limit_bytes,
+                                               queueLimitMessages=queue_limit_messages,
+                                               queueDropPolicy=path_options.get('queue_drop_policy', u'kill'),
                                                debug=path_options.get('debug', False),
                                                debug_transport_id=path_options.get('debug_transport_id', None)
                                                )
@@ -1037,6 +1069,8 @@ class RouterWorkerSession(NativeWorkerSession):
         #
         elif path_config['type'] == 'publisher':
 
+            from crossbar.adapter.rest import PublisherResource
+
             # create a vanilla session: the publisher will use this to inject events
             #
             publisher_session_config = ComponentConfig(realm=path_config['realm'], extra=None)
@@ -1054,6 +1088,8 @@ class RouterWorkerSession(NativeWorkerSession):
         #
         elif path_config['type'] == 'webhook':
 
+            from crossbar.adapter.rest import WebhookResource
+
             # create a vanilla session: the webhook will use this to inject events
             #
             webhook_session_config = ComponentConfig(realm=path_config['realm'], extra=None)
@@ -1071,6 +1107,8 @@ class RouterWorkerSession(NativeWorkerSession):
         #
         elif path_config['type'] == 'caller':
 
+            from crossbar.adapter.rest import CallerResource
+
             # create a vanilla session: the caller will use this to inject calls
             #
             caller_session_config = ComponentConfig(realm=path_config['realm'], extra=None)
@@ -1088,6 +1126,8 @@ class RouterWorkerSession(NativeWorkerSession):
         #
         elif path_config['type'] == 'upload':
 
+            from crossbar.twisted.fileupload import FileUploadResource
+
             upload_directory = os.path.abspath(os.path.join(self.config.extra.cbdir, path_config['directory']))
             upload_directory = upload_directory.encode('ascii', 'ignore')  # http://stackoverflow.com/a/20433918/884770
             if not os.path.isdir(upload_directory):
@@ -1118,7 +1158,20 @@ class RouterWorkerSession(NativeWorkerSession):
 
             self.log.info("File upload resource started. Uploads to {upl} using temp folder {tmp}.", upl=upload_directory, tmp=temp_directory)
 
-            return FileUploadResource(upload_directory, temp_directory, path_config['form_fields'], upload_session, path_config.get('options', {}))
+            # file I/O of uploads runs on a (bounded) thread pool
+            upload_options = path_config.get('options', {})
+            io_threads = upload_options.get('io_threads', DEFAULT_UPLOAD_IO_THREADS)
+            if io_threads:
+                pool = ThreadPool(maxthreads=io_threads,
+                                  minthreads=0,
+                                  name="crossbar_upload_threadpool")
+                self._reactor.addSystemEventTrigger('before', 'shutdown', pool.stop)
+                pool.start()
+            else:
+                pool = None
+
+            return FileUploadResource(upload_directory, temp_directory, path_config['form_fields'], upload_session, upload_options,
+                                      reactor=self._reactor, thread_pool=pool)
 
         # Generic Twisted Web resource
         #
@@ -32,8 +32,6 @@ from __future__ import absolute_import
 
 import os
 import sys
-import pkg_resources
-import jinja2
 import signal
 
 from twisted.internet.error import ReactorNotRunning
@@ -46,7 +44,7 @@ from autobahn.wamp.types import PublishOptions, RegisterOptions
 from crossbar._logging import make_logger
 from crossbar.common.reloader import TrackingModuleReloader
 from crossbar.common.process import NativeProcessSession
-from crossbar.common.profiler import PROFILERS
+from crossbar.common.profiler import PROFILERS, PROFILE_FORMATS, export_profile
 from crossbar.common.processinfo import _HAS_PSUTIL
 
 if _HAS_PSUTIL:
@@ -55,6 +53,29 @@ if _HAS_PSUTIL:
 __all__ = ('NativeWorkerSession',)
 
 
+class _WebTemplates(object):
+    """
+    Jinja2 templates for Web (like WS status page et al), which are loaded on first use.
+    """
+
+    log = make_logger()
+
+    def __init__(self):
+        self._env = None
+
+    def get_template(self, name):
+        if self._env is None:
+            import jinja2
+            import pkg_resources
+
+            templates_dir = os.path.abspath(pkg_resources.resource_filename("crossbar", "web/templates"))
+            self.log.debug("Using Web templates from {templates_dir}",
+                           templates_dir=templates_dir)
+            self._env = jinja2.Environment(loader=jinja2.FileSystemLoader(templates_dir))
+
+        return self._env.get_template(name)
+
+
 class NativeWorkerSession(NativeProcessSession):
 
     """
@@ -77,8 +98,14 @@ class NativeWorkerSession(NativeProcessSession):
         self._node_id = self.config.extra.node
         self._uri_prefix = 'crossbar.node.{}.worker.{}'.format(self.config.extra.node, self.config.extra.worker)
 
+        if 'loop_monitor' in self.config.extra:
+            self._loop_monitor = self.config.extra.loop_monitor
+
         NativeProcessSession.onConnect(self, False)
 
+        if 'telemetry' in self.config.extra:
+            self._telemetry_channel = self.config.extra.telemetry
+
         self._module_tracker = TrackingModuleReloader(debug=True)
 
         self._profiles = {}
@@ -88,10 +115,7 @@ class NativeWorkerSession(NativeProcessSession):
 
         # Jinja2 templates for Web (like WS status page et al)
         #
-        templates_dir = os.path.abspath(pkg_resources.resource_filename("crossbar", "web/templates"))
-        self.log.debug("Using Web templates from {templates_dir}",
-                       templates_dir=templates_dir)
-        self._templates = jinja2.Environment(loader=jinja2.FileSystemLoader(templates_dir))
+        self._templates = _WebTemplates()
 
         self.join(self.config.realm)
 
@@ -118,6 +142,7 @@ class NativeWorkerSession(NativeProcessSession):
             # profiling control
             'get_profilers',
             'start_profiler',
+            'stop_profiler',
             'get_profile',
         ]
 
@@ -215,7 +240,7 @@ class NativeWorkerSession(NativeProcessSession):
         :returns: A list of profilers.
         :rtype: list of unicode
         """
-        return [p.marshal() for p in PROFILERS.items()]
+        return [p.marshal() for p in PROFILERS.values()]
 
     def start_profiler(self, profiler, runtime=10, async=True, details=None):
         """
@@ -224,9 +249,10 @@ class NativeWorkerSession(NativeProcessSession):
         Start a profiler producing a profile which is stored and can be
         queried later.
 
-        :param profiler: The profiler to start, e.g. ``vmprof``.
+        :param profiler: The profiler to start, e.g. ``sampler`` or ``vmprof``.
         :type profiler: unicode
-        :param runtime: Profiling duration in seconds.
+        :param runtime: Profiling duration in seconds. The ``sampler`` profiler
+            runs until stopped (see :meth:`stop_profiler`) when this is ``0``.
         :type runtime: float
         :param async: Flag to turn on/off asynchronous mode.
         :type async: bool
@@ -239,6 +265,7 @@ class NativeWorkerSession(NativeProcessSession):
         if profiler not in PROFILERS:
             raise Exception("no such profiler")
 
+        profiler_id = profiler
         profiler = PROFILERS[profiler]
 
         self.log.debug("Starting profiler {profiler}, running for {secs} seconds", profiler=profiler, secs=runtime)
@@ -260,7 +287,7 @@ class NativeWorkerSession(NativeProcessSession):
             {
                 u'id': profile_id,
                 u'who': details.caller,
-                u'profiler': profiler,
+                u'profiler': profiler_id,
                 u'runtime': runtime,
                 u'async': async,
             },
@@ -270,7 +297,7 @@ class NativeWorkerSession(NativeProcessSession):
         def on_profile_success(profile_result):
             self._profiles[profile_id] = {
                 u'id': profile_id,
-                u'profiler': profiler,
+                u'profiler': profiler_id,
                 u'runtime': runtime,
                 u'profile': profile_result
             }
@@ -313,21 +340,71 @@ class NativeWorkerSession(NativeProcessSession):
             # actually finished - and return the complete profile
             return profile_finished
 
-    def get_profile(self, profile_id, details=None):
+    def stop_profiler(self, profiler, details=None):
         """
-        Get a profile previously produced by a profiler run.
+        Registered under: ``crossbar.node.<node_id>.worker.<worker_id>.stop_profiler``
+
+        Stop a running profiler (currently only supported by the ``sampler``
+        profiler) before its runtime is over, or when it was started to run
+        continuously. The profile is then stored and can be queried later.
+
+        :param profiler: The profiler to stop, e.g. ``sampler``.
+        :type profiler: unicode
+        :param details: WAMP call details (auto-filled by WAMP).
+        :type details: obj
+        :returns: The ID of the profile.
+        :rtype: unicode
+        """
+        if profiler not in PROFILERS or not hasattr(PROFILERS[profiler], 'stop'):
+            raise ApplicationError(u'crossbar.error.no_such_object', 'no profiler {} that can be stopped'.format(profiler))
+
+        profile_id = PROFILERS[profiler]._profile_id
+        if profile_id is None:
+            raise ApplicationError(u'crossbar.error.not_running', 'profiler {} is not running'.format(profiler))
+
+        PROFILERS[profiler].stop()
+        return profile_id
+
+    def get_profile(self, profile_id, format=None, details=None):
+        """
+        Get a profile previously produced by a profiler run, or the profile
+        sampled so far by the running ``sampler`` profiler.
 
         This procedure is registered under WAMP URI
         ``crossbar.node.<node_id>.worker.<worker_id>.get_profile``.
 
         When no profile with given ID exists, a WAMP error
         ``crossbar.error.no_such_object`` is raised.
+
+        :param profile_id: The ID of the profile.
+        :type profile_id: unicode
+        :param format: The format of ``sampler`` profiles, ``collapsed`` (the default,
+            for ``flamegraph.pl``) or ``speedscope``.
+        :type format: unicode
         """
-        if profile_id in self._profiles:
-            return self._profiles[profile_id]
+        sampler = PROFILERS[u'sampler']
+        if profile_id == sampler._profile_id:
+            profile = {
+                u'id': profile_id,
+                u'profiler': u'sampler',
+                u'runtime': None,
+                u'profile': sampler.snapshot()
+            }
+        elif profile_id in self._profiles:
+            profile = self._profiles[profile_id]
         else:
             raise ApplicationError(u'crossbar.error.no_such_object', 'no profile with ID {} saved'.format(profile_id))
 
+        if profile[u'profiler'] != u'sampler' or format is None:
+            return profile
+
+        if format not in PROFILE_FORMATS:
+            raise ApplicationError(u'crossbar.error.invalid_argument', 'invalid profile format {}'.format(format))
+
+        profile = dict(profile)
+        profile[u'profile'] = export_profile(profile[u'profile'], format, sampler._interval, u'{} ({})'.format(self._uri_prefix, profile_id))
+        return profile
+
     def get_cpu_count(self, logical=True):
         """
         Returns the CPU core count on the machine this process is running on.
@@ -503,8 +580,11 @@ class NativeWorkerSession(NativeProcessSession):
         #
         # @see: https://pythonhosted.org/setuptools/pkg_resources.html#workingset-objects
         #
-        for p in paths_added_resolved:
-            pkg_resources.working_set.add_entry(p)
+        # (when pkg_resources wasn't imported yet, it will pick up the extended sys.path)
+        #
+        if 'pkg_resources' in sys.modules:
+            for p in paths_added_resolved:
+                sys.modules['pkg_resources'].working_set.add_entry(p)
 
         # publish event "on_pythonpath_add" to all but the caller
         #